@@ -0,0 +1,247 @@
+"""Registry of DiT variants served from one process under a memory budget.
+
+The primary ``AceStepHandler`` owns the VAE, text encoder and silence latent.
+Every other variant (turbo/sft/base/... from ``SUBMODEL_REGISTRY`` or local
+checkpoints) gets its own handler that loads only its DiT decoder and shares
+those components by reference, see ``AceStepHandler.initialize_variant``.
+
+Variant DiTs are loaded on first use. When the VRAM budget is exceeded, the
+least recently used idle variant is offloaded to CPU and uploaded again on its
+next request. The primary DiT stays resident because other endpoints use
+``app.state.handler`` directly.
+
+Environment:
+- ``ACESTEP_DIT_MODELS``: comma-separated extra variants to serve (``ACESTEP_CONFIG_PATH2``/``3`` are included).
+- ``ACESTEP_DIT_POOL_GPU_GB``: VRAM budget for variant DiT weights (default 0, unbounded).
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from loguru import logger
+
+_GB = 1024 ** 3
+
+
+def model_name(config_path: Optional[str]) -> str:
+    """Return the model name for a config path (its last path component)."""
+    if not config_path:
+        return ""
+    return os.path.basename(config_path.strip().rstrip("/\\"))
+
+
+def module_bytes(module: Any) -> int:
+    """Return the parameter and buffer size of a torch module (0 if unknown)."""
+    if module is None or not hasattr(module, "parameters"):
+        return 0
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def _default_handler_factory():
+    from acestep.handler import AceStepHandler
+
+    return AceStepHandler()
+
+
+@dataclass
+class _VariantEntry:
+    """One DiT variant handler and its residency state."""
+
+    config_path: str
+    handler: Any = None
+    load_lock: threading.Lock = field(default_factory=threading.Lock)
+    state: str = "empty"  # "empty", "gpu" or "cpu"
+    users: int = 0
+    last_used: float = 0.0
+    weight_bytes: int = 0
+    error: Optional[str] = None
+
+
+class DiTModelRegistry:
+    """Serves the primary DiT and on-demand variants that share its components."""
+
+    def __init__(
+        self,
+        primary: Any,
+        primary_config_path: Callable[[], str],
+        variants: Sequence[str] = (),
+        gpu_budget_bytes: int = 0,
+        handler_factory: Callable[[], Any] = _default_handler_factory,
+    ):
+        """Create a registry around ``primary``.
+
+        ``primary_config_path`` returns the primary's current config path (it
+        can change when the service is re-initialized). ``variants`` lists the
+        config paths that may be served in addition to the primary.
+        """
+        self.primary = primary
+        self.primary_config_path = primary_config_path
+        self.gpu_budget_bytes = max(0, int(gpu_budget_bytes))
+        self.handler_factory = handler_factory
+        self._entries: Dict[str, _VariantEntry] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.reuploads = 0
+        self.offloads = 0
+        for config_path in variants:
+            self.register(config_path)
+
+    @classmethod
+    def from_env(cls, primary: Any, primary_config_path: Callable[[], str]) -> "DiTModelRegistry":
+        """Build a registry from ``ACESTEP_CONFIG_PATH2/3``, ``ACESTEP_DIT_MODELS`` and the budget."""
+        variants = [os.getenv("ACESTEP_CONFIG_PATH2", ""), os.getenv("ACESTEP_CONFIG_PATH3", "")]
+        variants += os.getenv("ACESTEP_DIT_MODELS", "").split(",")
+        try:
+            budget_gb = float(os.getenv("ACESTEP_DIT_POOL_GPU_GB", "0"))
+        except ValueError:
+            logger.warning("[DiTModelRegistry] Invalid ACESTEP_DIT_POOL_GPU_GB; using no budget")
+            budget_gb = 0.0
+        return cls(primary, primary_config_path, variants=variants, gpu_budget_bytes=int(budget_gb * _GB))
+
+    def register(self, config_path: str) -> None:
+        """Allow ``config_path`` to be served; it is loaded on first use."""
+        config_path = (config_path or "").strip()
+        name = model_name(config_path)
+        if not name or name == model_name(self.primary_config_path()):
+            return
+        with self._lock:
+            self._entries.setdefault(name, _VariantEntry(config_path=config_path))
+
+    def primary_model(self) -> str:
+        """Return the primary model name."""
+        return model_name(self.primary_config_path())
+
+    def variant_models(self) -> List[str]:
+        """Return registered variant names that have not failed to load."""
+        with self._lock:
+            return [name for name, entry in self._entries.items() if entry.error is None]
+
+    def resolve(self, requested: Optional[str]) -> Optional[str]:
+        """Return the served model name matching ``requested``, or ``None``."""
+        name = model_name(requested)
+        if not name:
+            return None
+        if name == self.primary_model():
+            return name
+        with self._lock:
+            entry = self._entries.get(name)
+            return name if entry is not None and entry.error is None else None
+
+    @contextmanager
+    def acquire(self, name: Optional[str]) -> Iterator[Any]:
+        """Yield the handler for model ``name``, loading or uploading its DiT if needed.
+
+        Unknown names and the primary model yield the primary handler. The
+        variant cannot be offloaded while the context is open. Raises
+        ``RuntimeError`` when the variant fails to load.
+        """
+        with self._lock:
+            entry = self._entries.get(model_name(name))
+            if entry is None or model_name(name) == self.primary_model():
+                entry = None
+            else:
+                entry.users += 1
+        if entry is None:
+            yield self.primary
+            return
+        try:
+            with entry.load_lock:
+                if entry.state != "gpu":
+                    self._make_resident(entry)
+            with self._lock:
+                entry.last_used = time.monotonic()
+            yield entry.handler
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+
+    def preload(self, name: str) -> bool:
+        """Load a variant ahead of the first request; returns whether it is usable."""
+        try:
+            with self.acquire(name):
+                return True
+        except RuntimeError as exc:
+            logger.warning(f"[DiTModelRegistry] Preloading {name} failed: {exc}")
+            return False
+
+    def _dit_on_device(self, handler: Any) -> bool:
+        """Whether the registry manages placement (not the handler's own DiT offload)."""
+        return not (getattr(handler, "offload_to_cpu", False) and getattr(handler, "offload_dit_to_cpu", False))
+
+    def _make_resident(self, entry: _VariantEntry) -> None:
+        """Load or upload ``entry``'s DiT; called with its ``load_lock`` held."""
+        if entry.state == "cpu":
+            self._free_budget(entry.weight_bytes)
+            start = time.time()
+            entry.handler.model.to(entry.handler.device)
+            entry.state = "gpu"
+            with self._lock:
+                self.reuploads += 1
+            logger.info(f"[DiTModelRegistry] Uploaded {model_name(entry.config_path)} in {time.time() - start:.2f}s")
+            return
+
+        handler = entry.handler or self.handler_factory()
+        start = time.time()
+        status, ok = handler.initialize_variant(self.primary, entry.config_path)
+        if not ok:
+            entry.error = status
+            raise RuntimeError(f"DiT variant {entry.config_path} failed to load: {status}")
+        entry.handler = handler
+        entry.error = None
+        entry.weight_bytes = module_bytes(handler.model) if self._dit_on_device(handler) else 0
+        entry.state = "gpu"
+        with self._lock:
+            self.loads += 1
+        logger.info(f"[DiTModelRegistry] Loaded {model_name(entry.config_path)} in {time.time() - start:.2f}s")
+        self._free_budget(0)
+
+    def _free_budget(self, incoming_bytes: int) -> None:
+        """Offload idle variants to CPU, least recently used first, until the budget fits."""
+        if not self.gpu_budget_bytes:
+            return
+        while True:
+            with self._lock:
+                resident = [e for e in self._entries.values() if e.state == "gpu"]
+                used = sum(e.weight_bytes for e in resident) + incoming_bytes
+                victim = None
+                if used > self.gpu_budget_bytes:
+                    for entry in sorted(resident, key=lambda e: e.last_used):
+                        if entry.users == 0 and entry.weight_bytes and entry.load_lock.acquire(blocking=False):
+                            victim = entry
+                            break
+            if victim is None:
+                return
+            try:
+                victim.handler.model.to("cpu")
+                victim.state = "cpu"
+                victim.handler._empty_cache()
+                with self._lock:
+                    self.offloads += 1
+                logger.info(f"[DiTModelRegistry] Offloaded {model_name(victim.config_path)} to CPU")
+            finally:
+                victim.load_lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-variant residency and registry counters."""
+        with self._lock:
+            return {
+                "primary": self.primary_model(),
+                "variants": {
+                    name: {"state": e.state, "users": e.users, "weight_bytes": e.weight_bytes, "error": e.error}
+                    for name, e in self._entries.items()
+                },
+                "gpu_budget_bytes": self.gpu_budget_bytes,
+                "loads": self.loads,
+                "reuploads": self.reuploads,
+                "offloads": self.offloads,
+            }
@@ -0,0 +1,115 @@
+"""Unit tests for the shared-component DiT variant registry."""
+
+import unittest
+
+import torch
+
+from acestep.api.dit_model_registry import DiTModelRegistry
+
+
+class _FakeHandler:
+    """AceStepHandler stand-in with a real module as DiT."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.device = "meta"
+        self.offload_to_cpu = False
+        self.offload_dit_to_cpu = False
+        self.model = None
+        self.vae = None
+        self.variant_calls = 0
+        self.cache_clears = 0
+
+    def initialize_variant(self, base, config_path):
+        self.variant_calls += 1
+        if self.fail:
+            return "boom", False
+        self.vae = base.vae
+        self.model = torch.nn.Linear(16, 16)  # 272 float32 values
+        return "ok", True
+
+    def _empty_cache(self):
+        self.cache_clears += 1
+
+
+def _make_registry(variants=("acestep-v15-sft", "acestep-v15-base"), budget=0):
+    primary = _FakeHandler()
+    primary.vae = object()
+    created = []
+
+    def _factory():
+        handler = _FakeHandler()
+        created.append(handler)
+        return handler
+
+    registry = DiTModelRegistry(
+        primary,
+        lambda: "acestep-v15-turbo",
+        variants=variants,
+        gpu_budget_bytes=budget,
+        handler_factory=_factory,
+    )
+    return registry, primary, created
+
+
+class DiTModelRegistryTests(unittest.TestCase):
+    """Tests for DiTModelRegistry routing, sharing and offload."""
+
+    def test_unknown_and_primary_names_use_primary(self):
+        """The primary name, empty names and unregistered names get the primary handler."""
+        registry, primary, created = _make_registry()
+        for name in (None, "", "acestep-v15-turbo", "nope"):
+            with registry.acquire(name) as handler:
+                self.assertIs(handler, primary)
+        self.assertIsNone(registry.resolve("nope"))
+        self.assertEqual(created, [])
+
+    def test_variant_loads_once_and_shares_base_components(self):
+        """A variant is initialized from the primary on first use and reused afterwards."""
+        registry, primary, created = _make_registry()
+        for _ in range(2):
+            with registry.acquire("acestep-v15-sft") as handler:
+                self.assertIs(handler.vae, primary.vae)
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0].variant_calls, 1)
+        self.assertEqual(registry.resolve("/ckpt/acestep-v15-sft/"), "acestep-v15-sft")
+
+    def test_lru_idle_variant_is_offloaded_over_budget(self):
+        """Exceeding the budget moves the least recently used idle DiT to CPU and back."""
+        registry, _primary, created = _make_registry(budget=272 * 4)
+        with registry.acquire("acestep-v15-sft"):
+            pass
+        with registry.acquire("acestep-v15-base"):
+            pass
+        self.assertEqual(registry.stats()["variants"]["acestep-v15-sft"]["state"], "cpu")
+        self.assertEqual(created[0].model.weight.device.type, "cpu")
+        with registry.acquire("acestep-v15-sft") as handler:
+            self.assertEqual(handler.model.weight.device.type, "meta")
+        self.assertEqual(registry.stats()["variants"]["acestep-v15-base"]["state"], "cpu")
+        self.assertEqual(registry.stats()["reuploads"], 1)
+        self.assertEqual(created[0].variant_calls, 1)
+
+    def test_variant_in_use_is_not_offloaded(self):
+        """A variant held by a running job stays on the device."""
+        registry, _primary, _created = _make_registry(budget=272 * 4)
+        with registry.acquire("acestep-v15-sft"):
+            with registry.acquire("acestep-v15-base"):
+                states = {name: v["state"] for name, v in registry.stats()["variants"].items()}
+        self.assertEqual(states, {"acestep-v15-sft": "gpu", "acestep-v15-base": "gpu"})
+
+    def test_failed_variant_is_hidden(self):
+        """A variant that fails to load raises and is no longer advertised."""
+        registry, _primary, _created = _make_registry(variants=("acestep-v15-sft",))
+        registry.handler_factory = lambda: _FakeHandler(fail=True)
+        self.assertFalse(registry.preload("acestep-v15-sft"))
+        self.assertEqual(registry.variant_models(), [])
+        self.assertIsNone(registry.resolve("acestep-v15-sft"))
+
+    def test_primary_config_is_not_registered_as_variant(self):
+        """Listing the primary model among the variants does not duplicate it."""
+        registry, _primary, _created = _make_registry(variants=("acestep-v15-turbo", "", "acestep-v15-sft"))
+        self.assertEqual(registry.variant_models(), ["acestep-v15-sft"])
+
+
+if __name__ == "__main__":
+    unittest.main()
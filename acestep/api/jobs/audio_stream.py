@@ -0,0 +1,356 @@
+"""Progressive audio streams for API jobs.
+
+While the VAE decodes, ``AceStepHandler.generate_music`` reports trimmed chunk
+cores through ``audio_chunk_callback``. ``JobAudioStreams`` turns those into
+one ``AudioStream`` per sample: PCM is encoded incrementally as it arrives and
+the encoded bytes are buffered so any number of HTTP readers can follow the
+stream from its start, long before the final file has been normalized and
+saved. Once the job has finished (its files are saved) and the last reader
+is done, ``AudioStreamRegistry`` drops the job and releases the buffers.
+
+mp3, opus and aac are encoded by an ``ffmpeg`` process fed with 16-bit PCM.
+Other formats, or hosts without ``ffmpeg``, stream WAV with an open-ended
+header. Streamed audio is clamped rather than peak-normalized, so it can
+differ slightly from the saved file.
+"""
+
+import shutil
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import torch
+from loguru import logger
+
+# format -> (ffmpeg muxer, ffmpeg codec, media type)
+_FFMPEG_FORMATS = {
+    "mp3": ("mp3", "libmp3lame", "audio/mpeg"),
+    "opus": ("ogg", "libopus", "audio/ogg"),
+    "aac": ("adts", "aac", "audio/aac"),
+}
+_UNKNOWN_SIZE = 0xFFFFFFFF
+
+
+def stream_format(audio_format: Optional[str]) -> str:
+    """Return the format a stream for ``audio_format`` will actually use."""
+    fmt = (audio_format or "").lower()
+    if fmt in _FFMPEG_FORMATS and shutil.which("ffmpeg"):
+        return fmt
+    return "wav"
+
+
+def stream_media_type(fmt: str) -> str:
+    """Return the HTTP media type for a stream format."""
+    return _FFMPEG_FORMATS[fmt][2] if fmt in _FFMPEG_FORMATS else "audio/wav"
+
+
+def _pcm16(audio: torch.Tensor) -> bytes:
+    """Interleave a ``[channels, samples]`` float tensor as little-endian int16 PCM."""
+    pcm = (audio.clamp(-1.0, 1.0) * 32767.0).round().to(torch.int16)
+    return np.ascontiguousarray(pcm.t().numpy()).astype("<i2", copy=False).tobytes()
+
+
+class WavStreamEncoder:
+    """16-bit WAV with an open-ended header, written as PCM arrives."""
+
+    def __init__(self, sample_rate: int, channels: int, sink: Callable[[bytes], None]):
+        self.sink = sink
+        block_align = channels * 2
+        header = b"RIFF" + _UNKNOWN_SIZE.to_bytes(4, "little") + b"WAVE"
+        header += b"fmt " + (16).to_bytes(4, "little") + (1).to_bytes(2, "little")
+        header += channels.to_bytes(2, "little") + sample_rate.to_bytes(4, "little")
+        header += (sample_rate * block_align).to_bytes(4, "little") + block_align.to_bytes(2, "little")
+        header += (16).to_bytes(2, "little")
+        header += b"data" + _UNKNOWN_SIZE.to_bytes(4, "little")
+        self.sink(header)
+
+    def encode(self, audio: torch.Tensor) -> None:
+        """Append ``[channels, samples]`` audio."""
+        self.sink(_pcm16(audio))
+
+    def finish(self) -> None:
+        """Nothing is buffered; the header stays open-ended."""
+
+
+class FfmpegStreamEncoder:
+    """Pipes PCM through ``ffmpeg`` and forwards encoded frames as ffmpeg emits them."""
+
+    def __init__(
+        self,
+        fmt: str,
+        sample_rate: int,
+        channels: int,
+        sink: Callable[[bytes], None],
+        bitrate: str = "192k",
+    ):
+        muxer, codec, _media_type = _FFMPEG_FORMATS[fmt]
+        self.sink = sink
+        self._process = subprocess.Popen(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+                "-c:a", codec, "-b:a", bitrate, "-f", muxer, "-flush_packets", "1", "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._reader = threading.Thread(target=self._read, name=f"audio-stream-{fmt}", daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        while True:
+            data = self._process.stdout.read1(64 * 1024)
+            if not data:
+                return
+            self.sink(data)
+
+    def encode(self, audio: torch.Tensor) -> None:
+        """Feed ``[channels, samples]`` audio to the encoder."""
+        self._process.stdin.write(_pcm16(audio))
+        self._process.stdin.flush()
+
+    def finish(self) -> None:
+        """Flush the encoder and wait for its last frames."""
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        self._reader.join()
+        self._process.wait()
+
+
+class AudioStream:
+    """Encoded audio of one sample, readable while it is still being written."""
+
+    def __init__(self, fmt: str, sample_rate: int):
+        self.format = fmt
+        self.media_type = stream_media_type(fmt)
+        self.sample_rate = sample_rate
+        self._cond = threading.Condition()
+        self._chunks: List[bytes] = []
+        self._encoder = None
+        self._position = 0
+        self.closed = False
+        self.released = False
+        self.error: Optional[str] = None
+        self.readers = 0
+        self.on_reader_exit: Optional[Callable[[], None]] = None
+
+    def _append(self, data: bytes) -> None:
+        with self._cond:
+            self._chunks.append(data)
+            self._cond.notify_all()
+
+    def _make_encoder(self, channels: int):
+        if self.format in _FFMPEG_FORMATS:
+            try:
+                return FfmpegStreamEncoder(self.format, self.sample_rate, channels, self._append)
+            except OSError as exc:
+                logger.warning(f"[AudioStream] ffmpeg unavailable ({exc}); streaming WAV instead")
+                self.format, self.media_type = "wav", stream_media_type("wav")
+        return WavStreamEncoder(self.sample_rate, channels, self._append)
+
+    def write(self, start_sample: int, audio: torch.Tensor, final: bool = False) -> None:
+        """Encode the part of ``audio`` (starting at ``start_sample``) not written yet.
+
+        ``final=True`` marks ``audio`` as the end of the sample and closes the stream.
+        """
+        if self.closed:
+            return
+        skip = self._position - start_sample
+        if skip < audio.shape[-1]:
+            new = audio[:, max(0, skip):]
+            if self._encoder is None:
+                encoder = self._make_encoder(audio.shape[0])
+                with self._cond:
+                    self._encoder = encoder
+                    self._cond.notify_all()
+            self._encoder.encode(new)
+            self._position += new.shape[-1]
+        if final:
+            self.close()
+
+    def close(self, error: Optional[str] = None) -> None:
+        """End the stream; readers see ``error`` if one is given."""
+        if self.closed:
+            return
+        try:
+            if self._encoder is not None:
+                self._encoder.finish()
+        finally:
+            with self._cond:
+                self.closed = True
+                self.error = error
+                self._cond.notify_all()
+
+    def wait_media_type(self, timeout: float = 600.0) -> Optional[str]:
+        """Wait until the encoder is chosen and return the media type it produces.
+
+        The ffmpeg-to-WAV fallback only happens when the first audio arrives,
+        so read the media type through this rather than ``media_type``.
+        Returns ``None`` once the stream has been released.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._encoder is not None or self.closed or self.released, timeout)
+            return None if self.released else self.media_type
+
+    def open_reader(self, idle_timeout: float = 600.0) -> Iterator[bytes]:
+        """``iter_bytes`` as a registered reader.
+
+        The reader is registered when iteration starts and unregistered when
+        the iterator is exhausted or closed, so the buffers are kept until
+        every started reader has finished but never for one that never ran.
+        """
+        with self._cond:
+            self.readers += 1
+        try:
+            yield from self.iter_bytes(idle_timeout)
+        finally:
+            with self._cond:
+                self.readers -= 1
+            if self.on_reader_exit is not None:
+                self.on_reader_exit()
+
+    def release(self) -> None:
+        """Drop the buffered bytes; later readers of this stream get nothing."""
+        with self._cond:
+            self._chunks = []
+            self.released = True
+            self._cond.notify_all()
+
+    def iter_bytes(self, idle_timeout: float = 600.0) -> Iterator[bytes]:
+        """Yield encoded bytes from the start, waiting for more until the stream closes."""
+        index = 0
+        while True:
+            with self._cond:
+                if index >= len(self._chunks) and not self.closed:
+                    self._cond.wait(idle_timeout)
+                    if index >= len(self._chunks) and not self.closed:
+                        return
+                pending = self._chunks[index:]
+                closed = self.closed
+            index += len(pending)
+            if pending:
+                yield b"".join(pending)
+            elif closed:
+                return
+
+
+class JobAudioStreams:
+    """The per-sample audio streams of one job."""
+
+    def __init__(self, audio_format: Optional[str], sample_rate: int):
+        self.format = stream_format(audio_format)
+        self.media_type = stream_media_type(self.format)
+        self.sample_rate = sample_rate
+        self._streams: Dict[int, AudioStream] = {}
+        self._lock = threading.Lock()
+        self.closed_at: Optional[float] = None
+        # Called when the job is closed and whenever a reader finishes
+        self.on_idle: Optional[Callable[[], None]] = None
+
+    def stream(self, index: int) -> AudioStream:
+        """Return the stream of sample ``index``, creating it if needed."""
+        with self._lock:
+            stream = self._streams.get(index)
+            if stream is None:
+                stream = AudioStream(self.format, self.sample_rate)
+                stream.on_reader_exit = self._notify_idle
+                if self.closed_at is not None:
+                    stream.close("no audio was produced for this index")
+                self._streams[index] = stream
+            return stream
+
+    def callback(self, offset: int = 0) -> Callable[..., None]:
+        """Return an ``audio_chunk_callback`` whose sample indexes start at ``offset``."""
+
+        def _on_chunk(sample_index: int, start_sample: int, audio: torch.Tensor, final: bool = False) -> None:
+            try:
+                self.stream(offset + sample_index).write(start_sample, audio, final=final)
+            except Exception as exc:
+                # Streaming is best-effort; never fail the generation for it
+                logger.warning(f"[AudioStream] Dropping stream {offset + sample_index}: {exc}")
+                self.stream(offset + sample_index).close(str(exc))
+
+        return _on_chunk
+
+    def close_all(self, error: Optional[str] = None) -> None:
+        """Close every stream (idempotent); call once the job's files are saved."""
+        with self._lock:
+            streams = list(self._streams.values())
+            if self.closed_at is None:
+                self.closed_at = time.time()
+        for stream in streams:
+            stream.close(error)
+        self._notify_idle()
+
+    def idle(self) -> bool:
+        """Whether the job is closed and no reader is still streaming."""
+        with self._lock:
+            return self.closed_at is not None and all(s.readers == 0 for s in self._streams.values())
+
+    def release(self) -> None:
+        """Drop the buffered bytes of every stream."""
+        with self._lock:
+            streams = list(self._streams.values())
+        for stream in streams:
+            stream.release()
+
+    def _notify_idle(self) -> None:
+        if self.on_idle is not None:
+            self.on_idle()
+
+
+class AudioStreamRegistry:
+    """Job id -> ``JobAudioStreams``.
+
+    A closed job is dropped, and its buffers released, as soon as its last
+    reader finishes; ``ttl_seconds`` bounds how long a reader that never
+    finishes can keep it alive.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600.0):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, JobAudioStreams] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, audio_format: Optional[str], sample_rate: int) -> JobAudioStreams:
+        """Register streams for ``job_id``."""
+        self._prune()
+        streams = JobAudioStreams(audio_format, sample_rate)
+        streams.on_idle = self._prune
+        with self._lock:
+            self._jobs[job_id] = streams
+        return streams
+
+    def get(self, job_id: str) -> Optional[JobAudioStreams]:
+        """Return the streams of ``job_id`` while they can still be read.
+
+        ``None`` if the job was created without streaming or has finished
+        and been released (read its saved files instead).
+        """
+        self._prune()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def close(self, job_id: str, error: Optional[str] = None) -> None:
+        """Close the streams of ``job_id`` (if any) and release them once unread."""
+        with self._lock:
+            streams = self._jobs.get(job_id)
+        if streams is not None:
+            streams.close_all(error)
+        self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, streams in self._jobs.items()
+                if streams.closed_at is not None and (streams.closed_at < cutoff or streams.idle())
+            ]
+            released = [self._jobs.pop(job_id) for job_id in expired]
+        for streams in released:
+            streams.release()
@@ -0,0 +1,150 @@
+"""Unit tests for progressive job audio streams."""
+
+import struct
+import threading
+import unittest
+from unittest import mock
+
+import torch
+
+from acestep.api.jobs import audio_stream
+from acestep.api.jobs.audio_stream import AudioStream, AudioStreamRegistry, JobAudioStreams
+
+
+def _wav_streams():
+    """Streams that always use the dependency-free WAV encoder."""
+    return JobAudioStreams("wav", 48000)
+
+
+def _pcm(data: bytes):
+    """Decode the int16 samples following the 44-byte WAV header."""
+    body = data[44:]
+    return list(struct.unpack(f"<{len(body) // 2}h", body))
+
+
+class AudioStreamTests(unittest.TestCase):
+    """Tests for AudioStream, JobAudioStreams and AudioStreamRegistry."""
+
+    def test_wav_header_and_interleaved_pcm(self):
+        """The stream starts with an open-ended WAV header followed by interleaved PCM."""
+        streams = _wav_streams()
+        callback = streams.callback()
+        callback(0, 0, torch.tensor([[0.5, -0.5], [1.0, 0.0]]), final=True)
+        data = b"".join(streams.stream(0).iter_bytes())
+        self.assertEqual(data[:4], b"RIFF")
+        self.assertEqual(data[8:12], b"WAVE")
+        self.assertEqual(struct.unpack("<H", data[22:24])[0], 2)
+        self.assertEqual(_pcm(data), [16384, 32767, -16384, 0])
+        self.assertEqual(streams.media_type, "audio/wav")
+
+    def test_overlapping_writes_are_deduplicated(self):
+        """Re-sent ranges (decode fallbacks, final flush) only add samples not written yet."""
+        streams = _wav_streams()
+        callback = streams.callback()
+        full = torch.linspace(-0.5, 0.5, 10).reshape(1, 10)
+        callback(0, 0, full[:, :4])
+        callback(0, 0, full[:, :6])
+        callback(0, 6, full[:, 6:8])
+        callback(0, 0, full, final=True)
+        data = b"".join(streams.stream(0).iter_bytes())
+        expected = [int(round(v * 32767)) for v in full[0].tolist()]
+        self.assertEqual(_pcm(data), expected)
+
+    def test_reader_receives_bytes_before_stream_closes(self):
+        """A reader gets early chunks while later audio is still being produced."""
+        streams = _wav_streams()
+        callback = streams.callback()
+        callback(0, 0, torch.zeros(1, 4))
+        reader = streams.stream(0).iter_bytes()
+        first = next(reader)
+        self.assertEqual(len(first), 44 + 8)
+        closer = threading.Timer(0.05, lambda: callback(0, 0, torch.zeros(1, 6), final=True))
+        closer.start()
+        rest = b"".join(reader)
+        closer.join()
+        self.assertEqual(len(rest), 4)
+
+    def test_callback_offset_and_close_all(self):
+        """Offsets map batch indexes to job-wide indexes; close_all ends idle streams."""
+        streams = _wav_streams()
+        streams.callback(offset=2)(0, 0, torch.zeros(1, 3), final=True)
+        self.assertTrue(streams.stream(2).closed)
+        waiting = streams.stream(3)
+        streams.close_all(error="boom")
+        self.assertTrue(waiting.closed)
+        self.assertEqual(waiting.error, "boom")
+        self.assertEqual(b"".join(waiting.iter_bytes()), b"")
+        self.assertTrue(streams.stream(7).closed)
+
+    def test_registry_prunes_expired_jobs(self):
+        """Closed job streams older than the TTL are dropped on the next create."""
+        registry = AudioStreamRegistry(ttl_seconds=0)
+        old = registry.create("old", "wav", 48000)
+        old.close_all()
+        old.closed_at -= 1
+        registry.create("new", "wav", 48000)
+        self.assertIsNone(registry.get("old"))
+        self.assertIsNotNone(registry.get("new"))
+
+    def test_closed_job_without_readers_is_released(self):
+        """Once a finished job has no reader its buffers are dropped."""
+        registry = AudioStreamRegistry()
+        streams = registry.create("job", "wav", 48000)
+        streams.callback()(0, 0, torch.zeros(1, 4), final=True)
+        stream = streams.stream(0)
+        registry.close("job")
+        self.assertIsNone(registry.get("job"))
+        self.assertEqual(b"".join(stream.iter_bytes()), b"")
+
+    def test_closed_job_is_kept_until_last_reader_finishes(self):
+        """A reader that started before the job finished still gets every byte."""
+        registry = AudioStreamRegistry()
+        streams = registry.create("job", "wav", 48000)
+        callback = streams.callback()
+        callback(0, 0, torch.zeros(1, 4))
+        first = streams.stream(0).open_reader()
+        second = streams.stream(0).open_reader()
+        first_head, second_head = next(first), next(second)
+        callback(0, 0, torch.zeros(1, 6), final=True)
+        streams.close_all()
+        self.assertIs(registry.get("job"), streams)
+
+        self.assertEqual(len(first_head + b"".join(first)), 44 + 12)
+        self.assertIs(registry.get("job"), streams)
+        self.assertEqual(len(second_head + b"".join(second)), 44 + 12)
+        self.assertIsNone(registry.get("job"))
+
+    def test_unstarted_or_abandoned_reader_does_not_pin_job(self):
+        """Only a reader that is being iterated keeps a finished job; closing it early lets go."""
+        registry = AudioStreamRegistry()
+        streams = registry.create("job", "wav", 48000)
+        streams.callback()(0, 0, torch.zeros(1, 4))
+        never_started = streams.stream(0).open_reader()
+        abandoned = streams.stream(0).open_reader()
+        next(abandoned)
+        self.assertEqual(streams.stream(0).readers, 1)
+        streams.close_all()
+        self.assertIs(registry.get("job"), streams)
+
+        abandoned.close()
+        self.assertEqual(streams.stream(0).readers, 0)
+        self.assertIsNone(registry.get("job"))
+        self.assertIsNone(streams.stream(0).wait_media_type(0))
+        never_started.close()
+
+    def test_media_type_follows_ffmpeg_fallback(self):
+        """wait_media_type reports WAV once a failed ffmpeg start has fallen back to it."""
+        stream = AudioStream("mp3", 48000)
+        self.assertEqual(stream.wait_media_type(0), "audio/mpeg")
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(stream.wait_media_type(5)))
+        waiter.start()
+        with mock.patch.object(audio_stream.subprocess, "Popen", side_effect=OSError("no ffmpeg")):
+            stream.write(0, torch.zeros(2, 4), final=True)
+        waiter.join(5)
+        self.assertEqual(result, ["audio/wav"])
+        self.assertEqual(b"".join(stream.iter_bytes())[:4], b"RIFF")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""In-memory publish/subscribe of job state changes for push-based progress.
+
+``_JobStore`` publishes a snapshot whenever a job changes (progress, stage,
+status text, success or failure). Subscribers are asyncio consumers such as
+the SSE endpoint; publishing is thread-safe and never blocks the worker that
+reports progress. Consecutive progress snapshots that a slow subscriber has
+not read yet are coalesced, so a subscriber only ever sees the latest
+progress and every terminal event.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+TERMINAL_EVENTS = ("result", "error")
+
+
+class JobSubscription:
+    """Events of one job for one subscriber, consumed on its event loop."""
+
+    def __init__(self, bus: "JobEventBus", job_id: str, loop: asyncio.AbstractEventLoop):
+        self.bus = bus
+        self.job_id = job_id
+        self._loop = loop
+        self._ready = asyncio.Event()
+        self._lock = threading.Lock()
+        self._pending: Deque[Dict[str, Any]] = deque()
+
+    def _push(self, event: Dict[str, Any]) -> None:
+        """Queue ``event`` (from any thread) and wake the consumer."""
+        with self._lock:
+            if event.get("type") == "progress" and self._pending and self._pending[-1].get("type") == "progress":
+                self._pending[-1] = event
+            else:
+                self._pending.append(event)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Loop already closed; the subscriber is gone.
+            pass
+
+    async def get(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Return pending events, waiting up to ``timeout`` seconds (``[]`` on timeout)."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        with self._lock:
+            events = list(self._pending)
+            self._pending.clear()
+        return events
+
+    def close(self) -> None:
+        """Stop receiving events."""
+        self.bus.unsubscribe(self)
+
+
+class JobEventBus:
+    """Fans job snapshots out to the subscribers of each job."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[JobSubscription]] = {}
+        self.published = 0
+
+    def subscribe(self, job_id: str) -> JobSubscription:
+        """Subscribe the running event loop to ``job_id``."""
+        subscription = JobSubscription(self, job_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: JobSubscription) -> None:
+        """Remove ``subscription``; unknown subscriptions are ignored."""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.job_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.job_id]
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        """Send ``event`` to every subscriber of ``job_id`` (cheap when there are none)."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+            if subscribers:
+                self.published += 1
+        for subscription in subscribers:
+            subscription._push(event)
+
+    def stats(self) -> Dict[str, int]:
+        """Return subscriber and event counters."""
+        with self._lock:
+            return {
+                "jobs": len(self._subscribers),
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+                "published": self.published,
+            }
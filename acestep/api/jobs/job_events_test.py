@@ -0,0 +1,60 @@
+"""Unit tests for the in-memory job event bus."""
+
+import asyncio
+import threading
+import unittest
+
+from acestep.api.jobs.job_events import JobEventBus
+
+
+class JobEventBusTests(unittest.IsolatedAsyncioTestCase):
+    """Tests for JobEventBus and JobSubscription."""
+
+    async def test_events_reach_only_subscribers_of_the_job(self):
+        """Subscribers receive events of their own job only."""
+        bus = JobEventBus()
+        sub_a = bus.subscribe("a")
+        sub_b = bus.subscribe("b")
+        bus.publish("a", {"type": "progress", "progress": 0.5})
+        self.assertEqual(await sub_a.get(timeout=1), [{"type": "progress", "progress": 0.5}])
+        self.assertEqual(await sub_b.get(timeout=0.01), [])
+
+    async def test_unread_progress_is_coalesced_but_terminal_events_kept(self):
+        """A slow subscriber sees the latest progress and every terminal event."""
+        bus = JobEventBus()
+        sub = bus.subscribe("job")
+        for value in (0.1, 0.2, 0.3):
+            bus.publish("job", {"type": "progress", "progress": value})
+        bus.publish("job", {"type": "result", "result": {"ok": True}})
+        events = await sub.get(timeout=1)
+        self.assertEqual([e["type"] for e in events], ["progress", "result"])
+        self.assertEqual(events[0]["progress"], 0.3)
+
+    async def test_publish_from_worker_thread_wakes_subscriber(self):
+        """Publishing from another thread wakes the subscriber's event loop."""
+        bus = JobEventBus()
+        sub = bus.subscribe("job")
+        thread = threading.Thread(target=bus.publish, args=("job", {"type": "error", "error": "boom"}))
+        thread.start()
+        events = await sub.get(timeout=1)
+        thread.join()
+        self.assertEqual(events, [{"type": "error", "error": "boom"}])
+
+    async def test_close_unsubscribes(self):
+        """Closed subscriptions stop receiving and are removed from the stats."""
+        bus = JobEventBus()
+        sub = bus.subscribe("job")
+        self.assertEqual(bus.stats()["subscribers"], 1)
+        sub.close()
+        bus.publish("job", {"type": "progress"})
+        self.assertEqual(bus.stats(), {"jobs": 0, "subscribers": 0, "published": 0})
+        self.assertEqual(await sub.get(timeout=0.01), [])
+
+    async def test_get_times_out_without_events(self):
+        """get returns an empty list when nothing arrives in time."""
+        sub = JobEventBus().subscribe("job")
+        self.assertEqual(await asyncio.wait_for(sub.get(timeout=0.01), 1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
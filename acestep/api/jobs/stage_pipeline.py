@@ -0,0 +1,137 @@
+"""Staged job execution with dedicated worker threads per stage and bounded hand-offs.
+
+A job is a generator. Code runs on the worker of the current stage until the
+generator yields the name of a later stage; the job is then handed to that
+stage's queue and continues there. ``return value`` completes the job. The
+queues between stages are bounded, so a slow stage applies back-pressure to
+the stages before it, while different jobs occupy different stages at once
+(job N+1 plans with the LM while job N is in diffusion or being encoded).
+
+A stage may have several workers (``stage_workers``), e.g. so that several
+jobs can reach the DiT stage together and share a diffusion batch.
+
+Stages only move forward: yielding the current or an earlier stage keeps
+running on the current worker, which keeps the queue graph acyclic.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Generator, List, Optional, Sequence
+
+from loguru import logger
+
+StageJob = Generator[str, None, Any]
+
+_STOP = object()
+
+
+def run_stages(job: StageJob) -> Any:
+    """Run a staged job to completion on the calling thread."""
+    try:
+        while True:
+            next(job)
+    except StopIteration as stop:
+        return stop.value
+
+
+class StagePipeline:
+    """Fixed chain of named stages, each served by dedicated worker threads."""
+
+    def __init__(
+        self,
+        stage_names: Sequence[str],
+        queue_size: int = 1,
+        name: str = "pipeline",
+        stage_workers: Optional[Dict[str, int]] = None,
+    ):
+        if not stage_names:
+            raise ValueError("StagePipeline needs at least one stage")
+        self.stage_names: List[str] = list(stage_names)
+        self._index: Dict[str, int] = {stage: i for i, stage in enumerate(self.stage_names)}
+        self.queue_size = max(1, int(queue_size))
+        # The first stage is fed by callers (which must never block); later
+        # hand-offs are bounded so a busy stage stalls its producers.
+        self._queues: List[queue.Queue] = [queue.Queue()] + [
+            queue.Queue(maxsize=self.queue_size) for _ in self.stage_names[1:]
+        ]
+        workers = stage_workers or {}
+        self._workers = [max(1, int(workers.get(stage, 1))) for stage in self.stage_names]
+        self._busy = [0] * len(self.stage_names)
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(i,),
+                name=f"{name}-{stage}" if self._workers[i] == 1 else f"{name}-{stage}-{n}",
+                daemon=True,
+            )
+            for i, stage in enumerate(self.stage_names)
+            for n in range(self._workers[i])
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def capacity(self) -> int:
+        """Number of jobs that can be in flight past the first stage's input queue."""
+        return sum(self._workers) + self.queue_size * (len(self.stage_names) - 1)
+
+    def submit(self, job: StageJob) -> Future:
+        """Queue ``job`` on the first stage and return a future for its return value."""
+        future: Future = Future()
+        self._queues[0].put((job, future))
+        return future
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return queue depth, worker count and busy workers per stage."""
+        with self._lock:
+            busy = list(self._busy)
+        return {
+            stage: {"queued": self._queues[i].qsize(), "workers": self._workers[i], "busy": busy[i]}
+            for i, stage in enumerate(self.stage_names)
+        }
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the workers after the jobs already handed to them."""
+        for q, workers in zip(self._queues, self._workers):
+            for _ in range(workers):
+                q.put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _advance(self, stage_idx: int, job: StageJob) -> Optional[int]:
+        """Run ``job`` until it asks for a later stage; ``None`` once it has finished."""
+        while True:
+            requested = next(job)
+            target = self._index.get(requested)
+            if target is None:
+                raise ValueError(f"Unknown pipeline stage {requested!r}; expected one of {self.stage_names}")
+            if target > stage_idx:
+                return target
+
+    def _worker(self, stage_idx: int) -> None:
+        while True:
+            item = self._queues[stage_idx].get()
+            if item is _STOP:
+                return
+            job, future = item
+            if future.cancelled():
+                job.close()
+                continue
+            with self._lock:
+                self._busy[stage_idx] += 1
+            try:
+                target = self._advance(stage_idx, job)
+            except StopIteration as stop:
+                future.set_result(stop.value)
+                continue
+            except Exception as exc:
+                logger.debug(f"[StagePipeline] Job failed in stage {self.stage_names[stage_idx]!r}: {exc!r}")
+                future.set_exception(exc)
+                continue
+            finally:
+                with self._lock:
+                    self._busy[stage_idx] -= 1
+            self._queues[target].put((job, future))
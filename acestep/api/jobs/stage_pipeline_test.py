@@ -0,0 +1,117 @@
+"""Unit tests for the staged job pipeline."""
+
+import threading
+import unittest
+
+from acestep.api.jobs.stage_pipeline import StagePipeline, run_stages
+
+
+def _job(log, name, gates=None):
+    """Record which thread runs each stage; optionally wait on per-stage gates."""
+    log.append((name, "lm", threading.current_thread().name))
+    yield "dit"
+    if gates is not None:
+        gates[name].wait(5)
+    log.append((name, "dit", threading.current_thread().name))
+    yield "save"
+    log.append((name, "save", threading.current_thread().name))
+    return name.upper()
+
+
+class StagePipelineTests(unittest.TestCase):
+    """Tests for StagePipeline and run_stages."""
+
+    def setUp(self):
+        self.pipeline = StagePipeline(["lm", "dit", "save"], queue_size=1, name="test")
+
+    def tearDown(self):
+        self.pipeline.shutdown(wait=True)
+
+    def test_jobs_complete_on_their_stage_workers(self):
+        """Each stage runs on its own worker thread and the return value resolves the future."""
+        log = []
+        future = self.pipeline.submit(_job(log, "a"))
+        self.assertEqual(future.result(timeout=5), "A")
+        self.assertEqual([(stage, thread) for _, stage, thread in log], [
+            ("lm", "test-lm"),
+            ("dit", "test-dit"),
+            ("save", "test-save"),
+        ])
+
+    def test_next_job_plans_while_previous_is_in_dit(self):
+        """The LM stage accepts a new job while an earlier job is blocked in the DiT stage."""
+        log = []
+        gates = {"a": threading.Event(), "b": threading.Event()}
+        first = self.pipeline.submit(_job(log, "a", gates))
+        second_started = threading.Event()
+
+        def _second():
+            second_started.set()
+            yield from _job(log, "b", gates)
+            return "B"
+
+        second = self.pipeline.submit(_second())
+        self.assertTrue(second_started.wait(5))
+        self.assertFalse(first.done())
+        gates["a"].set()
+        gates["b"].set()
+        self.assertEqual(first.result(timeout=5), "A")
+        self.assertEqual(second.result(timeout=5), "B")
+
+    def test_exception_is_set_on_future(self):
+        """Errors raised inside a stage propagate through the future."""
+
+        def _failing():
+            yield "dit"
+            raise RuntimeError("boom")
+
+        with self.assertRaisesRegex(RuntimeError, "boom"):
+            self.pipeline.submit(_failing()).result(timeout=5)
+
+    def test_backward_yield_continues_in_place(self):
+        """Yielding an earlier stage keeps running on the current worker."""
+        threads = []
+
+        def _repeat():
+            for _ in range(2):
+                yield "dit"
+                threads.append(threading.current_thread().name)
+            return len(threads)
+
+        self.assertEqual(self.pipeline.submit(_repeat()).result(timeout=5), 2)
+        self.assertEqual(threads, ["test-dit", "test-dit"])
+
+    def test_unknown_stage_fails_job(self):
+        """Yielding a stage name that is not part of the pipeline fails the job."""
+
+        def _bad():
+            yield "nope"
+
+        with self.assertRaises(ValueError):
+            self.pipeline.submit(_bad()).result(timeout=5)
+
+    def test_stage_with_several_workers_runs_jobs_together(self):
+        """A stage with several workers holds several jobs at once and counts them as busy."""
+        pipeline = StagePipeline(["lm", "dit", "save"], name="multi", stage_workers={"dit": 2})
+        self.addCleanup(pipeline.shutdown, True)
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _meet(name):
+            yield "dit"
+            barrier.wait()
+            return name
+
+        futures = [pipeline.submit(_meet(name)) for name in ("a", "b")]
+        self.assertEqual([f.result(timeout=5) for f in futures], ["a", "b"])
+        self.assertEqual(pipeline.stats()["dit"]["workers"], 2)
+        self.assertEqual(pipeline.capacity, 6)
+
+    def test_run_stages_inline(self):
+        """run_stages drives a job to completion on the calling thread."""
+        log = []
+        self.assertEqual(run_stages(_job(log, "c")), "C")
+        self.assertEqual({thread for _, _, thread in log}, {threading.current_thread().name})
+
+
+if __name__ == "__main__":
+    unittest.main()
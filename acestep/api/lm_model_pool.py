@@ -0,0 +1,305 @@
+"""Pool of resident 5Hz LM handlers keyed by ``lm_model_path``.
+
+Requests may ask for a different LM (0.6B/1.7B/4B) than the one loaded at
+startup. Instead of re-initializing the shared handler and restoring it after
+every such request, the pool keeps one ``LLMHandler`` per model resident and
+routes each request to it. Loading only locks the model being loaded, so
+requests for models that are already resident never wait on it.
+
+Residency is bounded by a model count and, optionally, by a VRAM budget
+estimated from checkpoint sizes; the primary model counts against both.
+Idle models are evicted least recently used first, before the next model is
+loaded. With a host-memory budget, evicted PyTorch-backend models are moved to
+CPU RAM instead of being unloaded, so re-uploading them skips the disk load.
+The vLLM and MLX backends cannot be parked that way and are unloaded.
+
+Environment (the pool is only used when one of the first two is set;
+otherwise the API server ignores per-request ``lm_model_path``):
+- ``ACESTEP_LM_POOL_SIZE``: max resident LMs including the primary one (default 2).
+- ``ACESTEP_LM_POOL_GPU_GB``: VRAM budget for resident LM weights, primary included
+  (default 0, unbounded).
+- ``ACESTEP_LM_POOL_HOST_GB``: host RAM budget for parked LMs (default 0, parking disabled).
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+_WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt")
+_GB = 1024 ** 3
+
+
+def checkpoint_weight_bytes(model_dir: str) -> int:
+    """Return the size of the weight files under ``model_dir`` (0 if missing)."""
+    total = 0
+    for root, _dirs, files in os.walk(model_dir):
+        for name in files:
+            if name.endswith(_WEIGHT_SUFFIXES):
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total
+
+
+def _default_handler_factory():
+    from acestep.llm_inference import LLMHandler
+
+    return LLMHandler()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"[LMModelPool] Invalid {name}; using {default}")
+        return default
+
+
+@dataclass
+class _PoolEntry:
+    """One pooled handler and its residency state."""
+
+    handler: Any
+    load_lock: threading.Lock = field(default_factory=threading.Lock)
+    state: str = "empty"  # "empty", "gpu" or "host"
+    users: int = 0
+    last_used: float = 0.0
+    weight_bytes: int = 0
+
+
+class LMModelPool:
+    """Keeps several LM handlers resident and hands them out per request."""
+
+    def __init__(
+        self,
+        primary: Any,
+        default_init_params: Callable[[], Dict[str, Any]],
+        max_resident: int = 2,
+        gpu_budget_bytes: int = 0,
+        host_budget_bytes: int = 0,
+        handler_factory: Callable[[], Any] = _default_handler_factory,
+    ):
+        """Create a pool around the startup ``primary`` handler.
+
+        ``default_init_params`` returns the ``LLMHandler.initialize`` keyword
+        arguments used for pooled models (``lm_model_path`` is overridden).
+        The primary handler is never evicted; it counts as one resident model
+        and its checkpoint size counts against ``gpu_budget_bytes``.
+        """
+        self.primary = primary
+        self.default_init_params = default_init_params
+        self.max_resident = max(1, int(max_resident))
+        self.gpu_budget_bytes = max(0, int(gpu_budget_bytes))
+        self.host_budget_bytes = max(0, int(host_budget_bytes))
+        self.handler_factory = handler_factory
+        self._entries: Dict[str, _PoolEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.reuploads = 0
+        self.evictions = 0
+        self._primary_bytes: tuple = (None, 0)  # (lm_model_path, checkpoint bytes)
+
+    @classmethod
+    def from_env(
+        cls, primary: Any, default_init_params: Callable[[], Dict[str, Any]]
+    ) -> Optional["LMModelPool"]:
+        """Build a pool configured from ``ACESTEP_LM_POOL_*`` environment variables.
+
+        Returns ``None`` unless ``ACESTEP_LM_POOL_SIZE`` or
+        ``ACESTEP_LM_POOL_GPU_GB`` is set, so keeping several LMs resident
+        is opt-in.
+        """
+        if os.getenv("ACESTEP_LM_POOL_SIZE") is None and os.getenv("ACESTEP_LM_POOL_GPU_GB") is None:
+            return None
+        return cls(
+            primary,
+            default_init_params,
+            max_resident=int(_env_float("ACESTEP_LM_POOL_SIZE", 2)),
+            gpu_budget_bytes=int(_env_float("ACESTEP_LM_POOL_GPU_GB", 0) * _GB),
+            host_budget_bytes=int(_env_float("ACESTEP_LM_POOL_HOST_GB", 0) * _GB),
+        )
+
+    def primary_model(self) -> Optional[str]:
+        """Return the ``lm_model_path`` the primary handler was initialized with."""
+        params = getattr(self.primary, "last_init_params", None)
+        model = params.get("lm_model_path") if isinstance(params, dict) else None
+        return model.strip() if isinstance(model, str) else None
+
+    def _primary_weight_bytes(self) -> int:
+        """Checkpoint size of the loaded primary model (0 when it is not loaded)."""
+        model = self.primary_model()
+        if not model or not getattr(self.primary, "llm_initialized", False):
+            return 0
+        if self._primary_bytes[0] != model:
+            checkpoint_dir = self.default_init_params().get("checkpoint_dir", "")
+            self._primary_bytes = (model, checkpoint_weight_bytes(os.path.join(checkpoint_dir, model)))
+        return self._primary_bytes[1]
+
+    @contextmanager
+    def acquire(self, lm_model_path: Optional[str]) -> Iterator[Any]:
+        """Yield an initialized handler for ``lm_model_path``, loading it if needed.
+
+        Empty paths and the primary model yield the primary handler. The model
+        cannot be evicted while the context is open. Raises ``RuntimeError``
+        when the model fails to load.
+        """
+        desired = (lm_model_path or "").strip()
+        if not desired or desired == self.primary_model():
+            yield self.primary
+            return
+
+        with self._lock:
+            entry = self._entries.get(desired)
+            if entry is None:
+                entry = _PoolEntry(handler=self.handler_factory())
+                self._entries[desired] = entry
+            entry.users += 1
+        try:
+            with entry.load_lock:
+                if entry.state == "gpu":
+                    with self._lock:
+                        self.hits += 1
+                else:
+                    self._make_resident(desired, entry)
+            with self._lock:
+                entry.last_used = time.monotonic()
+            self._enforce_budget()
+            yield entry.handler
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+
+    def _make_resident(self, model: str, entry: _PoolEntry) -> None:
+        """Load or re-upload ``entry``; called with its ``load_lock`` held."""
+        params = dict(self.default_init_params())
+        params["lm_model_path"] = model
+        if not entry.weight_bytes:
+            entry.weight_bytes = checkpoint_weight_bytes(os.path.join(params.get("checkpoint_dir", ""), model))
+        self._enforce_budget(incoming_bytes=entry.weight_bytes)
+
+        handler = entry.handler
+        if entry.state == "host":
+            start = time.time()
+            if not getattr(handler, "offload_to_cpu", False):
+                handler.llm.to(handler.device)
+            entry.state = "gpu"
+            with self._lock:
+                self.reuploads += 1
+            logger.info(f"[LMModelPool] Re-uploaded {model} from host memory in {time.time() - start:.2f}s")
+            return
+
+        start = time.time()
+        status, ok = handler.initialize(**params)
+        if not ok:
+            entry.state = "empty"
+            raise RuntimeError(f"5Hz LM init failed for {model}: {status}")
+        entry.state = "gpu"
+        with self._lock:
+            self.loads += 1
+        logger.info(f"[LMModelPool] Loaded {model} in {time.time() - start:.2f}s")
+
+    def _enforce_budget(self, incoming_bytes: Optional[int] = None) -> None:
+        """Evict idle resident models until the count and VRAM budget fit.
+
+        ``incoming_bytes`` is the size of a model about to be loaded; it takes
+        a resident slot even when its size is unknown (0).
+        """
+        primary_bytes = self._primary_weight_bytes()
+        while True:
+            with self._lock:
+                resident = [(m, e) for m, e in self._entries.items() if e.state == "gpu"]
+                # The primary always holds one slot; the incoming model one more
+                count = len(resident) + 1 + (incoming_bytes is not None)
+                gpu_bytes = primary_bytes + sum(e.weight_bytes for _, e in resident) + (incoming_bytes or 0)
+                over = count > self.max_resident or (
+                    self.gpu_budget_bytes and gpu_bytes > self.gpu_budget_bytes
+                )
+                victim = self._pick_idle_locked(resident) if over else None
+            if victim is None:
+                return
+            self._demote(*victim)
+
+    def _pick_idle_locked(self, candidates: List[tuple]) -> Optional[tuple]:
+        """Return the LRU idle candidate with its ``load_lock`` taken, or ``None``."""
+        for model, entry in sorted(candidates, key=lambda item: item[1].last_used):
+            if entry.users == 0 and entry.load_lock.acquire(blocking=False):
+                return model, entry
+        return None
+
+    def _demote(self, model: str, entry: _PoolEntry) -> None:
+        """Park or unload an idle entry; its ``load_lock`` is held by the caller."""
+        try:
+            handler = entry.handler
+            can_park = (
+                self.host_budget_bytes
+                and getattr(handler, "llm_backend", None) == "pt"
+                and entry.weight_bytes <= self.host_budget_bytes
+            )
+            if can_park:
+                self._trim_host(entry.weight_bytes)
+                if not getattr(handler, "offload_to_cpu", False):
+                    handler.llm.to("cpu")
+                    self._empty_device_cache()
+                entry.state = "host"
+                logger.info(f"[LMModelPool] Parked {model} in host memory")
+            else:
+                handler.unload()
+                entry.state = "empty"
+                logger.info(f"[LMModelPool] Unloaded {model}")
+            with self._lock:
+                self.evictions += 1
+        finally:
+            entry.load_lock.release()
+
+    def _trim_host(self, incoming_bytes: int) -> None:
+        """Unload parked models until ``incoming_bytes`` fits the host budget."""
+        while True:
+            with self._lock:
+                parked = [(m, e) for m, e in self._entries.items() if e.state == "host"]
+                used = sum(e.weight_bytes for _, e in parked)
+                victim = self._pick_idle_locked(parked) if used + incoming_bytes > self.host_budget_bytes else None
+            if victim is None:
+                return
+            model, entry = victim
+            try:
+                entry.handler.unload()
+                entry.state = "empty"
+                logger.info(f"[LMModelPool] Dropped parked {model}")
+            finally:
+                entry.load_lock.release()
+
+    @staticmethod
+    def _empty_device_cache() -> None:
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-model residency and pool counters."""
+        with self._lock:
+            return {
+                "primary": self.primary_model(),
+                "models": {
+                    model: {"state": e.state, "users": e.users, "weight_bytes": e.weight_bytes}
+                    for model, e in self._entries.items()
+                },
+                "max_resident": self.max_resident,
+                "hits": self.hits,
+                "loads": self.loads,
+                "reuploads": self.reuploads,
+                "evictions": self.evictions,
+            }
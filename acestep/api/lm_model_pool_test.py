@@ -0,0 +1,224 @@
+"""Unit tests for the resident LM model pool."""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from acestep.api.lm_model_pool import LMModelPool
+
+
+class _FakeModel:
+    """Records the device the weights were moved to."""
+
+    def __init__(self):
+        self.device = "cuda"
+
+    def to(self, device):
+        self.device = device
+        return self
+
+
+class _FakeHandler:
+    """LLMHandler stand-in counting initialize/unload calls."""
+
+    def __init__(self, backend="pt", fail=False):
+        self.backend = backend
+        self.fail = fail
+        self.device = "cuda"
+        self.offload_to_cpu = False
+        self.llm = None
+        self.llm_backend = None
+        self.llm_initialized = False
+        self.last_init_params = None
+        self.init_calls = 0
+        self.unload_calls = 0
+
+    def initialize(self, **params):
+        self.init_calls += 1
+        if self.fail:
+            return "boom", False
+        self.llm = _FakeModel()
+        self.llm_backend = self.backend
+        self.llm_initialized = True
+        self.last_init_params = params
+        return "ok", True
+
+    def unload(self):
+        self.unload_calls += 1
+        self.llm = None
+        self.llm_initialized = False
+
+
+def _make_pool(max_resident=2, host_budget_bytes=0, backend="pt", gpu_budget_bytes=0, checkpoint_dir="/nonexistent"):
+    primary = _FakeHandler()
+    primary.initialize(lm_model_path="lm-0.6B")
+    created = []
+
+    def _factory():
+        handler = _FakeHandler(backend=backend)
+        created.append(handler)
+        return handler
+
+    pool = LMModelPool(
+        primary,
+        lambda: {"checkpoint_dir": checkpoint_dir, "backend": backend},
+        max_resident=max_resident,
+        gpu_budget_bytes=gpu_budget_bytes,
+        host_budget_bytes=host_budget_bytes,
+        handler_factory=_factory,
+    )
+    return pool, primary, created
+
+
+class LMModelPoolTests(unittest.TestCase):
+    """Tests for LMModelPool routing, eviction and host parking."""
+
+    def test_primary_model_and_empty_path_use_primary(self):
+        """Requests without a model or for the loaded model get the primary handler."""
+        pool, primary, created = _make_pool()
+        for path in (None, "", "lm-0.6B", " lm-0.6B "):
+            with pool.acquire(path) as handler:
+                self.assertIs(handler, primary)
+        self.assertEqual(created, [])
+
+    def test_other_model_is_loaded_once_and_reused(self):
+        """Alternating requests reuse the resident handler instead of reloading."""
+        pool, primary, created = _make_pool(max_resident=3)
+        for _ in range(3):
+            with pool.acquire("lm-1.7B") as handler:
+                self.assertEqual(handler.last_init_params["lm_model_path"], "lm-1.7B")
+            with pool.acquire("lm-0.6B") as handler:
+                self.assertIs(handler, primary)
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0].init_calls, 1)
+        self.assertEqual(primary.init_calls, 1)
+        self.assertEqual(pool.stats()["hits"], 2)
+
+    def test_lru_idle_model_is_unloaded_when_full(self):
+        """Loading past the resident limit unloads the least recently used idle model."""
+        pool, _primary, created = _make_pool(max_resident=2)
+        with pool.acquire("lm-1.7B"):
+            pass
+        with pool.acquire("lm-4B"):
+            pass
+        self.assertEqual(created[0].unload_calls, 1)
+        self.assertEqual(pool.stats()["models"]["lm-1.7B"]["state"], "empty")
+        self.assertEqual(pool.stats()["models"]["lm-4B"]["state"], "gpu")
+
+    def test_in_use_model_is_not_evicted(self):
+        """A model held by a request stays resident even when the pool is over its limit."""
+        pool, _primary, created = _make_pool(max_resident=2)
+        with pool.acquire("lm-1.7B"):
+            with pool.acquire("lm-4B"):
+                self.assertEqual(created[0].unload_calls, 0)
+        self.assertEqual(pool.stats()["evictions"], 0)
+
+    def test_parked_model_is_reuploaded_without_reinit(self):
+        """With a host budget, evicted PyTorch models are parked on CPU and re-uploaded."""
+        pool, _primary, created = _make_pool(max_resident=2, host_budget_bytes=1 << 30)
+        with pool.acquire("lm-1.7B"):
+            pass
+        with pool.acquire("lm-4B"):
+            pass
+        self.assertEqual(created[0].llm.device, "cpu")
+        self.assertEqual(created[0].unload_calls, 0)
+        with pool.acquire("lm-1.7B") as handler:
+            self.assertEqual(handler.llm.device, "cuda")
+        self.assertEqual(created[0].init_calls, 1)
+        self.assertEqual(pool.stats()["reuploads"], 1)
+
+    def test_vllm_models_are_unloaded_not_parked(self):
+        """Backends that cannot be moved to host memory are unloaded on eviction."""
+        pool, _primary, created = _make_pool(max_resident=2, host_budget_bytes=1 << 30, backend="vllm")
+        with pool.acquire("lm-1.7B"):
+            pass
+        with pool.acquire("lm-4B"):
+            pass
+        self.assertEqual(created[0].unload_calls, 1)
+
+    def test_failed_load_raises_and_can_retry(self):
+        """A failing initialize raises RuntimeError and leaves the entry reloadable."""
+        pool, _primary, _created = _make_pool()
+        failing = _FakeHandler(fail=True)
+        pool.handler_factory = lambda: failing
+        with self.assertRaises(RuntimeError):
+            with pool.acquire("lm-1.7B"):
+                pass
+        failing.fail = False
+        with pool.acquire("lm-1.7B") as handler:
+            self.assertTrue(handler.llm_initialized)
+        self.assertEqual(pool.stats()["models"]["lm-1.7B"]["users"], 0)
+
+    def test_concurrent_requests_load_model_once(self):
+        """Parallel requests for the same model share a single load."""
+        pool, _primary, created = _make_pool(max_resident=3)
+        barrier = threading.Barrier(4)
+
+        def _use():
+            barrier.wait()
+            with pool.acquire("lm-1.7B"):
+                pass
+
+        threads = [threading.Thread(target=_use) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0].init_calls, 1)
+
+    def test_idle_model_is_unloaded_before_next_load(self):
+        """A model of unknown size still takes a slot, so the old one goes first."""
+        pool, _primary, created = _make_pool(max_resident=2)
+        with pool.acquire("lm-1.7B"):
+            pass
+        loaded_while_full = []
+        original_factory = pool.handler_factory
+
+        def _factory():
+            handler = original_factory()
+            init = handler.initialize
+
+            def _initialize(**params):
+                loaded_while_full.append(created[0].llm_initialized)
+                return init(**params)
+
+            handler.initialize = _initialize
+            return handler
+
+        pool.handler_factory = _factory
+        with pool.acquire("lm-4B"):
+            pass
+        self.assertEqual(loaded_while_full, [False])
+
+    def test_primary_counts_against_gpu_budget(self):
+        """The primary's checkpoint size is part of the VRAM budget."""
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            for model, size in (("lm-0.6B", 600), ("lm-1.7B", 1700), ("lm-4B", 400)):
+                os.makedirs(os.path.join(checkpoint_dir, model))
+                with open(os.path.join(checkpoint_dir, model, "model.safetensors"), "wb") as f:
+                    f.write(b"0" * size)
+            pool, _primary, created = _make_pool(
+                max_resident=5, gpu_budget_bytes=2500, checkpoint_dir=checkpoint_dir
+            )
+            with pool.acquire("lm-1.7B"):
+                pass
+            with pool.acquire("lm-4B"):
+                pass
+        self.assertEqual(created[0].unload_calls, 1)
+        self.assertEqual(pool.stats()["models"]["lm-4B"]["state"], "gpu")
+
+    def test_from_env_is_opt_in(self):
+        """Without a pool size or VRAM budget the server keeps swapping models."""
+        primary = _FakeHandler()
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(LMModelPool.from_env(primary, dict))
+        with mock.patch.dict(os.environ, {"ACESTEP_LM_POOL_GPU_GB": "12"}, clear=True):
+            pool = LMModelPool.from_env(primary, dict)
+        self.assertEqual((pool.max_resident, pool.gpu_budget_bytes), (2, 12 * 1024 ** 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
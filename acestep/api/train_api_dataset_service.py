@@ -248,7 +248,7 @@ def register_training_dataset_routes(
         mgr.offload_decoder_to_cpu()
 
         try:
-            with temporary_llm_model(app, llm, request.lm_model_path):
+            with temporary_llm_model(app, llm, request.lm_model_path) as active_llm:
                 resolved_save_path = (request.save_path.strip() if request.save_path else None) or getattr(
                     app.state,
                     "dataset_json_path",
@@ -256,6 +256,7 @@ def register_training_dataset_routes(
                 )
                 resolved_save_path = os.path.normpath(resolved_save_path) if resolved_save_path else None
                 resolved_jsonl_path = f"{resolved_save_path}.autolabel.jsonl" if resolved_save_path else None
+                resolved_checkpoint_path = f"{resolved_save_path}.autolabel.ckpt.json" if resolved_save_path else None
 
                 if resolved_save_path:
                     try:
@@ -294,13 +295,14 @@ def register_training_dataset_routes(
 
                 _samples, status = builder.label_all_samples(
                     dit_handler=handler,
-                    llm_handler=llm,
+                    llm_handler=active_llm,
                     format_lyrics=request.format_lyrics,
                     transcribe_lyrics=request.transcribe_lyrics,
                     skip_metas=request.skip_metas,
                     only_unlabeled=request.only_unlabeled,
                     chunk_size=request.chunk_size,
                     batch_size=request.batch_size,
+                    checkpoint_path=resolved_checkpoint_path,
                     progress_callback=None,
                     sample_labeled_callback=sample_labeled_callback,
                 )
@@ -393,7 +395,7 @@ def register_training_dataset_routes(
             mgr.offload_decoder_to_cpu()
 
             try:
-                with temporary_llm_model(app, llm, request.lm_model_path):
+                with temporary_llm_model(app, llm, request.lm_model_path) as active_llm:
                     def progress_callback(msg: str):
                         with train_api_models._auto_label_lock:
                             task = train_api_models._auto_label_tasks.get(task_id)
@@ -408,6 +410,9 @@ def register_training_dataset_routes(
                                     task.total = int(match.group(2))
 
                     resolved_jsonl_path = f"{resolved_save_path}.autolabel.jsonl" if resolved_save_path else None
+                    resolved_checkpoint_path = (
+                        f"{resolved_save_path}.autolabel.ckpt.json" if resolved_save_path else None
+                    )
 
                     def sample_labeled_callback(sample_idx: int, sample: Any, status: str):
                         if "✅" not in status:
@@ -449,13 +454,14 @@ def register_training_dataset_routes(
 
                     _samples, status = builder.label_all_samples(
                         dit_handler=handler,
-                        llm_handler=llm,
+                        llm_handler=active_llm,
                         format_lyrics=request.format_lyrics,
                         transcribe_lyrics=request.transcribe_lyrics,
                         skip_metas=request.skip_metas,
                         only_unlabeled=request.only_unlabeled,
                         chunk_size=request.chunk_size,
                         batch_size=request.batch_size,
+                        checkpoint_path=resolved_checkpoint_path,
                         progress_callback=progress_callback,
                         sample_labeled_callback=sample_labeled_callback,
                     )
@@ -27,11 +27,11 @@ import tempfile
 import urllib.parse
 from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from contextlib import asynccontextmanager, contextmanager
+from contextlib import ExitStack, asynccontextmanager, contextmanager, nullcontext
 from dataclasses import dataclass
 from pathlib import Path
 from threading import Lock
-from typing import Any, Dict, List, Literal, Optional, Union
+from typing import Any, Dict, Generator, List, Literal, Optional, Set, Union
 from uuid import uuid4
 from loguru import logger
 import torch
@@ -59,12 +59,19 @@ from acestep.constants import (
 from acestep.inference import (
     GenerationParams,
     GenerationConfig,
-    generate_music,
+    iter_generate_music,
     create_sample,
     format_sample,
 )
 from acestep.ui.gradio.events.results_handlers import _build_generation_info
+from acestep.api.jobs.audio_stream import AudioStreamRegistry, JobAudioStreams
+from acestep.api.jobs.job_events import TERMINAL_EVENTS, JobEventBus
+from acestep.api.jobs.stage_pipeline import StagePipeline, run_stages
+from acestep.api.dit_model_registry import DiTModelRegistry
+from acestep.core.generation.handler.dit_batcher import DiTMicroBatcher
+from acestep.api.lm_model_pool import LMModelPool
 from acestep.gpu_config import (
+    check_batch_size_limit,
     get_gpu_config,
     set_global_gpu_config,
     get_recommended_lm_model,
@@ -349,6 +356,7 @@ PARAM_ALIASES = {
     "thinking": ["thinking"],
     "analysis_only": ["analysis_only", "analysisOnly"],
     "full_analysis_only": ["full_analysis_only", "fullAnalysisOnly"],
+    "stream_audio": ["stream_audio", "streamAudio"],
     "sample_mode": ["sample_mode", "sampleMode"],
     "sample_query": ["sample_query", "sampleQuery", "description", "desc"],
     "use_format": ["use_format", "useFormat", "format"],
@@ -522,6 +530,8 @@ class GenerateMusicRequest(BaseModel):
         description="Output audio format. Supported formats: 'flac', 'mp3', 'opus', 'aac', 'wav', 'wav32'. Default: 'mp3'"
     )
     use_tiled_decode: bool = True
+    # Serve audio progressively on /v1/stream/{task_id} while it is decoded
+    stream_audio: bool = False
 
     # 5Hz LM (server-side): used for metadata completion and (when thinking=True) codes generation.
     lm_model_path: Optional[str] = None  # e.g. "acestep-5Hz-lm-0.6B"
@@ -629,100 +639,51 @@ def _start_tensorboard(app: FastAPI, logdir: str) -> Optional[str]:
 
 @contextmanager
 def _temporary_llm_model(app: FastAPI, llm: "LLMHandler", lm_model_path: Optional[str]):
-    """Temporarily switch LLM model for a critical section and restore afterward.
-
-    This is intentionally best-effort and conservative:
-    - If lm_model_path is empty/None -> no-op
-    - If LLM isn't initialized -> no-op (handlers already validate this)
-    - Uses app.state._llm_init_lock to serialize LLM re-inits
+    """Yield the LLM handler to use for ``lm_model_path`` in a critical section.
+
+    Requests for another model are routed to a resident handler from
+    ``app.state.lm_pool``.  The pool is opt-in (``ACESTEP_LM_POOL_SIZE`` /
+    ``ACESTEP_LM_POOL_GPU_GB``); without it the shared handler is never
+    re-initialized per request and ``lm_model_path`` is ignored:
+    - If lm_model_path is empty/None or names the loaded model -> yields ``llm``
+    - If LLM isn't initialized or no pool exists -> yields ``llm`` (handlers already validate this)
+    - If the requested model fails to load -> yields ``llm`` and records the error
     """
     desired = (lm_model_path or "").strip()
-    if not desired:
-        yield
-        return
-
-    if llm is None or not getattr(llm, "llm_initialized", False):
-        yield
+    if not desired or llm is None or not getattr(llm, "llm_initialized", False):
+        yield llm
         return
-
-    lock = getattr(app.state, "_llm_init_lock", None)
-    if lock is None:
-        yield
+    pool = getattr(app.state, "lm_pool", None)
+    if pool is None:
+        loaded = (getattr(llm, "last_init_params", None) or {}).get("lm_model_path")
+        if desired != (loaded or "").strip() and desired not in _ignored_lm_models:
+            _ignored_lm_models.add(desired)
+            print(
+                f"[API Server] lm_model_path={desired} ignored: set ACESTEP_LM_POOL_SIZE "
+                f"to keep additional LM models resident"
+            )
+        yield llm
         return
 
-    with lock:
-        prev_params = getattr(llm, "last_init_params", None)
-        prev_model = (prev_params or {}).get("lm_model_path") if isinstance(prev_params, dict) else None
-        if prev_model and prev_model.strip() == desired:
-            yield
-            return
-
-        project_root = _get_project_root()
-        checkpoint_dir = os.path.join(project_root, "checkpoints")
-        os.makedirs(checkpoint_dir, exist_ok=True)
-
+    if desired != pool.primary_model():
         lm_model_name = _get_model_name(desired)
         if lm_model_name:
             try:
-                _ensure_model_downloaded(lm_model_name, checkpoint_dir)
+                _ensure_model_downloaded(lm_model_name, os.path.join(_get_project_root(), "checkpoints"))
             except Exception:
                 pass
 
-        restore_params = prev_params if isinstance(prev_params, dict) else None
-
-        ok_switched = False
+    with ExitStack() as stack:
         try:
-            new_params = dict(restore_params) if restore_params else {
-                "checkpoint_dir": checkpoint_dir,
-                "backend": os.getenv("ACESTEP_LM_BACKEND", "vllm").strip().lower() or "vllm",
-                "device": os.getenv("ACESTEP_LM_DEVICE", os.getenv("ACESTEP_DEVICE", "auto")),
-                "offload_to_cpu": _env_bool("ACESTEP_LM_OFFLOAD_TO_CPU", False),
-                "dtype": None,
-            }
-            new_params["checkpoint_dir"] = checkpoint_dir
-            new_params["lm_model_path"] = desired
-
-            status, ok = llm.initialize(**new_params)
-            if ok:
-                ok_switched = True
-                try:
-                    app.state._llm_initialized = True
-                    app.state._llm_init_error = None
-                except Exception:
-                    pass
-            else:
-                try:
-                    app.state._llm_initialized = False
-                    app.state._llm_init_error = status
-                except Exception:
-                    pass
+            handler = stack.enter_context(pool.acquire(desired))
         except Exception as e:
-            try:
-                app.state._llm_initialized = False
-                app.state._llm_init_error = str(e)
-            except Exception:
-                pass
+            print(f"[API Server] Warning: failed to load LM model {desired}, using current model: {e}")
+            handler = llm
+        yield handler
 
-        try:
-            yield
-        finally:
-            if not ok_switched:
-                return
-            if not restore_params:
-                return
-            try:
-                llm.initialize(**restore_params)
-                try:
-                    app.state._llm_initialized = True
-                    app.state._llm_init_error = None
-                except Exception:
-                    pass
-            except Exception as e:
-                try:
-                    app.state._llm_initialized = False
-                    app.state._llm_init_error = str(e)
-                except Exception:
-                    pass
+
+# lm_model_path values already reported as ignored (no LM pool configured)
+_ignored_lm_models: Set[str] = set()
 
 
 def _atomic_write_json(path: str, payload: Dict[str, Any]) -> None:
@@ -762,6 +723,7 @@ class CreateJobResponse(BaseModel):
     status: JobStatus
     queue_position: int = 0  # 1-based best-effort position when queued
     progress_text: Optional[str] = ""
+    stream_url: Optional[str] = None  # set when stream_audio was requested
 
 
 class JobResult(BaseModel):
@@ -822,10 +784,35 @@ class _JobRecord:
 
 
 class _JobStore:
-    def __init__(self, max_age_seconds: int = JOB_STORE_MAX_AGE_SECONDS) -> None:
+    def __init__(self, max_age_seconds: int = JOB_STORE_MAX_AGE_SECONDS, events: Optional[JobEventBus] = None) -> None:
         self._lock = Lock()
         self._jobs: Dict[str, _JobRecord] = {}
         self._max_age = max_age_seconds
+        # Push-based progress for /v1/jobs/{task_id}/events
+        self.events = events if events is not None else JobEventBus()
+
+    @staticmethod
+    def snapshot(rec: _JobRecord, event_type: str = "progress") -> Dict[str, Any]:
+        """Event payload describing ``rec``; call with the store lock held."""
+        event = {
+            "type": event_type,
+            "task_id": rec.job_id,
+            "status": rec.status,
+            "progress": rec.progress,
+            "stage": rec.stage,
+            "progress_text": rec.progress_text,
+            "status_text": rec.status_text,
+            "updated_at": rec.updated_at,
+        }
+        if event_type == "result":
+            event["result"] = rec.result
+        elif event_type == "error":
+            event["error"] = rec.error
+        return event
+
+    def _publish(self, job_id: str, event: Optional[Dict[str, Any]]) -> None:
+        if event is not None:
+            self.events.publish(job_id, event)
 
     def create(self) -> _JobRecord:
         job_id = str(uuid4())
@@ -855,6 +842,15 @@ class _JobStore:
         with self._lock:
             return self._jobs.get(job_id)
 
+    def current_event(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of the job as the event a new subscriber should see first."""
+        with self._lock:
+            rec = self._jobs.get(job_id)
+            if rec is None:
+                return None
+            event_type = {"succeeded": "result", "failed": "error"}.get(rec.status, "progress")
+            return self.snapshot(rec, event_type)
+
     def mark_running(self, job_id: str) -> None:
         with self._lock:
             rec = self._jobs[job_id]
@@ -863,6 +859,8 @@ class _JobStore:
             rec.progress = max(rec.progress, 0.01)
             rec.stage = "running"
             rec.updated_at = time.time()
+            event = self.snapshot(rec)
+        self._publish(job_id, event)
 
     def mark_succeeded(self, job_id: str, result: Dict[str, Any]) -> None:
         with self._lock:
@@ -874,6 +872,8 @@ class _JobStore:
             rec.progress = 1.0
             rec.stage = "succeeded"
             rec.updated_at = time.time()
+            event = self.snapshot(rec, "result")
+        self._publish(job_id, event)
 
     def mark_failed(self, job_id: str, error: str) -> None:
         with self._lock:
@@ -885,6 +885,8 @@ class _JobStore:
             rec.progress = rec.progress if rec.progress > 0 else 0.0
             rec.stage = "failed"
             rec.updated_at = time.time()
+            event = self.snapshot(rec, "error")
+        self._publish(job_id, event)
 
     def update_progress(self, job_id: str, progress: float, stage: Optional[str] = None) -> None:
         with self._lock:
@@ -895,6 +897,8 @@ class _JobStore:
             if stage:
                 rec.stage = stage
             rec.updated_at = time.time()
+            event = self.snapshot(rec)
+        self._publish(job_id, event)
 
     def cleanup_old_jobs(self, max_age_seconds: Optional[int] = None) -> int:
         """
@@ -940,14 +944,20 @@ class _JobStore:
             return stats
 
     def update_status_text(self, job_id: str, text: str) -> None:
+        event = None
         with self._lock:
             if job_id in self._jobs:
                 self._jobs[job_id].status_text = text
+                event = self.snapshot(self._jobs[job_id])
+        self._publish(job_id, event)
 
     def update_progress_text(self, job_id: str, text: str) -> None:
+        event = None
         with self._lock:
             if job_id in self._jobs:
                 self._jobs[job_id].progress_text = text
+                event = self.snapshot(self._jobs[job_id])
+        self._publish(job_id, event)
 
 def _env_bool(name: str, default: bool) -> bool:
     v = os.getenv(name)
@@ -956,6 +966,19 @@ def _env_bool(name: str, default: bool) -> bool:
     return v.strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+def _pipeline_overlap_fits(gpu_memory_gb: float) -> bool:
+    """Whether the LM and DiT stages of different jobs may run at the same time.
+
+    Only DiT generation runs inside the DiT batcher section; the LM phase of
+    the next job does not, so overlapping jobs keep both models on the GPU.
+    With CPU offload or below the auto-offload VRAM threshold that thrashes
+    weights between host and device (or runs out of memory) instead.
+    """
+    if gpu_memory_gb < VRAM_AUTO_OFFLOAD_THRESHOLD_GB:
+        return False
+    return not (_env_bool("ACESTEP_OFFLOAD_TO_CPU", False) or _env_bool("ACESTEP_LM_OFFLOAD_TO_CPU", False))
+
+
 
 
 def _get_model_name(config_path: str) -> str:
@@ -1209,7 +1232,7 @@ sys.stderr = StderrLogger(sys.stderr, log_buffer)
 
 
 def create_app() -> FastAPI:
-    store = _JobStore()
+    store = _JobStore(events=JobEventBus())
 
     # API Key authentication (from environment variable)
     api_key = os.getenv("ACESTEP_API_KEY", None)
@@ -1217,6 +1240,16 @@ def create_app() -> FastAPI:
 
     QUEUE_MAXSIZE = int(os.getenv("ACESTEP_QUEUE_MAXSIZE", "200"))
     WORKER_COUNT = int(os.getenv("ACESTEP_QUEUE_WORKERS", "1"))  # Single GPU recommended
+    # Overlap LM planning, DiT+VAE and audio encoding of consecutive jobs.
+    # "auto" enables it only when no model is offloaded and the GPU is large enough.
+    PIPELINE_MODE = os.getenv("ACESTEP_API_PIPELINE", "auto").strip().lower()
+    PIPELINE_QUEUE_SIZE = int(os.getenv("ACESTEP_API_PIPELINE_QUEUE", "1"))
+    # Jobs that may wait in the DiT stage together and share one diffusion batch
+    DIT_BATCH_JOBS = max(1, int(os.getenv("ACESTEP_DIT_BATCH_JOBS", "4")))
+
+    JOB_EVENTS_KEEPALIVE_SECONDS = 15.0
+    # Progress goes to the local cache (read by /query_result) at most this often per job
+    LOCAL_CACHE_PROGRESS_INTERVAL = float(os.getenv("ACESTEP_CACHE_PROGRESS_INTERVAL", "2.0"))
 
     INITIAL_AVG_JOB_SECONDS = float(os.getenv("ACESTEP_AVG_JOB_SECONDS", "5.0"))
     AVG_WINDOW = int(os.getenv("ACESTEP_AVG_WINDOW", "50"))
@@ -1277,27 +1310,55 @@ def create_app() -> FastAPI:
         app.state._llm_init_lock = Lock()
         app.state._llm_lazy_load_disabled = False  # Will be set to True if LLM skipped due to GPU config
 
-        # Multi-model support: secondary DiT handlers
-        handler2 = None
-        handler3 = None
-        config_path2 = os.getenv("ACESTEP_CONFIG_PATH2", "").strip()
-        config_path3 = os.getenv("ACESTEP_CONFIG_PATH3", "").strip()
-
-        if config_path2:
-            handler2 = AceStepHandler()
-        if config_path3:
-            handler3 = AceStepHandler()
-
-        app.state.handler2 = handler2
-        app.state.handler3 = handler3
-        app.state._initialized2 = False
-        app.state._initialized3 = False
+        def _lm_pool_init_params() -> Dict[str, Any]:
+            """Load pooled LMs like the primary one (env defaults before it is loaded)."""
+            params = dict(getattr(llm_handler, "last_init_params", None) or {
+                "backend": os.getenv("ACESTEP_LM_BACKEND", "vllm").strip().lower() or "vllm",
+                "device": os.getenv("ACESTEP_LM_DEVICE", os.getenv("ACESTEP_DEVICE", "auto")),
+                "offload_to_cpu": _env_bool("ACESTEP_LM_OFFLOAD_TO_CPU", False),
+                "dtype": None,
+            })
+            params["checkpoint_dir"] = os.path.join(_get_project_root(), "checkpoints")
+            return params
+
+        # Resident LMs for requests that ask for another lm_model_path (None: lm_model_path is ignored)
+        app.state.lm_pool = LMModelPool.from_env(llm_handler, _lm_pool_init_params)
+
+        def _dit_batch_fits(batch_size: int) -> bool:
+            gpu_config = getattr(app.state, "gpu_config", None)
+            if gpu_config is None:
+                return batch_size == 1
+            return check_batch_size_limit(batch_size, gpu_config, bool(app.state._llm_initialized))[0]
+
+        if PIPELINE_MODE == "auto":
+            pipeline_enabled = _pipeline_overlap_fits(get_gpu_config().gpu_memory_gb)
+            if not pipeline_enabled:
+                print("[API Server] Job pipeline disabled (CPU offload or small GPU); set ACESTEP_API_PIPELINE=1 to force it")
+        else:
+            pipeline_enabled = _env_bool("ACESTEP_API_PIPELINE", False)
+
+        # Cross-job diffusion batching (shared with DiT variants)
+        dit_batcher = DiTMicroBatcher(fits=_dit_batch_fits) if pipeline_enabled and DIT_BATCH_JOBS > 1 else None
+        handler.dit_batcher = dit_batcher
+        app.state.dit_batcher = dit_batcher
+
         app.state._config_path = os.getenv("ACESTEP_CONFIG_PATH", "acestep-v15-turbo")
-        app.state._config_path2 = config_path2
-        app.state._config_path3 = config_path3
+        # Multi-model support: DiT variants share the primary's VAE/text encoder and load on demand
+        dit_registry = DiTModelRegistry.from_env(handler, lambda: app.state._config_path)
+        app.state.dit_registry = dit_registry
 
         max_workers = int(os.getenv("ACESTEP_API_WORKERS", "1"))
         executor = ThreadPoolExecutor(max_workers=max_workers)
+        job_pipeline = (
+            StagePipeline(
+                ["lm", "dit", "save"],
+                queue_size=PIPELINE_QUEUE_SIZE,
+                name="api-job",
+                stage_workers={"dit": DIT_BATCH_JOBS},
+            )
+            if pipeline_enabled
+            else None
+        )
 
         # Queue & observability
         app.state.job_queue = asyncio.Queue(maxsize=QUEUE_MAXSIZE)  # (job_id, req)
@@ -1315,7 +1376,9 @@ def create_app() -> FastAPI:
 
         app.state.handler = handler
         app.state.executor = executor
+        app.state.job_pipeline = job_pipeline
         app.state.job_store = store
+        app.state.audio_streams = AudioStreamRegistry(ttl_seconds=JOB_STORE_MAX_AGE_SECONDS)
         app.state._python_executable = sys.executable
         initialize_training_state(app)
 
@@ -1470,47 +1533,30 @@ def create_app() -> FastAPI:
 
             await _ensure_initialized()
             job_store.mark_running(job_id)
+            audio_streams: Optional[JobAudioStreams] = app.state.audio_streams.get(job_id)
             _update_local_cache_progress(job_id, 0.01, "running")
 
-            # Select DiT handler based on user's model choice
-            # Default: use primary handler
-            selected_handler: AceStepHandler = app.state.handler
-            selected_model_name = _get_model_name(app.state._config_path)
+            # Select DiT model based on user's model choice
+            # Default: use primary model
+            dit_registry: DiTModelRegistry = app.state.dit_registry
+            selected_model_name = dit_registry.primary_model()
 
             if req.model:
-                model_matched = False
-
-                # Check if it matches the second model
-                if app.state.handler2 and getattr(app.state, "_initialized2", False):
-                    model2_name = _get_model_name(app.state._config_path2)
-                    if req.model == model2_name:
-                        selected_handler = app.state.handler2
-                        selected_model_name = model2_name
-                        model_matched = True
-                        print(f"[API Server] Job {job_id}: Using second model: {model2_name}")
-
-                # Check if it matches the third model
-                if not model_matched and app.state.handler3 and getattr(app.state, "_initialized3", False):
-                    model3_name = _get_model_name(app.state._config_path3)
-                    if req.model == model3_name:
-                        selected_handler = app.state.handler3
-                        selected_model_name = model3_name
-                        model_matched = True
-                        print(f"[API Server] Job {job_id}: Using third model: {model3_name}")
-
-                if not model_matched:
-                    available_models = [_get_model_name(app.state._config_path)]
-                    if app.state.handler2 and getattr(app.state, "_initialized2", False):
-                        available_models.append(_get_model_name(app.state._config_path2))
-                    if app.state.handler3 and getattr(app.state, "_initialized3", False):
-                        available_models.append(_get_model_name(app.state._config_path3))
+                resolved_model = dit_registry.resolve(req.model)
+                if resolved_model:
+                    selected_model_name = resolved_model
+                    if resolved_model != dit_registry.primary_model():
+                        print(f"[API Server] Job {job_id}: Using model: {resolved_model}")
+                else:
+                    available_models = [dit_registry.primary_model()] + dit_registry.variant_models()
                     print(f"[API Server] Job {job_id}: Model '{req.model}' not found in {available_models}, using primary: {selected_model_name}")
 
-            # Use selected handler for generation
-            h: AceStepHandler = selected_handler
+            def _blocking_generate(llm: LLMHandler, h: AceStepHandler) -> Generator[str, None, Dict[str, Any]]:
+                """Generate music using unified inference logic from acestep.inference
 
-            def _blocking_generate() -> Dict[str, Any]:
-                """Generate music using unified inference logic from acestep.inference"""
+                Staged job for ``StagePipeline``: yields ``"dit"`` and ``"save"``
+                when the work moves to the DiT/VAE and audio encoding stages.
+                """
 
                 def _ensure_llm_ready() -> None:
                     """Ensure LLM handler is initialized when needed"""
@@ -1839,7 +1885,7 @@ def create_app() -> FastAPI:
                 llm_to_pass = llm if llm_is_initialized else None
 
                 # Progress callback for API polling
-                last_progress = {"value": -1.0, "time": 0.0, "stage": ""}
+                last_progress = {"value": -1.0, "time": 0.0, "stage": "", "cache_time": 0.0}
 
                 def _progress_cb(value: float, desc: str = "") -> None:
                     now = time.time()
@@ -1848,38 +1894,46 @@ def create_app() -> FastAPI:
                     except Exception:
                         value_f = 0.0
                     stage = desc or last_progress["stage"] or "running"
-                    # Throttle updates to avoid excessive cache writes
+                    # Throttle updates; event subscribers get every update, the
+                    # disk-backed local cache (polling clients) fewer
                     if (
                         value_f - last_progress["value"] >= 0.01
                         or stage != last_progress["stage"]
                         or (now - last_progress["time"]) >= 0.5
                     ):
+                        stage_changed = stage != last_progress["stage"]
                         last_progress["value"] = value_f
                         last_progress["time"] = now
                         last_progress["stage"] = stage
                         job_store.update_progress(job_id, value_f, stage=stage)
-                        _update_local_cache_progress(job_id, value_f, stage)
+                        if stage_changed or (now - last_progress["cache_time"]) >= LOCAL_CACHE_PROGRESS_INTERVAL:
+                            last_progress["cache_time"] = now
+                            _update_local_cache_progress(job_id, value_f, stage)
 
                 if req.full_analysis_only:
                     store.update_progress_text(job_id, "Starting Deep Analysis...")
                     # Step A: Convert source audio to semantic codes
                     # We use params.src_audio which is the server-side path
-                    audio_codes = h.convert_src_audio_to_codes(params.src_audio)
-
-                    if not audio_codes or audio_codes.startswith("❌"):
-                        raise RuntimeError(f"Audio encoding failed: {audio_codes}")
-
-                    # Step B: LLM Understanding of those specific codes
-                    # This yields the deep metadata and lyrics transcription
-                    metadata_dict, status_string = llm_to_pass.understand_audio_from_codes(
-                        audio_codes=audio_codes,
-                        temperature=0.3,
-                        use_constrained_decoding=True,
-                        constrained_decoding_debug=config.constrained_decoding_debug
-                    )
+                    yield "dit"
+                    # Several DiT-stage workers may run; keep GPU work exclusive
+                    batcher = getattr(h, "dit_batcher", None)
+                    with batcher.section() if batcher is not None else nullcontext():
+                        audio_codes = h.convert_src_audio_to_codes(params.src_audio)
+
+                        if not audio_codes or audio_codes.startswith("❌"):
+                            raise RuntimeError(f"Audio encoding failed: {audio_codes}")
+
+                        # Step B: LLM Understanding of those specific codes
+                        # This yields the deep metadata and lyrics transcription
+                        metadata_dict, status_string = llm_to_pass.understand_audio_from_codes(
+                            audio_codes=audio_codes,
+                            temperature=0.3,
+                            use_constrained_decoding=True,
+                            constrained_decoding_debug=config.constrained_decoding_debug
+                        )
 
-                    if not metadata_dict:
-                        raise RuntimeError(f"LLM Understanding failed: {status_string}")
+                        if not metadata_dict:
+                            raise RuntimeError(f"LLM Understanding failed: {status_string}")
 
                     return {
                         "status_message": "Full Hardware Analysis Success",
@@ -1969,13 +2023,16 @@ def create_app() -> FastAPI:
                     else:
                         progress_cb = _progress_cb
 
-                    result = generate_music(
+                    result = yield from iter_generate_music(
                         dit_handler=h,
                         llm_handler=llm_to_pass,
                         params=params,
                         config=config,
                         save_dir=app.state.temp_audio_dir,
                         progress=progress_cb,
+                        audio_chunk_callback=(
+                            audio_streams.callback(offset=len(all_audios)) if audio_streams is not None else None
+                        ),
                     )
                     if not result.success:
                         raise RuntimeError(f"Music generation failed: {result.error or result.status_message}")
@@ -2132,10 +2189,20 @@ def create_app() -> FastAPI:
                     "signature": client_signature or "",
                 }
 
+            def _pooled_generate() -> Generator[str, None, Dict[str, Any]]:
+                """Run the job with the resident DiT and LM it asked for."""
+                with dit_registry.acquire(selected_model_name) as job_handler:
+                    with _temporary_llm_model(app, llm, req.lm_model_path) as job_llm:
+                        return (yield from _blocking_generate(job_llm, job_handler))
+
             t0 = time.time()
             try:
                 loop = asyncio.get_running_loop()
-                result = await loop.run_in_executor(executor, _blocking_generate)
+                job_pipeline: Optional[StagePipeline] = app.state.job_pipeline
+                if job_pipeline is not None:
+                    result = await asyncio.wrap_future(job_pipeline.submit(_pooled_generate()))
+                else:
+                    result = await loop.run_in_executor(executor, lambda: run_stages(_pooled_generate()))
                 job_store.mark_succeeded(job_id, result)
 
                 # Update local cache
@@ -2145,12 +2212,17 @@ def create_app() -> FastAPI:
                 print(f"[API Server] Job {job_id} FAILED: {e}")
                 print(f"[API Server] Traceback:\n{error_traceback}")
                 job_store.mark_failed(job_id, error_traceback)
+                if audio_streams is not None:
+                    audio_streams.close_all(error=str(e))
 
                 # Update local cache
                 _update_local_cache(job_id, None, "failed")
             finally:
+                if audio_streams is not None:
+                    audio_streams.close_all()
                 # Best-effort cache cleanup to reduce MPS memory fragmentation between jobs
                 try:
+                    h = app.state.handler
                     if hasattr(h, "_empty_cache"):
                         h._empty_cache()
                     else:
@@ -2216,6 +2288,9 @@ def create_app() -> FastAPI:
                     print(f"[API Server] Job cleanup error: {e}")
 
         worker_count = max(1, WORKER_COUNT)
+        if job_pipeline is not None:
+            # Keep every pipeline stage fed; the stages themselves bound GPU concurrency
+            worker_count = max(worker_count, job_pipeline.capacity)
         workers = [asyncio.create_task(_queue_worker(i)) for i in range(worker_count)]
         cleanup_task = asyncio.create_task(_job_store_cleanup_worker())
         app.state.worker_tasks = workers
@@ -2316,63 +2391,13 @@ def create_app() -> FastAPI:
             app.state._initialized = True
             print(f"[API Server] Primary model loaded: {_get_model_name(config_path)}")
 
-            # Initialize secondary model if configured
-            if handler2 and config_path2:
-                model2_name = _get_model_name(config_path2)
-                if model2_name:
-                    try:
-                        _ensure_model_downloaded(model2_name, checkpoint_dir)
-                    except Exception as e:
-                        print(f"[API Server] Warning: Failed to download secondary model: {e}")
-
-                print(f"[API Server] Loading secondary DiT model: {config_path2}")
-                try:
-                    status_msg2, ok2 = handler2.initialize_service(
-                        project_root=project_root,
-                        config_path=config_path2,
-                        device=device,
-                        use_flash_attention=use_flash_attention,
-                        compile_model=compile_model,
-                        offload_to_cpu=offload_to_cpu,
-                        offload_dit_to_cpu=offload_dit_to_cpu,
-                    )
-                    app.state._initialized2 = ok2
-                    if ok2:
-                        print(f"[API Server] Secondary model loaded: {model2_name}")
-                    else:
-                        print(f"[API Server] Warning: Secondary model failed: {status_msg2}")
-                except Exception as e:
-                    print(f"[API Server] Warning: Failed to initialize secondary model: {e}")
-                    app.state._initialized2 = False
-
-            # Initialize third model if configured
-            if handler3 and config_path3:
-                model3_name = _get_model_name(config_path3)
-                if model3_name:
-                    try:
-                        _ensure_model_downloaded(model3_name, checkpoint_dir)
-                    except Exception as e:
-                        print(f"[API Server] Warning: Failed to download third model: {e}")
-
-                print(f"[API Server] Loading third DiT model: {config_path3}")
-                try:
-                    status_msg3, ok3 = handler3.initialize_service(
-                        project_root=project_root,
-                        config_path=config_path3,
-                        device=device,
-                        use_flash_attention=use_flash_attention,
-                        compile_model=compile_model,
-                        offload_to_cpu=offload_to_cpu,
-                        offload_dit_to_cpu=offload_dit_to_cpu,
-                    )
-                    app.state._initialized3 = ok3
-                    if ok3:
-                        print(f"[API Server] Third model loaded: {model3_name}")
-                    else:
-                        print(f"[API Server] Warning: Third model failed: {status_msg3}")
-                except Exception as e:
-                    print(f"[API Server] Warning: Failed to initialize third model: {e}")
-                    app.state._initialized3 = False
+            # Load configured DiT variants now; others load on their first request
+            for variant_path in (os.getenv("ACESTEP_CONFIG_PATH2", ""), os.getenv("ACESTEP_CONFIG_PATH3", "")):
+                variant_name = _get_model_name(variant_path.strip())
+                if variant_name and variant_name in dit_registry.variant_models():
+                    print(f"[API Server] Loading DiT variant: {variant_name}")
+                    if dit_registry.preload(variant_name):
+                        print(f"[API Server] DiT variant loaded: {variant_name}")
 
             # Initialize LLM model based on GPU configuration
             # ACESTEP_INIT_LLM controls LLM initialization:
@@ -2487,6 +2512,8 @@ def create_app() -> FastAPI:
             for t in workers:
                 t.cancel()
             executor.shutdown(wait=False, cancel_futures=True)
+            if job_pipeline is not None:
+                job_pipeline.shutdown()
 
     app = FastAPI(title="NCZ API", version="1.1", lifespan=lifespan)
 
@@ -2544,6 +2571,7 @@ def create_app() -> FastAPI:
                 thinking=p.bool("thinking"),
                 analysis_only=p.bool("analysis_only"),
                 full_analysis_only=p.bool("full_analysis_only"),
+                stream_audio=p.bool("stream_audio"),
                 sample_mode=p.bool("sample_mode"),
                 sample_query=p.str("sample_query"),
                 use_format=p.bool("use_format"),
@@ -2733,8 +2761,57 @@ def create_app() -> FastAPI:
             app.state.pending_ids.append(rec.job_id)
             position = len(app.state.pending_ids)
 
+        response = {"task_id": rec.job_id, "status": "queued", "queue_position": position}
+        if req.stream_audio:
+            app.state.audio_streams.create(
+                rec.job_id, req.audio_format, getattr(app.state.handler, "sample_rate", 48000)
+            )
+            response["stream_url"] = f"/v1/stream/{rec.job_id}"
+
         await q.put((rec.job_id, req))
-        return _wrap_response({"task_id": rec.job_id, "status": "queued", "queue_position": position})
+        return _wrap_response(response)
+
+    @app.get("/v1/jobs/{task_id}/events")
+    async def job_events(task_id: str, request: Request, _: None = Depends(verify_api_key)):
+        """Server-sent events with job progress, ending with a ``result`` or ``error`` event.
+
+        Push-based alternative to polling ``/query_result``.
+        """
+        from fastapi.responses import StreamingResponse
+
+        subscription = store.events.subscribe(task_id)
+        first = store.current_event(task_id)
+        if first is None:
+            subscription.close()
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        def _sse(event: Dict[str, Any]) -> str:
+            return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+        async def _stream():
+            try:
+                yield _sse(first)
+                if first["type"] in TERMINAL_EVENTS:
+                    return
+                while True:
+                    events = await subscription.get(timeout=JOB_EVENTS_KEEPALIVE_SECONDS)
+                    if not events:
+                        if await request.is_disconnected():
+                            return
+                        yield ": keepalive\n\n"
+                        continue
+                    for event in events:
+                        yield _sse(event)
+                        if event["type"] in TERMINAL_EVENTS:
+                            return
+            finally:
+                subscription.close()
+
+        return StreamingResponse(
+            _stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     @app.post("/query_result")
     async def query_result(request: Request, authorization: Optional[str] = Header(None)):
@@ -2763,33 +2840,35 @@ def create_app() -> FastAPI:
         data_list = []
         current_time = time.time()
 
-        for task_id in task_id_list:
-            result_key = f"{RESULT_KEY_PREFIX}{task_id}"
+        # One batched lookup for the whole list instead of a read per task
+        if local_cache:
+            cached = local_cache.mget([f"{RESULT_KEY_PREFIX}{task_id}" for task_id in task_id_list])
+        else:
+            cached = [None] * len(task_id_list)
 
+        for task_id, data in zip(task_id_list, cached):
             # Read from local cache first
-            if local_cache:
-                data = local_cache.get(result_key)
-                if data:
-                    try:
-                        data_json = json.loads(data)
-                    except Exception:
-                        data_json = []
+            if data:
+                try:
+                    data_json = json.loads(data)
+                except Exception:
+                    data_json = []
 
-                    if len(data_json) <= 0:
+                if len(data_json) <= 0:
+                    data_list.append({"task_id": task_id, "result": data, "status": 2})
+                else:
+                    status = data_json[0].get("status")
+                    create_time = data_json[0].get("create_time", 0)
+                    if status == 0 and (current_time - create_time) > TASK_TIMEOUT_SECONDS:
                         data_list.append({"task_id": task_id, "result": data, "status": 2})
                     else:
-                        status = data_json[0].get("status")
-                        create_time = data_json[0].get("create_time", 0)
-                        if status == 0 and (current_time - create_time) > TASK_TIMEOUT_SECONDS:
-                            data_list.append({"task_id": task_id, "result": data, "status": 2})
-                        else:
-                            data_list.append({
-                                "task_id": task_id,
-                                "result": data,
-                                "status": int(status) if status is not None else 1,
-                                "progress_text": log_buffer.last_message
-                            })
-                    continue
+                        data_list.append({
+                            "task_id": task_id,
+                            "result": data,
+                            "status": int(status) if status is not None else 1,
+                            "progress_text": log_buffer.last_message
+                        })
+                continue
 
             # Fallback to job_store query
             rec = store.get(task_id)
@@ -2871,11 +2950,18 @@ def create_app() -> FastAPI:
         job_stats = store.get_stats()
         async with app.state.stats_lock:
             avg_job_seconds = getattr(app.state, "avg_job_seconds", INITIAL_AVG_JOB_SECONDS)
+        llm_handler = getattr(app.state, "llm_handler", None)
         return _wrap_response({
             "jobs": job_stats,
             "queue_size": app.state.job_queue.qsize(),
             "queue_maxsize": QUEUE_MAXSIZE,
             "avg_job_seconds": avg_job_seconds,
+            "lm_prefix_cache": llm_handler.get_prefix_cache_stats() if llm_handler is not None else None,
+            "pipeline": app.state.job_pipeline.stats() if app.state.job_pipeline is not None else None,
+            "lm_pool": app.state.lm_pool.stats() if app.state.lm_pool is not None else None,
+            "dit_registry": app.state.dit_registry.stats(),
+            "dit_batcher": app.state.dit_batcher.stats() if app.state.dit_batcher is not None else None,
+            "job_events": store.events.stats(),
         })
 
     @app.get("/v1/models")
@@ -2892,23 +2978,12 @@ def create_app() -> FastAPI:
                     "is_default": True,
                 })
 
-        # Secondary model
-        if getattr(app.state, "_initialized2", False) and app.state._config_path2:
-            secondary_model = _get_model_name(app.state._config_path2)
-            if secondary_model:
-                models.append({
-                    "name": secondary_model,
-                    "is_default": False,
-                })
-
-        # Third model
-        if getattr(app.state, "_initialized3", False) and app.state._config_path3:
-            third_model = _get_model_name(app.state._config_path3)
-            if third_model:
-                models.append({
-                    "name": third_model,
-                    "is_default": False,
-                })
+        # DiT variants (loaded on first use)
+        for variant_model in app.state.dit_registry.variant_models():
+            models.append({
+                "name": variant_model,
+                "is_default": False,
+            })
 
         return _wrap_response({
             "models": models,
@@ -3288,6 +3363,27 @@ def create_app() -> FastAPI:
         append_jsonl=_append_jsonl,
     )
 
+    @app.get("/v1/stream/{task_id}")
+    async def stream_audio(task_id: str, index: int = 0, _: None = Depends(verify_api_key)):
+        """Stream a job's audio while it is being decoded (jobs created with stream_audio=true)."""
+        from fastapi.responses import StreamingResponse
+
+        streams: Optional[JobAudioStreams] = app.state.audio_streams.get(task_id)
+        if streams is None:
+            raise HTTPException(status_code=404, detail="No audio stream for this task")
+        if index < 0:
+            raise HTTPException(status_code=400, detail="index must be >= 0")
+        stream = streams.stream(index)
+        # The encoder, and with it the media type, is only chosen once audio arrives
+        media_type = await asyncio.to_thread(stream.wait_media_type)
+        if media_type is None:
+            raise HTTPException(status_code=404, detail="Audio stream already finished; fetch the saved file")
+        return StreamingResponse(
+            stream.open_reader(),
+            media_type=media_type,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     @app.get("/v1/audio")
     async def get_audio(path: str, request: Request, _: None = Depends(verify_api_key)):
         """Serve audio file by path."""
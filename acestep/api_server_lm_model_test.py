@@ -0,0 +1,53 @@
+"""Tests for per-request LM model selection in the API server."""
+
+import threading
+import unittest
+from types import SimpleNamespace
+
+from acestep.api_server import _temporary_llm_model
+
+
+class _FakeLLM:
+    """LLMHandler stand-in counting re-initializations."""
+
+    def __init__(self):
+        self.llm_initialized = True
+        self.last_init_params = {"lm_model_path": "acestep-5Hz-lm-0.6B"}
+        self.init_calls = 0
+
+    def initialize(self, **params):
+        self.init_calls += 1
+        return "ok", True
+
+
+def _app(lm_pool=None):
+    """App stand-in with the server's non-reentrant LM init lock."""
+    return SimpleNamespace(state=SimpleNamespace(_llm_init_lock=threading.Lock(), lm_pool=lm_pool))
+
+
+class TemporaryLLMModelTests(unittest.TestCase):
+    """Tests for _temporary_llm_model without an LM pool."""
+
+    def test_other_model_without_pool_keeps_shared_handler_and_lock_free(self):
+        """A job asking for another LM with thinking on neither reloads nor holds the init lock."""
+        app, llm = _app(), _FakeLLM()
+        with _temporary_llm_model(app, llm, "acestep-5Hz-lm-4B") as job_llm:
+            self.assertIs(job_llm, llm)
+            # thinking=True jobs call _ensure_llm_ready(), which takes the init lock
+            acquired = app.state._llm_init_lock.acquire(timeout=1)
+            self.assertTrue(acquired)
+            app.state._llm_init_lock.release()
+        self.assertEqual(llm.init_calls, 0)
+
+    def test_repeated_requests_do_not_reload(self):
+        """Consecutive requests for a non-default LM never touch the loaded model."""
+        app, llm = _app(), _FakeLLM()
+        for _ in range(3):
+            with _temporary_llm_model(app, llm, "acestep-5Hz-lm-1.7B"):
+                pass
+        self.assertEqual(llm.init_calls, 0)
+        self.assertTrue(llm.llm_initialized)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,339 @@
+"""
+Token-level DFA for the closed-vocabulary part of the CoT metadata grammar.
+
+``MetadataConstrainedLogitsProcessor`` walks Python prefix trees and re-encodes
+fixed strings on every metadata step. Everything it decides without looking at
+the logits (field names, the ``<think>`` tags, bpm/duration/keyscale/language/
+timesignature values) is a finite language over token IDs, so it is compiled
+once per tokenizer into a DFA:
+
+- every node stores the index of a packed allowed-token bitset; identical sets
+  are stored once, so the table holds a few dozen rows of ``ceil(V / 8)`` bytes;
+- transitions are kept in CSR form (per node, sorted token IDs and targets);
+- nodes are grouped in segments named after the ``FSMState`` they implement and
+  addressed by a key: ``(position,)`` for fixed strings, the token prefix for
+  value fields.
+
+The compiled arrays are cached on disk (``.npz``) keyed by a hash of the
+tokenizer and of the grammar inputs, so later processes skip compilation.
+Masking any number of rows is then one gather from the bitset table.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+import torch
+from loguru import logger
+
+
+DFA_EXIT = -1    # Token completes the segment; the FSM moves on to its next state
+DFA_REJECT = -2  # Token is not part of the compiled grammar at this node
+
+_CACHE_VERSION = 1
+_CACHE_DIR_ENV = "ACESTEP_CONSTRAINED_DFA_CACHE_DIR"
+_BIT_SHIFTS = torch.arange(8, dtype=torch.uint8)
+
+
+class MetadataDFA:
+    """Compiled DFA with packed allowed-token bitsets (see module docstring)."""
+
+    _ARRAYS = (
+        "masks", "node_mask", "node_greedy", "node_segment",
+        "key_ptr", "key_tokens", "trans_ptr", "trans_tokens", "trans_next",
+    )
+
+    def __init__(
+        self,
+        vocab_size: int,
+        segments: List[str],
+        masks: np.ndarray,
+        node_mask: np.ndarray,
+        node_greedy: np.ndarray,
+        node_segment: np.ndarray,
+        key_ptr: np.ndarray,
+        key_tokens: np.ndarray,
+        trans_ptr: np.ndarray,
+        trans_tokens: np.ndarray,
+        trans_next: np.ndarray,
+    ):
+        self.vocab_size = int(vocab_size)
+        self.segments = list(segments)
+        self.masks = masks
+        self.node_mask = node_mask
+        self.node_greedy = node_greedy
+        self.node_segment = node_segment
+        self.key_ptr = key_ptr
+        self.key_tokens = key_tokens
+        self.trans_ptr = trans_ptr
+        self.trans_tokens = trans_tokens
+        self.trans_next = trans_next
+
+        # Host-side lookups used on the per-token update path
+        self._nodes: Dict[Tuple[str, Tuple[int, ...]], int] = {}
+        self._transitions: List[Dict[int, int]] = []
+        for node in range(self.num_nodes):
+            self._nodes[(self.segments[node_segment[node]], self.node_key(node))] = node
+            lo, hi = trans_ptr[node], trans_ptr[node + 1]
+            self._transitions.append(dict(zip(trans_tokens[lo:hi].tolist(), trans_next[lo:hi].tolist())))
+        self._device_masks: Dict[torch.device, Tuple[torch.Tensor, torch.Tensor]] = {}
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_mask)
+
+    def lookup(self, segment: str, key: Tuple[int, ...]) -> int:
+        """Return the node for ``key`` inside ``segment``, or -1 if it was not compiled."""
+        return self._nodes.get((segment, key), -1)
+
+    def node_key(self, node: int) -> Tuple[int, ...]:
+        return tuple(self.key_tokens[self.key_ptr[node]:self.key_ptr[node + 1]].tolist())
+
+    def step(self, node: int, token_id: int) -> int:
+        """Follow ``token_id`` from ``node``: next node, ``DFA_EXIT`` or ``DFA_REJECT``."""
+        return self._transitions[node].get(token_id, DFA_REJECT)
+
+    def allowed_mask(self, nodes: np.ndarray, device: torch.device, width: int) -> torch.Tensor:
+        """
+        Unpack the allowed-token bitsets of ``nodes`` into a [len(nodes), width] bool mask.
+
+        Columns beyond the tokenizer vocabulary (padded LM heads) are never allowed.
+        """
+        cached = self._device_masks.get(device)
+        if cached is None:
+            cached = (torch.from_numpy(self.masks).to(device), _BIT_SHIFTS.to(device))
+            self._device_masks[device] = cached
+        table, shifts = cached
+        mask_ids = torch.from_numpy(self.node_mask[nodes].astype(np.int64)).to(device, non_blocking=True)
+        packed = table.index_select(0, mask_ids)
+        bits = (packed.unsqueeze(-1) >> shifts) & 1
+        allowed = bits.flatten(1).bool()
+        if allowed.shape[1] >= width:
+            return allowed[:, :width]
+        return torch.nn.functional.pad(allowed, (0, width - allowed.shape[1]), value=False)
+
+    def save(self, path: str):
+        """Write the compiled arrays to ``path`` atomically."""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    vocab_size=np.int64(self.vocab_size),
+                    segments=np.asarray(self.segments, dtype=np.str_),
+                    **{name: getattr(self, name) for name in self._ARRAYS},
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataDFA":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                vocab_size=int(data["vocab_size"]),
+                segments=data["segments"].tolist(),
+                **{name: data[name] for name in cls._ARRAYS},
+            )
+
+
+class MetadataDFABuilder:
+    """
+    Collect grammar segments and compile them into a ``MetadataDFA``.
+
+    A segment whose reachable nodes include one with no allowed token is rejected
+    as a whole, so the processor keeps handling that field with its FSM fallbacks.
+    """
+
+    def __init__(self, vocab_size: int):
+        self.vocab_size = vocab_size
+        self._segments: List[str] = []
+        # Per segment: key -> (allowed tokens, greedy flag, {token: target key or DFA_EXIT})
+        self._nodes: List[Dict[Tuple[int, ...], Tuple[Set[int], bool, Dict[int, object]]]] = []
+
+    def add_fixed_string(
+        self,
+        segment: str,
+        length: int,
+        allowed_at: Callable[[int], List[int]],
+        token_length: Callable[[int], int],
+    ) -> bool:
+        """
+        Add a fixed string of ``length`` characters.
+
+        ``allowed_at(position)`` gives the tokens that may continue the string at a
+        character position; emitting one advances by ``token_length(token)``.
+        """
+        nodes = {}
+        queue = deque([0])
+        while queue:
+            position = queue.popleft()
+            if (position,) in nodes:
+                continue
+            allowed = set(allowed_at(position))
+            if not allowed:
+                return False
+            transitions = {}
+            for token_id in allowed:
+                next_position = position + token_length(token_id)
+                if next_position >= length:
+                    transitions[token_id] = DFA_EXIT
+                else:
+                    transitions[token_id] = (next_position,)
+                    queue.append(next_position)
+            nodes[(position,)] = (allowed, False, transitions)
+        return self._add_segment(segment, nodes)
+
+    def add_prefix_tree(
+        self,
+        segment: str,
+        prefix_tree: Dict[Tuple[int, ...], Set[int]],
+        newline_token: int,
+        newline_exclusive: bool = False,
+        greedy_root: bool = False,
+    ) -> bool:
+        """
+        Add a value field from a token-prefix tree (prefix -> allowed next tokens).
+
+        ``newline`` ends the field. With ``newline_exclusive`` a complete value only
+        allows the newline; with ``greedy_root`` the first token is restricted to the
+        top-1 candidate at decode time.
+        """
+        if () not in prefix_tree:
+            return False
+        nodes = {}
+        queue = deque([()])
+        while queue:
+            prefix = queue.popleft()
+            if prefix in nodes:
+                continue
+            allowed = set(prefix_tree[prefix])
+            greedy = greedy_root and not prefix
+            if newline_exclusive and not greedy and newline_token in allowed:
+                allowed = {newline_token}
+            if not allowed:
+                return False
+            transitions = {}
+            for token_id in allowed:
+                if token_id == newline_token:
+                    transitions[token_id] = DFA_EXIT
+                    continue
+                child = prefix + (token_id,)
+                if child not in prefix_tree:
+                    return False
+                transitions[token_id] = child
+                queue.append(child)
+            nodes[prefix] = (allowed, greedy, transitions)
+        return self._add_segment(segment, nodes)
+
+    def _add_segment(self, segment: str, nodes: Dict) -> bool:
+        self._segments.append(segment)
+        self._nodes.append(nodes)
+        return True
+
+    def build(self) -> MetadataDFA:
+        node_ids: Dict[Tuple[int, Tuple[int, ...]], int] = {}
+        for seg_idx, nodes in enumerate(self._nodes):
+            for key in nodes:
+                node_ids[(seg_idx, key)] = len(node_ids)
+
+        mask_ids: Dict[frozenset, int] = {}
+        node_mask, node_greedy, node_segment = [], [], []
+        key_ptr, key_tokens = [0], []
+        trans_ptr, trans_tokens, trans_next = [0], [], []
+        for seg_idx, nodes in enumerate(self._nodes):
+            for key, (allowed, greedy, transitions) in nodes.items():
+                node_mask.append(mask_ids.setdefault(frozenset(allowed), len(mask_ids)))
+                node_greedy.append(greedy)
+                node_segment.append(seg_idx)
+                key_tokens.extend(key)
+                key_ptr.append(len(key_tokens))
+                for token_id in sorted(transitions):
+                    target = transitions[token_id]
+                    trans_tokens.append(token_id)
+                    trans_next.append(target if target == DFA_EXIT else node_ids[(seg_idx, target)])
+                trans_ptr.append(len(trans_tokens))
+
+        masks = np.zeros((max(len(mask_ids), 1), (self.vocab_size + 7) // 8), dtype=np.uint8)
+        for allowed, mask_id in mask_ids.items():
+            bits = np.zeros(masks.shape[1] * 8, dtype=bool)
+            bits[[t for t in allowed if 0 <= t < self.vocab_size]] = True
+            masks[mask_id] = np.packbits(bits, bitorder="little")
+
+        return MetadataDFA(
+            vocab_size=self.vocab_size,
+            segments=self._segments,
+            masks=masks,
+            node_mask=np.asarray(node_mask, dtype=np.int32),
+            node_greedy=np.asarray(node_greedy, dtype=bool),
+            node_segment=np.asarray(node_segment, dtype=np.int32),
+            key_ptr=np.asarray(key_ptr, dtype=np.int64),
+            key_tokens=np.asarray(key_tokens, dtype=np.int64),
+            trans_ptr=np.asarray(trans_ptr, dtype=np.int64),
+            trans_tokens=np.asarray(trans_tokens, dtype=np.int64),
+            trans_next=np.asarray(trans_next, dtype=np.int64),
+        )
+
+
+def tokenizer_fingerprint(tokenizer, probes: Iterable[str] = ()) -> str:
+    """
+    Hash the tokenizer vocabulary plus the encoding of a few probe strings.
+
+    The probes pin down merge behaviour that the vocabulary alone does not capture.
+    """
+    digest = hashlib.sha256(type(tokenizer).__name__.encode())
+    get_vocab = getattr(tokenizer, "get_vocab", None)
+    if callable(get_vocab):
+        for token, token_id in sorted(get_vocab().items(), key=lambda item: item[1]):
+            digest.update(f"{token_id}\t{token}\n".encode("utf-8", "surrogatepass"))
+    else:
+        for token_id in range(len(tokenizer)):
+            digest.update(f"{token_id}\t{tokenizer.decode([token_id])}\n".encode("utf-8", "surrogatepass"))
+    for probe in probes:
+        digest.update(json.dumps([probe, tokenizer.encode(probe, add_special_tokens=False)]).encode())
+    return digest.hexdigest()
+
+
+def get_dfa_cache_dir() -> str:
+    """Cache directory in the user cache (``ACESTEP_CONSTRAINED_DFA_CACHE_DIR`` overrides it).
+
+    Defaults to ``$XDG_CACHE_HOME/acestep/constrained_dfa`` (``~/.cache`` when unset)
+    so read-only installs and source checkouts stay untouched.
+    """
+    override = os.getenv(_CACHE_DIR_ENV, "").strip()
+    if override:
+        return override
+    cache_home = os.getenv("XDG_CACHE_HOME", "").strip() or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "acestep", "constrained_dfa")
+
+
+def load_or_compile_dfa(cache_key: Dict, compile_fn: Callable[[], MetadataDFA]) -> MetadataDFA:
+    """
+    Load the DFA compiled for ``cache_key`` from disk, compiling and storing it on a miss.
+
+    ``cache_key`` must be JSON-serialisable and cover everything the grammar depends
+    on (tokenizer fingerprint, value lists, fixed strings). Cache I/O errors only
+    cost a recompile.
+    """
+    key = dict(cache_key, version=_CACHE_VERSION)
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    path = os.path.join(get_dfa_cache_dir(), f"{digest}.npz")
+    if os.path.exists(path):
+        try:
+            return MetadataDFA.load(path)
+        except Exception as exc:
+            logger.warning(f"Ignoring unreadable constrained DFA cache {path}: {exc}")
+    dfa = compile_fn()
+    try:
+        dfa.save(path)
+    except OSError as exc:
+        logger.warning(f"Could not write constrained DFA cache {path}: {exc}")
+    return dfa
@@ -0,0 +1,97 @@
+"""Unit tests for the compiled metadata DFA in ``acestep.constrained_dfa``."""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import numpy as np
+    import torch
+    from acestep.constrained_dfa import (
+        DFA_EXIT,
+        DFA_REJECT,
+        MetadataDFA,
+        MetadataDFABuilder,
+        get_dfa_cache_dir,
+        load_or_compile_dfa,
+    )
+    _IMPORT_ERROR = None
+except ImportError as exc:  # pragma: no cover - dependency guard
+    MetadataDFABuilder = None
+    _IMPORT_ERROR = exc
+
+_NEWLINE = 9
+
+
+def _build():
+    """Two segments: a 3-char fixed string and a tree for the values "12" and "123"."""
+    builder = MetadataDFABuilder(vocab_size=20)
+    builder.add_fixed_string("NAME", 3, lambda position: [10 + position], lambda token_id: 1)
+    tree = {(): {1}, (1,): {2}, (1, 2): {3, _NEWLINE}, (1, 2, 3): {_NEWLINE}}
+    builder.add_prefix_tree("VALUE", tree, _NEWLINE)
+    builder.add_prefix_tree("EXCLUSIVE", tree, _NEWLINE, newline_exclusive=True)
+    return builder.build()
+
+
+@unittest.skipIf(MetadataDFABuilder is None, f"constrained_dfa import unavailable: {_IMPORT_ERROR}")
+class MetadataDFATests(unittest.TestCase):
+    """Compilation, masking and on-disk caching of the metadata DFA."""
+
+    def test_transitions_follow_segments(self):
+        """Fixed strings advance by token length and values exit on newline."""
+        dfa = _build()
+        node = dfa.lookup("NAME", (0,))
+        node = dfa.step(node, 10)
+        self.assertEqual(dfa.node_key(node), (1,))
+        self.assertEqual(dfa.step(dfa.step(node, 11), 12), DFA_EXIT)
+        value = dfa.step(dfa.step(dfa.lookup("VALUE", ()), 1), 2)
+        self.assertEqual(dfa.step(value, _NEWLINE), DFA_EXIT)
+        self.assertEqual(dfa.step(value, 7), DFA_REJECT)
+        self.assertEqual(dfa.lookup("VALUE", (5,)), -1)
+
+    def test_allowed_mask_unpacks_bitsets(self):
+        """Masks match the allowed sets and never allow padded vocabulary columns."""
+        dfa = _build()
+        value = dfa.lookup("VALUE", (1, 2))
+        exclusive = dfa.lookup("EXCLUSIVE", (1, 2))
+        mask = dfa.allowed_mask(np.array([value, exclusive]), torch.device("cpu"), 32)
+        self.assertEqual(mask.shape, (2, 32))
+        self.assertEqual(torch.nonzero(mask[0]).flatten().tolist(), [3, _NEWLINE])
+        self.assertEqual(torch.nonzero(mask[1]).flatten().tolist(), [_NEWLINE])
+
+    def test_segment_with_dead_end_is_rejected(self):
+        """A reachable node without allowed tokens leaves the segment to the FSM."""
+        builder = MetadataDFABuilder(vocab_size=20)
+        self.assertFalse(builder.add_prefix_tree("VALUE", {(): {1}, (1,): set()}, _NEWLINE))
+        self.assertFalse(builder.add_fixed_string("NAME", 2, lambda position: [], lambda token_id: 1))
+        self.assertEqual(builder.build().segments, [])
+
+    def test_cache_round_trip(self):
+        """A compiled DFA is stored once and loaded back for the same key."""
+        compile_fn = mock.Mock(side_effect=_build)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with mock.patch.dict(os.environ, {"ACESTEP_CONSTRAINED_DFA_CACHE_DIR": cache_dir}):
+                first = load_or_compile_dfa({"tokenizer": "abc"}, compile_fn)
+                second = load_or_compile_dfa({"tokenizer": "abc"}, compile_fn)
+                load_or_compile_dfa({"tokenizer": "other"}, compile_fn)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+        self.assertEqual(compile_fn.call_count, 2)
+        self.assertIsInstance(second, MetadataDFA)
+        self.assertEqual(second.segments, first.segments)
+        np.testing.assert_array_equal(second.masks, first.masks)
+        np.testing.assert_array_equal(second.trans_next, first.trans_next)
+
+    def test_cache_dir_defaults_to_user_cache(self):
+        """Without the override the cache lives under XDG_CACHE_HOME (or ~/.cache), not the checkout."""
+        with mock.patch.dict(os.environ, {"ACESTEP_CONSTRAINED_DFA_CACHE_DIR": "", "XDG_CACHE_HOME": "/tmp/xdg"}):
+            self.assertEqual(get_dfa_cache_dir(), os.path.join("/tmp/xdg", "acestep", "constrained_dfa"))
+        with mock.patch.dict(os.environ, {"ACESTEP_CONSTRAINED_DFA_CACHE_DIR": "", "XDG_CACHE_HOME": ""}):
+            self.assertEqual(
+                get_dfa_cache_dir(),
+                os.path.join(os.path.expanduser("~"), ".cache", "acestep", "constrained_dfa"),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
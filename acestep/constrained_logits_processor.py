@@ -20,13 +20,16 @@ Usage:
     outputs = model.generate(inputs, logits_processor=[processor])
 """
 
+import copy
 from enum import Enum, auto
-from typing import Optional, Dict, Any, Tuple, List, Callable, Set
+from typing import Optional, Dict, Any, Tuple, List, Callable, Set, Hashable, Sequence
 from loguru import logger
 from transformers import AutoTokenizer
 from transformers.generation.logits_process import LogitsProcessor
 import os
+import numpy as np
 import torch
+from acestep.constrained_dfa import DFA_EXIT, MetadataDFA, MetadataDFABuilder, load_or_compile_dfa, tokenizer_fingerprint
 from acestep.constants import (
     VALID_LANGUAGES,
     KEYSCALE_NOTES,
@@ -78,6 +81,80 @@ class FSMState(Enum):
     COMPLETED = auto()           # Generation completed
 
 
+# Compact integer ids for FSMState, used by the per-sequence state arrays
+_FSM_STATES: Tuple[FSMState, ...] = tuple(FSMState)
+_FSM_STATE_IDS: Dict[FSMState, int] = {state: i for i, state in enumerate(_FSM_STATES)}
+_THINK_TAG_ID = _FSM_STATE_IDS[FSMState.THINK_TAG]
+_CODES_ID = _FSM_STATE_IDS[FSMState.CODES_GENERATION]
+_COMPLETED_ID = _FSM_STATE_IDS[FSMState.COMPLETED]
+
+# Rows of the additive mask table gathered once per step for codes/completed rows
+_MASK_NONE = 0
+_MASK_CODES = 1             # Only audio codes and EOS
+_MASK_CODES_BLOCK_EOS = 2   # Only audio codes (target code count not reached)
+_MASK_FORCE_EOS = 3         # Only EOS (target code count reached)
+_MASK_NO_AUDIO_CODES = 4    # Everything except audio codes (understand phase lyrics)
+
+# Value states compiled into the metadata DFA, with their user metadata key.
+# Caption and genres stay on the FSM: caption transitions look at the logits and
+# the genres trie depends on the caption and a hot-reloaded vocabulary file.
+_DFA_VALUE_FIELDS: Dict[FSMState, str] = {
+    FSMState.BPM_VALUE: "bpm",
+    FSMState.DURATION_VALUE: "duration",
+    FSMState.KEYSCALE_VALUE: "keyscale",
+    FSMState.LANGUAGE_VALUE: "language",
+    FSMState.TIMESIG_VALUE: "timesignature",
+}
+
+
+class _RowFSMState:
+    """Per-sequence FSM fields that are only touched during metadata generation.
+
+    The hot fields (FSM state and codes counter) live in the processor's numpy
+    arrays so the codes phase can be handled for all rows at once.
+    """
+
+    __slots__ = (
+        "position_in_state",
+        "accumulated_value",
+        "accumulated_token_ids",
+        "caption_after_newline",
+        "caption_token_count",
+        "caption_ending",
+        "pending_field_name",
+        "user_field_token_queue",
+        "current_user_field",
+    )
+
+    def __init__(self):
+        self.position_in_state = 0  # Position within current state's fixed string
+        self.accumulated_value = ""  # For numeric/text value accumulation (legacy, for compatibility)
+        self.accumulated_token_ids: List[int] = []  # Token ID sequence for keyscale (and other fields)
+        # Caption generation state tracking
+        self.caption_after_newline = False  # Track if we're right after a newline in caption
+        self.caption_token_count = 0  # Track token count for caption (max 512)
+        self.caption_ending = False  # Track if caption is ending (after detecting non-indented line)
+        self.pending_field_name = ""  # Accumulate field name tokens when caption is ending
+        # Token queue for user-provided fields (injected directly without generation)
+        self.user_field_token_queue: List[int] = []
+        self.current_user_field: Optional[str] = None  # Current field being injected
+
+
+class _ActiveRowField:
+    """Processor attribute that reads/writes a field of the active sequence row."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj._rows[obj._active_row], self.name)
+
+    def __set__(self, obj, value):
+        setattr(obj._rows[obj._active_row], self.name, value)
+
+
 class MetadataConstrainedLogitsProcessor(LogitsProcessor):
     """
     FSM-driven LogitsProcessor that constrains generation to produce valid metadata.
@@ -97,7 +174,25 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
     For field transitions (e.g., end of numeric value), it compares P(newline) vs P(digit).
     For caption field, it blocks code blocks and newlines, and only transitions when
     the previous token was a period and newline has the highest probability.
+
+    FSM state is kept per sequence (row). ``__call__``/``update_states`` map batch
+    rows to positional rows; ``process_batch``/``update_states`` with ``seq_keys``
+    map them to stable keys (e.g. nano-vllm sequence ids) so a continuously
+    batched engine can reorder rows between steps. The single-row helpers and
+    attributes below (``state``, ``codes_count``, ...) refer to the active row,
+    which is row 0 outside of a batched call.
     """
+
+    # Per-sequence FSM fields, resolved against the active row
+    position_in_state = _ActiveRowField()
+    accumulated_value = _ActiveRowField()
+    accumulated_token_ids = _ActiveRowField()
+    caption_after_newline = _ActiveRowField()
+    caption_token_count = _ActiveRowField()
+    caption_ending = _ActiveRowField()
+    pending_field_name = _ActiveRowField()
+    user_field_token_queue = _ActiveRowField()
+    current_user_field = _ActiveRowField()
     
     def __init__(
         self,
@@ -155,7 +250,6 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         # 5 codes = 1 second, so target_codes = target_duration * 5
         self.target_duration: Optional[float] = None  # User-specified duration in seconds
         self.target_codes: Optional[int] = None  # Computed target codes count
-        self.codes_count: int = 0  # Counter for generated codes
         
         # Stop at reasoning flag - if True, stop generation after </think> tag
         self.stop_at_reasoning: bool = False
@@ -164,21 +258,12 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         # Used to determine FSM behavior when prompt already contains CoT
         self.generation_phase: str = "cot"
         
-        # Current state
-        self.state = FSMState.THINK_TAG
-        self.position_in_state = 0  # Position within current state's fixed string
-        self.accumulated_value = ""  # For numeric/text value accumulation (legacy, for compatibility)
-        self.accumulated_token_ids: List[int] = []  # Token ID sequence for keyscale (and other fields)
-        
-        # Caption generation state tracking
-        self.caption_after_newline = False  # Track if we're right after a newline in caption
-        self.caption_token_count = 0  # Track token count for caption (max 512)
-        self.caption_ending = False  # Track if caption is ending (after detecting non-indented line)
-        self.pending_field_name = ""  # Accumulate field name tokens when caption is ending
+        # Per-sequence FSM state (current state, codes counter, field accumulators)
+        self._reset_rows()
         
-        # Token queue for user-provided fields (injected directly without generation)
-        self.user_field_token_queue: List[int] = []
-        self.current_user_field: Optional[str] = None  # Current field being injected
+        # Additive masks for codes/completed rows, keyed by (device, dtype).
+        # Shared with fork()ed processors since the masks only depend on the tokenizer.
+        self._mask_tables: Dict[Tuple[torch.device, torch.dtype], torch.Tensor] = {}
         
         # Pre-compute token IDs for efficiency
         self._precompute_tokens()
@@ -258,6 +343,9 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         
         # State transitions
         self._build_state_transitions()
+        
+        # Token-level DFA for the closed-vocabulary fields (loaded from disk when cached)
+        self._dfa: Optional[MetadataDFA] = self._build_metadata_dfa()
     
     def _get_next_field_state(self, current_field: str) -> Optional[FSMState]:
         """
@@ -523,6 +611,9 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         backtick_tokens = self.tokenizer.encode("`", add_special_tokens=False)
         self.backtick_token = backtick_tokens[-1] if backtick_tokens else None
         
+        # </think> token sequence for detecting prompts that already contain the CoT
+        self.think_end_tokens: List[int] = self.tokenizer.encode("</think>", add_special_tokens=False)
+        
         # Valid language codes (ISO 639-1 and common variants)
         self.valid_languages = VALID_LANGUAGES
         
@@ -910,6 +1001,57 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         
         return prefix_to_tokens
     
+    def _build_metadata_dfa(self) -> Optional[MetadataDFA]:
+        """
+        Load or compile the token-level DFA for fixed strings and closed-vocabulary values.
+        
+        The DFA only depends on the tokenizer and the grammar inputs below, so it is
+        cached on disk under a hash of both (see ``acestep.constrained_dfa``).
+        """
+        if self.newline_token is None:
+            return None
+        fixed_strings = {state.name: text for state, text in self.fixed_strings.items()}
+        cache_key = {
+            "tokenizer": tokenizer_fingerprint(
+                self.tokenizer, probes=list(fixed_strings.values()) + ["bpm: 120\nkeyscale: C# minor\n"]
+            ),
+            "vocab_size": self.vocab_size,
+            "newline_token": self.newline_token,
+            "fixed_strings": fixed_strings,
+            "bpm": self.valid_bpm_values,
+            "duration": self.valid_duration_values,
+            "keyscale": list(self.valid_keyscales),
+            "language": list(self.valid_languages),
+            "timesignature": self.valid_timesig_values,
+        }
+        return load_or_compile_dfa(cache_key, self._compile_metadata_dfa)
+    
+    def _compile_metadata_dfa(self) -> MetadataDFA:
+        """Compile the fixed strings and value prefix trees into a ``MetadataDFA``."""
+        builder = MetadataDFABuilder(self.vocab_size)
+        token_length = lambda token_id: len(self.tokenizer.decode([token_id]))
+        for state, fixed_str in self.fixed_strings.items():
+            builder.add_fixed_string(
+                state.name,
+                len(fixed_str),
+                lambda position, fixed_str=fixed_str: self._get_allowed_tokens_for_fixed_string(fixed_str, position),
+                token_length,
+            )
+        # Numeric fields allow newline alongside longer values; the others end as
+        # soon as the value is complete, and language picks its first token greedily
+        builder.add_prefix_tree(FSMState.BPM_VALUE.name, self.bpm_prefix_tree, self.newline_token)
+        builder.add_prefix_tree(FSMState.DURATION_VALUE.name, self.duration_prefix_tree, self.newline_token)
+        builder.add_prefix_tree(FSMState.KEYSCALE_VALUE.name, self.keyscale_prefix_tree, self.newline_token, newline_exclusive=True)
+        builder.add_prefix_tree(
+            FSMState.LANGUAGE_VALUE.name, self.language_prefix_tree, self.newline_token,
+            newline_exclusive=True, greedy_root=True,
+        )
+        builder.add_prefix_tree(FSMState.TIMESIG_VALUE.name, self.timesig_prefix_tree, self.newline_token, newline_exclusive=True)
+        dfa = builder.build()
+        if self.debug:
+            logger.debug(f"Compiled metadata DFA: {dfa.num_nodes} nodes, {len(dfa.masks)} distinct masks, segments={dfa.segments}")
+        return dfa
+    
     def diagnose_keyscale_prefix_tree(self):
         """
         Diagnose the keyscale prefix tree to help debug generation bias.
@@ -1268,19 +1410,77 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         
         return list(allowed)
     
+    @property
+    def state(self) -> FSMState:
+        """FSM state of the active row."""
+        return _FSM_STATES[self._row_state_ids[self._active_row]]
+    
+    @state.setter
+    def state(self, value: FSMState):
+        self._row_state_ids[self._active_row] = _FSM_STATE_IDS[value]
+    
+    @property
+    def codes_count(self) -> int:
+        """Number of audio codes generated by the active row."""
+        return int(self._row_codes_counts[self._active_row])
+    
+    @codes_count.setter
+    def codes_count(self, value: int):
+        self._row_codes_counts[self._active_row] = value
+    
+    def _reset_rows(self):
+        """Drop all per-sequence state, leaving a single fresh row 0."""
+        self._rows: List[_RowFSMState] = [_RowFSMState()]
+        self._row_state_ids = np.full(1, _THINK_TAG_ID, dtype=np.int8)
+        self._row_codes_counts = np.zeros(1, dtype=np.int64)
+        self._row_dfa_nodes = np.full(1, -1, dtype=np.int64)  # -1: row is not on the DFA
+        self._row_slots: Dict[Hashable, int] = {}  # seq key -> row index
+        self._active_row = 0
+    
+    def _ensure_rows(self, num_rows: int):
+        """Grow the per-sequence state to at least ``num_rows`` fresh rows."""
+        missing = num_rows - len(self._rows)
+        if missing <= 0:
+            return
+        self._rows.extend(_RowFSMState() for _ in range(missing))
+        self._row_state_ids = np.concatenate([self._row_state_ids, np.full(missing, _THINK_TAG_ID, dtype=np.int8)])
+        self._row_codes_counts = np.concatenate([self._row_codes_counts, np.zeros(missing, dtype=np.int64)])
+        self._row_dfa_nodes = np.concatenate([self._row_dfa_nodes, np.full(missing, -1, dtype=np.int64)])
+    
+    def _bind_rows(self, batch_size: int, seq_keys: Optional[Sequence[Hashable]] = None) -> np.ndarray:
+        """
+        Map batch rows to state rows.
+        
+        Without keys, batch row b uses state row b (HF generate loops keep rows fixed).
+        With keys, each key gets a state row on first sight and keeps it afterwards.
+        """
+        if seq_keys is None:
+            self._ensure_rows(batch_size)
+            return np.arange(batch_size)
+        slots = list(map(self._row_slots.get, seq_keys))
+        if None in slots:
+            for i, key in enumerate(seq_keys):
+                if slots[i] is None:
+                    slots[i] = self._row_slots.setdefault(key, len(self._row_slots))
+            self._ensure_rows(len(self._row_slots))
+        return np.asarray(slots, dtype=np.int64)
+    
     def reset(self):
         """Reset the processor state for a new generation."""
-        self.state = FSMState.THINK_TAG
-        self.position_in_state = 0
-        self.accumulated_value = ""  # Legacy, kept for compatibility
-        self.accumulated_token_ids = []  # Reset token ID sequence
-        self.codes_count = 0  # Reset codes counter
-        self.user_field_token_queue = []  # Reset user field token queue
-        self.current_user_field = None  # Reset current user field
-        self.caption_after_newline = False  # Reset caption newline tracking
-        self.caption_token_count = 0  # Reset caption token count
-        self.caption_ending = False  # Reset caption ending tracking
-        self.pending_field_name = ""  # Reset pending field name
+        self._reset_rows()
+    
+    def fork(self) -> "MetadataConstrainedLogitsProcessor":
+        """
+        Return a processor for a single generation request.
+        
+        The copy shares the tokenizer-derived tables (prefix trees, masks, genres
+        trie) with this instance but has its own settings and FSM state, so
+        requests decoded concurrently cannot reset or advance each other.
+        """
+        clone = copy.copy(self)
+        clone.user_provided_metadata = dict(self.user_provided_metadata)
+        clone._reset_rows()
+        return clone
     
     def set_target_duration(self, duration: Optional[float]):
         """
@@ -1328,24 +1528,31 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
             context_prefix_for_matching="duration:",
             context_prefix_for_tokenization="duration: "
         )
+        self._dfa = self._build_metadata_dfa()
         
         if self.debug:
             logger.debug(f"Updated max duration: {old_max}s -> {max_duration}s, rebuilt prefix tree with {len(self.valid_duration_values)} values")
     
-    def _get_allowed_tokens_for_fixed_string(self, fixed_str: str) -> List[int]:
+    def _get_allowed_tokens_for_fixed_string(self, fixed_str: str, position: Optional[int] = None) -> List[int]:
         """
         Get the token IDs that can continue the fixed string from current position.
         Returns list of allowed token IDs.
         
         Strategy: Find the longest prefix that encodes to a single token, and return that token.
         This ensures we generate by tokens, not character-by-character.
+        
+        Args:
+            fixed_str: The fixed string being generated
+            position: Character position to continue from (default: the active row's position_in_state)
         """
-        remaining = fixed_str[self.position_in_state:]
+        if position is None:
+            position = self.position_in_state
+        remaining = fixed_str[position:]
         if not remaining:
             return []
         
         if self.debug:
-            logger.debug(f"_get_allowed_tokens_for_fixed_string: fixed_str={repr(fixed_str)}, position_in_state={self.position_in_state}, remaining={repr(remaining)}")
+            logger.debug(f"_get_allowed_tokens_for_fixed_string: fixed_str={repr(fixed_str)}, position_in_state={position}, remaining={repr(remaining)}")
         
         # Try encoding progressively longer prefixes, from longest to shortest
         # We want to find the longest prefix that encodes to a single token
@@ -1400,7 +1607,7 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         if self.debug:
             logger.debug(f"Fallback: returning {len(result)} tokens: {[(t, repr(self.tokenizer.decode([t]))) for t in result[:5]]}")
             if result:
-                logger.debug(f"Fixed string: {repr(fixed_str)}, position: {self.position_in_state}, remaining: {repr(remaining)}")
+                logger.debug(f"Fixed string: {repr(fixed_str)}, position: {position}, remaining: {repr(remaining)}")
         
         return result
     
@@ -1580,63 +1787,178 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         Returns:
             Modified scores with invalid tokens masked to -inf and temperature scaling applied
         """
-        if not self.enabled:
-            return self._apply_temperature_scaling(scores)
+        return self.process_batch(scores, input_ids=input_ids)
+    
+    def process_batch(
+        self,
+        scores: torch.FloatTensor,
+        input_ids: Optional[Sequence[Any]] = None,
+        seq_keys: Optional[Sequence[Hashable]] = None,
+    ) -> torch.FloatTensor:
+        """
+        Apply constrained decoding to a batch where every row has its own FSM state.
         
-        if self.state == FSMState.COMPLETED:
-            # In understanding phase, block audio codes during lyrics generation (COMPLETED state)
-            if self.generation_phase == "understand" and self.audio_code_mask is not None:
-                # Move mask to same device/dtype as scores if needed
-                if self.audio_code_mask.device != scores.device or self.audio_code_mask.dtype != scores.dtype:
-                    self.audio_code_mask = self.audio_code_mask.to(device=scores.device, dtype=scores.dtype)
-                scores = scores + self.audio_code_mask
-            return self._apply_temperature_scaling(scores)
+        Rows generating audio codes (or lyrics after the CoT in understand phase) are
+        masked together with a single gather from a precomputed additive mask table.
+        Metadata rows on a compiled DFA node (field names, closed-vocabulary values)
+        are masked with one gather from the DFA bitsets; only the remaining metadata
+        rows (caption, genres, user-provided values) are processed one by one.
+        
+        Args:
+            scores: [batch_size, vocab_size] logits for next token
+            input_ids: Per-row token IDs (tensor rows or lists); only read to detect a
+                </think> already present in the prompt during the codes phase
+            seq_keys: Stable per-row keys (see ``_bind_rows``); positional when None
+            
+        Returns:
+            Modified scores with invalid tokens masked to -inf and temperature scaling applied
+        """
+        slots = self._bind_rows(scores.shape[0], seq_keys)
+        if not self.enabled:
+            return self._apply_temperature_scaling(scores, slots)
         
         # For codes phase, detect if input already contains </think> and skip to CODES_GENERATION
-        if self.generation_phase == "codes" and self.state == FSMState.THINK_TAG:
-            # Check if input contains </think> token sequence
-            if self._input_contains_think_end_tag(input_ids):
-                # Skip metadata generation, go directly to codes generation
-                self.state = FSMState.CODES_GENERATION
-                self.codes_count = 0
-                if self.debug:
-                    logger.debug("Codes phase: detected </think> in input, skipping to CODES_GENERATION")
+        if self.generation_phase == "codes" and input_ids is not None:
+            for b in np.flatnonzero(self._row_state_ids[slots] == _THINK_TAG_ID):
+                if self._row_contains_think_end_tag(input_ids[b]):
+                    # Skip metadata generation, go directly to codes generation
+                    self._row_state_ids[slots[b]] = _CODES_ID
+                    self._row_codes_counts[slots[b]] = 0
+                    self._row_dfa_nodes[slots[b]] = -1
+                    if self.debug:
+                        logger.debug("Codes phase: detected </think> in input, skipping to CODES_GENERATION")
         
-        if self.state == FSMState.CODES_GENERATION:
+        state_ids = self._row_state_ids[slots]
+        mask_kinds = self._get_mask_kinds(state_ids, slots)
+        
+        # Metadata rows: rows entering a field look up their DFA node, rows on the
+        # DFA are masked together and the rest walk the FSM individually (inplace)
+        metadata_rows = np.flatnonzero((state_ids != _CODES_ID) & (state_ids != _COMPLETED_ID))
+        dfa_nodes = self._row_dfa_nodes[slots[metadata_rows]]
+        try:
+            for i in np.flatnonzero(dfa_nodes < 0):
+                self._active_row = int(slots[metadata_rows[i]])
+                dfa_nodes[i] = self._row_dfa_nodes[self._active_row] = self._dfa_node_for_active_row()
+            on_dfa = dfa_nodes >= 0
+            if on_dfa.any():
+                self._apply_dfa_masks(scores, metadata_rows[on_dfa], dfa_nodes[on_dfa])
+            for b in metadata_rows[~on_dfa]:
+                self._active_row = int(slots[b])
+                row_input_ids = input_ids[b] if input_ids is not None else None
+                result = self._process_single_sequence(row_input_ids, scores[b:b+1])
+                scores[b] = result[0]  # result is [1, vocab_size], need [vocab_size]
+        finally:
+            self._active_row = 0
+        
+        # One combined additive mask for all codes/completed rows
+        if mask_kinds.any():
+            table = self._get_mask_table(scores.device, scores.dtype)
+            kinds = torch.from_numpy(mask_kinds).to(device=scores.device, non_blocking=True)
+            scores = scores + table.index_select(0, kinds)
+            if self.debug and self.target_codes is not None:
+                logger.debug(f"Codes generation: {self._row_codes_counts[slots].tolist()}/{self.target_codes}")
+        
+        # Apply temperature scaling after constraint masking
+        return self._apply_temperature_scaling(scores, slots)
+    
+    def _dfa_node_for_active_row(self) -> int:
+        """DFA node matching the active row's FSM position, or -1 if the FSM must handle it."""
+        if self._dfa is None or self.user_field_token_queue:
+            return -1
+        state = self.state
+        if state in self.fixed_strings:
+            if state == FSMState.THINK_END_TAG and self.stop_at_reasoning:
+                return -1  # EOS is forced near the end of </think>
+            return self._dfa.lookup(state.name, (self.position_in_state,))
+        field_name = _DFA_VALUE_FIELDS.get(state)
+        if field_name is None or self.user_provided_metadata[field_name] is not None:
+            return -1
+        if state == FSMState.DURATION_VALUE and self.target_duration is not None:
+            return -1  # Target duration digits are forced by the FSM
+        return self._dfa.lookup(state.name, tuple(self.accumulated_token_ids))
+    
+    def _apply_dfa_masks(self, scores: torch.FloatTensor, rows: np.ndarray, nodes: np.ndarray) -> None:
+        """Keep only the tokens allowed at each row's DFA node (inplace on ``scores``)."""
+        index = torch.from_numpy(rows).to(device=scores.device, non_blocking=True)
+        allowed = self._dfa.allowed_mask(nodes, scores.device, scores.shape[-1])
+        masked = scores.index_select(0, index).masked_fill_(~allowed, float('-inf'))
+        greedy = np.flatnonzero(self._dfa.node_greedy[nodes])
+        if len(greedy):
+            # Greedy nodes (language start) keep only their top-1 allowed token
+            greedy_index = torch.from_numpy(greedy).to(device=scores.device, non_blocking=True)
+            greedy_scores = masked.index_select(0, greedy_index)
+            best = greedy_scores.argmax(dim=-1, keepdim=True)
+            top1 = torch.full_like(greedy_scores, float('-inf')).scatter_(1, best, greedy_scores.gather(1, best))
+            masked.index_copy_(0, greedy_index, top1)
+        scores.index_copy_(0, index, masked)
+    
+    def _sync_fsm_from_dfa_node(self, node: int):
+        """Rebuild the active row's FSM field accumulators from the DFA node it left."""
+        key = self._dfa.node_key(node)
+        if self.state in self.fixed_strings:
+            self.position_in_state = key[0]
+            return
+        token_strs = [self.tokenizer.decode([t]) for t in key]
+        self.accumulated_token_ids = list(key)
+        if self.state in (FSMState.BPM_VALUE, FSMState.DURATION_VALUE, FSMState.TIMESIG_VALUE):
+            self.accumulated_value = "".join(t.strip() for t in token_strs if t.strip().isdigit())
+        else:
+            self.accumulated_value = "".join(token_strs)
+    
+    def _get_mask_kinds(self, state_ids: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        """Select the additive mask table row for each batch row (0 = no mask)."""
+        kinds = np.zeros(len(state_ids), dtype=np.int64)
+        in_codes = state_ids == _CODES_ID
+        if in_codes.any():
             # Block all non-audio-code tokens (only allow audio codes and EOS)
             # Note: audio_code_token_ids already contains only valid tokens (0-63999 range)
             # because _precompute_audio_code_tokens() filters out invalid tokens during initialization
             if self.non_audio_code_mask is not None:
-                # Move mask to same device/dtype as scores if needed
-                if self.non_audio_code_mask.device != scores.device or self.non_audio_code_mask.dtype != scores.dtype:
-                    self.non_audio_code_mask = self.non_audio_code_mask.to(device=scores.device, dtype=scores.dtype)
-                scores = scores + self.non_audio_code_mask
-            
-            # Apply duration constraint in codes generation phase
+                kinds[in_codes] = _MASK_CODES
+            # Apply duration constraint in codes generation phase: block EOS until the
+            # target codes count is reached, then force it
             if self.target_codes is not None and self.eos_token_id is not None:
-                if self.codes_count < self.target_codes:
-                    # Block EOS token until target codes count is reached
-                    scores[:, self.eos_token_id] = float('-inf')
-                    if self.debug:
-                        logger.debug(f"Codes generation: {self.codes_count}/{self.target_codes}, blocking EOS")
-                else:
-                    # Force EOS token when target codes count is reached - inplace
-                    eos_scores = scores[:, self.eos_token_id].clone()
-                    scores.fill_(float('-inf'))
-                    scores[:, self.eos_token_id] = eos_scores
-                    if self.debug:
-                        logger.debug(f"Codes generation: {self.codes_count}/{self.target_codes}, forcing EOS")
-            return self._apply_temperature_scaling(scores)
-        
-        batch_size = scores.shape[0]
-        
-        # Process each sequence in batch
-        for b in range(batch_size):
-            result = self._process_single_sequence(input_ids[b], scores[b:b+1])
-            scores[b] = result[0]  # result is [1, vocab_size], need [vocab_size]
-        
-        # Apply temperature scaling after constraint masking
-        return self._apply_temperature_scaling(scores)
+                reached = self._row_codes_counts[slots] >= self.target_codes
+                kinds[in_codes & ~reached] = _MASK_CODES_BLOCK_EOS
+                kinds[in_codes & reached] = _MASK_FORCE_EOS
+        if self.generation_phase == "understand" and self.audio_code_mask is not None:
+            # In understanding phase, block audio codes during lyrics generation (COMPLETED state)
+            kinds[state_ids == _COMPLETED_ID] = _MASK_NO_AUDIO_CODES
+        return kinds
+    
+    def _get_mask_table(self, device: torch.device, dtype: torch.dtype) -> torch.Tensor:
+        """Return the [5, vocab_size] additive mask table (rows indexed by _MASK_*) on device."""
+        key = (device, dtype)
+        table = self._mask_tables.get(key)
+        if table is None:
+            neg_inf = float('-inf')
+            no_mask = torch.zeros(self.vocab_size, dtype=torch.float32)
+            codes = self.non_audio_code_mask[0] if self.non_audio_code_mask is not None else no_mask
+            codes_block_eos = codes.clone()
+            force_eos = codes.clone()
+            if self.eos_token_id is not None:
+                codes_block_eos[self.eos_token_id] = neg_inf
+                force_eos = torch.full((self.vocab_size,), neg_inf, dtype=torch.float32)
+                force_eos[self.eos_token_id] = 0
+            no_audio_codes = self.audio_code_mask[0] if self.audio_code_mask is not None else no_mask
+            table = torch.stack([no_mask, codes, codes_block_eos, force_eos, no_audio_codes])
+            table = table.to(device=device, dtype=dtype)
+            self._mask_tables[key] = table
+        return table
+    
+    def _row_contains_think_end_tag(self, row_input_ids: Any) -> bool:
+        """Check if one row of input token IDs contains the </think> closing tag."""
+        think_end_tokens = self.think_end_tokens
+        if not think_end_tokens:
+            return False
+        seq = row_input_ids.tolist() if isinstance(row_input_ids, torch.Tensor) else list(row_input_ids)
+        # Search for the token sequence in the input
+        n = len(think_end_tokens)
+        first = think_end_tokens[0]
+        for i in range(len(seq) - n + 1):
+            if seq[i] == first and seq[i:i+n] == think_end_tokens:
+                return True
+        return False
     
     def _input_contains_think_end_tag(self, input_ids: torch.LongTensor) -> bool:
         """
@@ -1648,24 +1970,11 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         Returns:
             True if </think> is found in the input (any sequence in batch)
         """
-        # Tokenize </think> to get its token sequence
-        think_end_tokens = self.tokenizer.encode("</think>", add_special_tokens=False)
-        if not think_end_tokens:
-            return False
-        
-        # Check each sequence in batch
-        for b in range(input_ids.shape[0]):
-            seq = input_ids[b].tolist()
-            # Search for the token sequence in the input
-            for i in range(len(seq) - len(think_end_tokens) + 1):
-                if seq[i:i+len(think_end_tokens)] == think_end_tokens:
-                    return True
-        
-        return False
+        return any(self._row_contains_think_end_tag(input_ids[b]) for b in range(input_ids.shape[0]))
     
-    def _apply_temperature_scaling(self, scores: torch.FloatTensor) -> torch.FloatTensor:
+    def _apply_temperature_scaling(self, scores: torch.FloatTensor, slots: Optional[np.ndarray] = None) -> torch.FloatTensor:
         """
-        Apply temperature scaling based on current generation phase.
+        Apply temperature scaling based on each row's current generation phase.
         
         Temperature scaling: logits = logits / temperature
         - Lower temperature (< 1.0) makes distribution sharper (more deterministic)
@@ -1673,26 +1982,39 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         
         Args:
             scores: [batch_size, vocab_size] logits
+            slots: State rows of the batch rows (defaults to the active row)
             
         Returns:
             Temperature-scaled logits
         """
-        # Determine which temperature to use based on current state
-        if self.state == FSMState.CODES_GENERATION or self.state == FSMState.COMPLETED:
-            temperature = self.codes_temperature
-        else:
-            temperature = self.metadata_temperature
-        
-        # If no temperature is set for this phase, return scores unchanged
-        if temperature is None:
+        # If no temperature is set for either phase, return scores unchanged
+        if self.metadata_temperature is None and self.codes_temperature is None:
             return scores
-        
+        if slots is None:
+            slots = np.array([self._active_row])
+        
+        # Determine which temperature to use based on each row's current state
+        state_ids = self._row_state_ids[slots]
+        in_codes = (state_ids == _CODES_ID) | (state_ids == _COMPLETED_ID)
+        if in_codes.all() or not in_codes.any():
+            # Uniform phase across the batch: scalar division
+            temperature = self._effective_temperature(
+                self.codes_temperature if in_codes.all() else self.metadata_temperature
+            )
+            return scores if temperature is None else scores / temperature
+
+        codes_temp = self._effective_temperature(self.codes_temperature) or 1.0
+        metadata_temp = self._effective_temperature(self.metadata_temperature) or 1.0
+        row_temps = np.where(in_codes, codes_temp, metadata_temp).astype(np.float32)
+        return scores / torch.from_numpy(row_temps).to(device=scores.device, dtype=scores.dtype).unsqueeze(1)
+    
+    @staticmethod
+    def _effective_temperature(temperature: Optional[float]) -> Optional[float]:
+        """Clamp a phase temperature away from zero (None means no scaling)."""
+        if temperature is None:
+            return None
         # Avoid division by zero
-        if temperature <= 0:
-            temperature = 1e-6
-        
-        # Apply temperature scaling
-        return scores / temperature
+        return temperature if temperature > 0 else 1e-6
     
     def _get_user_provided_field_tokens(self, field_name: str) -> Optional[List[int]]:
         """
@@ -2136,6 +2458,32 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
             if self.debug:
                 logger.debug(f"FSM transition: {old_state.name} -> {self.state.name}")
     
+    def update_states(self, generated_token_ids: Sequence[int], seq_keys: Optional[Sequence[Hashable]] = None):
+        """
+        Update every row's FSM state after one sampling step.
+
+        Codes counters of rows in CODES_GENERATION are advanced together; only
+        rows still generating metadata go through ``update_state``.
+
+        Args:
+            generated_token_ids: Sampled token ID per batch row
+            seq_keys: Stable per-row keys, as passed to ``process_batch``
+        """
+        if not self.enabled:
+            return
+        slots = self._bind_rows(len(generated_token_ids), seq_keys)
+        state_ids = self._row_state_ids[slots]
+        in_codes = state_ids == _CODES_ID
+        if in_codes.any():
+            # Count generated codes for duration constraint
+            self._row_codes_counts[slots[in_codes]] += 1
+        try:
+            for b in np.flatnonzero(~in_codes & (state_ids != _COMPLETED_ID)):
+                self._active_row = int(slots[b])
+                self.update_state(int(generated_token_ids[b]))
+        finally:
+            self._active_row = 0
+
     def update_state(self, generated_token_id: int):
         """
         Update internal state after a token has been generated.
@@ -2157,6 +2505,23 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
                 logger.debug(f"Codes count: {self.codes_count}/{self.target_codes}")
             return
         
+        # Rows on the metadata DFA advance by a table lookup
+        node = self._row_dfa_nodes[self._active_row]
+        if node >= 0:
+            next_node = self._dfa.step(int(node), generated_token_id)
+            if next_node >= 0:
+                self._row_dfa_nodes[self._active_row] = next_node
+                return
+            self._row_dfa_nodes[self._active_row] = -1
+            if next_node == DFA_EXIT:
+                self._transition_to_next_state()
+                return
+            # Token outside the compiled grammar (e.g. masked by another processor):
+            # hand the row back to the FSM at the position the DFA had reached
+            if self.debug:
+                logger.warning(f"Token {generated_token_id} left the metadata DFA in state {self.state.name}")
+            self._sync_fsm_from_dfa_node(int(node))
+        
         # Handle user-provided field token injection
         if self.user_field_token_queue:
             # Verify the generated token matches the expected token from queue
@@ -0,0 +1,185 @@
+"""Unit tests for per-sequence FSM state in ``MetadataConstrainedLogitsProcessor``."""
+
+import os
+import random
+import string
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import torch
+    from acestep.constrained_logits_processor import FSMState, MetadataConstrainedLogitsProcessor
+    _IMPORT_ERROR = None
+except ImportError as exc:  # pragma: no cover - dependency guard
+    MetadataConstrainedLogitsProcessor = None
+    _IMPORT_ERROR = exc
+
+
+class _CharTokenizer:
+    """Character-level tokenizer with the special tokens the processor looks for."""
+
+    def __init__(self, num_codes: int = 16):
+        specials = ["<|endoftext|>", "<think>", "</think>"]
+        specials += [f"<|audio_code_{i}|>" for i in range(num_codes)]
+        chars = list(string.ascii_letters + string.digits + " \n.,:#-/'`()") + ["♯", "♭"]
+        self.vocab = specials + chars
+        self._ids = {token: i for i, token in enumerate(self.vocab)}
+        self._specials = sorted(specials, key=len, reverse=True)
+        self.eos_token_id = 0
+        self.pad_token_id = 0
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def encode(self, text, add_special_tokens=False):
+        ids, i = [], 0
+        while i < len(text):
+            for special in self._specials:
+                if text.startswith(special, i):
+                    ids.append(self._ids[special])
+                    i += len(special)
+                    break
+            else:
+                if text[i] in self._ids:
+                    ids.append(self._ids[text[i]])
+                i += 1
+        return ids
+
+    def decode(self, ids, skip_special_tokens=False):
+        return "".join(self.vocab[i] for i in ids)
+
+
+@unittest.skipIf(MetadataConstrainedLogitsProcessor is None, f"processor import unavailable: {_IMPORT_ERROR}")
+class PerSequenceStateTests(unittest.TestCase):
+    """Batched constrained decoding must behave like independent single-row decoding."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._cache_dir = tempfile.TemporaryDirectory()
+        with mock.patch.dict(os.environ, {"ACESTEP_CONSTRAINED_DFA_CACHE_DIR": cls._cache_dir.name}):
+            cls.tokenizer = _CharTokenizer()
+            cls.base = MetadataConstrainedLogitsProcessor(cls.tokenizer, skip_genres=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._cache_dir.cleanup()
+
+    def _request(self, target_duration=3.0, metadata=None, phase="cot"):
+        processor = self.base.fork()
+        processor.set_target_duration(target_duration)
+        processor.set_user_metadata(metadata)
+        processor.set_skip_caption(False)
+        processor.set_skip_language(False)
+        processor.set_generation_phase(phase)
+        return processor
+
+    def _decode_single(self, seed, steps, use_dfa=True, **request_kwargs):
+        processor = self._request(**request_kwargs)
+        if not use_dfa:
+            processor._dfa = None
+        generator = torch.Generator().manual_seed(seed)
+        out = []
+        for _ in range(steps):
+            scores = torch.randn(1, len(self.tokenizer), generator=generator)
+            scores[:, self.tokenizer.eos_token_id] -= 50
+            token = int(processor(torch.tensor([out or [1]]), scores)[0].argmax())
+            out.append(token)
+            processor.update_state(token)
+            if token == self.tokenizer.eos_token_id:
+                break
+        return out
+
+    def test_keyed_batch_matches_single_sequence_decoding(self):
+        """Rows keep their own FSM state even when their batch order changes."""
+        seeds = [0, 1, 2, 3]
+        steps = 400
+        expected = {seed: self._decode_single(seed, steps) for seed in seeds}
+
+        processor = self._request()
+        generators = {seed: torch.Generator().manual_seed(seed) for seed in seeds}
+        outputs = {seed: [] for seed in seeds}
+        live = list(seeds)
+        shuffler = random.Random(0)
+        for _ in range(steps):
+            if not live:
+                break
+            shuffler.shuffle(live)
+            rows = []
+            for seed in live:
+                row = torch.randn(1, len(self.tokenizer), generator=generators[seed])
+                row[:, self.tokenizer.eos_token_id] -= 50
+                rows.append(row)
+            scores = processor.process_batch(torch.cat(rows), seq_keys=live)
+            tokens = scores.argmax(dim=-1).tolist()
+            processor.update_states(tokens, seq_keys=live)
+            for seed, token in zip(live, tokens):
+                outputs[seed].append(token)
+            live = [seed for seed, token in zip(live, tokens) if token != self.tokenizer.eos_token_id]
+
+        for seed in seeds:
+            self.assertEqual(outputs[seed], expected[seed], f"row with seed {seed} diverged")
+
+    def test_codes_rows_block_then_force_eos_per_row(self):
+        """EOS is blocked or forced per row from that row's own codes counter."""
+        processor = self._request(target_duration=1.0, phase="codes")  # 5 codes
+        prompt = self.tokenizer.encode("<think>\nbpm: 90\n</think>\n")
+        processor.process_batch(torch.zeros(2, len(self.tokenizer)), input_ids=[prompt, prompt], seq_keys=["a", "b"])
+        code_token = self.tokenizer.encode("<|audio_code_3|>")[0]
+        for _ in range(5):
+            processor.update_states([code_token], seq_keys=["a"])
+
+        scores = processor.process_batch(torch.zeros(2, len(self.tokenizer)), seq_keys=["b", "a"])
+        eos = self.tokenizer.eos_token_id
+        self.assertEqual(scores[0, eos].item(), float("-inf"))
+        self.assertEqual(scores[0, code_token].item(), 0.0)
+        self.assertEqual(scores[1, eos].item(), 0.0)
+        self.assertEqual(scores[1, code_token].item(), float("-inf"))
+
+    def test_positional_rows_for_hf_style_calls(self):
+        """Without keys, batch row b always maps to state row b."""
+        processor = self._request()
+        think = self.tokenizer.encode("<think>")[0]
+        scores = processor(torch.ones(2, 1, dtype=torch.long), torch.zeros(2, len(self.tokenizer)))
+        self.assertEqual(scores[:, think].tolist(), [0.0, 0.0])
+        processor.update_states([think, think])
+        processor._active_row = 1
+        self.assertEqual(processor.state, FSMState.NEWLINE_AFTER_THINK)
+        processor._active_row = 0
+        self.assertEqual(processor.state, FSMState.NEWLINE_AFTER_THINK)
+
+    def test_dfa_masking_matches_fsm_masking(self):
+        """Fields compiled into the DFA decode exactly as the FSM decodes them."""
+        self.assertIn("KEYSCALE_VALUE", self.base._dfa.segments)
+        for seed in range(6):
+            for kwargs in ({"target_duration": None}, {"target_duration": None, "metadata": {"keyscale": "A minor"}}):
+                expected = self._decode_single(seed, 300, use_dfa=False, **kwargs)
+                self.assertEqual(self._decode_single(seed, 300, **kwargs), expected, f"seed {seed}, {kwargs}")
+
+    def test_off_grammar_token_hands_row_back_to_fsm(self):
+        """A token outside the DFA resumes FSM tracking from the position reached."""
+        processor = self._request(target_duration=None)
+        for token in self.tokenizer.encode("<think>\nbpm: 1"):
+            processor(torch.ones(1, 1, dtype=torch.long), torch.zeros(1, len(self.tokenizer)))
+            processor.update_state(token)
+        self.assertEqual(processor.state, FSMState.BPM_VALUE)
+        self.assertGreaterEqual(processor._row_dfa_nodes[0], 0)
+        processor.update_state(self.tokenizer.encode("x")[0])
+        self.assertEqual(processor._row_dfa_nodes[0], -1)
+        self.assertEqual(processor.accumulated_value, "1")
+        self.assertEqual(processor.accumulated_token_ids[:2], self.tokenizer.encode(" 1"))
+
+    def test_fork_isolates_state_and_settings(self):
+        """Forked processors share tables but not FSM state or user metadata."""
+        first = self._request(metadata={"bpm": "120"})
+        second = self._request(metadata=None)
+        first.update_state(self.tokenizer.encode("<think>")[0])
+        self.assertEqual(first.state, FSMState.NEWLINE_AFTER_THINK)
+        self.assertEqual(second.state, FSMState.THINK_TAG)
+        self.assertIsNone(second.user_provided_metadata["bpm"])
+        self.assertIsNone(self.base.user_provided_metadata["bpm"])
+        self.assertIs(first.keyscale_prefix_tree, second.keyscale_prefix_tree)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,16 @@
 """Audio-code parsing and conversion helpers for handler decomposition."""
 
+import os
 import re
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
 import torch
 from loguru import logger
 
+from acestep.core.generation.handler.latent_cache import codes_cache_scope, make_cache_key
+
 
 class AudioCodesMixin:
     """Mixin containing audio-code parsing and latent conversion helpers.
@@ -65,6 +69,36 @@ class AudioCodesMixin:
             lm_hints_25hz = detokenizer(quantized)
             return lm_hints_25hz
 
+    def _audio_codes_cache_key(self, audio_file) -> Optional[str]:
+        """Return the latent-cache key for a source file, or ``None`` when uncacheable."""
+        cache = getattr(self, "latent_cache", None)
+        if cache is None or not isinstance(audio_file, str) or not os.path.isfile(audio_file):
+            return None
+        from acestep.audio_utils import get_audio_file_hash
+
+        return make_cache_key("audio_codes", codes_cache_scope(self), get_audio_file_hash(audio_file))
+
+    def _cached_audio_codes(self, cache_key: Optional[str]) -> Optional[str]:
+        """Return cached code tokens for ``cache_key`` if present."""
+        if cache_key is None:
+            return None
+        cached_indices = self.latent_cache.get(cache_key)
+        if cached_indices is None:
+            return None
+        logger.info(f"[convert_src_audio_to_codes] Reusing {cached_indices.numel()} cached audio codes")
+        return "".join([f"<|audio_code_{idx}|>" for idx in cached_indices.tolist()])
+
+    def _tokenize_latents_to_codes(self, latents: torch.Tensor, cache_key: Optional[str]) -> str:
+        """Quantize 25Hz latents into code tokens; call inside the ``model`` context."""
+        attention_mask = torch.ones(latents.shape[0], dtype=torch.bool, device=self.device)
+        hidden_states = latents.unsqueeze(0)
+        _, indices, _ = self.model.tokenize(hidden_states, self.silence_latent, attention_mask.unsqueeze(0))
+        indices_flat = indices.flatten().cpu().tolist()
+        if cache_key is not None:
+            self.latent_cache.put(cache_key, torch.tensor(indices_flat, dtype=torch.long))
+        logger.info(f"[convert_src_audio_to_codes] Generated {len(indices_flat)} audio codes")
+        return "".join([f"<|audio_code_{idx}|>" for idx in indices_flat])
+
     def convert_src_audio_to_codes(self, audio_file) -> str:
         """Convert uploaded source audio into serialized audio code tokens."""
         if audio_file is None:
@@ -73,6 +107,11 @@ class AudioCodesMixin:
             return "❌ Model not initialized. Please initialize the service first."
 
         try:
+            cache_key = self._audio_codes_cache_key(audio_file)
+            cached = self._cached_audio_codes(cache_key)
+            if cached is not None:
+                return cached
+
             processed_audio = self.process_src_audio(audio_file)
             if processed_audio is None:
                 return "❌ Failed to process audio file"
@@ -83,17 +122,77 @@ class AudioCodesMixin:
                         return "❌ Audio file appears to be silent"
                     latents = self._encode_audio_to_latents(processed_audio)
 
-                attention_mask = torch.ones(latents.shape[0], dtype=torch.bool, device=self.device)
                 with self._load_model_context("model"):
-                    hidden_states = latents.unsqueeze(0)
-                    _, indices, _ = self.model.tokenize(
-                        hidden_states, self.silence_latent, attention_mask.unsqueeze(0)
-                    )
-                    indices_flat = indices.flatten().cpu().tolist()
-                    codes_string = "".join([f"<|audio_code_{idx}|>" for idx in indices_flat])
-                    logger.info(f"[convert_src_audio_to_codes] Generated {len(indices_flat)} audio codes")
-                    return codes_string
+                    return self._tokenize_latents_to_codes(latents, cache_key)
         except Exception as e:
             error_msg = f"❌ Error converting audio to codes: {str(e)}\n{traceback.format_exc()}"
             logger.exception("[convert_src_audio_to_codes] Error converting audio to codes")
             return error_msg
+
+    def convert_src_audios_to_codes(self, audio_files: List[str], num_workers: int = 4) -> List[str]:
+        """Convert several source files into code tokens, one result per file.
+
+        Files are decoded and resampled by a thread pool while earlier ones are
+        still being read; VAE encoding and tokenization then run stage by stage,
+        so each model is brought onto the device once per call instead of once
+        per file. Failures are reported per file with the same ``❌`` messages
+        as :meth:`convert_src_audio_to_codes`.
+        """
+        results: List[Optional[str]] = [None] * len(audio_files)
+        if self.model is None or self.vae is None:
+            return ["❌ Model not initialized. Please initialize the service first."] * len(audio_files)
+
+        cache_keys: List[Optional[str]] = [None] * len(audio_files)
+        pending = []
+        for i, audio_file in enumerate(audio_files):
+            if audio_file is None:
+                results[i] = "❌ Please upload source audio first"
+                continue
+            try:
+                cache_keys[i] = self._audio_codes_cache_key(audio_file)
+            except OSError:
+                cache_keys[i] = None
+            cached = self._cached_audio_codes(cache_keys[i])
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+
+        if pending:
+            def _decode(i: int) -> Optional[torch.Tensor]:
+                try:
+                    return self.process_src_audio(audio_files[i])
+                except Exception:
+                    logger.exception(f"[convert_src_audios_to_codes] Error loading {audio_files[i]}")
+                    return None
+
+            workers = max(1, min(num_workers, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="audio-decode") as pool:
+                decoded = list(pool.map(_decode, pending))
+
+            latents = {}
+            with torch.inference_mode():
+                with self._load_model_context("vae"):
+                    for i, processed_audio in zip(pending, decoded):
+                        if processed_audio is None:
+                            results[i] = "❌ Failed to process audio file"
+                            continue
+                        try:
+                            if self.is_silence(processed_audio.unsqueeze(0)):
+                                results[i] = "❌ Audio file appears to be silent"
+                            else:
+                                latents[i] = self._encode_audio_to_latents(processed_audio)
+                        except Exception as e:
+                            logger.exception(f"[convert_src_audios_to_codes] Error encoding {audio_files[i]}")
+                            results[i] = f"❌ Error converting audio to codes: {str(e)}"
+                del decoded
+
+                if latents:
+                    with self._load_model_context("model"):
+                        for i, item in latents.items():
+                            try:
+                                results[i] = self._tokenize_latents_to_codes(item, cache_keys[i])
+                            except Exception as e:
+                                logger.exception(f"[convert_src_audios_to_codes] Error tokenizing {audio_files[i]}")
+                                results[i] = f"❌ Error converting audio to codes: {str(e)}"
+        return results
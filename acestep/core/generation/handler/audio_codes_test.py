@@ -0,0 +1,78 @@
+"""Unit tests for batch source-audio to code conversion."""
+
+from contextlib import contextmanager
+import unittest
+
+import torch
+
+from acestep.core.generation.handler.audio_codes import AudioCodesMixin
+
+
+class _Model:
+    """DiT stand-in whose tokenizer returns one code per latent frame."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize(self, hidden_states, silence_latent, attention_mask):
+        del silence_latent, attention_mask
+        self.calls += 1
+        return None, torch.arange(hidden_states.shape[1]), None
+
+
+class _Host(AudioCodesMixin):
+    """Host recording how often each model context is entered."""
+
+    def __init__(self):
+        self.latent_cache = None
+        self.model = _Model()
+        self.vae = object()
+        self.device = "cpu"
+        self.silence_latent = None
+        self.contexts = []
+
+    @contextmanager
+    def _load_model_context(self, name):
+        self.contexts.append(name)
+        yield
+
+    def process_src_audio(self, audio_file):
+        if audio_file == "broken.wav":
+            return None
+        if audio_file == "raises.wav":
+            raise ValueError("bad header")
+        return torch.ones(2, int(audio_file.split(".")[0]))
+
+    def is_silence(self, audio):
+        del audio
+        return False
+
+    def _encode_audio_to_latents(self, audio):
+        return torch.zeros(audio.shape[-1], 4)
+
+
+class ConvertSrcAudiosToCodesTests(unittest.TestCase):
+    """Tests for AudioCodesMixin.convert_src_audios_to_codes."""
+
+    def test_results_keep_input_order_and_load_each_model_once(self):
+        """Codes come back per file in order with one vae and one model context."""
+        host = _Host()
+        codes = host.convert_src_audios_to_codes(["2.wav", "3.wav", "1.wav"], num_workers=2)
+        self.assertEqual(codes[0], "<|audio_code_0|><|audio_code_1|>")
+        self.assertEqual(codes[2], "<|audio_code_0|>")
+        self.assertEqual(len(codes[1].split("><")), 3)
+        self.assertEqual(host.contexts, ["vae", "model"])
+        self.assertEqual(host.model.calls, 3)
+
+    def test_failures_are_reported_per_file(self):
+        """Unreadable files get an error message without failing the others."""
+        host = _Host()
+        codes = host.convert_src_audios_to_codes(["broken.wav", "raises.wav", "1.wav", None])
+        self.assertEqual(codes[0], "❌ Failed to process audio file")
+        self.assertEqual(codes[1], "❌ Failed to process audio file")
+        self.assertEqual(codes[2], "<|audio_code_0|>")
+        self.assertEqual(codes[3], "❌ Please upload source audio first")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,24 @@
 """Reference/text embedding preprocessing helpers for conditioned generation."""
 
-from typing import Dict, List, Tuple
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import torch
 from loguru import logger
 
+from acestep.core.generation.handler.latent_cache import (
+    make_cache_key,
+    tensor_content_hash,
+    text_encoder_cache_scope,
+)
+
 
 class ConditioningEmbedMixin:
     """Mixin containing reference/text embedding preprocessing steps.
 
     Depends on host members:
-    - Attributes: ``device``, ``dtype``, ``silence_latent``, ``text_encoder``.
+    - Attributes: ``device``, ``dtype``, ``silence_latent``, ``text_encoder``;
+      optional ``text_embedding_cache`` (a ``TensorCache``).
     - Methods: ``_ensure_silence_latent_on_device``, ``_load_model_context``,
       ``tiled_encode``.
     """
@@ -70,13 +78,74 @@ class ConditioningEmbedMixin:
 
     def infer_text_embeddings(self, text_token_idss):
         """Infer text-token embeddings via text encoder."""
-        with torch.inference_mode():
-            return self.text_encoder(input_ids=text_token_idss, lyric_attention_mask=None).last_hidden_state
+        return self._embed_token_rows(self._lookup_token_rows("text", text_token_idss), self._encode_text_rows)
 
     def infer_lyric_embeddings(self, lyric_token_ids):
         """Infer lyric-token embeddings via text encoder embedding table."""
+        return self._embed_token_rows(self._lookup_token_rows("lyric", lyric_token_ids), self._encode_lyric_rows)
+
+    def _encode_text_rows(self, token_ids: torch.Tensor) -> torch.Tensor:
+        """Run the text encoder on ``[rows, seq]`` caption ids."""
         with torch.inference_mode():
-            return self.text_encoder.embed_tokens(lyric_token_ids)
+            return self.text_encoder(input_ids=token_ids, lyric_attention_mask=None).last_hidden_state
+
+    def _encode_lyric_rows(self, token_ids: torch.Tensor) -> torch.Tensor:
+        """Look up ``[rows, seq]`` lyric ids in the text encoder embedding table."""
+        with torch.inference_mode():
+            return self.text_encoder.embed_tokens(token_ids)
+
+    def _token_row_keys(self, kind: str, unique_rows: torch.Tensor) -> List[str]:
+        """Cache keys for each row of ``unique_rows`` under the current text encoder."""
+        scope = text_encoder_cache_scope(self)
+        return [make_cache_key(kind, scope, tensor_content_hash(row)) for row in unique_rows]
+
+    def _lookup_token_rows(self, kind: str, token_ids: torch.Tensor) -> Dict[str, Any]:
+        """Fetch the cached embedding of each distinct row of ``token_ids``.
+
+        Every row is read from ``text_embedding_cache`` exactly once, so a
+        row evicted by a concurrent request between the lookup and the
+        embedding step cannot turn a planned cache hit into an encoder call.
+        ``missing`` lists the rows that still have to be encoded.
+        """
+        cache = getattr(self, "text_embedding_cache", None)
+        unique_rows, inverse = torch.unique(token_ids.cpu(), dim=0, return_inverse=True)
+        keys = self._token_row_keys(kind, unique_rows) if cache is not None else [None] * unique_rows.shape[0]
+        embeddings: List[Optional[torch.Tensor]] = [cache.get(key) if key else None for key in keys]
+        return {
+            "token_ids": token_ids,
+            "unique_rows": unique_rows,
+            "inverse": inverse,
+            "keys": keys,
+            "embeddings": embeddings,
+            "missing": [i for i, embedding in enumerate(embeddings) if embedding is None],
+        }
+
+    def _embed_token_rows(
+        self,
+        lookup: Dict[str, Any],
+        encode_fn: Callable[[torch.Tensor], torch.Tensor],
+    ) -> torch.Tensor:
+        """Embed the ``[batch, seq]`` ids of ``lookup``, encoding each missing distinct row once.
+
+        Rows are encoded independently (no attention mask), so identical rows in
+        a batch share one encoder pass and rows seen in earlier calls are served
+        from ``text_embedding_cache`` when the host has one.
+        """
+        cache = getattr(self, "text_embedding_cache", None)
+        token_ids, unique_rows = lookup["token_ids"], lookup["unique_rows"]
+        if cache is None and unique_rows.shape[0] == token_ids.shape[0]:
+            return encode_fn(token_ids)
+
+        keys, embeddings, missing = lookup["keys"], list(lookup["embeddings"]), lookup["missing"]
+        if missing:
+            encoded = encode_fn(unique_rows[missing].to(token_ids.device))
+            for row, i in enumerate(missing):
+                embeddings[i] = encoded[row]
+                if cache is not None:
+                    cache.put(keys[i], encoded[row])
+        device = encoded.device if missing else token_ids.device
+        stacked = torch.stack([embedding.to(device) for embedding in embeddings])
+        return stacked[lookup["inverse"].to(device)]
 
     def preprocess_batch(self, batch) -> Tuple:
         """Preprocess an already prepared batch for DiT model input."""
@@ -107,20 +176,30 @@ class ConditioningEmbedMixin:
         lyric_attention_mask = batch["lyric_attention_masks"]
         text_inputs = batch["text_inputs"]
 
+        non_cover_text_input_ids = batch.get("non_cover_text_input_ids", None)
+        # Look the rows up once; the encoder is loaded only if some row missed
+        text_lookup = self._lookup_token_rows("text", text_token_idss)
+        lyric_lookup = self._lookup_token_rows("lyric", lyric_token_idss)
+        non_cover_lookup = None
+        if non_cover_text_input_ids is not None:
+            non_cover_lookup = self._lookup_token_rows("text", non_cover_text_input_ids)
+        needs_text_encoder = any(
+            lookup is not None and lookup["missing"]
+            for lookup in (text_lookup, lyric_lookup, non_cover_lookup)
+        )
         logger.info("[preprocess_batch] Inferring prompt embeddings...")
-        with self._load_model_context("text_encoder"):
-            text_hidden_states = self.infer_text_embeddings(text_token_idss)
+        with self._load_model_context("text_encoder") if needs_text_encoder else nullcontext():
+            text_hidden_states = self._embed_token_rows(text_lookup, self._encode_text_rows)
             logger.info("[preprocess_batch] Inferring lyric embeddings...")
-            lyric_hidden_states = self.infer_lyric_embeddings(lyric_token_idss)
+            lyric_hidden_states = self._embed_token_rows(lyric_lookup, self._encode_lyric_rows)
 
             is_covers = batch["is_covers"]
             precomputed_lm_hints_25hz = batch.get("precomputed_lm_hints_25Hz", None)
-            non_cover_text_input_ids = batch.get("non_cover_text_input_ids", None)
             non_cover_text_attention_masks = batch.get("non_cover_text_attention_masks", None)
             non_cover_text_hidden_states = None
-            if non_cover_text_input_ids is not None:
+            if non_cover_lookup is not None:
                 logger.info("[preprocess_batch] Inferring non-cover text embeddings...")
-                non_cover_text_hidden_states = self.infer_text_embeddings(non_cover_text_input_ids)
+                non_cover_text_hidden_states = self._embed_token_rows(non_cover_lookup, self._encode_text_rows)
 
         return (
             keys,
@@ -6,6 +6,7 @@ import unittest
 import torch
 
 from acestep.core.generation.handler.conditioning_embed import ConditioningEmbedMixin
+from acestep.core.generation.handler.latent_cache import TensorCache
 
 
 class _FakeTextEncoder:
@@ -21,6 +22,44 @@ class _FakeTextEncoder:
         return torch.zeros(b, t, 6, dtype=torch.float32)
 
 
+def _make_batch():
+    """Build a two-item preprocessed batch with fixed text/lyric token ids."""
+    return {
+        "keys": ["k1", "k2"],
+        "target_latents": torch.zeros(2, 128, 6, dtype=torch.float32),
+        "src_latents": torch.zeros(2, 128, 6, dtype=torch.float32),
+        "latent_masks": torch.ones(2, 128, dtype=torch.long),
+        "refer_audioss": [[torch.zeros(2, 96000)], [torch.zeros(2, 96000)]],
+        "chunk_masks": torch.ones(2, 128, dtype=torch.bool),
+        "spans": [("full", 0, 128), ("full", 0, 128)],
+        "text_token_idss": torch.ones(2, 8, dtype=torch.long),
+        "text_attention_masks": torch.ones(2, 8, dtype=torch.long),
+        "lyric_token_idss": torch.ones(2, 10, dtype=torch.long),
+        "lyric_attention_masks": torch.ones(2, 10, dtype=torch.long),
+        "text_inputs": ["a", "b"],
+        "is_covers": torch.zeros(2, dtype=torch.bool),
+        "precomputed_lm_hints_25Hz": None,
+        "non_cover_text_input_ids": None,
+        "non_cover_text_attention_masks": None,
+    }
+
+
+class _CountingTextEncoder:
+    """Text encoder stub whose outputs depend on the ids and which counts encoded rows."""
+
+    def __init__(self):
+        self.rows_encoded = 0
+
+    @staticmethod
+    def expected(input_ids):
+        return input_ids.float().unsqueeze(-1).repeat(1, 1, 4)
+
+    def __call__(self, input_ids, lyric_attention_mask=None):
+        del lyric_attention_mask
+        self.rows_encoded += input_ids.shape[0]
+        return type("O", (), {"last_hidden_state": self.expected(input_ids)})
+
+
 class _Host(ConditioningEmbedMixin):
     """Minimal host implementing ConditioningEmbedMixin dependencies."""
 
@@ -30,12 +69,14 @@ class _Host(ConditioningEmbedMixin):
         self.silence_latent = torch.zeros(1, 128, 6, dtype=torch.float32)
         self.text_encoder = _FakeTextEncoder()
         self.tiled_encode_calls = 0
+        self.loaded_models = []
 
     def _ensure_silence_latent_on_device(self):
         return None
 
     @contextmanager
-    def _load_model_context(self, _name):
+    def _load_model_context(self, name):
+        self.loaded_models.append(name)
         yield
 
     def tiled_encode(self, audio, offload_latent_to_cpu=True):
@@ -88,29 +129,64 @@ class ConditioningEmbedMixinTests(unittest.TestCase):
     def test_preprocess_batch_returns_expected_tuple_shape(self):
         """Preprocess batch and return full model-input tuple contract."""
         host = _Host()
-        batch = {
-            "keys": ["k1", "k2"],
-            "target_latents": torch.zeros(2, 128, 6, dtype=torch.float32),
-            "src_latents": torch.zeros(2, 128, 6, dtype=torch.float32),
-            "latent_masks": torch.ones(2, 128, dtype=torch.long),
-            "refer_audioss": [[torch.zeros(2, 96000)], [torch.zeros(2, 96000)]],
-            "chunk_masks": torch.ones(2, 128, dtype=torch.bool),
-            "spans": [("full", 0, 128), ("full", 0, 128)],
-            "text_token_idss": torch.ones(2, 8, dtype=torch.long),
-            "text_attention_masks": torch.ones(2, 8, dtype=torch.long),
-            "lyric_token_idss": torch.ones(2, 10, dtype=torch.long),
-            "lyric_attention_masks": torch.ones(2, 10, dtype=torch.long),
-            "text_inputs": ["a", "b"],
-            "is_covers": torch.zeros(2, dtype=torch.bool),
-            "precomputed_lm_hints_25Hz": None,
-            "non_cover_text_input_ids": None,
-            "non_cover_text_attention_masks": None,
-        }
+        batch = _make_batch()
         result = host.preprocess_batch(batch)
         self.assertEqual(len(result), 19)
         self.assertEqual(result[0], ["k1", "k2"])
         self.assertEqual(result[3].shape, (2, 128, 6))
 
+    def test_infer_text_embeddings_encodes_duplicate_rows_once(self):
+        """Identical caption rows in a batch share one encoder pass."""
+        host = _Host()
+        host.text_encoder = _CountingTextEncoder()
+        ids = torch.tensor([[1, 2, 3], [4, 5, 6], [1, 2, 3]])
+        out = host.infer_text_embeddings(ids)
+        self.assertEqual(host.text_encoder.rows_encoded, 2)
+        self.assertTrue(torch.equal(out, _CountingTextEncoder.expected(ids)))
+
+    def test_text_embedding_cache_serves_repeated_requests(self):
+        """Rows seen in an earlier call come from the cache."""
+        host = _Host()
+        host.text_encoder = _CountingTextEncoder()
+        host.text_embedding_cache = TensorCache(max_bytes=1 << 20)
+        ids = torch.tensor([[1, 2, 3], [4, 5, 6]])
+        host.infer_text_embeddings(ids)
+        out = host.infer_text_embeddings(torch.tensor([[4, 5, 6], [7, 8, 9]]))
+        self.assertEqual(host.text_encoder.rows_encoded, 3)
+        self.assertTrue(torch.equal(out, _CountingTextEncoder.expected(torch.tensor([[4, 5, 6], [7, 8, 9]]))))
+        self.assertEqual(host._lookup_token_rows("text", ids)["missing"], [])
+        self.assertEqual(host._lookup_token_rows("text", torch.tensor([[0, 0, 0], [1, 2, 3]]))["missing"], [0])
+
+    def test_preprocess_batch_skips_text_encoder_load_on_full_hit(self):
+        """A repeated batch is embedded from the cache without loading the text encoder."""
+        host = _Host()
+        host.text_embedding_cache = TensorCache(max_bytes=1 << 20)
+        first = host.preprocess_batch(_make_batch())
+        host.loaded_models.clear()
+        second = host.preprocess_batch(_make_batch())
+        self.assertNotIn("text_encoder", host.loaded_models)
+        self.assertTrue(torch.equal(first[4], second[4]))
+        self.assertTrue(torch.equal(first[6], second[6]))
+
+    def test_preprocess_batch_uses_rows_fetched_before_eviction(self):
+        """Rows looked up as hits are used even if the cache drops them mid-batch."""
+        host = _Host()
+        host.text_embedding_cache = TensorCache(max_bytes=1 << 20)
+        first = host.preprocess_batch(_make_batch())
+        host.loaded_models.clear()
+        embed = host._embed_token_rows
+
+        def evict_then_embed(lookup, encode_fn):
+            host.text_embedding_cache.clear()
+            return embed(lookup, encode_fn)
+
+        host._embed_token_rows = evict_then_embed
+        host.text_encoder = None  # any encoder call would fail
+        second = host.preprocess_batch(_make_batch())
+        self.assertNotIn("text_encoder", host.loaded_models)
+        self.assertTrue(torch.equal(first[4], second[4]))
+        self.assertTrue(torch.equal(first[6], second[6]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,242 @@
+"""Cross-request micro-batching of ``service_generate`` calls.
+
+Concurrent generation requests (e.g. API jobs handled by several DiT-stage
+workers) enter an exclusive GPU *section*. Inside it each request prepares its
+inputs as usual; when it reaches the diffusion call it parks its per-item
+inputs in the batcher and releases the section, so the next request can
+prepare too. Once no request is still preparing (or the batch is full), the
+oldest parked request runs one ``service_generate`` for all compatible parked
+requests and hands every request its slice of the outputs.
+
+Requests are compatible when they use the same handler, diffusion settings
+and target length, so padding is limited to the text/lyric tokens and each
+item keeps its own seed, caption, lyrics, metas and repaint span. Because all
+GPU work still runs inside the section one request at a time, the handler's
+CPU offload contexts keep working unchanged.
+"""
+
+import random
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import torch
+from loguru import logger
+
+from acestep.core.generation.handler.service_generate_request import MAX_BATCH_SIZE
+
+# Per-item ``service_generate`` arguments that are concatenated across requests.
+_ITEM_ARGS = (
+    "captions",
+    "lyrics",
+    "metas",
+    "vocal_languages",
+    "refer_audios",
+    "repainting_start",
+    "repainting_end",
+    "instructions",
+    "audio_code_hints",
+)
+# Arguments that must match for requests to share one diffusion call.
+_SHARED_ARGS = (
+    "infer_steps",
+    "guidance_scale",
+    "audio_cover_strength",
+    "cover_noise_strength",
+    "use_adg",
+    "cfg_interval_start",
+    "cfg_interval_end",
+    "shift",
+    "infer_method",
+    "return_intermediate",
+)
+
+
+class _Request:
+    """One parked ``service_generate`` call."""
+
+    def __init__(self, handler: Any, kwargs: Dict[str, Any], size: int, key: tuple):
+        self.handler = handler
+        self.kwargs = kwargs
+        self.size = size
+        self.key = key
+        self.done = False
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+def _batch_key(handler: Any, kwargs: Dict[str, Any]) -> tuple:
+    target = kwargs.get("target_wavs")
+    timesteps = kwargs.get("timesteps")
+    return (
+        id(handler),
+        tuple(kwargs.get(name) for name in _SHARED_ARGS),
+        tuple(timesteps) if timesteps is not None else None,
+        tuple(target.shape[1:]) if isinstance(target, torch.Tensor) else None,
+        tuple(kwargs.get(name) is None for name in _ITEM_ARGS),
+    )
+
+
+def _as_items(value: Any, size: int) -> List[Any]:
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value] * size
+
+
+def merge_service_kwargs(requests: List[_Request]) -> Dict[str, Any]:
+    """Concatenate per-item arguments of compatible requests into one call."""
+    merged = dict(requests[0].kwargs)
+    for name in _ITEM_ARGS:
+        if all(req.kwargs.get(name) is None for req in requests):
+            merged[name] = None
+            continue
+        merged[name] = [item for req in requests for item in _as_items(req.kwargs.get(name), req.size)]
+    seeds: List[int] = []
+    for req in requests:
+        seed = req.kwargs.get("seed")
+        if seed is None:
+            seed = [random.randint(0, 2**32 - 1) for _ in range(req.size)]
+        seeds.extend(_as_items(seed, req.size))
+    merged["seed"] = seeds
+    targets = [req.kwargs.get("target_wavs") for req in requests]
+    merged["target_wavs"] = None if targets[0] is None else torch.cat(targets, dim=0)
+    return merged
+
+
+def split_service_outputs(outputs: Dict[str, Any], sizes: List[int]) -> List[Dict[str, Any]]:
+    """Split a merged ``service_generate`` output back into per-request outputs."""
+    total = sum(sizes)
+    parts: List[Dict[str, Any]] = [{} for _ in sizes]
+    for name, value in outputs.items():
+        batched = (isinstance(value, torch.Tensor) and value.dim() > 0 and value.shape[0] == total) or (
+            isinstance(value, (list, tuple)) and len(value) == total
+        )
+        start = 0
+        for part, size in zip(parts, sizes):
+            if batched:
+                part[name] = value[start:start + size]
+            elif isinstance(value, dict):
+                part[name] = dict(value)
+            else:
+                part[name] = value
+            start += size
+    return parts
+
+
+class DiTMicroBatcher:
+    """Coalesces concurrent ``service_generate`` calls into shared diffusion batches."""
+
+    def __init__(self, fits: Optional[Callable[[int], bool]] = None):
+        """``fits(n)`` tells whether a diffusion batch of ``n`` items fits in memory.
+
+        Batches never exceed ``MAX_BATCH_SIZE``, which ``service_generate`` enforces.
+        """
+        self._fits = fits
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._pending: List[_Request] = []
+        self._active = 0
+        self._entering = 0
+        self._entering_lock = threading.Lock()
+        self.calls = 0
+        self.batched_requests = 0
+
+    def fits(self, size: int) -> bool:
+        """Whether a diffusion batch of ``size`` items may be run."""
+        return size <= MAX_BATCH_SIZE and (self._fits is None or self._fits(size))
+
+    @contextmanager
+    def section(self) -> Iterator[None]:
+        """Run the enclosed GPU work exclusively; ``run`` may coalesce inside it."""
+        if getattr(self._local, "depth", 0):
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        with self._entering_lock:
+            self._entering += 1
+        with self._cond:
+            with self._entering_lock:
+                self._entering -= 1
+            self._active += 1
+            self._local.depth = 1
+            try:
+                yield
+            finally:
+                self._local.depth = 0
+                self._active -= 1
+                self._cond.notify_all()
+
+    def run(self, handler: Any, size: int, **kwargs: Any) -> Dict[str, Any]:
+        """Call ``handler.service_generate(**kwargs)``, sharing the diffusion with parked requests.
+
+        ``size`` is the number of items in this call. Outside a section the
+        call runs directly.
+        """
+        if not getattr(self._local, "depth", 0):
+            return handler.service_generate(**kwargs)
+        request = _Request(handler, kwargs, size, _batch_key(handler, kwargs))
+        self._pending.append(request)
+        self._active -= 1
+        self._cond.notify_all()
+        try:
+            while not request.done:
+                if self._pending and self._pending[0] is request and self._ready(request):
+                    self._execute(request)
+                    break
+                self._cond.wait()
+        finally:
+            self._active += 1
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _group(self, leader: _Request) -> List[_Request]:
+        group, total = [leader], leader.size
+        for req in self._pending[1:]:
+            if req.key == leader.key and self.fits(total + req.size):
+                group.append(req)
+                total += req.size
+        return group
+
+    def _ready(self, leader: _Request) -> bool:
+        """Run once nobody is still preparing a request, or the batch cannot grow."""
+        with self._entering_lock:
+            entering = self._entering
+        if self._active == 0 and entering == 0:
+            return True
+        group = self._group(leader)
+        return not self.fits(sum(req.size for req in group) + 1)
+
+    def _execute(self, leader: _Request) -> None:
+        """Run the leader's group with the section held and wake its members."""
+        group = self._group(leader)
+        for req in group:
+            self._pending.remove(req)
+        try:
+            if len(group) == 1:
+                leader.result = leader.handler.service_generate(**leader.kwargs)
+            else:
+                logger.info(
+                    f"[DiTMicroBatcher] Coalescing {len(group)} requests "
+                    f"({sum(req.size for req in group)} items) into one diffusion batch"
+                )
+                outputs = leader.handler.service_generate(**merge_service_kwargs(group))
+                for req, part in zip(group, split_service_outputs(outputs, [req.size for req in group])):
+                    req.result = part
+        except BaseException as exc:
+            for req in group:
+                req.error = exc
+        finally:
+            for req in group:
+                req.done = True
+            self.calls += 1
+            self.batched_requests += len(group)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        """Return diffusion call and request counters."""
+        with self._cond:
+            return {"calls": self.calls, "requests": self.batched_requests, "pending": len(self._pending)}
@@ -0,0 +1,150 @@
+"""Unit tests for cross-request DiT micro-batching."""
+
+import threading
+import time
+import unittest
+
+import torch
+
+from acestep.core.generation.handler.dit_batcher import DiTMicroBatcher
+
+
+class _FakeHandler:
+    """Handler stand-in whose ``service_generate`` echoes its per-item inputs."""
+
+    def __init__(self):
+        self.calls = []
+
+    def service_generate(self, **kwargs):
+        self.calls.append(kwargs)
+        return {
+            "target_latents": kwargs["target_wavs"][:, :1] + 0,
+            "captions": list(kwargs["captions"]),
+            "seeds": list(kwargs["seed"] or []),
+            "time_costs": {"total_time_cost": 1.0},
+        }
+
+
+def _kwargs(captions, steps=8, length=4, seed=None):
+    return {
+        "captions": list(captions),
+        "lyrics": ["la"] * len(captions),
+        "metas": None,
+        "vocal_languages": ["en"] * len(captions),
+        "refer_audios": [[] for _ in captions],
+        "target_wavs": torch.arange(len(captions), dtype=torch.float32)[:, None, None].expand(-1, 2, length),
+        "infer_steps": steps,
+        "guidance_scale": 7.0,
+        "seed": seed,
+        "repainting_start": None,
+        "repainting_end": None,
+        "instructions": ["t2m"] * len(captions),
+        "audio_cover_strength": 1.0,
+        "cover_noise_strength": 0.0,
+        "use_adg": False,
+        "cfg_interval_start": 0.0,
+        "cfg_interval_end": 1.0,
+        "shift": 1.0,
+        "infer_method": "ode",
+        "audio_code_hints": None,
+        "return_intermediate": True,
+        "timesteps": None,
+    }
+
+
+def _run_concurrently(batcher, handler, jobs):
+    """Run ``jobs`` from threads that all enter the section while it is held."""
+    results = [None] * len(jobs)
+
+    def _worker(index):
+        with batcher.section():
+            results[index] = batcher.run(handler, len(jobs[index]["captions"]), **jobs[index])
+
+    threads = [threading.Thread(target=_worker, args=(i,)) for i in range(len(jobs))]
+    with batcher.section():
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while batcher._entering < len(jobs) and time.monotonic() < deadline:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+class DiTMicroBatcherTests(unittest.TestCase):
+    """Tests for DiTMicroBatcher grouping and output splitting."""
+
+    def test_direct_call_outside_section(self):
+        """Calls made outside a section go straight to the handler."""
+        handler = _FakeHandler()
+        out = DiTMicroBatcher().run(handler, 1, **_kwargs(["a"], seed=[3]))
+        self.assertEqual(out["seeds"], [3])
+        self.assertEqual(len(handler.calls), 1)
+
+    def test_compatible_requests_share_one_call(self):
+        """Concurrent compatible requests run as one batch and get their own slices back."""
+        handler = _FakeHandler()
+        batcher = DiTMicroBatcher()
+        results = _run_concurrently(batcher, handler, [_kwargs(["a"], seed=[1]), _kwargs(["b", "c"], seed=[2, 3])])
+        self.assertEqual(len(handler.calls), 1)
+        self.assertEqual(results[0]["captions"], ["a"])
+        self.assertEqual(results[1]["captions"], ["b", "c"])
+        self.assertEqual(results[1]["seeds"], [2, 3])
+        self.assertEqual(results[0]["target_latents"].shape[0], 1)
+        self.assertEqual(results[1]["target_latents"].shape[0], 2)
+        self.assertEqual(results[1]["time_costs"], {"total_time_cost": 1.0})
+        self.assertEqual(batcher.stats(), {"calls": 1, "requests": 2, "pending": 0})
+
+    def test_missing_seeds_become_explicit_per_item(self):
+        """Requests without seeds get one seed per item in the merged call."""
+        handler = _FakeHandler()
+        batcher = DiTMicroBatcher()
+        _run_concurrently(batcher, handler, [_kwargs(["a"]), _kwargs(["b", "c"], seed=[5, 6])])
+        seeds = handler.calls[0]["seed"]
+        self.assertEqual(len(seeds), 3)
+        self.assertTrue(all(isinstance(seed, int) for seed in seeds))
+        self.assertIn([5, 6], (seeds[:2], seeds[1:]))
+
+    def test_incompatible_requests_run_separately(self):
+        """Different step counts or target lengths are never merged."""
+        handler = _FakeHandler()
+        batcher = DiTMicroBatcher()
+        results = _run_concurrently(
+            batcher, handler, [_kwargs(["a"]), _kwargs(["b"], steps=50), _kwargs(["c"], length=8)]
+        )
+        self.assertEqual(len(handler.calls), 3)
+        self.assertEqual([r["captions"] for r in results], [["a"], ["b"], ["c"]])
+
+    def test_batch_limit_is_respected(self):
+        """Groups never exceed what ``fits`` allows."""
+        handler = _FakeHandler()
+        batcher = DiTMicroBatcher(fits=lambda n: n <= 2)
+        results = _run_concurrently(batcher, handler, [_kwargs([c]) for c in "abc"])
+        self.assertEqual(sorted(len(call["captions"]) for call in handler.calls), [1, 2])
+        self.assertEqual([r["captions"] for r in results], [["a"], ["b"], ["c"]])
+
+    def test_errors_reach_every_request_in_the_group(self):
+        """A failing merged call raises in every coalesced request."""
+        handler = _FakeHandler()
+        handler.service_generate = lambda **_: (_ for _ in ()).throw(RuntimeError("oom"))
+        batcher = DiTMicroBatcher()
+        errors = []
+
+        def _worker():
+            with batcher.section():
+                try:
+                    batcher.run(handler, 1, **_kwargs(["a"]))
+                except RuntimeError as exc:
+                    errors.append(str(exc))
+
+        threads = [threading.Thread(target=_worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(errors, ["oom", "oom"])
+
+
+if __name__ == "__main__":
+    unittest.main()
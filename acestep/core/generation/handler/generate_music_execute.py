@@ -1,5 +1,6 @@
 """Execution helper for ``generate_music`` service invocation with progress tracking."""
 
+from functools import partial
 from typing import Any, Dict, List, Optional, Sequence
 
 
@@ -25,7 +26,11 @@ class GenerateMusicExecuteMixin:
         shift: float,
         infer_method: str,
     ) -> Dict[str, Any]:
-        """Invoke ``service_generate`` while maintaining background progress estimation."""
+        """Invoke ``service_generate`` while maintaining background progress estimation.
+
+        With a ``dit_batcher`` attached, the call may share one diffusion batch
+        with concurrent requests (see ``DiTMicroBatcher``).
+        """
         infer_steps_for_progress = len(timesteps) if timesteps else inference_steps
         progress_desc = f"Generating music (batch size: {actual_batch_size})..."
         progress(0.52, desc=progress_desc)
@@ -41,7 +46,11 @@ class GenerateMusicExecuteMixin:
                 duration_sec=audio_duration if audio_duration and audio_duration > 0 else None,
                 desc=progress_desc,
             )
-            outputs = self.service_generate(
+            batcher = getattr(self, "dit_batcher", None)
+            service_generate = (
+                self.service_generate if batcher is None else partial(batcher.run, self, actual_batch_size)
+            )
+            outputs = service_generate(
                 captions=service_inputs["captions_batch"],
                 lyrics=service_inputs["lyrics_batch"],
                 metas=service_inputs["metas_batch"],
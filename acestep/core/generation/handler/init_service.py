@@ -8,6 +8,7 @@ from .init_service_memory_transfer import InitServiceMemoryTransferMixin
 from .init_service_offload_context import InitServiceOffloadContextMixin
 from .init_service_orchestrator import InitServiceOrchestratorMixin
 from .init_service_setup import InitServiceSetupMixin
+from .init_service_variant import InitServiceVariantMixin
 
 
 class InitServiceMixin(
@@ -16,6 +17,7 @@ class InitServiceMixin(
     InitServiceDownloadsMixin,
     InitServiceLoaderMixin,
     InitServiceOrchestratorMixin,
+    InitServiceVariantMixin,
     InitServiceMemoryBasicMixin,
     InitServiceMemoryTransferMixin,
     InitServiceOffloadContextMixin,
@@ -1,13 +1,34 @@
 """Context manager for temporary model loading/offloading."""
 
+import threading
 import time
 from contextlib import contextmanager
 
 from loguru import logger
 
+# Guards the lazy creation of each handler's offload use counts
+_OFFLOAD_STATE_LOCK = threading.Lock()
+
+# Offloadable models a DiT variant shares by reference with its ``offload_owner``
+SHARED_OFFLOAD_MODELS = ("vae", "text_encoder")
+
 
 class InitServiceOffloadContextMixin:
-    """Context-managed model load/offload behavior for CPU offload mode."""
+    """Context-managed model load/offload behavior for CPU offload mode.
+
+    Temporarily loaded models are reference counted per handler, so
+    overlapping contexts (pipelined jobs, DiT variants sharing the VAE and
+    text encoder through ``offload_owner``) load a model once and offload
+    it only when the last user leaves.
+    """
+
+    def _offload_users(self):
+        """Return this handler's ``(lock, {model_name: active contexts})``."""
+        with _OFFLOAD_STATE_LOCK:
+            state = self.__dict__.get("_offload_state")
+            if state is None:
+                state = self._offload_state = (threading.Lock(), {})
+        return state
 
     @contextmanager
     def _load_model_context(self, model_name: str):
@@ -16,6 +37,13 @@ class InitServiceOffloadContextMixin:
             yield
             return
 
+        owner = getattr(self, "offload_owner", None)
+        if owner is not None and owner is not self and model_name in SHARED_OFFLOAD_MODELS:
+            # Shared component: the handler that owns it decides its placement
+            with owner._load_model_context(model_name):
+                yield
+            return
+
         if model_name == "model" and not self.offload_dit_to_cpu:
             model = getattr(self, model_name, None)
             if model is not None:
@@ -36,6 +64,22 @@ class InitServiceOffloadContextMixin:
             yield
             return
 
+        lock, users = self._offload_users()
+        with lock:
+            if not users.get(model_name):
+                self._load_for_context(model_name, model)
+            users[model_name] = users.get(model_name, 0) + 1
+
+        try:
+            yield
+        finally:
+            with lock:
+                users[model_name] -= 1
+                if not users[model_name]:
+                    self._offload_after_context(model_name, model)
+
+    def _load_for_context(self, model_name: str, model) -> None:
+        """Move ``model`` to the compute device for the first active context."""
         logger.info(f"[_load_model_context] Loading {model_name} to {self.device}")
         start_time = time.time()
         if model_name == "vae":
@@ -51,17 +95,16 @@ class InitServiceOffloadContextMixin:
         self.current_offload_cost += load_time
         logger.info(f"[_load_model_context] Loaded {model_name} to {self.device} in {load_time:.4f}s")
 
-        try:
-            yield
-        finally:
-            logger.info(f"[_load_model_context] Offloading {model_name} to CPU")
-            start_time = time.time()
-            if model_name == "vae":
-                self._recursive_to_device(model, "cpu", self._get_vae_dtype("cpu"))
-            else:
-                self._recursive_to_device(model, "cpu")
-
-            self._empty_cache()
-            offload_time = time.time() - start_time
-            self.current_offload_cost += offload_time
-            logger.info(f"[_load_model_context] Offloaded {model_name} to CPU in {offload_time:.4f}s")
+    def _offload_after_context(self, model_name: str, model) -> None:
+        """Move ``model`` back to CPU once its last active context exits."""
+        logger.info(f"[_load_model_context] Offloading {model_name} to CPU")
+        start_time = time.time()
+        if model_name == "vae":
+            self._recursive_to_device(model, "cpu", self._get_vae_dtype("cpu"))
+        else:
+            self._recursive_to_device(model, "cpu")
+
+        self._empty_cache()
+        offload_time = time.time() - start_time
+        self.current_offload_cost += offload_time
+        logger.info(f"[_load_model_context] Offloaded {model_name} to CPU in {offload_time:.4f}s")
@@ -41,6 +41,7 @@ class InitServiceOrchestratorMixin:
             self.device = resolved_device
             self.offload_to_cpu = offload_to_cpu
             self.offload_dit_to_cpu = offload_dit_to_cpu
+            self.offload_owner = None
 
             normalized_compile, normalized_quantization, mlx_compile_requested = self._configure_initialize_runtime(
                 device=resolved_device,
@@ -439,6 +439,49 @@ class InitServiceMixinTests(unittest.TestCase):
         self.assertIn("Traceback:", status)
         self.assertIn("RuntimeError: load failed", status)
 
+    def test_initialize_variant_loads_only_dit_and_shares_components(self):
+        """It loads the variant DiT and reuses the base VAE, text encoder and silence latent."""
+        base = _Host(project_root="K:/fake_root", device="cpu")
+        base.vae = object()
+        base.text_encoder = object()
+        base.text_tokenizer = object()
+        base.silence_latent = torch.zeros(1, 4, 8)
+        base.last_init_params = {"project_root": "K:/fake_root", "config_path": "acestep-v15-turbo", "use_mlx_dit": True}
+        host = _Host(project_root="K:/fake_root", device="cpu")
+        captured = {}
+
+        def _fake_load_main_model(**kwargs):
+            """Record the variant path and set a silence latent equal to the base one."""
+            captured.update(kwargs)
+            host.model = object()
+            host.silence_latent = torch.zeros(1, 4, 8)
+
+        with patch.object(host, "_ensure_models_present", return_value=None):
+            with patch.object(host, "_sync_model_code_if_needed"):
+                with patch.object(host, "_load_main_model_from_checkpoint", side_effect=_fake_load_main_model):
+                    with patch.object(host, "_load_vae_model") as load_vae:
+                        status, ok = host.initialize_variant(base, "acestep-v15-sft")
+        self.assertTrue(ok, status)
+        load_vae.assert_not_called()
+        self.assertEqual(
+            os.path.normpath(captured["model_checkpoint_path"]),
+            os.path.normpath("K:/fake_root/checkpoints/acestep-v15-sft"),
+        )
+        self.assertIs(host.vae, base.vae)
+        self.assertIs(host.text_encoder, base.text_encoder)
+        self.assertIs(host.silence_latent, base.silence_latent)
+        self.assertIs(host.offload_owner, base)
+        self.assertEqual(host.last_init_params["config_path"], "acestep-v15-sft")
+        self.assertFalse(host.last_init_params["use_mlx_dit"])
+
+    def test_initialize_variant_requires_initialized_base(self):
+        """It refuses to load a variant before the base handler is initialized."""
+        base = _Host(project_root="K:/fake_root", device="cpu")
+        host = _Host(project_root="K:/fake_root", device="cpu")
+        status, ok = host.initialize_variant(base, "acestep-v15-sft")
+        self.assertFalse(ok)
+        self.assertIn("not initialized", status)
+
     def test_validate_quantization_setup_raises_import_error_when_torchao_missing(self):
         """It raises ImportError with guidance when torchao is unavailable."""
         host = _Host(project_root="K:/fake_root", device="cpu")
@@ -480,6 +523,27 @@ class InitServiceMixinTests(unittest.TestCase):
         self.assertEqual(move_mock.call_count, 2)
         empty_cache.assert_called_once()
 
+    def test_load_model_context_shared_vae_is_offloaded_by_last_user(self):
+        """A variant sharing the base VAE never offloads it while the base still uses it."""
+        base = _Host(project_root="K:/fake_root", device="cpu")
+        base.offload_to_cpu = True
+        base.vae = torch.nn.Linear(1, 1)
+        variant = _Host(project_root="K:/fake_root", device="cpu")
+        variant.offload_to_cpu = True
+        variant.vae = base.vae
+        variant.offload_owner = base
+        with patch.object(base, "_recursive_to_device") as move_mock:
+            with patch.object(base, "_empty_cache"):
+                with patch.object(variant, "_recursive_to_device") as variant_move:
+                    with base._load_model_context("vae"):
+                        with variant._load_model_context("vae"):
+                            pass
+                        self.assertEqual(move_mock.call_count, 1)
+                    with variant._load_model_context("vae"):
+                        pass
+        self.assertEqual(move_mock.call_count, 4)
+        variant_move.assert_not_called()
+
     def test_recursive_to_device_uses_quantized_move_fallback(self):
         """It routes parameters through quantized move fallback after to() failure."""
         host = _Host(project_root="K:/fake_root", device="cpu")
@@ -0,0 +1,95 @@
+"""Load an additional DiT variant that shares components with a loaded handler."""
+
+import os
+import traceback
+from pathlib import Path
+from typing import Tuple
+
+import torch
+from loguru import logger
+
+# Components that are identical across turbo/sft/base variants of one checkpoint tree.
+SHARED_VARIANT_COMPONENTS = (
+    "vae",
+    "text_encoder",
+    "text_tokenizer",
+    "mlx_vae",
+    "use_mlx_vae",
+    "latent_cache",
+    "text_embedding_cache",
+    "dit_batcher",
+)
+
+
+class InitServiceVariantMixin:
+    """``initialize_variant`` entrypoint for DiT-only initialization."""
+
+    def initialize_variant(self, base, config_path: str) -> Tuple[str, bool]:
+        """Load only the DiT for ``config_path`` and share everything else with ``base``.
+
+        ``base`` must be an initialized handler. VAE, text encoder/tokenizer,
+        MLX VAE, the latent/text-embedding caches and the diffusion batcher are
+        shared by reference; the silence latent is shared when the variant
+        ships an identical one. Device, dtype, offload, compile and quantization settings follow
+        ``base``. With CPU offload, ``base`` stays the ``offload_owner`` of the
+        shared VAE and text encoder, so overlapping jobs on different variants
+        never offload a component another job is still using. The MLX DiT is
+        not initialized for variants.
+        """
+        base_params = getattr(base, "last_init_params", None)
+        if not base_params:
+            return "Error initializing variant: base handler is not initialized", False
+        try:
+            self.device = base.device
+            self.dtype = base.dtype
+            self.offload_to_cpu = base.offload_to_cpu
+            self.offload_dit_to_cpu = base.offload_dit_to_cpu
+            self.offload_owner = getattr(base, "offload_owner", None) or base
+            self.compiled = base.compiled
+            self.quantization = base.quantization
+            for name in SHARED_VARIANT_COMPONENTS:
+                setattr(self, name, getattr(base, name, None))
+
+            base_root = base_params.get("project_root") or self._get_project_root()
+            checkpoint_dir = os.path.join(base_root, "checkpoints")
+            checkpoint_path = Path(checkpoint_dir)
+            precheck_failure = self._ensure_models_present(
+                checkpoint_path=checkpoint_path,
+                config_path=config_path,
+                prefer_source=base_params.get("prefer_source"),
+            )
+            if precheck_failure is not None:
+                self.model = None
+                self.config = None
+                self.silence_latent = None
+                return precheck_failure
+
+            self._sync_model_code_if_needed(config_path, checkpoint_path)
+
+            model_path = os.path.join(checkpoint_dir, config_path)
+            self._load_main_model_from_checkpoint(
+                model_checkpoint_path=model_path,
+                device=self.device,
+                use_flash_attention=base_params.get("use_flash_attention", False),
+                compile_model=self.compiled,
+                quantization=self.quantization,
+            )
+            base_silence = getattr(base, "silence_latent", None)
+            if (
+                base_silence is not None
+                and self.silence_latent is not None
+                and self.silence_latent.shape == base_silence.shape
+                and torch.equal(self.silence_latent, base_silence)
+            ):
+                self.silence_latent = base_silence
+
+            self.last_init_params = dict(base_params, config_path=config_path, use_mlx_dit=False)
+            logger.info(f"[initialize_variant] DiT variant loaded from {model_path} (shared VAE/text encoder)")
+            return f"✅ DiT variant initialized: {model_path} (sharing VAE and text encoder)", True
+        except Exception as exc:
+            self.model = None
+            self.config = None
+            self.silence_latent = None
+            error_msg = f"Error initializing model variant: {str(exc)}\n\nTraceback:\n{traceback.format_exc()}"
+            logger.exception(error_msg)
+            return error_msg, False
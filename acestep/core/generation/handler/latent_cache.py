@@ -0,0 +1,179 @@
+"""Content-addressed caches for VAE latents, audio codes and text embeddings.
+
+Reference and cover/repaint source tracks are often reused across many jobs,
+as are captions and lyrics. Entries are keyed by a hash of the input content
+plus the model state that produced them, so repeated inputs skip VAE encoding,
+tokenization or the text encoder. The in-memory tier is an LRU bounded by
+bytes; an optional on-disk tier stores entries as safetensors files and
+survives restarts.
+
+Environment:
+- ``ACESTEP_LATENT_CACHE_MB``: latent/code budget in MiB (default 0, disabled). When enabled every
+  VAE encode copies its input audio to the CPU to hash it, so only turn it on when the same
+  reference/source tracks are reused across jobs.
+- ``ACESTEP_LATENT_CACHE_DIR``: directory for the on-disk latent tier (unset disables it).
+- ``ACESTEP_TEXT_EMBED_CACHE_MB``: text/lyric embedding budget in MiB (default 256, ``0`` disables it).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import torch
+from loguru import logger
+
+_TENSOR_NAME = "value"
+
+
+def tensor_content_hash(tensor: torch.Tensor) -> str:
+    """Return a SHA-256 hex digest of a tensor's dtype, shape and values."""
+    data = tensor.detach().to("cpu").contiguous()
+    hash_obj = hashlib.sha256(f"{data.dtype}|{tuple(data.shape)}|".encode("utf-8"))
+    hash_obj.update(data.reshape(-1).view(torch.uint8).numpy().tobytes() if data.numel() else b"")
+    return hash_obj.hexdigest()
+
+
+def make_cache_key(kind: str, scope: str, content_hash: str, *extra: Any) -> str:
+    """Combine entry kind, model scope, content hash and options into one key."""
+    parts = [kind, scope, content_hash, *(str(item) for item in extra)]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def vae_cache_scope(host) -> str:
+    """Describe the VAE state that latents depend on."""
+    params = getattr(host, "last_init_params", None) or {}
+    vae = getattr(host, "vae", None)
+    return "|".join(
+        [
+            str(params.get("project_root")),
+            str(getattr(vae, "dtype", None)),
+            str(bool(getattr(host, "use_mlx_vae", False))),
+        ]
+    )
+
+
+def text_encoder_cache_scope(host) -> str:
+    """Describe the text encoder state that caption/lyric embeddings depend on."""
+    params = getattr(host, "last_init_params", None) or {}
+    return "|".join([str(params.get("project_root")), str(getattr(host, "dtype", None))])
+
+
+def codes_cache_scope(host) -> str:
+    """Describe the VAE and DiT tokenizer state that audio codes depend on."""
+    params = getattr(host, "last_init_params", None) or {}
+    return "|".join([vae_cache_scope(host), str(params.get("config_path")), str(params.get("quantization"))])
+
+
+class TensorCache:
+    """Thread-safe LRU of CPU tensors with an optional safetensors disk tier."""
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None):
+        self.max_bytes = max(0, int(max_bytes))
+        self.disk_dir = disk_dir or None
+        self._entries: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, size_var: str, default_mb: float, dir_var: Optional[str] = None) -> Optional["TensorCache"]:
+        """Build a cache from environment settings, or ``None`` when disabled."""
+        try:
+            max_mb = float(os.environ.get(size_var, default_mb))
+        except ValueError:
+            logger.warning(f"[TensorCache] Invalid {size_var}; using {default_mb} MiB")
+            max_mb = default_mb
+        if max_mb <= 0:
+            return None
+        return cls(int(max_mb * 1024 * 1024), os.environ.get(dir_var) if dir_var else None)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.safetensors")
+
+    def _insert(self, key: str, value: torch.Tensor) -> None:
+        """Insert under the lock and evict least recently used entries."""
+        size = value.numel() * value.element_size()
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.numel() * old.element_size()
+        self._entries[key] = value
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.numel() * evicted.element_size()
+
+    def get(self, key: str) -> Optional[torch.Tensor]:
+        """Return a copy of the cached tensor, or ``None`` on a miss."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value.clone()
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                try:
+                    from safetensors.torch import load_file
+
+                    value = load_file(path)[_TENSOR_NAME]
+                except Exception as exc:
+                    logger.warning(f"[TensorCache] Failed to read {path}: {exc}")
+                else:
+                    with self._lock:
+                        self._insert(key, value)
+                        self.disk_hits += 1
+                    return value.clone()
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: torch.Tensor) -> None:
+        """Store a CPU copy of ``value`` in memory and, if enabled, on disk."""
+        value = value.detach().to("cpu").contiguous().clone()
+        with self._lock:
+            self._insert(key, value)
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            from safetensors.torch import save_file
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            os.close(fd)
+            try:
+                save_file({_TENSOR_NAME: value}, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except Exception as exc:
+            logger.warning(f"[TensorCache] Failed to write {path}: {exc}")
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the disk tier is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return entry count, memory usage and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
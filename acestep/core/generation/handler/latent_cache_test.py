@@ -0,0 +1,152 @@
+"""Unit tests for the content-addressed audio latent cache."""
+
+from contextlib import contextmanager
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import torch
+
+from acestep.core.generation.handler.audio_codes import AudioCodesMixin
+from acestep.core.generation.handler.latent_cache import (
+    TensorCache,
+    make_cache_key,
+    tensor_content_hash,
+)
+from acestep.core.generation.handler.vae_encode import VaeEncodeMixin
+
+
+class _EncodeHost(VaeEncodeMixin):
+    """Host whose uncached encode counts calls and returns content-derived latents."""
+
+    def __init__(self, cache):
+        self.latent_cache = cache
+        self.device = "cpu"
+        self.encode_calls = 0
+
+    def _tiled_encode_uncached(self, audio, chunk_size, overlap, offload_latent_to_cpu):
+        self.encode_calls += 1
+        return audio[..., ::4].clone()
+
+
+class _Tokenized:
+    """Minimal DiT stand-in exposing ``tokenize``."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize(self, hidden_states, silence_latent, attention_mask):
+        del silence_latent, attention_mask
+        self.calls += 1
+        return None, torch.arange(hidden_states.shape[1]), None
+
+
+class _CodesHost(AudioCodesMixin):
+    """Host providing the AudioCodesMixin dependencies."""
+
+    def __init__(self, cache):
+        self.latent_cache = cache
+        self.model = _Tokenized()
+        self.vae = object()
+        self.device = "cpu"
+        self.silence_latent = None
+        self.loaded_files = 0
+
+    @contextmanager
+    def _load_model_context(self, _name):
+        yield
+
+    def process_src_audio(self, audio_file):
+        del audio_file
+        self.loaded_files += 1
+        return torch.ones(2, 3)
+
+    def is_silence(self, audio):
+        del audio
+        return False
+
+    def _encode_audio_to_latents(self, audio):
+        return torch.zeros(audio.shape[-1], 4)
+
+
+class TensorCacheTests(unittest.TestCase):
+    """Tests for TensorCache and its handler integration."""
+
+    def test_lru_evicts_by_bytes(self):
+        """Least recently used entries are evicted once the byte budget is exceeded."""
+        cache = TensorCache(max_bytes=3 * 16)
+        for name in ("a", "b", "c"):
+            cache.put(name, torch.zeros(4))
+        self.assertIsNotNone(cache.get("a"))
+        cache.put("d", torch.zeros(4))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 3)
+
+    def test_get_returns_independent_copy(self):
+        """Mutating a returned tensor does not corrupt the cached entry."""
+        cache = TensorCache(max_bytes=1024)
+        cache.put("k", torch.ones(2))
+        cache.get("k").zero_()
+        self.assertEqual(cache.get("k").tolist(), [1.0, 1.0])
+
+    def test_disk_tier_survives_new_instance(self):
+        """Entries written to the disk tier are loaded by a fresh cache."""
+        with tempfile.TemporaryDirectory() as disk_dir:
+            TensorCache(max_bytes=1024, disk_dir=disk_dir).put("abcd", torch.arange(5.0))
+            fresh = TensorCache(max_bytes=1024, disk_dir=disk_dir)
+            self.assertEqual(fresh.get("abcd").tolist(), [0.0, 1.0, 2.0, 3.0, 4.0])
+            self.assertEqual(fresh.stats()["disk_hits"], 1)
+
+    def test_handler_latent_cache_is_opt_in(self):
+        """The handler only builds a latent cache when ACESTEP_LATENT_CACHE_MB is set."""
+        from acestep.handler import AceStepHandler
+
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("ACESTEP_LATENT_CACHE_MB", None)
+            self.assertIsNone(AceStepHandler().latent_cache)
+            os.environ["ACESTEP_LATENT_CACHE_MB"] = "8"
+            self.assertEqual(AceStepHandler().latent_cache.max_bytes, 8 * 1024 * 1024)
+
+    def test_keys_depend_on_content_and_options(self):
+        """Equal content hashes equally; options and content changes alter the key."""
+        a, b = torch.ones(2, 8), torch.ones(2, 8)
+        self.assertEqual(tensor_content_hash(a), tensor_content_hash(b))
+        self.assertNotEqual(tensor_content_hash(a), tensor_content_hash(b * 2))
+        digest = tensor_content_hash(a)
+        self.assertNotEqual(make_cache_key("k", "s", digest, 10), make_cache_key("k", "s", digest, 20))
+
+    def test_tiled_encode_reuses_latents_for_equal_audio(self):
+        """Distinct tensors with the same samples are encoded once."""
+        host = _EncodeHost(TensorCache(max_bytes=1 << 20))
+        first = host.tiled_encode(torch.arange(32.0).reshape(2, 16))
+        second = host.tiled_encode(torch.arange(32.0).reshape(2, 16))
+        host.tiled_encode(torch.zeros(2, 16))
+        self.assertEqual(host.encode_calls, 2)
+        self.assertTrue(torch.equal(first, second))
+
+    def test_tiled_encode_without_cache_always_encodes(self):
+        """Hosts without a latent cache keep the uncached behaviour."""
+        host = _EncodeHost(None)
+        host.tiled_encode(torch.ones(2, 16))
+        host.tiled_encode(torch.ones(2, 16))
+        self.assertEqual(host.encode_calls, 2)
+
+    def test_convert_src_audio_to_codes_skips_work_for_known_file(self):
+        """A repeated source file returns cached codes without loading or tokenizing."""
+        host = _CodesHost(TensorCache(max_bytes=1 << 20))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "src.wav")
+            with open(path, "wb") as f:
+                f.write(b"fake audio bytes")
+            first = host.convert_src_audio_to_codes(path)
+            second = host.convert_src_audio_to_codes(path)
+        self.assertEqual(first, "<|audio_code_0|><|audio_code_1|><|audio_code_2|>")
+        self.assertEqual(second, first)
+        self.assertEqual(host.loaded_files, 1)
+        self.assertEqual(host.model.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
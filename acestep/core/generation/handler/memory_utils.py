@@ -82,6 +82,37 @@ class MemoryUtilsMixin:
             return min(128, max_chunk)
         return min(256, max_chunk)
 
+    # Conservative peak VRAM of one sample's VAE decode window, per 1k latent frames.
+    VAE_DECODE_GB_PER_1K_FRAMES = 6.0
+
+    def _get_vae_decode_batch_size(self, batch_size: int, chunk_size: int) -> int:
+        """Choose how many samples one VAE decode call may pack, from free VRAM."""
+        override = os.environ.get("ACESTEP_VAE_DECODE_BATCH")
+        if override:
+            try:
+                value = int(override)
+                if value > 0:
+                    return min(batch_size, value)
+            except ValueError:
+                pass
+        if batch_size <= 1:
+            return 1
+        if not (self.device == "cuda" or (isinstance(self.device, str) and self.device.startswith("cuda"))):
+            return 1
+        try:
+            free_gb = get_effective_free_vram_gb()
+        except Exception:
+            return 1
+        per_sample_gb = self.VAE_DECODE_GB_PER_1K_FRAMES * chunk_size / 1024.0
+        safety_margin_gb = 1.5
+        fit = int((free_gb - safety_margin_gb) / per_sample_gb) if per_sample_gb > 0 else 1
+        packed = max(1, min(batch_size, fit))
+        logger.debug(
+            f"[_get_vae_decode_batch_size] Effective free VRAM: {free_gb:.2f} GB, "
+            f"chunk_size={chunk_size} -> {packed} sample(s) per decode"
+        )
+        return packed
+
     def _should_offload_wav_to_cpu(self) -> bool:
         """Decide whether to offload decoded wavs to CPU for memory safety."""
         override = os.environ.get("ACESTEP_MPS_DECODE_OFFLOAD")
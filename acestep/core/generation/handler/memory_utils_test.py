@@ -0,0 +1,52 @@
+"""Unit tests for ``MemoryUtilsMixin`` sizing helpers."""
+
+import os
+import unittest
+from unittest import mock
+
+from acestep.core.generation.handler.memory_utils import MemoryUtilsMixin
+
+
+class _Host(MemoryUtilsMixin):
+    """Minimal host exposing the attributes the mixin reads."""
+
+    def __init__(self, device="cuda"):
+        """Store the target device."""
+        self.device = device
+
+
+class VaeDecodeBatchSizeTests(unittest.TestCase):
+    """Tests for ``_get_vae_decode_batch_size``."""
+
+    def setUp(self):
+        """Ignore any packing override from the calling environment."""
+        patcher = mock.patch.dict(os.environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.environ.pop("ACESTEP_VAE_DECODE_BATCH", None)
+
+    def test_packs_samples_that_fit_in_free_vram(self):
+        """Free VRAM minus the safety margin is divided by the per-sample window cost."""
+        with mock.patch(
+            "acestep.core.generation.handler.memory_utils.get_effective_free_vram_gb", return_value=13.5
+        ):
+            self.assertEqual(_Host()._get_vae_decode_batch_size(8, 512), 4)
+            self.assertEqual(_Host()._get_vae_decode_batch_size(2, 512), 2)
+
+    def test_tight_vram_and_non_cuda_stay_sequential(self):
+        """Small cards and non-CUDA devices decode one sample at a time."""
+        with mock.patch(
+            "acestep.core.generation.handler.memory_utils.get_effective_free_vram_gb", return_value=3.0
+        ):
+            self.assertEqual(_Host()._get_vae_decode_batch_size(8, 512), 1)
+        self.assertEqual(_Host(device="mps")._get_vae_decode_batch_size(8, 512), 1)
+
+    def test_env_override(self):
+        """ACESTEP_VAE_DECODE_BATCH forces the packing size, capped at the batch."""
+        with mock.patch.dict(os.environ, {"ACESTEP_VAE_DECODE_BATCH": "3"}):
+            self.assertEqual(_Host(device="cpu")._get_vae_decode_batch_size(8, 512), 3)
+            self.assertEqual(_Host(device="cpu")._get_vae_decode_batch_size(2, 512), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 """Chunk-level VAE decode helpers used by tiled decode orchestration."""
 
 import math
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
 
 import torch
 from loguru import logger
@@ -10,32 +12,45 @@ from tqdm import tqdm
 class VaeDecodeChunksMixin:
     """Implement chunked decode strategies for GPU and CPU-offload modes."""
 
+    @contextmanager
+    def streaming_decode(self, on_chunk: Optional[Callable[[int, int, torch.Tensor], None]]) -> Iterator[None]:
+        """Report decoded audio to ``on_chunk`` while decoding inside the context.
+
+        ``on_chunk(sample_index, start_sample, audio)`` receives trimmed chunk
+        cores as ``[channels, samples]`` float32 CPU tensors clamped to
+        ``[-1, 1]``, in order per sample. Ranges may overlap when a decode
+        falls back and restarts, so consumers keep only samples past what
+        they already have. ``None`` disables reporting. Paths that cannot
+        decode chunk by chunk (MLX, direct decode) report nothing; callers
+        send the finished audio themselves.
+        """
+        previous = getattr(self, "_decode_chunk_callback", None)
+        self._decode_chunk_callback = on_chunk
+        self._decode_chunk_sample = 0
+        try:
+            yield
+        finally:
+            self._decode_chunk_callback = previous
+            self._decode_chunk_sample = 0
+
+    def _emit_decoded_chunk(self, start_sample: int, audio: torch.Tensor) -> None:
+        """Forward a decoded ``[batch, channels, samples]`` chunk to the streaming callback."""
+        on_chunk = getattr(self, "_decode_chunk_callback", None)
+        if on_chunk is None:
+            return
+        first = getattr(self, "_decode_chunk_sample", 0)
+        chunk = audio.detach().float().clamp(-1.0, 1.0).cpu()
+        for offset in range(chunk.shape[0]):
+            on_chunk(first + offset, start_sample, chunk[offset])
+
     def _tiled_decode_inner(self, latents, chunk_size, overlap, offload_wav_to_cpu):
         """Run tiled decode with adaptive overlap and OOM fallbacks."""
         bsz, _channels, latent_frames = latents.shape
 
-        # Batch-sequential decode keeps peak VRAM stable across batch sizes.
         if bsz > 1:
-            logger.info(f"[tiled_decode] Batch size {bsz} > 1; decoding samples sequentially to save VRAM")
-            per_sample_results = []
-            for b_idx in range(bsz):
-                single = latents[b_idx : b_idx + 1]
-                decoded = self._tiled_decode_inner(single, chunk_size, overlap, offload_wav_to_cpu)
-                per_sample_results.append(decoded.cpu() if decoded.device.type != "cpu" else decoded)
-                self._empty_cache()
-            result = torch.cat(per_sample_results, dim=0)
-            if latents.device.type != "cpu" and not offload_wav_to_cpu:
-                result = result.to(latents.device)
-            return result
+            return self._tiled_decode_batch(latents, chunk_size, overlap, offload_wav_to_cpu)
 
-        effective_overlap = overlap
-        while chunk_size - 2 * effective_overlap <= 0 and effective_overlap > 0:
-            effective_overlap = effective_overlap // 2
-        if effective_overlap != overlap:
-            logger.warning(
-                f"[tiled_decode] Reduced overlap from {overlap} to {effective_overlap} for chunk_size={chunk_size}"
-            )
-        overlap = effective_overlap
+        overlap = self._effective_decode_overlap(chunk_size, overlap)
 
         if latent_frames <= chunk_size:
             try:
@@ -80,10 +95,76 @@ class VaeDecodeChunksMixin:
                 self._empty_cache()
                 return self._decode_on_cpu(latents)
 
+    def _effective_decode_overlap(self, chunk_size, overlap):
+        """Halve ``overlap`` until the window keeps a positive stride."""
+        effective_overlap = overlap
+        while chunk_size - 2 * effective_overlap <= 0 and effective_overlap > 0:
+            effective_overlap = effective_overlap // 2
+        if effective_overlap != overlap:
+            logger.warning(
+                f"[tiled_decode] Reduced overlap from {overlap} to {effective_overlap} for chunk_size={chunk_size}"
+            )
+        return effective_overlap
+
+    def _tiled_decode_batch(self, latents, chunk_size, overlap, offload_wav_to_cpu):
+        """Decode a batch in packed groups sized from free VRAM.
+
+        Groups that hit OOM are halved and retried; single samples use the
+        regular per-sample path with its OOM fallbacks, so small cards keep
+        the previous batch-sequential behavior.
+        """
+        bsz = latents.shape[0]
+        group_size = self._get_vae_decode_batch_size(bsz, chunk_size)
+        if group_size > 1:
+            logger.info(f"[tiled_decode] Batch size {bsz}; decoding up to {group_size} samples per VAE call")
+        else:
+            logger.info(f"[tiled_decode] Batch size {bsz} > 1; decoding samples sequentially to save VRAM")
+        results = []
+        start = 0
+        while start < bsz:
+            size = min(group_size, bsz - start)
+            group = latents[start : start + size]
+            self._decode_chunk_sample = start
+            if size > 1:
+                try:
+                    decoded = self._tiled_decode_packed(group, chunk_size, overlap, offload_wav_to_cpu)
+                except torch.cuda.OutOfMemoryError:
+                    group_size = max(1, size // 2)
+                    logger.warning(f"[tiled_decode] OOM decoding {size} samples together; retrying with {group_size}")
+                    self._empty_cache()
+                    continue
+            else:
+                decoded = self._tiled_decode_inner(group, chunk_size, overlap, offload_wav_to_cpu)
+            results.append(decoded.cpu() if decoded.device.type != "cpu" else decoded)
+            self._empty_cache()
+            start += size
+        self._decode_chunk_sample = 0
+        result = torch.cat(results, dim=0)
+        if latents.device.type != "cpu" and not offload_wav_to_cpu:
+            result = result.to(latents.device)
+        return result
+
+    def _tiled_decode_packed(self, latents, chunk_size, overlap, offload_wav_to_cpu):
+        """Decode several samples per ``vae.decode`` call without OOM fallbacks."""
+        bsz, _channels, latent_frames = latents.shape
+        if latent_frames <= chunk_size:
+            decoder_output = self.vae.decode(latents)
+            audio = decoder_output.sample
+            del decoder_output
+            self._emit_decoded_chunk(0, audio)
+            return audio
+        overlap = self._effective_decode_overlap(chunk_size, overlap)
+        stride = chunk_size - 2 * overlap
+        num_steps = math.ceil(latent_frames / stride)
+        if offload_wav_to_cpu:
+            return self._tiled_decode_offload_cpu(latents, bsz, latent_frames, stride, overlap, num_steps)
+        return self._tiled_decode_gpu(latents, stride, overlap, num_steps)
+
     def _tiled_decode_gpu(self, latents, stride, overlap, num_steps):
         """Decode chunks and keep decoded audio tensors on GPU."""
         decoded_audio_list = []
         upsample_factor = None
+        audio_write_pos = 0
 
         for i in tqdm(range(num_steps), desc="Decoding audio chunks", disable=self.disable_tqdm):
             core_start = i * stride
@@ -108,6 +189,8 @@ class VaeDecodeChunksMixin:
             end_idx = audio_len - trim_end if trim_end > 0 else audio_len
             audio_core = audio_chunk[:, :, trim_start:end_idx]
             decoded_audio_list.append(audio_core)
+            self._emit_decoded_chunk(audio_write_pos, audio_core)
+            audio_write_pos += audio_core.shape[-1]
 
         return torch.cat(decoded_audio_list, dim=-1)
 
@@ -134,6 +217,7 @@ class VaeDecodeChunksMixin:
         first_audio_core = first_audio_chunk[:, :, :first_end_idx]
         audio_write_pos = first_audio_core.shape[-1]
         final_audio[:, :, :audio_write_pos] = first_audio_core.cpu()
+        self._emit_decoded_chunk(0, first_audio_core)
 
         del first_audio_chunk, first_audio_core, first_latent_chunk
 
@@ -159,6 +243,7 @@ class VaeDecodeChunksMixin:
 
             core_len = audio_core.shape[-1]
             final_audio[:, :, audio_write_pos : audio_write_pos + core_len] = audio_core.cpu()
+            self._emit_decoded_chunk(audio_write_pos, audio_core)
             audio_write_pos += core_len
 
             del audio_chunk, audio_core, latent_chunk
@@ -4,7 +4,7 @@ import unittest
 
 import torch
 
-from acestep.core.generation.handler.vae_decode_test_helpers import _ChunksHost
+from acestep.core.generation.handler.vae_decode_test_helpers import _ChunksHost, _FakeVae
 
 
 class VaeDecodeChunksMixinTests(unittest.TestCase):
@@ -17,6 +17,45 @@ class VaeDecodeChunksMixinTests(unittest.TestCase):
         out = host._tiled_decode_inner(latents, chunk_size=10, overlap=2, offload_wav_to_cpu=False)
         self.assertEqual(tuple(out.shape), (2, 2, 12))
 
+    def test_packed_batch_decode_matches_sequential(self):
+        """Packing samples into one VAE call gives the same audio with fewer decode calls."""
+        latents = torch.rand(4, 2, 30)
+        outputs = {}
+        for packed in (1, 4):
+            host = _ChunksHost()
+            host.decode_batch_size = packed
+            calls = []
+
+            def _decode(chunk, calls=calls):
+                calls.append(chunk.shape[0])
+                return chunk.repeat_interleave(2, dim=-1)
+
+            host.vae = _FakeVae(_decode)
+            out = host._tiled_decode_inner(latents, chunk_size=12, overlap=2, offload_wav_to_cpu=False)
+            outputs[packed] = (out, calls)
+        self.assertTrue(torch.equal(outputs[1][0], outputs[4][0]))
+        self.assertEqual(set(outputs[4][1]), {4})
+        self.assertEqual(len(outputs[4][1]) * 4, len(outputs[1][1]))
+
+    def test_packed_batch_decode_halves_group_on_oom(self):
+        """An OOM while packing retries with smaller groups instead of the CPU fallback."""
+        host = _ChunksHost()
+        host.decode_batch_size = 4
+        sizes = []
+
+        def _decode(chunk):
+            sizes.append(chunk.shape[0])
+            if chunk.shape[0] > 2:
+                raise torch.cuda.OutOfMemoryError("oom")
+            return chunk.repeat_interleave(2, dim=-1)
+
+        host.vae = _FakeVae(_decode)
+        out = host._tiled_decode_inner(torch.rand(4, 2, 30), chunk_size=12, overlap=2, offload_wav_to_cpu=False)
+        self.assertEqual(tuple(out.shape), (4, 2, 60))
+        self.assertEqual(sizes[0], 4)
+        self.assertEqual(set(sizes[1:]), {2})
+        self.assertEqual(host.decode_on_cpu_calls, 0)
+
     def test_direct_decode_for_short_latents(self):
         """Short latents should take direct decode path without tiling loop."""
         host = _ChunksHost()
@@ -74,6 +113,23 @@ class VaeDecodeChunksMixinTests(unittest.TestCase):
         self.assertTrue(torch.equal(out, torch.full((1, 2, 7), 9.0)))
         self.assertEqual(host.decode_on_cpu_calls, 1)
 
+    def test_streaming_decode_reports_chunk_cores_in_order(self):
+        """Streamed chunk cores cover the decoded audio per sample, in order, for both tiled paths."""
+        for offload in (False, True):
+            host = _ChunksHost()
+            host.vae = _FakeVae(lambda latents: latents[:, :2].repeat_interleave(2, dim=-1))
+            latents = torch.arange(40, dtype=torch.float32).reshape(1, 1, 40).repeat(2, 2, 1) / 100.0
+            chunks = []
+            with host.streaming_decode(lambda idx, start, audio: chunks.append((idx, start, audio))):
+                out = host._tiled_decode_inner(latents, chunk_size=12, overlap=2, offload_wav_to_cpu=offload)
+            self.assertGreater(len(chunks), 2)
+            for sample in range(2):
+                parts = [(start, audio) for idx, start, audio in chunks if idx == sample]
+                self.assertEqual([start for start, _ in parts][0], 0)
+                streamed = torch.cat([audio for _, audio in parts], dim=-1)
+                self.assertTrue(torch.equal(streamed, out[sample].float()))
+            self.assertIsNone(getattr(host, "_decode_chunk_callback", None))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -94,12 +94,18 @@ class _ChunksHost(VaeDecodeChunksMixin):
         self.vae = _FakeVae()
         self.empty_cache_calls = 0
         self.decode_on_cpu_calls = 0
+        self.decode_batch_size = 1
         self.recorded = {}
 
     def _empty_cache(self):
         """Track cache-empty calls to validate OOM paths."""
         self.empty_cache_calls += 1
 
+    def _get_vae_decode_batch_size(self, batch_size, chunk_size):
+        """Return the configured packing size, capped at ``batch_size``."""
+        _ = chunk_size
+        return min(batch_size, self.decode_batch_size)
+
     def _decode_on_cpu(self, latents):
         """Return sentinel tensor for CPU-fallback assertions."""
         self.decode_on_cpu_calls += 1
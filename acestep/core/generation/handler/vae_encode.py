@@ -6,6 +6,11 @@ from typing import Optional
 import torch
 from loguru import logger
 
+from acestep.core.generation.handler.latent_cache import (
+    make_cache_key,
+    tensor_content_hash,
+    vae_cache_scope,
+)
 from acestep.gpu_config import get_gpu_memory_gb
 
 
@@ -15,6 +20,9 @@ class VaeEncodeMixin:
     def tiled_encode(self, audio, chunk_size=None, overlap=None, offload_latent_to_cpu=True):
         """Encode audio to latents using overlap-discard tiling.
 
+        When the host has a ``latent_cache``, results are reused for audio with
+        identical content, so repeated reference/source tracks skip the VAE.
+
         Args:
             audio: Tensor shaped ``[batch, channels, samples]`` or ``[channels, samples]``.
             chunk_size: Audio chunk size in samples; auto-selected when ``None``.
@@ -24,6 +32,23 @@ class VaeEncodeMixin:
         Returns:
             Latent tensor shaped ``[batch, latent_channels, latent_frames]``.
         """
+        cache = getattr(self, "latent_cache", None)
+        if cache is None:
+            return self._tiled_encode_uncached(audio, chunk_size, overlap, offload_latent_to_cpu)
+
+        key = make_cache_key("vae_latent", vae_cache_scope(self), tensor_content_hash(audio), chunk_size, overlap)
+        latents = cache.get(key)
+        if latents is None:
+            latents = self._tiled_encode_uncached(audio, chunk_size, overlap, offload_latent_to_cpu)
+            cache.put(key, latents)
+            return latents
+        logger.info(f"[tiled_encode] Reusing cached latents for audio shaped {tuple(audio.shape)}")
+        if not offload_latent_to_cpu:
+            latents = latents.to(self.device)
+        return latents
+
+    def _tiled_encode_uncached(self, audio, chunk_size, overlap, offload_latent_to_cpu):
+        """Run the MLX or PyTorch tiled VAE encode (see ``tiled_encode``)."""
         # ---- MLX fast path (macOS Apple Silicon) ----
         if self.use_mlx_vae and self.mlx_vae is not None:
             input_was_2d = audio.dim() == 2
@@ -18,7 +18,7 @@ import uuid
 import hashlib
 import json
 import threading
-from typing import Optional, Dict, Any, Tuple, List, Union
+from typing import Optional, Dict, Any, Tuple, List, Union, Callable
 
 import torch
 import torchaudio
@@ -59,6 +59,7 @@ from acestep.core.generation.handler import (
     ServiceGenerateExecuteMixin,
     ServiceGenerateOutputsMixin,
 )
+from acestep.core.generation.handler.latent_cache import TensorCache
 from acestep.gpu_config import get_effective_free_vram_gb
 
 
@@ -106,10 +107,17 @@ class AceStepHandler(
 
         # VAE for audio encoding/decoding
         self.vae = None
+        # Content-addressed latent/audio-code cache for reused reference/source audio (opt-in:
+        # every VAE encode then hashes a CPU copy of its input)
+        self.latent_cache = TensorCache.from_env("ACESTEP_LATENT_CACHE_MB", 0, "ACESTEP_LATENT_CACHE_DIR")
         
         # Text encoder and tokenizer
         self.text_encoder = None
         self.text_tokenizer = None
+        # Caption/lyric embedding cache keyed on token ids
+        self.text_embedding_cache = TensorCache.from_env("ACESTEP_TEXT_EMBED_CACHE_MB", 256)
+        # Optional cross-request diffusion batcher (set by the API server)
+        self.dit_batcher = None
         
         # Silence latent for initialization
         self.silence_latent = None
@@ -127,6 +135,8 @@ class AceStepHandler(
         self.custom_layers_config = {2: [6], 3: [10, 11], 4: [3], 5: [8, 9], 6: [8]}
         self.offload_to_cpu = False
         self.offload_dit_to_cpu = False
+        # Handler that owns CPU offload of the shared VAE/text encoder (DiT variants only)
+        self.offload_owner = None
         self.compiled = False
         self.current_offload_cost = 0.0
         self.disable_tqdm = os.environ.get("ACESTEP_DISABLE_TQDM", "").lower() in ("1", "true", "yes") or not getattr(sys.stderr, 'isatty', lambda: False)()
@@ -710,10 +720,16 @@ class AceStepHandler(
         timesteps: Optional[List[float]] = None,
         latent_shift: float = 0.0,
         latent_rescale: float = 1.0,
-        progress=None
+        progress=None,
+        audio_chunk_callback: Optional[Callable[..., None]] = None,
     ) -> Dict[str, Any]:
         """
         Main interface for music generation
+
+        ``audio_chunk_callback(sample_index, start_sample, audio, final=False)``
+        receives decoded audio while the VAE is still decoding (see
+        ``streaming_decode``), then each sample's finished audio once with
+        ``final=True``.
         
         Returns:
             Dictionary containing:
@@ -852,7 +868,7 @@ class AceStepHandler(
             
             # Decode latents to audio
             start_time = time.time()
-            with torch.inference_mode():
+            with torch.inference_mode(), self.streaming_decode(audio_chunk_callback):
                 with self._load_model_context("vae"):
                     # Move pred_latents to CPU early to save VRAM (will be used in extra_outputs later)
                     pred_latents_cpu = pred_latents.detach().cpu()
@@ -955,6 +971,8 @@ class AceStepHandler(
                 # Extract audio tensor: [channels, samples] format, CPU, float32
                 audio_tensor = pred_wavs[i].cpu()
                 audio_tensors.append(audio_tensor)
+                if audio_chunk_callback is not None:
+                    audio_chunk_callback(i, 0, audio_tensor, final=True)
             
             status_message = "Generation completed successfully!"
             logger.info(f"[generate_music] Done! Generated {len(audio_tensors)} audio tensors.")
@@ -9,7 +9,8 @@ backward-compatible Gradio UI support.
 import math
 import os
 import tempfile
-from typing import Optional, Union, List, Dict, Any, Tuple
+from contextlib import nullcontext
+from typing import Optional, Union, List, Dict, Any, Tuple, Generator
 from dataclasses import dataclass, field, asdict
 from loguru import logger
 import torch
@@ -314,6 +315,7 @@ def generate_music(
     config: GenerationConfig,
     save_dir: Optional[str] = None,
     progress=None,
+    audio_chunk_callback=None,
 ) -> GenerationResult:
     """Generate music using ACE-Step model with optional LM reasoning.
     
@@ -322,10 +324,45 @@ def generate_music(
         llm_handler: Initialized LLM handler (LLMHandler instance)
         params: Generation parameters (GenerationParams instance)
         config: Generation configuration (GenerationConfig instance)
+        audio_chunk_callback: Optional receiver of audio while it is decoded
+            (see AceStepHandler.generate_music)
         
     Returns:
         GenerationResult with generated audio files and metadata
     """
+    stages = iter_generate_music(
+        dit_handler,
+        llm_handler,
+        params,
+        config,
+        save_dir=save_dir,
+        progress=progress,
+        audio_chunk_callback=audio_chunk_callback,
+    )
+    try:
+        while True:
+            next(stages)
+    except StopIteration as stop:
+        return stop.value
+
+
+def iter_generate_music(
+    dit_handler,
+    llm_handler,
+    params: GenerationParams,
+    config: GenerationConfig,
+    save_dir: Optional[str] = None,
+    progress=None,
+    audio_chunk_callback=None,
+) -> Generator[str, None, GenerationResult]:
+    """Staged form of :func:`generate_music`.
+
+    Runs LM planning, then yields ``"dit"`` before DiT diffusion and VAE
+    decode and ``"save"`` before audio normalization and file encoding, so a
+    caller can move each stage onto its own worker. The generator's return
+    value is the ``GenerationResult``. ``audio_chunk_callback`` is passed to
+    ``AceStepHandler.generate_music`` to receive audio while it is decoded.
+    """
     try:
         # Phase 1: LM-based metadata and code generation (if enabled)
         audio_code_string_to_use = params.audio_codes
@@ -577,41 +614,46 @@ def generate_music(
             logger.info(f"[generate_music] Final inputs: dit_input_caption='{dit_input_caption}', dit_input_lyrics='{dit_input_lyrics}'")
 
         # Phase 2: DiT music generation
+        yield "dit"
         # Use seed_for_generation (from config.seed or params.seed) instead of params.seed for actual generation
-        result = dit_handler.generate_music(
-            captions=dit_input_caption,
-            lyrics=dit_input_lyrics,
-            bpm=bpm,
-            key_scale=key_scale,
-            time_signature=time_signature,
-            vocal_language=dit_input_vocal_language,
-            inference_steps=params.inference_steps,
-            guidance_scale=params.guidance_scale,
-            use_random_seed=config.use_random_seed,
-            seed=seed_for_generation,  # Use config.seed (or params.seed fallback) instead of params.seed directly
-            reference_audio=params.reference_audio,
-            audio_duration=audio_duration,
-            batch_size=config.batch_size if config.batch_size is not None else 1,
-            # text2music (Custom mode) never uses src_audio; force None to
-            # prevent stale UI values from leaking into generation.
-            src_audio=None if params.task_type == "text2music" else params.src_audio,
-            audio_code_string=audio_code_string_to_use,
-            repainting_start=params.repainting_start,
-            repainting_end=params.repainting_end,
-            instruction=params.instruction,
-            audio_cover_strength=params.audio_cover_strength,
-            cover_noise_strength=params.cover_noise_strength,
-            task_type=params.task_type,
-            use_adg=params.use_adg,
-            cfg_interval_start=params.cfg_interval_start,
-            cfg_interval_end=params.cfg_interval_end,
-            shift=params.shift,
-            infer_method=params.infer_method,
-            timesteps=params.timesteps,
-            latent_shift=params.latent_shift,
-            latent_rescale=params.latent_rescale,
-            progress=progress,
-        )
+        # Concurrent jobs sharing this handler may coalesce their diffusion batches here
+        batcher = getattr(dit_handler, "dit_batcher", None)
+        with batcher.section() if batcher is not None else nullcontext():
+            result = dit_handler.generate_music(
+                captions=dit_input_caption,
+                lyrics=dit_input_lyrics,
+                bpm=bpm,
+                key_scale=key_scale,
+                time_signature=time_signature,
+                vocal_language=dit_input_vocal_language,
+                inference_steps=params.inference_steps,
+                guidance_scale=params.guidance_scale,
+                use_random_seed=config.use_random_seed,
+                seed=seed_for_generation,  # Use config.seed (or params.seed fallback) instead of params.seed directly
+                reference_audio=params.reference_audio,
+                audio_duration=audio_duration,
+                batch_size=config.batch_size if config.batch_size is not None else 1,
+                # text2music (Custom mode) never uses src_audio; force None to
+                # prevent stale UI values from leaking into generation.
+                src_audio=None if params.task_type == "text2music" else params.src_audio,
+                audio_code_string=audio_code_string_to_use,
+                repainting_start=params.repainting_start,
+                repainting_end=params.repainting_end,
+                instruction=params.instruction,
+                audio_cover_strength=params.audio_cover_strength,
+                cover_noise_strength=params.cover_noise_strength,
+                task_type=params.task_type,
+                use_adg=params.use_adg,
+                cfg_interval_start=params.cfg_interval_start,
+                cfg_interval_end=params.cfg_interval_end,
+                shift=params.shift,
+                infer_method=params.infer_method,
+                timesteps=params.timesteps,
+                latent_shift=params.latent_shift,
+                latent_rescale=params.latent_rescale,
+                progress=progress,
+                audio_chunk_callback=audio_chunk_callback,
+            )
 
         # Check if generation failed
         if not result.get("success", False):
@@ -632,6 +674,9 @@ def generate_music(
         # actual_seed_list was computed earlier using dit_handler.prepare_seeds
         seed_list = actual_seed_list
 
+        # Phase 3: normalization and audio file encoding
+        yield "save"
+
         # Get base params dictionary
         base_params_dict = params.to_dict()
 
@@ -61,6 +61,8 @@ class LLMHandler:
         self.device = "cpu"
         self.dtype = torch.float32
         self.offload_to_cpu = False
+        # Arguments of the last successful initialize(), used to reload the same model
+        self.last_init_params: Optional[Dict[str, Any]] = None
         self.disable_tqdm = os.environ.get("ACESTEP_DISABLE_TQDM", "").lower() in ("1", "true", "yes") or not (hasattr(sys.stderr, 'isatty') and sys.stderr.isatty())
 
         # HuggingFace Space persistent storage support
@@ -124,6 +126,12 @@ class LLMHandler:
         except Exception as exc:
             logger.warning(f"[LLM vLLM] Failed to clean torch distributed state: {exc}")
 
+    def get_prefix_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Return prefix KV cache counters of the vLLM engine, or None for other backends."""
+        if self.llm_backend != "vllm" or self.llm is None or not hasattr(self.llm, "get_prefix_cache_stats"):
+            return None
+        return self.llm.get_prefix_cache_stats()
+
     def _get_checkpoint_dir(self) -> str:
         """Get checkpoint directory, prioritizing persistent storage"""
         if self.persistent_storage_path:
@@ -288,42 +296,42 @@ class LLMHandler:
         if not use_constrained_decoding and not use_phase_temperatures:
             return None
 
-        # Reset processor state for new generation
-        self.constrained_processor.reset()
-
-        # Use shared processor, just update settings
-        self.constrained_processor.enabled = use_constrained_decoding
-        self.constrained_processor.debug = constrained_decoding_debug
+        # Per-request copy of the shared processor: it reuses the precomputed
+        # tables but has its own settings and FSM state, so generations decoded
+        # concurrently by the engine cannot reset or advance each other.
+        constrained_processor = self.constrained_processor.fork()
+        constrained_processor.enabled = use_constrained_decoding
+        constrained_processor.debug = constrained_decoding_debug
 
         # Phase temperatures only supported in single mode
         if use_phase_temperatures:
-            self.constrained_processor.metadata_temperature = metadata_temperature
-            self.constrained_processor.codes_temperature = codes_temperature
+            constrained_processor.metadata_temperature = metadata_temperature
+            constrained_processor.codes_temperature = codes_temperature
         else:
-            self.constrained_processor.metadata_temperature = None
-            self.constrained_processor.codes_temperature = None
+            constrained_processor.metadata_temperature = None
+            constrained_processor.codes_temperature = None
 
-        self.constrained_processor.set_target_duration(target_duration)
+        constrained_processor.set_target_duration(target_duration)
 
         # Batch mode uses default/disabled settings for these options
         if is_batch:
-            self.constrained_processor.set_user_metadata(None)
-            self.constrained_processor.set_stop_at_reasoning(False)
-            self.constrained_processor.set_skip_genres(True)
-            self.constrained_processor.set_skip_caption(True)
-            self.constrained_processor.set_skip_language(True)
+            constrained_processor.set_user_metadata(None)
+            constrained_processor.set_stop_at_reasoning(False)
+            constrained_processor.set_skip_genres(True)
+            constrained_processor.set_skip_caption(True)
+            constrained_processor.set_skip_language(True)
         else:
             # Single mode uses provided settings
-            self.constrained_processor.set_user_metadata(user_metadata)
-            self.constrained_processor.set_stop_at_reasoning(stop_at_reasoning)
-            self.constrained_processor.set_skip_genres(skip_genres)
-            self.constrained_processor.set_skip_caption(skip_caption)
-            self.constrained_processor.set_skip_language(skip_language)
+            constrained_processor.set_user_metadata(user_metadata)
+            constrained_processor.set_stop_at_reasoning(stop_at_reasoning)
+            constrained_processor.set_skip_genres(skip_genres)
+            constrained_processor.set_skip_caption(skip_caption)
+            constrained_processor.set_skip_language(skip_language)
 
         # Set generation phase for phase-aware processing
-        self.constrained_processor.set_generation_phase(generation_phase)
+        constrained_processor.set_generation_phase(generation_phase)
 
-        return self.constrained_processor
+        return constrained_processor
 
     def _build_unconditional_prompt(
         self,
@@ -410,8 +418,7 @@ class LLMHandler:
     def _update_constrained_processor_state(self, constrained_processor: Optional[MetadataConstrainedLogitsProcessor], tokens: torch.Tensor):
         """Update constrained processor state with generated tokens"""
         if constrained_processor is not None:
-            for b in range(tokens.shape[0]):
-                constrained_processor.update_state(tokens[b].item())
+            constrained_processor.update_states(tokens.tolist())
 
     def _forward_pass(
         self,
@@ -453,6 +460,38 @@ class LLMHandler:
         device: str = "auto",
         offload_to_cpu: bool = False,
         dtype: Optional[torch.dtype] = None,
+    ) -> Tuple[str, bool]:
+        """Initialize 5Hz LM model and remember the arguments on success.
+
+        See ``_initialize`` for the arguments.
+        """
+        status, ok = self._initialize(
+            checkpoint_dir=checkpoint_dir,
+            lm_model_path=lm_model_path,
+            backend=backend,
+            device=device,
+            offload_to_cpu=offload_to_cpu,
+            dtype=dtype,
+        )
+        if ok:
+            self.last_init_params = {
+                "checkpoint_dir": checkpoint_dir,
+                "lm_model_path": lm_model_path,
+                "backend": backend,
+                "device": device,
+                "offload_to_cpu": offload_to_cpu,
+                "dtype": dtype,
+            }
+        return status, ok
+
+    def _initialize(
+        self,
+        checkpoint_dir: str,
+        lm_model_path: str,
+        backend: str = "vllm",
+        device: str = "auto",
+        offload_to_cpu: bool = False,
+        dtype: Optional[torch.dtype] = None,
     ) -> Tuple[str, bool]:
         """
         Initialize 5Hz LM model
@@ -1742,6 +1781,77 @@ class LLMHandler:
         status_msg = f"✅ Understanding completed successfully\nGenerated fields: {', '.join(metadata.keys())}"
         return metadata, status_msg
 
+    def understand_audio_from_codes_batch(
+        self,
+        audio_codes_list: List[str],
+        temperature: float = 0.3,
+        top_k: Optional[int] = None,
+        top_p: Optional[float] = None,
+        repetition_penalty: float = 1.0,
+        use_constrained_decoding: bool = True,
+        constrained_decoding_debug: bool = False,
+    ) -> List[Tuple[Dict[str, Any], str]]:
+        """
+        Batch variant of :meth:`understand_audio_from_codes`.
+
+        All prompts are submitted to the backend in one multi-prompt call (one
+        scheduler pass on vllm, one model context on pt/mlx). Returns one
+        ``(metadata_dict, status_message)`` tuple per input, in order; empty
+        inputs yield ``({}, error)`` without being sent to the model.
+        """
+        if not getattr(self, "llm_initialized", False):
+            return [({}, "❌ 5Hz LM not initialized. Please initialize it first.")] * len(audio_codes_list)
+
+        results: List[Tuple[Dict[str, Any], str]] = [
+            ({}, "❌ No audio codes provided. Please paste audio codes first.")
+        ] * len(audio_codes_list)
+        indices = [i for i, codes in enumerate(audio_codes_list) if codes and codes.strip()]
+        if not indices:
+            return results
+
+        logger.info(f"Understanding {len(indices)} audio code sequences in one batch")
+        formatted_prompts = [
+            self.build_formatted_prompt_for_understanding(audio_codes_list[i]) for i in indices
+        ]
+        output_texts, status = self.generate_from_formatted_prompt(
+            formatted_prompt=formatted_prompts,
+            cfg={
+                "temperature": temperature,
+                "top_k": top_k,
+                "top_p": top_p,
+                "repetition_penalty": repetition_penalty,
+                "target_duration": None,
+                "user_metadata": None,
+                "skip_caption": False,
+                "skip_language": False,
+                "skip_genres": False,
+                "generation_phase": "understand",
+                "caption": "",
+                "lyrics": "",
+            },
+            use_constrained_decoding=use_constrained_decoding,
+            constrained_decoding_debug=constrained_decoding_debug,
+            stop_at_reasoning=False,
+        )
+        if not isinstance(output_texts, list):
+            for i in indices:
+                results[i] = ({}, status)
+            return results
+
+        for i, output_text in zip(indices, output_texts):
+            if not output_text:
+                results[i] = ({}, "❌ Empty LM output")
+                continue
+            metadata, _ = self.parse_lm_output(output_text)
+            lyrics = self._extract_lyrics_from_output(output_text)
+            if lyrics:
+                metadata['lyrics'] = lyrics
+            results[i] = (
+                metadata,
+                f"✅ Understanding completed successfully\nGenerated fields: {', '.join(metadata.keys())}",
+            )
+        return results
+
     def _extract_lyrics_from_output(self, output_text: str) -> str:
         """
         Extract lyrics section from LLM output.
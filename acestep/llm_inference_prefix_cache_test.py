@@ -0,0 +1,36 @@
+"""Unit tests for prefix KV cache stats reporting in ``LLMHandler``."""
+
+import unittest
+from unittest.mock import MagicMock
+
+try:
+    from acestep.llm_inference import LLMHandler
+    _IMPORT_ERROR = None
+except ImportError as exc:  # pragma: no cover - dependency guard
+    LLMHandler = None
+    _IMPORT_ERROR = exc
+
+
+@unittest.skipIf(LLMHandler is None, f"llm_inference import unavailable: {_IMPORT_ERROR}")
+class LlmPrefixCacheStatsTests(unittest.TestCase):
+    """Verify prefix cache counters are exposed only for the vLLM backend."""
+
+    def test_stats_come_from_vllm_engine(self):
+        """The vLLM backend forwards the engine's prefix cache counters."""
+        handler = LLMHandler()
+        handler.llm_backend = "vllm"
+        handler.llm = MagicMock()
+        handler.llm.get_prefix_cache_stats.return_value = {"hits": 3, "misses": 1}
+        self.assertEqual(handler.get_prefix_cache_stats(), {"hits": 3, "misses": 1})
+
+    def test_stats_are_none_without_vllm(self):
+        """Other backends (or no model) report no prefix cache."""
+        handler = LLMHandler()
+        self.assertIsNone(handler.get_prefix_cache_stats())
+        handler.llm_backend = "pt"
+        handler.llm = MagicMock()
+        self.assertIsNone(handler.get_prefix_cache_stats())
+
+
+if __name__ == "__main__":
+    unittest.main()
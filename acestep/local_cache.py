@@ -2,11 +2,21 @@
 
 Uses diskcache as backend, provides Redis-compatible API.
 Supports persistent storage and TTL expiration.
+
+Reads and writes are served from an in-memory tier (dict + sorted key index
+for prefix queries + TTL heap); changes are persisted to diskcache (SQLite)
+in batches by a background writer, and the in-memory tier is loaded from
+disk on startup.
 """
 
+import atexit
+import bisect
+import heapq
 import json
 import os
-from typing import Any, Optional
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from threading import Lock
 
 try:
@@ -15,6 +25,24 @@ try:
 except ImportError:
     HAS_DISKCACHE = False
 
+_DELETED = object()
+
+
+class _Entry:
+    """One cached value; dict/list values are serialized lazily, once."""
+
+    __slots__ = ("raw", "text", "expire_at")
+
+    def __init__(self, raw: Any, expire_at: Optional[float]):
+        self.raw = raw
+        self.text = None if isinstance(raw, (dict, list)) else raw
+        self.expire_at = expire_at
+
+    def value(self) -> Any:
+        if self.text is None:
+            self.text = json.dumps(self.raw, ensure_ascii=False)
+        return self.text
+
 
 class LocalCache:
     """
@@ -25,7 +53,7 @@ class LocalCache:
     _instance = None
     _lock = Lock()
 
-    def __new__(cls, cache_dir: Optional[str] = None):
+    def __new__(cls, cache_dir: Optional[str] = None, flush_interval: Optional[float] = None):
         """Singleton pattern"""
         if cls._instance is None:
             with cls._lock:
@@ -34,7 +62,7 @@ class LocalCache:
                     cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self, cache_dir: Optional[str] = None):
+    def __init__(self, cache_dir: Optional[str] = None, flush_interval: Optional[float] = None):
         if getattr(self, '_initialized', False):
             return
 
@@ -49,11 +77,133 @@ class LocalCache:
                 ".cache",
                 "local_redis"
             )
+        if flush_interval is None:
+            flush_interval = float(os.getenv("ACESTEP_LOCAL_CACHE_FLUSH_SECONDS", "1.0"))
 
         os.makedirs(cache_dir, exist_ok=True)
         self._cache = Cache(cache_dir)
+        self._mem_lock = threading.RLock()
+        self._entries: Dict[str, _Entry] = {}
+        self._sorted_keys: List[str] = []
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._dirty: Dict[str, Any] = {}  # key -> _Entry or _DELETED
+        self._flush_interval = max(0.0, flush_interval)
+        self._flush_wakeup = threading.Event()
+        self._closed = False
+        self._load_from_disk()
+        self._writer = threading.Thread(target=self._write_behind, name="local-cache-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
         self._initialized = True
 
+    # ------------------------------------------------------------------
+    # In-memory tier
+    # ------------------------------------------------------------------
+    def _load_from_disk(self) -> None:
+        now = time.time()
+        for key in list(self._cache.iterkeys()):
+            value, expire_at = self._cache.get(key, expire_time=True)
+            if value is None or (expire_at is not None and expire_at <= now):
+                continue
+            self._put(key, _Entry(value, expire_at))
+
+    def _put(self, name: str, entry: _Entry) -> None:
+        """Store ``entry`` in memory; call with ``_mem_lock`` held."""
+        if name not in self._entries:
+            bisect.insort(self._sorted_keys, name)
+        self._entries[name] = entry
+        if entry.expire_at is None:
+            return
+        heap = self._expiry_heap
+        heapq.heappush(heap, (entry.expire_at, name))
+        # Overwrites and deletes leave stale items behind: drop those on top
+        # lazily, and rebuild once they outnumber the live keys
+        while heap and self._is_stale(heap[0]):
+            heapq.heappop(heap)
+        if len(heap) > 2 * len(self._entries):
+            self._expiry_heap = [(e.expire_at, k) for k, e in self._entries.items() if e.expire_at is not None]
+            heapq.heapify(self._expiry_heap)
+
+    def _is_stale(self, item: Tuple[float, str]) -> bool:
+        """Whether a heap item no longer matches its key's current expiry."""
+        entry = self._entries.get(item[1])
+        return entry is None or entry.expire_at != item[0]
+
+    def _remove(self, name: str) -> bool:
+        """Drop ``name`` from memory; call with ``_mem_lock`` held."""
+        if self._entries.pop(name, None) is None:
+            return False
+        index = bisect.bisect_left(self._sorted_keys, name)
+        if index < len(self._sorted_keys) and self._sorted_keys[index] == name:
+            del self._sorted_keys[index]
+        return True
+
+    def _expire_due(self) -> None:
+        """Evict entries whose TTL has passed; call with ``_mem_lock`` held."""
+        now = time.time()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            item = heapq.heappop(heap)
+            # Heap items of overwritten entries are stale and just discarded
+            if not self._is_stale(item):
+                name = item[1]
+                self._remove(name)
+                self._dirty[name] = _DELETED
+
+    def _live(self, name: str) -> Optional[_Entry]:
+        self._expire_due()
+        return self._entries.get(name)
+
+    # ------------------------------------------------------------------
+    # Write-behind persistence
+    # ------------------------------------------------------------------
+    def _mark_dirty(self, name: str, entry: Any) -> None:
+        self._dirty[name] = entry
+        if self._flush_interval == 0:
+            self.flush()
+
+    def _write_behind(self) -> None:
+        while not self._closed:
+            self._flush_wakeup.wait(self._flush_interval or None)
+            self._flush_wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Keep serving from memory; the next flush retries
+                pass
+
+    def flush(self) -> int:
+        """Persist pending changes to disk in one transaction; returns the number written."""
+        with self._mem_lock:
+            if not self._dirty:
+                return 0
+            pending, self._dirty = self._dirty, {}
+            batch = [
+                (name, entry if entry is _DELETED else (entry.value(), entry.expire_at))
+                for name, entry in pending.items()
+            ]
+        now = time.time()
+        try:
+            with self._cache.transact():
+                for name, item in batch:
+                    if item is _DELETED:
+                        self._cache.delete(name)
+                        continue
+                    value, expire_at = item
+                    if expire_at is None:
+                        self._cache.set(name, value)
+                    elif expire_at > now:
+                        self._cache.set(name, value, expire=expire_at - now)
+        except Exception:
+            with self._mem_lock:
+                for name, entry in pending.items():
+                    self._dirty.setdefault(name, entry)
+            raise
+        return len(batch)
+
+    # ------------------------------------------------------------------
+    # Redis-compatible API
+    # ------------------------------------------------------------------
     def set(self, name: str, value: Any, ex: Optional[int] = None) -> bool:
         """
         Set key-value pair
@@ -66,54 +216,92 @@ class LocalCache:
         Returns:
             bool: Success status
         """
-        if isinstance(value, (dict, list)):
-            value = json.dumps(value, ensure_ascii=False)
-        self._cache.set(name, value, expire=ex)
+        entry = _Entry(value, time.time() + ex if ex else None)
+        with self._mem_lock:
+            self._expire_due()
+            self._put(name, entry)
+            self._mark_dirty(name, entry)
         return True
 
     def get(self, name: str) -> Optional[str]:
         """Get value"""
-        return self._cache.get(name)
+        with self._mem_lock:
+            entry = self._live(name)
+            return entry.value() if entry is not None else None
+
+    def mget(self, names: List[str]) -> List[Optional[str]]:
+        """Get several values at once (``None`` for missing keys)"""
+        with self._mem_lock:
+            self._expire_due()
+            result = []
+            for name in names:
+                entry = self._entries.get(name)
+                result.append(entry.value() if entry is not None else None)
+            return result
 
     def delete(self, name: str) -> int:
         """Delete key, returns number of deleted items"""
-        return 1 if self._cache.delete(name) else 0
+        with self._mem_lock:
+            self._expire_due()
+            if not self._remove(name):
+                return 0
+            self._mark_dirty(name, _DELETED)
+            return 1
 
     def exists(self, name: str) -> bool:
         """Check if key exists"""
-        return name in self._cache
+        with self._mem_lock:
+            return self._live(name) is not None
 
     def keys(self, pattern: str = "*") -> list:
         """
         Get list of matching keys
         Note: Simplified implementation, only supports prefix and full matching
         """
-        if pattern == "*":
-            return list(self._cache.iterkeys())
-
-        prefix = pattern.rstrip("*")
-        return [k for k in self._cache.iterkeys() if k.startswith(prefix)]
+        with self._mem_lock:
+            self._expire_due()
+            if pattern == "*":
+                return list(self._sorted_keys)
+            if not pattern.endswith("*"):
+                return [pattern] if pattern in self._entries else []
+            prefix = pattern.rstrip("*")
+            start = bisect.bisect_left(self._sorted_keys, prefix)
+            end = start
+            while end < len(self._sorted_keys) and self._sorted_keys[end].startswith(prefix):
+                end += 1
+            return self._sorted_keys[start:end]
 
     def expire(self, name: str, seconds: int) -> bool:
         """Set key expiration time"""
-        value = self._cache.get(name)
-        if value is not None:
-            self._cache.set(name, value, expire=seconds)
+        with self._mem_lock:
+            entry = self._live(name)
+            if entry is None:
+                return False
+            updated = _Entry(entry.raw, time.time() + seconds)
+            updated.text = entry.text
+            self._put(name, updated)
+            self._mark_dirty(name, updated)
             return True
-        return False
 
     def ttl(self, name: str) -> int:
         """
         Get remaining time to live (seconds)
-        Note: diskcache does not directly support TTL queries
+        Returns -1 for keys without expiration and -2 for missing keys.
         """
-        if name in self._cache:
-            return -1  # Exists but TTL unknown
-        return -2  # Key does not exist
+        with self._mem_lock:
+            entry = self._live(name)
+            if entry is None:
+                return -2  # Key does not exist
+            if entry.expire_at is None:
+                return -1
+            return max(0, int(round(entry.expire_at - time.time())))
 
     def close(self):
         """Close cache connection"""
         if hasattr(self, '_cache'):
+            self._closed = True
+            self._flush_wakeup.set()
+            self.flush()
             self._cache.close()
 
 
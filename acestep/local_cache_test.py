@@ -0,0 +1,91 @@
+"""Unit tests for the tiered local cache."""
+
+import json
+import tempfile
+import time
+import unittest
+
+from acestep.local_cache import LocalCache
+
+
+class LocalCacheTests(unittest.TestCase):
+    """Tests for the in-memory tier and write-behind persistence of LocalCache."""
+
+    def setUp(self):
+        """Create a fresh (non-singleton) cache in a temporary directory."""
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = self._open()
+
+    def tearDown(self):
+        """Close the cache and reset the singleton."""
+        self.cache.close()
+        LocalCache._instance = None
+        self._tmp.cleanup()
+
+    def _open(self):
+        """Open a new instance over the temporary directory."""
+        LocalCache._instance = None
+        return LocalCache(self._tmp.name, flush_interval=3600)
+
+    def test_get_serializes_dict_values(self):
+        """dict/list values are returned as JSON text, strings unchanged."""
+        self.cache.set("a", [{"status": 1}])
+        self.cache.set("b", "plain")
+        self.assertEqual(json.loads(self.cache.get("a")), [{"status": 1}])
+        self.assertEqual(self.cache.get("b"), "plain")
+        self.assertIsNone(self.cache.get("missing"))
+
+    def test_mget_returns_values_in_order(self):
+        """mget answers a whole key list in one call with None for misses."""
+        self.cache.set("x", "1")
+        self.cache.set("y", "2")
+        self.assertEqual(self.cache.mget(["y", "nope", "x"]), ["2", None, "1"])
+
+    def test_prefix_keys_use_sorted_index(self):
+        """keys() with a trailing * returns only keys sharing the prefix."""
+        for key in ("job_b", "job_a", "other", "jo"):
+            self.cache.set(key, "v")
+        self.assertEqual(self.cache.keys("job_*"), ["job_a", "job_b"])
+        self.assertEqual(self.cache.keys("other"), ["other"])
+        self.cache.delete("job_a")
+        self.assertEqual(self.cache.keys("job_*"), ["job_b"])
+
+    def test_expired_entries_are_evicted(self):
+        """Entries past their TTL disappear from get, keys and ttl."""
+        self.cache.set("short", "v", ex=1)
+        self.cache.set("long", "v", ex=100)
+        self.assertIn(self.cache.ttl("long"), (99, 100))
+        self.assertEqual(self.cache.ttl("missing"), -2)
+        self.cache._entries["short"].expire_at = time.time() - 1
+        self.cache._expiry_heap[:] = sorted((e.expire_at, k) for k, e in self.cache._entries.items())
+        self.assertIsNone(self.cache.get("short"))
+        self.assertEqual(self.cache.keys("*"), ["long"])
+
+    def test_rewritten_keys_do_not_grow_expiry_heap(self):
+        """Stale heap items of overwritten keys are dropped instead of piling up."""
+        for i in range(500):
+            self.cache.set("progress", str(i), ex=3600)
+            self.cache.set("other", str(i), ex=7200)
+        self.assertLessEqual(len(self.cache._expiry_heap), 2 * len(self.cache._entries) + 1)
+        self.assertIn(self.cache.ttl("progress"), (3599, 3600))
+        self.cache._entries["progress"].expire_at = time.time() - 1
+        self.cache._expiry_heap[:] = sorted((e.expire_at, k) for k, e in self.cache._entries.items())
+        self.assertIsNone(self.cache.get("progress"))
+        self.assertEqual(self.cache.get("other"), "499")
+
+    def test_writes_persist_after_flush_and_reload(self):
+        """Pending writes reach disk on flush and are loaded by a new instance."""
+        self.cache.set("kept", {"n": 1}, ex=100)
+        self.cache.set("plain", "v")
+        self.cache.set("gone", "v")
+        self.cache.delete("gone")
+        self.assertEqual(self.cache.flush(), 3)
+        self.cache.close()
+        self.cache = self._open()
+        self.assertEqual(json.loads(self.cache.get("kept")), {"n": 1})
+        self.assertEqual(self.cache.ttl("plain"), -1)
+        self.assertFalse(self.cache.exists("gone"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Tests for conditional-only DiT steps outside the CFG interval (base and SFT models)."""
+
+import importlib
+import unittest
+from unittest import mock
+
+import torch
+
+_VARIANTS = ("base", "sft")
+_BSZ, _FRAMES, _DIM = 2, 20, 8
+
+
+def _tiny_model(variant):
+    """Random-weight generation model small enough to sample on the CPU."""
+    config_mod = importlib.import_module(f"acestep.models.{variant}.configuration_acestep_v15")
+    model_mod = importlib.import_module(f"acestep.models.{variant}.modeling_acestep_v15_base")
+    config = config_mod.AceStepConfig(
+        hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=2,
+        num_key_value_heads=1, head_dim=16, num_lyric_encoder_hidden_layers=1, text_hidden_dim=16,
+        timbre_hidden_dim=_DIM, audio_acoustic_hidden_dim=_DIM, num_timbre_encoder_hidden_layers=1,
+        num_attention_pooler_hidden_layers=1, num_audio_decoder_hidden_layers=2, in_channels=3 * _DIM,
+        fsq_dim=32, sliding_window=8, timbre_fix_frame=10, _attn_implementation="sdpa",
+    )
+    torch.manual_seed(0)
+    return model_mod, model_mod.AceStepConditionGenerationModel(config).eval()
+
+
+def _inputs():
+    """Text2music inputs for a batch of two."""
+    gen = torch.Generator().manual_seed(1)
+    return dict(
+        text_hidden_states=torch.randn(_BSZ, 5, 16, generator=gen),
+        text_attention_mask=torch.ones(_BSZ, 5),
+        lyric_hidden_states=torch.randn(_BSZ, 6, 16, generator=gen),
+        lyric_attention_mask=torch.ones(_BSZ, 6),
+        refer_audio_acoustic_hidden_states_packed=torch.randn(_BSZ, 10, _DIM, generator=gen),
+        refer_audio_order_mask=torch.arange(_BSZ),
+        src_latents=torch.randn(_BSZ, _FRAMES, _DIM, generator=gen),
+        chunk_masks=torch.ones(_BSZ, _FRAMES, _DIM),
+        is_covers=torch.zeros(_BSZ, dtype=torch.long),
+        silence_latent=torch.zeros(1, _FRAMES, _DIM),
+    )
+
+
+class CfgIntervalTests(unittest.TestCase):
+    """generate_audio skips the unconditional half only outside the CFG interval."""
+
+    def _run(self, variant):
+        """Sample with a narrow CFG interval, recording every decoder call and guidance call."""
+        model_mod, model = _tiny_model(variant)
+        calls = []
+        decoder_forward = model.decoder.forward
+
+        def spy(**kwargs):
+            out = decoder_forward(**kwargs)
+            calls.append((float(kwargs["timestep"][0]), kwargs, out[0].clone()))
+            return out
+
+        with mock.patch.object(model.decoder, "forward", side_effect=spy), \
+                mock.patch.object(model_mod, "apg_forward", wraps=model_mod.apg_forward) as apg:
+            result = model.generate_audio(
+                **_inputs(), seed=3, infer_steps=6, diffusion_guidance_sale=3.0,
+                cfg_interval_start=0.3, cfg_interval_end=0.7, use_progress_bar=False,
+            )
+        return model, calls, apg, result
+
+    def test_steps_outside_interval_run_conditional_half_only(self):
+        """Outside steps use batch B and match the conditional half of a full CFG forward."""
+        for variant in _VARIANTS:
+            with self.subTest(variant=variant):
+                model, calls, _, result = self._run(variant)
+                inside = [c for c in calls if 0.3 <= c[0] <= 0.7]
+                outside = [c for c in calls if not 0.3 <= c[0] <= 0.7]
+                self.assertTrue(inside and outside)
+                self.assertEqual(tuple(result["target_latents"].shape), (_BSZ, _FRAMES, _DIM))
+
+                doubled = inside[0][1]
+                for t, kwargs, vt in outside:
+                    self.assertEqual(kwargs["hidden_states"].shape[0], _BSZ)
+                    self.assertTrue(torch.equal(kwargs["encoder_hidden_states"], doubled["encoder_hidden_states"][:_BSZ]))
+                    x = kwargs["hidden_states"]
+                    with torch.no_grad():
+                        full = model.decoder(
+                            hidden_states=torch.cat([x, x], dim=0),
+                            timestep=torch.full((2 * _BSZ,), t),
+                            timestep_r=torch.full((2 * _BSZ,), t),
+                            attention_mask=doubled["attention_mask"],
+                            encoder_hidden_states=doubled["encoder_hidden_states"],
+                            encoder_attention_mask=doubled["encoder_attention_mask"],
+                            context_latents=doubled["context_latents"],
+                            use_cache=False,
+                        )[0]
+                    torch.testing.assert_close(vt, full[:_BSZ], rtol=1e-5, atol=1e-6)
+
+    def test_steps_inside_interval_keep_doubled_batch_and_guidance(self):
+        """Inside steps still run both branches and feed them to the guidance function."""
+        for variant in _VARIANTS:
+            with self.subTest(variant=variant):
+                _, calls, apg, _ = self._run(variant)
+                inside = [c for c in calls if 0.3 <= c[0] <= 0.7]
+                for _, kwargs, vt in inside:
+                    self.assertEqual(kwargs["hidden_states"].shape[0], 2 * _BSZ)
+                    self.assertEqual(vt.shape[0], 2 * _BSZ)
+                self.assertEqual(apg.call_count, len(inside))
+                for call in apg.call_args_list:
+                    self.assertEqual(call.kwargs["pred_cond"].shape[0], _BSZ)
+                    self.assertEqual(call.kwargs["pred_uncond"].shape[0], _BSZ)
+
+
+if __name__ == "__main__":
+    unittest.main()
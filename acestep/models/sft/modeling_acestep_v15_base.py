@@ -1917,6 +1917,10 @@ class AceStepConditionGenerationModel(AceStepPreTrainedModel):
             # src_latents
             context_latents = torch.cat([context_latents, context_latents], dim=0)
             attention_mask = torch.cat([attention_mask, attention_mask], dim=0)
+        # Steps outside [cfg_interval_start, cfg_interval_end] only need the conditional
+        # branch: they run on the first half of the doubled inputs and keep their own
+        # cross-attention KV cache, since cached encoder K/V are sized per batch.
+        cond_past_key_values = EncoderDecoderCache(DynamicCache(), DynamicCache())
         
         _switched_to_non_cover = False
         with torch.no_grad():
@@ -1933,45 +1937,58 @@ class AceStepConditionGenerationModel(AceStepPreTrainedModel):
                     encoder_attention_mask = encoder_attention_mask_non_cover
                     context_latents = context_latents_non_cover
                     past_key_values = EncoderDecoderCache(DynamicCache(), DynamicCache())
+                    cond_past_key_values = EncoderDecoderCache(DynamicCache(), DynamicCache())
                 
-                x = torch.cat([xt, xt], dim=0) if do_cfg_guidance else xt
-                t_curr_tensor = t_curr * torch.ones((x.shape[0],), device=device, dtype=dtype)
-                decoder_outputs = self.decoder(
-                    hidden_states=x,
-                    timestep=t_curr_tensor,
-                    timestep_r=t_curr_tensor,
-                    attention_mask=attention_mask,
-                    encoder_hidden_states=encoder_hidden_states,
-                    encoder_attention_mask=encoder_attention_mask,
-                    context_latents=context_latents,
-                    use_cache=True,
-                    past_key_values=past_key_values,
-                )
-                
-                vt = decoder_outputs[0]
-                past_key_values = decoder_outputs[1]
-                apply_cfg_guidance = t_curr >= cfg_interval_start and t_curr <= cfg_interval_end
-                if do_cfg_guidance:
+                apply_cfg_guidance = do_cfg_guidance and cfg_interval_start <= t_curr <= cfg_interval_end
+                if do_cfg_guidance and not apply_cfg_guidance:
+                    t_curr_tensor = t_curr * torch.ones((bsz,), device=device, dtype=dtype)
+                    decoder_outputs = self.decoder(
+                        hidden_states=xt,
+                        timestep=t_curr_tensor,
+                        timestep_r=t_curr_tensor,
+                        attention_mask=attention_mask[:bsz],
+                        encoder_hidden_states=encoder_hidden_states[:bsz],
+                        encoder_attention_mask=encoder_attention_mask[:bsz],
+                        context_latents=context_latents[:bsz],
+                        use_cache=True,
+                        past_key_values=cond_past_key_values,
+                    )
+                    vt = decoder_outputs[0]
+                    cond_past_key_values = decoder_outputs[1]
+                else:
+                    x = torch.cat([xt, xt], dim=0) if do_cfg_guidance else xt
+                    t_curr_tensor = t_curr * torch.ones((x.shape[0],), device=device, dtype=dtype)
+                    decoder_outputs = self.decoder(
+                        hidden_states=x,
+                        timestep=t_curr_tensor,
+                        timestep_r=t_curr_tensor,
+                        attention_mask=attention_mask,
+                        encoder_hidden_states=encoder_hidden_states,
+                        encoder_attention_mask=encoder_attention_mask,
+                        context_latents=context_latents,
+                        use_cache=True,
+                        past_key_values=past_key_values,
+                    )
+                    vt = decoder_outputs[0]
+                    past_key_values = decoder_outputs[1]
+                if apply_cfg_guidance:
                     pred_cond, pred_null_cond = vt.chunk(2)
-                    if apply_cfg_guidance:
-                        if not use_adg:
-                            vt = apg_forward(
-                                pred_cond=pred_cond,
-                                pred_uncond=pred_null_cond,
-                                guidance_scale=diffusion_guidance_sale,
-                                momentum_buffer=momentum_buffer,
-                                dims=[1],
-                            )
-                        else:
-                            vt = adg_forward(
-                                latents=xt,
-                                noise_pred_cond=pred_cond,
-                                noise_pred_uncond=pred_null_cond,
-                                sigma=t_curr,
-                                guidance_scale=diffusion_guidance_sale,
-                            )
+                    if not use_adg:
+                        vt = apg_forward(
+                            pred_cond=pred_cond,
+                            pred_uncond=pred_null_cond,
+                            guidance_scale=diffusion_guidance_sale,
+                            momentum_buffer=momentum_buffer,
+                            dims=[1],
+                        )
                     else:
-                        vt = pred_cond
+                        vt = adg_forward(
+                            latents=xt,
+                            noise_pred_cond=pred_cond,
+                            noise_pred_uncond=pred_null_cond,
+                            sigma=t_curr,
+                            guidance_scale=diffusion_guidance_sale,
+                        )
                 # Update x_t based on inference method
                 if infer_method == "sde":
                     # Stochastic Differential Equation: predict clean, then re-add noise
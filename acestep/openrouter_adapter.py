@@ -613,37 +613,20 @@ def create_openrouter_router(app_state_getter) -> APIRouter:
                     description="AI music generation model",
                 ))
 
-        # Secondary model
-        if getattr(state, "_initialized2", False) and getattr(state, "_config_path2", ""):
-            model_name = _get_model_name_from_path(state._config_path2)
-            if model_name:
-                models.append(ModelInfo(
-                    id=_get_model_id(model_name),
-                    name=f"ACE-Step {model_name}",
-                    created=created_timestamp,
-                    input_modalities=["text", "audio"],
-                    output_modalities=["audio", "text"],
-                    context_length=4096,
-                    max_output_length=300,
-                    pricing=ModelPricing(),
-                    description="AI music generation model",
-                ))
-
-        # Third model
-        if getattr(state, "_initialized3", False) and getattr(state, "_config_path3", ""):
-            model_name = _get_model_name_from_path(state._config_path3)
-            if model_name:
-                models.append(ModelInfo(
-                    id=_get_model_id(model_name),
-                    name=f"ACE-Step {model_name}",
-                    created=created_timestamp,
-                    input_modalities=["text", "audio"],
-                    output_modalities=["audio", "text"],
-                    context_length=4096,
-                    max_output_length=300,
-                    pricing=ModelPricing(),
-                    description="AI music generation model",
-                ))
+        # DiT variants served by the model registry (loaded on first use)
+        dit_registry = getattr(state, "dit_registry", None)
+        for model_name in (dit_registry.variant_models() if dit_registry is not None else []):
+            models.append(ModelInfo(
+                id=_get_model_id(model_name),
+                name=f"ACE-Step {model_name}",
+                created=created_timestamp,
+                input_modalities=["text", "audio"],
+                output_modalities=["audio", "text"],
+                context_length=4096,
+                max_output_length=300,
+                pricing=ModelPricing(),
+                description="AI music generation model",
+            ))
 
         return ModelsResponse(data=models)
 
@@ -0,0 +1,115 @@
+"""Scheduler / BlockManager micro-benchmark (CPU only, no model).
+
+Replays a schedule of thousands of sequences through Scheduler.schedule() and
+Scheduler.postprocess() and reports the host-side overhead per step together
+with the prefix cache counters. A schedule is a JSON list of requests:
+
+    {"arrival": step, "template": id, "prefix_len": n, "suffix_len": n,
+     "max_tokens": n, "cfg": bool}
+
+Requests sharing a template share their first prefix_len prompt tokens (like
+the LM instruction prompt); CFG requests also add an unconditional sequence
+whose prompt is the template alone. Use --record to save the synthetic schedule
+and --schedule to replay a recorded one, so runs stay comparable.
+"""
+import argparse
+import json
+import time
+from random import Random
+from types import SimpleNamespace
+
+from nanovllm.engine.scheduler import Scheduler
+from nanovllm.engine.sequence import Sequence
+from nanovllm.sampling_params import SamplingParams
+
+
+def make_schedule(num_seqs: int, num_templates: int, seed: int) -> list[dict]:
+    rng = Random(seed)
+    schedule = []
+    for i in range(num_seqs):
+        schedule.append({
+            "arrival": i // 8,
+            "template": rng.randrange(num_templates),
+            "prefix_len": 600,
+            "suffix_len": rng.randint(20, 400),
+            "max_tokens": rng.randint(50, 600),
+            "cfg": rng.random() < 0.5,
+        })
+    return schedule
+
+
+def build_sequences(entry: dict, index: int) -> list[Sequence]:
+    prefix = [(entry["template"] * 7919 + j) % 150000 for j in range(entry["prefix_len"])]
+    rng = Random(index)
+    prompt = prefix + [rng.randrange(150000) for _ in range(entry["suffix_len"])]
+    params = SamplingParams(max_tokens=entry["max_tokens"], ignore_eos=True, cfg_scale=2.0 if entry["cfg"] else 1.0)
+    if not entry["cfg"]:
+        return [Sequence(prompt, params)]
+    uncond = Sequence(prefix, params, is_unconditional=True)
+    cond = Sequence(prompt, params, conditional_seq=uncond)
+    uncond.paired_seq = cond
+    return [cond, uncond]
+
+
+def replay(schedule: list[dict], num_blocks: int, block_size: int, max_num_seqs: int, max_num_batched_tokens: int):
+    Sequence.block_size = block_size
+    config = SimpleNamespace(
+        max_num_seqs=max_num_seqs,
+        max_num_batched_tokens=max_num_batched_tokens,
+        eos=-1,
+        num_kvcache_blocks=num_blocks,
+        kvcache_block_size=block_size,
+    )
+    scheduler = Scheduler(config)
+    pending = sorted(enumerate(schedule), key=lambda item: item[1]["arrival"])
+    step = num_steps = 0
+    sched_time = 0.0
+    while pending or not scheduler.is_finished():
+        while pending and pending[0][1]["arrival"] <= step:
+            index, entry = pending.pop(0)
+            for seq in build_sequences(entry, index):
+                scheduler.add(seq)
+        step += 1
+        if scheduler.is_finished():
+            continue
+        t = time.perf_counter()
+        seqs, _ = scheduler.schedule()
+        token_ids = [step % 1000] * sum(1 for seq in seqs if not seq.is_unconditional)
+        scheduler.postprocess(seqs, token_ids)
+        sched_time += time.perf_counter() - t
+        num_steps += 1
+    return num_steps, sched_time, scheduler.block_manager.get_prefix_cache_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-seqs", type=int, default=4000)
+    parser.add_argument("--num-templates", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--num-blocks", type=int, default=20000)
+    parser.add_argument("--block-size", type=int, default=256)
+    parser.add_argument("--max-num-seqs", type=int, default=64)
+    parser.add_argument("--max-num-batched-tokens", type=int, default=16384)
+    parser.add_argument("--schedule", help="replay a recorded schedule (JSON)")
+    parser.add_argument("--record", help="write the schedule used to this path")
+    args = parser.parse_args()
+
+    if args.schedule:
+        with open(args.schedule) as f:
+            schedule = json.load(f)
+    else:
+        schedule = make_schedule(args.num_seqs, args.num_templates, args.seed)
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump(schedule, f)
+
+    num_steps, sched_time, stats = replay(
+        schedule, args.num_blocks, args.block_size, args.max_num_seqs, args.max_num_batched_tokens
+    )
+    print(f"Requests: {len(schedule)}, Steps: {num_steps}, Scheduler time: {sched_time:.2f}s, "
+          f"Per step: {sched_time / max(num_steps, 1) * 1e6:.1f}us")
+    print(f"Prefix cache: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import os
-from collections import deque
+from collections import OrderedDict
 import xxhash
 import numpy as np
 
@@ -15,6 +15,7 @@ def _debug_log(msg: str):
 
 
 class Block:
+    __slots__ = ("block_id", "ref_count", "hash", "token_ids")
 
     def __init__(self, block_id):
         self.block_id = block_id
@@ -33,13 +34,38 @@ class Block:
 
 
 class BlockManager:
+    """KV cache block allocator with a cross-request prefix cache.
+
+    Full blocks are content-hashed (chained over the preceding blocks). When the
+    last sequence using a hashed block releases it, the block keeps its KV data and
+    hash and moves to an LRU pool of cached blocks instead of the free list, so a
+    later request with the same prompt prefix (instruction template, CFG
+    unconditional prompt) can reuse it without prefill. Cached blocks count as
+    free capacity and are evicted, least recently used first, only when no plain
+    free block is left.
+
+    Every block is in exactly one place: referenced (ref_count > 0), the cached
+    pool (insertion-ordered dict) or the free list (a list used as a stack), so
+    allocate, free, reuse and eviction are all O(1) per block.
+    """
 
     def __init__(self, num_blocks: int, block_size: int):
         self.block_size = block_size
         self.blocks: list[Block] = [Block(i) for i in range(num_blocks)]
         self.hash_to_block_id: dict[int, int] = dict()
-        self.free_block_ids: deque[int] = deque(range(num_blocks))
-        self.used_block_ids: set[int] = set()
+        # Popped from the end; reversed so block 0 is handed out first
+        self.free_block_ids: list[int] = list(reversed(range(num_blocks)))
+        # Unreferenced blocks that still hold reusable prefix KV, oldest first
+        self.cached_block_ids: OrderedDict[int, None] = OrderedDict()
+        # Prefix cache counters (full prompt blocks looked up at allocation)
+        self.prefix_cache_hits = 0
+        self.prefix_cache_misses = 0
+        self.prefix_cache_evictions = 0
+
+    @property
+    def num_free_blocks(self) -> int:
+        """Blocks available for allocation, including evictable cached blocks."""
+        return len(self.free_block_ids) + len(self.cached_block_ids)
 
     @classmethod
     def compute_hash(cls, token_ids: list[int], prefix: int = -1):
@@ -49,21 +75,33 @@ class BlockManager:
         h.update(np.array(token_ids).tobytes())
         return h.intdigest()
 
-    def _allocate_block(self, block_id: int) -> Block:
-        block = self.blocks[block_id]
+    def _take_block(self) -> Block:
+        """Claim a block for new content, evicting the least recently used cached block if needed."""
+        if self.free_block_ids:
+            block = self.blocks[self.free_block_ids.pop()]
+        else:
+            block_id, _ = self.cached_block_ids.popitem(last=False)
+            block = self.blocks[block_id]
+            # Drop the stale mapping so no later lookup can resolve to overwritten KV
+            if self.hash_to_block_id.get(block.hash) == block_id:
+                del self.hash_to_block_id[block.hash]
+            self.prefix_cache_evictions += 1
         assert block.ref_count == 0
         block.reset()
-        self.free_block_ids.remove(block_id)
-        self.used_block_ids.add(block_id)
-        return self.blocks[block_id]
+        return block
 
-    def _deallocate_block(self, block_id: int) -> Block:
-        assert self.blocks[block_id].ref_count == 0
-        self.used_block_ids.remove(block_id)
-        self.free_block_ids.append(block_id)
+    def _release_block(self, block: Block):
+        assert block.ref_count == 0
+        if block.hash != -1 and self.hash_to_block_id.get(block.hash) == block.block_id:
+            # Keep the KV data for future prefix hits; most recently released last
+            self.cached_block_ids[block.block_id] = None
+        else:
+            block.hash = -1
+            block.token_ids = []
+            self.free_block_ids.append(block.block_id)
 
     def can_allocate(self, seq: Sequence) -> bool:
-        return len(self.free_block_ids) >= seq.num_blocks
+        return self.num_free_blocks >= seq.num_blocks
 
     def allocate(self, seq: Sequence):
         _debug_log(f"allocate: seq_id={seq.seq_id}, len={len(seq)}, num_blocks={seq.num_blocks}, "
@@ -75,23 +113,30 @@ class BlockManager:
             token_ids = seq.block(i)
             h = self.compute_hash(token_ids, h) if len(token_ids) == self.block_size else -1
             block_id = self.hash_to_block_id.get(h, -1)
-            if block_id == -1 or self.blocks[block_id].token_ids != token_ids:
+            # The last prompt token must always be recomputed to produce logits, so a
+            # prompt that ends exactly on a block boundary never reuses its last block
+            if block_id == -1 or self.blocks[block_id].token_ids != token_ids or i == seq.num_blocks - 1:
                 cache_miss = True
+            if h != -1 and seq.num_completion_tokens == 0:
+                if cache_miss:
+                    self.prefix_cache_misses += 1
+                else:
+                    self.prefix_cache_hits += 1
             if cache_miss:
-                if len(self.free_block_ids) == 0:
+                if self.num_free_blocks == 0:
                     _debug_log(f"  ERROR: no free blocks available!")
-                block_id = self.free_block_ids[0]
-                block = self._allocate_block(block_id)
+                block = self._take_block()
+                block_id = block.block_id
+                if h != -1:
+                    block.update(h, token_ids)
+                    self.hash_to_block_id[h] = block_id
             else:
                 seq.num_cached_tokens += self.block_size
-                if block_id in self.used_block_ids:
-                    block = self.blocks[block_id]
-                    block.ref_count += 1
-                else:
-                    block = self._allocate_block(block_id)
-            if h != -1:
-                block.update(h, token_ids)
-                self.hash_to_block_id[h] = block_id
+                block = self.blocks[block_id]
+                if block.ref_count == 0:
+                    # Revive from the cached pool; hash and KV data are still valid
+                    del self.cached_block_ids[block_id]
+                block.ref_count += 1
             seq.block_table.append(block_id)
         _debug_log(f"  allocated block_table: {seq.block_table}")
 
@@ -102,29 +147,37 @@ class BlockManager:
             block.ref_count -= 1
             _debug_log(f"  block_id={block_id}, ref_count after decrement={block.ref_count}")
             if block.ref_count == 0:
-                # Fix: Clean up hash_to_block_id mapping to prevent stale references
-                # This prevents CUDA illegal memory access when prefix cache tries to
-                # reuse a block_id that has already been freed
-                if block.hash != -1:
-                    cached_id = self.hash_to_block_id.get(block.hash)
-                    if cached_id == block_id:
-                        del self.hash_to_block_id[block.hash]
-                self._deallocate_block(block_id)
+                # Hashed blocks keep their hash_to_block_id entry while they sit in the
+                # cached pool; the entry is dropped when the block is evicted and reused
+                # for other content, so a lookup never resolves to overwritten KV
+                self._release_block(block)
         seq.num_cached_tokens = 0
         seq.block_table.clear()
-        _debug_log(f"  deallocated, free_blocks={len(self.free_block_ids)}")
+        _debug_log(f"  deallocated, free_blocks={len(self.free_block_ids)}, cached_blocks={len(self.cached_block_ids)}")
+
+    def get_prefix_cache_stats(self) -> dict:
+        """Prefix cache counters: full prompt blocks hit/missed at allocation and pool size."""
+        lookups = self.prefix_cache_hits + self.prefix_cache_misses
+        return {
+            "hits": self.prefix_cache_hits,
+            "misses": self.prefix_cache_misses,
+            "hit_rate": self.prefix_cache_hits / lookups if lookups else 0.0,
+            "hit_tokens": self.prefix_cache_hits * self.block_size,
+            "evictions": self.prefix_cache_evictions,
+            "cached_blocks": len(self.cached_block_ids),
+            "free_blocks": len(self.free_block_ids),
+            "total_blocks": len(self.blocks),
+        }
 
     def can_append(self, seq: Sequence) -> bool:
-        return len(self.free_block_ids) >= (len(seq) % self.block_size == 1)
+        return self.num_free_blocks >= (len(seq) % self.block_size == 1)
 
     def may_append(self, seq: Sequence):
         block_table = seq.block_table
         last_block = self.blocks[block_table[-1]]
         if len(seq) % self.block_size == 1:
             assert last_block.hash != -1
-            block_id = self.free_block_ids[0]
-            self._allocate_block(block_id)
-            block_table.append(block_id)
+            block_table.append(self._take_block().block_id)
         elif len(seq) % self.block_size == 0:
             assert last_block.hash == -1
             token_ids = seq.block(seq.num_blocks-1)
@@ -0,0 +1,183 @@
+"""Tests for the KV block allocator and its cross-request prefix cache."""
+
+import unittest
+
+from nanovllm.engine.block_manager import BlockManager
+from nanovllm.engine.sequence import Sequence
+
+_BLOCK_SIZE = 4
+
+
+class _BlockSizeMixin:
+    """Run with a 4-token KV block so tests stay small."""
+
+    def setUp(self):
+        self._block_size = Sequence.block_size
+        Sequence.block_size = _BLOCK_SIZE
+
+    def tearDown(self):
+        Sequence.block_size = self._block_size
+
+
+def _allocate(manager, token_ids):
+    """Allocate a fresh sequence for ``token_ids``."""
+    seq = Sequence(list(token_ids))
+    manager.allocate(seq)
+    return seq
+
+
+class PrefixCacheTests(_BlockSizeMixin, unittest.TestCase):
+    """Tests for prefix reuse, LRU eviction and hash invalidation."""
+
+    def test_released_prefix_is_reused(self):
+        """Full blocks of a finished request serve the next request with the same prefix."""
+        manager = BlockManager(4, _BLOCK_SIZE)
+        first = _allocate(manager, range(1, 9))
+        manager.deallocate(first)
+        self.assertEqual(list(manager.cached_block_ids), [1, 0])
+
+        second = _allocate(manager, list(range(1, 9)) + [9])
+        self.assertEqual(second.block_table, [0, 1, 2])
+        self.assertEqual(second.num_cached_tokens, 8)
+        self.assertEqual((manager.prefix_cache_hits, manager.prefix_cache_misses), (2, 2))
+        self.assertEqual(len(manager.cached_block_ids), 0)
+
+    def test_eviction_takes_least_recently_released_block_first(self):
+        """With no free block left, the oldest cached block is reused and unmapped."""
+        manager = BlockManager(4, _BLOCK_SIZE)
+        first = _allocate(manager, range(1, 9))
+        manager.deallocate(first)
+        other = _allocate(manager, range(20, 28))
+        manager.deallocate(other)
+        self.assertEqual(list(manager.cached_block_ids), [1, 0, 3, 2])
+        self.assertEqual(manager.free_block_ids, [])
+        stale_hash = manager.blocks[1].hash
+
+        newcomer = _allocate(manager, range(40, 44))
+        self.assertEqual(newcomer.block_table, [1])
+        self.assertEqual(manager.prefix_cache_evictions, 1)
+        self.assertEqual(list(manager.cached_block_ids), [0, 3, 2])
+        self.assertNotIn(stale_hash, manager.hash_to_block_id)
+
+    def test_reused_block_no_longer_resolves_old_prefix(self):
+        """After eviction only the surviving part of a prefix hits."""
+        manager = BlockManager(4, _BLOCK_SIZE)
+        first = _allocate(manager, range(1, 9))
+        manager.deallocate(first)
+        other = _allocate(manager, range(20, 28))
+        manager.deallocate(other)
+        newcomer = _allocate(manager, range(40, 44))
+
+        again = _allocate(manager, list(range(1, 9)) + [99])
+        self.assertEqual(again.block_table[0], 0)
+        self.assertEqual(again.num_cached_tokens, _BLOCK_SIZE)
+        self.assertNotIn(newcomer.block_table[0], again.block_table)
+        self.assertEqual(manager.blocks[again.block_table[1]].token_ids, list(range(5, 9)))
+
+    def test_last_block_is_recomputed_on_block_boundary(self):
+        """A prompt ending on a block boundary reuses all but its last block."""
+        manager = BlockManager(4, _BLOCK_SIZE)
+        first = _allocate(manager, range(1, 9))
+        manager.deallocate(first)
+
+        again = _allocate(manager, range(1, 9))
+        self.assertEqual(again.block_table[0], 0)
+        self.assertEqual(again.num_cached_tokens, _BLOCK_SIZE)
+        self.assertEqual((manager.prefix_cache_hits, manager.prefix_cache_misses), (1, 3))
+
+    def test_partial_block_is_never_cached(self):
+        """A trailing partial block goes back to the free list, not the cache."""
+        manager = BlockManager(4, _BLOCK_SIZE)
+        seq = _allocate(manager, range(1, 7))
+        partial = seq.block_table[1]
+        manager.deallocate(seq)
+        self.assertEqual(list(manager.cached_block_ids), [0])
+        self.assertIn(partial, manager.free_block_ids)
+        self.assertEqual(manager.blocks[partial].hash, -1)
+
+
+class AllocatorTests(_BlockSizeMixin, unittest.TestCase):
+    """Tests for allocate / deallocate / append bookkeeping."""
+
+    def _assert_partition(self, manager):
+        """Every block is referenced, cached or free, in exactly one place."""
+        referenced = {b.block_id for b in manager.blocks if b.ref_count > 0}
+        cached = set(manager.cached_block_ids)
+        free = set(manager.free_block_ids)
+        self.assertEqual(len(free), len(manager.free_block_ids))
+        self.assertFalse(referenced & cached or referenced & free or cached & free)
+        self.assertEqual(referenced | cached | free, set(range(len(manager.blocks))))
+        self.assertEqual(manager.num_free_blocks, len(cached) + len(free))
+
+    def test_allocate_and_deallocate_keep_blocks_partitioned(self):
+        """Blocks move between free, referenced and cached without leaking."""
+        manager = BlockManager(8, _BLOCK_SIZE)
+        seqs = [_allocate(manager, range(n, n + 6)) for n in (1, 100, 200)]
+        self._assert_partition(manager)
+        self.assertEqual(manager.num_free_blocks, 2)
+        for seq in seqs:
+            manager.deallocate(seq)
+            self.assertEqual((seq.block_table, seq.num_cached_tokens), ([], 0))
+            self._assert_partition(manager)
+        self.assertEqual(manager.num_free_blocks, 8)
+
+    def test_exhaustion_blocks_allocate_and_append(self):
+        """can_allocate / can_append turn False when no block is left, and recover on release."""
+        manager = BlockManager(2, _BLOCK_SIZE)
+        seq = _allocate(manager, range(1, 9))
+        waiting = Sequence([50, 51, 52, 53, 54])
+        self.assertFalse(manager.can_allocate(waiting))
+        seq.append_token(9)
+        self.assertFalse(manager.can_append(seq))
+        manager.deallocate(seq)
+        self.assertTrue(manager.can_allocate(waiting))
+        self._assert_partition(manager)
+
+    def test_may_append_hashes_full_blocks_and_opens_new_ones(self):
+        """A block is hashed when it fills and a new one is taken on the next token."""
+        manager = BlockManager(4, _BLOCK_SIZE)
+        seq = _allocate(manager, [1, 2, 3])
+        last = manager.blocks[seq.block_table[-1]]
+        self.assertEqual(last.hash, -1)
+        self.assertTrue(manager.can_append(seq))
+
+        seq.append_token(4)
+        manager.may_append(seq)
+        self.assertNotEqual(last.hash, -1)
+        self.assertEqual(manager.hash_to_block_id[last.hash], last.block_id)
+        self.assertEqual(len(seq.block_table), 1)
+
+        seq.append_token(5)
+        self.assertTrue(manager.can_append(seq))
+        manager.may_append(seq)
+        self.assertEqual(len(seq.block_table), 2)
+        self.assertEqual(manager.blocks[seq.block_table[-1]].hash, -1)
+
+        seq.append_token(6)
+        manager.may_append(seq)
+        self.assertEqual(len(seq.block_table), 2)
+        self._assert_partition(manager)
+
+    def test_shared_prefix_blocks_are_reference_counted(self):
+        """Concurrent sequences share full prefix blocks until the last one releases them."""
+        manager = BlockManager(8, _BLOCK_SIZE)
+        prompt = list(range(1, 10))
+        first = _allocate(manager, prompt)
+        second = _allocate(manager, prompt)
+        shared = first.block_table[:2]
+        self.assertEqual(second.block_table[:2], shared)
+        self.assertNotEqual(first.block_table[2], second.block_table[2])
+        self.assertEqual([manager.blocks[i].ref_count for i in shared], [2, 2])
+
+        manager.deallocate(first)
+        self.assertEqual([manager.blocks[i].ref_count for i in shared], [1, 1])
+        self.assertFalse(set(shared) & set(manager.cached_block_ids))
+        self._assert_partition(manager)
+
+        manager.deallocate(second)
+        self.assertEqual(list(manager.cached_block_ids), shared[::-1])
+        self._assert_partition(manager)
+
+
+if __name__ == "__main__":
+    unittest.main()
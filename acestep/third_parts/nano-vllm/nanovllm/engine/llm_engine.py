@@ -1,9 +1,11 @@
 import atexit
+import queue
 import threading
 from dataclasses import fields
 from time import perf_counter
 from tqdm.auto import tqdm
 from transformers import AutoTokenizer
+import torch
 import torch.multiprocessing as mp
 
 from nanovllm.config import Config
@@ -13,6 +15,71 @@ from nanovllm.engine.scheduler import Scheduler
 from nanovllm.engine.model_runner import ModelRunner
 
 
+_STREAM_END = object()
+
+
+class GenerationRequest:
+    """Handle for prompts submitted with ``LLMEngine.submit()``.
+
+    Outputs are filled in by the engine loop as each prompt finishes, so
+    callers can block on ``result()`` or consume ``stream()`` while other
+    requests keep decoding in the same batches.
+    """
+
+    def __init__(self, num_prompts: int):
+        self.num_prompts = num_prompts
+        self._outputs: list[dict | None] = [None] * num_prompts
+        self._remaining = num_prompts
+        self._events: queue.Queue = queue.Queue()
+        self._done = threading.Event()
+        self._exception: BaseException | None = None
+        if num_prompts == 0:
+            self._finish()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self, timeout: float | None = None) -> list[dict]:
+        """Wait for all prompts and return outputs in prompt order."""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Generation did not finish within {timeout}s")
+        if self._exception is not None:
+            raise self._exception
+        return list(self._outputs)
+
+    def stream(self, timeout: float | None = None):
+        """Yield ``(index, output)`` pairs in completion order."""
+        while True:
+            try:
+                item = self._events.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No generation output within {timeout}s") from None
+            if item is _STREAM_END:
+                if self._exception is not None:
+                    raise self._exception
+                return
+            yield item
+
+    def _set_output(self, index: int, output: dict):
+        if self._done.is_set():
+            return
+        self._outputs[index] = output
+        self._remaining -= 1
+        self._events.put((index, output))
+        if self._remaining == 0:
+            self._finish()
+
+    def _set_exception(self, exc: BaseException):
+        if self._done.is_set():
+            return
+        self._exception = exc
+        self._finish()
+
+    def _finish(self):
+        self._done.set()
+        self._events.put(_STREAM_END)
+
+
 class LLMEngine:
 
     def __init__(self, model, **kwargs):
@@ -21,15 +88,22 @@ class LLMEngine:
         config = Config(model, **config_kwargs)
         self.ps = []
         self.events = []
-        # Thread-safety lock for generate().
+        # Continuous batching.
         # The scheduler, block manager, model runner, and CUDA graph buffers are all
-        # shared mutable state that is NOT thread-safe. In concurrent serving scenarios
-        # (API server with ThreadPoolExecutor, multiple queue workers, Gradio with
-        # concurrent requests), multiple threads can call generate() simultaneously.
-        # Without this lock, concurrent access corrupts scheduler state, block tables,
-        # and CUDA graph input buffers, leading to intermittent CUDA device-side
-        # assertion failures (illegal memory access in KV cache).
-        self._generate_lock = threading.Lock()
+        # shared mutable state that is NOT thread-safe. Instead of serializing whole
+        # generate() calls, callers only enqueue prompts; a single engine-loop thread
+        # owns every step() and admits new prompts between steps, so concurrent
+        # requests (API server workers, Gradio) share decode batches instead of
+        # waiting for each other. _step_lock guards the scheduler against
+        # reset()/abort() issued from other threads.
+        self._step_lock = threading.RLock()
+        self._loop_cond = threading.Condition()
+        self._pending: list[tuple] = []
+        self._active: dict[int, tuple[GenerationRequest, int, list[Sequence]]] = {}
+        self._loop_thread: threading.Thread | None = None
+        self._stop_loop = False
+        self.prefill_throughput = 0.
+        self.decode_throughput = 0.
         ctx = mp.get_context("spawn")
         for i in range(1, config.tensor_parallel_size):
             event = ctx.Event()
@@ -48,12 +122,14 @@ class LLMEngine:
         atexit.register(self.exit)
 
     def exit(self):
+        self._stop_engine_loop()
         self.model_runner.call("exit")
         del self.model_runner
         for p in self.ps:
             p.join()
 
-    def add_request(self, prompt: str | list[int], sampling_params: SamplingParams, unconditional_prompt: str | list[int] | None = None):
+    def add_request(self, prompt: str | list[int], sampling_params: SamplingParams, unconditional_prompt: str | list[int] | None = None) -> Sequence:
+        """Queue one prompt and return its (conditional) sequence."""
         if isinstance(prompt, str):
             prompt = self.tokenizer.encode(prompt)
         # For CFG: if cfg_scale > 1.0, create both conditional and unconditional sequences
@@ -77,14 +153,19 @@ class LLMEngine:
             # Add both sequences to scheduler
             self.scheduler.add(cond_seq)
             self.scheduler.add(uncond_seq)
+            return cond_seq
         else:
             seq = Sequence(prompt, sampling_params)
             self.scheduler.add(seq)
+            return seq
 
     def step(self):
         seqs, is_prefill = self.scheduler.schedule()
         token_ids = self.model_runner.call("run", seqs, is_prefill)
         self.scheduler.postprocess(seqs, token_ids)
+        finished_ids = [seq.seq_id for seq in seqs if seq.is_finished]
+        if finished_ids:
+            self.model_runner.call("release_sequences", finished_ids)
         # Only output conditional sequences (unconditional sequences are just for CFG computation)
         output_seqs = [seq for seq in seqs if seq.is_finished and (seq.cfg_scale <= 1.0 or not seq.is_unconditional)]
         outputs = [(seq.seq_id, seq.completion_token_ids) for seq in output_seqs]
@@ -94,85 +175,185 @@ class LLMEngine:
     def is_finished(self):
         return self.scheduler.is_finished()
 
+    def _release(self, seq: Sequence):
+        """Drop a sequence from the scheduler queues and free its KV blocks."""
+        if seq in self.scheduler.running:
+            self.scheduler.running.remove(seq)
+        if seq in self.scheduler.waiting:
+            self.scheduler.waiting.remove(seq)
+        if seq.block_table:  # Only deallocate if blocks are allocated
+            self.scheduler.block_manager.deallocate(seq)
+        self.model_runner.call("release_sequences", [seq.seq_id])
+
+    def get_prefix_cache_stats(self) -> dict:
+        """Hit/miss counters and pool size of the cross-request prefix KV cache.
+
+        Read without ``_step_lock`` so a stats request (e.g. from an async
+        HTTP handler) never waits for a decode step; the counters are plain
+        ints and may be one step apart from each other.
+        """
+        return self.scheduler.block_manager.get_prefix_cache_stats()
+
     def reset(self):
         """
-        Reset the scheduler state and release all allocated blocks.
-        This should be called when an exception occurs during generation to prevent
-        KV cache block leaks that can cause 'deque index out of range' errors.
+        Release sequences that no live request owns (residue of an interrupted
+        generation) and free their KV blocks. This should be called when an
+        exception occurs during generation to prevent KV cache block leaks that
+        can cause 'deque index out of range' errors. Sequences of requests still
+        being served by the engine loop are left untouched.
         """
-        # Deallocate all running sequences
-        while self.scheduler.running:
-            seq = self.scheduler.running.popleft()
-            if seq.block_table:  # Only deallocate if blocks are allocated
-                self.scheduler.block_manager.deallocate(seq)
-        
-        # Deallocate all waiting sequences (they might have blocks from preemption)
-        while self.scheduler.waiting:
-            seq = self.scheduler.waiting.popleft()
-            if seq.block_table:
-                self.scheduler.block_manager.deallocate(seq)
+        with self._step_lock:
+            owned = {id(s) for _, _, group in self._active.values() for s in group}
+            for seq in list(self.scheduler.running) + list(self.scheduler.waiting):
+                if id(seq) not in owned:
+                    self._release(seq)
 
-    def generate(
+    def abort(self, request: GenerationRequest, exc: BaseException | None = None):
+        """Stop serving a request and free its sequences."""
+        with self._step_lock:
+            for seq_id, (owner, _, group) in list(self._active.items()):
+                if owner is request:
+                    del self._active[seq_id]
+                    for seq in group:
+                        self._release(seq)
+        request._set_exception(exc or RuntimeError("Generation request aborted"))
+
+    def submit(
         self,
         prompts: list[str] | list[list[int]],
         sampling_params: SamplingParams | list[SamplingParams],
-        use_tqdm: bool = True,
         unconditional_prompts: list[str] | list[list[int]] | None = None,
-    ) -> list[str]:
-        # Serialize access to the engine to prevent concurrent corruption of
-        # scheduler state, block manager, CUDA graph buffers, and KV cache.
-        # This is the primary defense against the intermittent CUDA device-side
-        # assertion error that occurs in concurrent serving scenarios.
-        with self._generate_lock:
-            return self._generate_impl(prompts, sampling_params, use_tqdm, unconditional_prompts)
-
-    def _generate_impl(
+    ) -> GenerationRequest:
+        """Enqueue prompts for the engine loop and return a handle without blocking.
+
+        Prompts from concurrent submissions are admitted between steps and decoded
+        in the same batches as requests already in flight.
+        """
+        if not isinstance(sampling_params, list):
+            sampling_params = [sampling_params] * len(prompts)
+        if unconditional_prompts is None:
+            unconditional_prompts = [None] * len(prompts)
+        request = GenerationRequest(len(prompts))
+        if not prompts:
+            return request
+        with self._loop_cond:
+            self._pending.append((request, list(prompts), list(sampling_params), list(unconditional_prompts)))
+            self._ensure_engine_loop()
+            self._loop_cond.notify()
+        return request
+
+    def _ensure_engine_loop(self):
+        """Start the engine-loop thread on first use (caller holds _loop_cond)."""
+        if self._loop_thread is not None and self._loop_thread.is_alive():
+            return
+        self._stop_loop = False
+        self._loop_thread = threading.Thread(target=self._engine_loop, name="nanovllm-engine-loop", daemon=True)
+        self._loop_thread.start()
+
+    def _stop_engine_loop(self):
+        with self._loop_cond:
+            self._stop_loop = True
+            self._loop_cond.notify_all()
+        thread = self._loop_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._loop_thread = None
+
+    def _admit(self, request: GenerationRequest, prompts, sampling_params, unconditional_prompts):
+        """Add one submission to the scheduler (caller holds _step_lock)."""
+        admitted = []
+        try:
+            for index, (prompt, sp, uncond_prompt) in enumerate(zip(prompts, sampling_params, unconditional_prompts)):
+                seq = self.add_request(prompt, sp, uncond_prompt)
+                group = [seq] if seq.paired_seq is None else [seq, seq.paired_seq]
+                admitted.append(seq.seq_id)
+                self._active[seq.seq_id] = (request, index, group)
+        except Exception as exc:
+            # e.g. tokenization failure: drop what was queued for this request only
+            for seq_id in admitted:
+                for seq in self._active.pop(seq_id)[2]:
+                    self._release(seq)
+            request._set_exception(exc)
+
+    def _fail_active(self, exc: BaseException):
+        """Fail every in-flight request after a step error and free all blocks."""
+        with self._step_lock:
+            requests = {id(owner): owner for owner, _, _ in self._active.values()}
+            self._active.clear()
+            self.reset()
+        for request in requests.values():
+            request._set_exception(exc)
+
+    def _engine_loop(self):
+        # CUDA's current device is per thread; match the rank-0 model runner.
+        if torch.cuda.is_available():
+            torch.cuda.set_device(self.model_runner.rank)
+        while True:
+            with self._loop_cond:
+                while not self._stop_loop and not self._pending and not self._active:
+                    self._loop_cond.wait()
+                if self._stop_loop:
+                    break
+                pending, self._pending = self._pending, []
+            finished = []
+            with self._step_lock:
+                for submission in pending:
+                    self._admit(*submission)
+                if not self._active:
+                    continue
+                if self.is_finished():
+                    # Owned sequences vanished from the scheduler; never leave waiters hanging
+                    self._fail_active(RuntimeError("Scheduler lost in-flight sequences"))
+                    continue
+                try:
+                    t = perf_counter()
+                    output, num_tokens = self.step()
+                    if num_tokens > 0:
+                        self.prefill_throughput = num_tokens / (perf_counter() - t)
+                    else:
+                        self.decode_throughput = -num_tokens / (perf_counter() - t)
+                except Exception as exc:
+                    self._fail_active(exc)
+                    continue
+                for seq_id, token_ids in output:
+                    entry = self._active.pop(seq_id, None)
+                    if entry is not None:
+                        finished.append((entry, token_ids))
+            # Decode and notify outside the step lock so waiters never stall the loop
+            for (request, index, _), token_ids in finished:
+                try:
+                    text = self.tokenizer.decode(token_ids)
+                except Exception as exc:
+                    self.abort(request, exc)
+                    continue
+                request._set_output(index, {"text": text, "token_ids": token_ids})
+
+    def generate(
         self,
         prompts: list[str] | list[list[int]],
         sampling_params: SamplingParams | list[SamplingParams],
         use_tqdm: bool = True,
         unconditional_prompts: list[str] | list[list[int]] | None = None,
     ) -> list[str]:
-        # Clean up any residual state from previous interrupted generations
-        # This prevents 'deque index out of range' errors from accumulated block leaks
-        if not self.is_finished():
-            self.reset()
-        
+        # Blocking wrapper around submit(): concurrent callers are batched together
+        # by the engine loop instead of taking turns on a global lock.
+        request = self.submit(prompts, sampling_params, unconditional_prompts)
         if use_tqdm:
             pbar = tqdm(total=len(prompts), desc="Generating", dynamic_ncols=True)
-        if not isinstance(sampling_params, list):
-            sampling_params = [sampling_params] * len(prompts)
-        if unconditional_prompts is None:
-            unconditional_prompts = [None] * len(prompts)
-        for prompt, sp, uncond_prompt in zip(prompts, sampling_params, unconditional_prompts):
-            self.add_request(prompt, sp, uncond_prompt)
-        outputs = {}
-        prefill_throughput = decode_throughput = 0.
         try:
-            while not self.is_finished():
-                t = perf_counter()
-                output, num_tokens = self.step()
+            for _ in request.stream():
                 if use_tqdm:
-                    if num_tokens > 0:
-                        prefill_throughput = num_tokens / (perf_counter() - t)
-                    else:
-                        decode_throughput = -num_tokens / (perf_counter() - t)
                     pbar.set_postfix({
-                        "Prefill": f"{int(prefill_throughput)}tok/s",
-                        "Decode": f"{int(decode_throughput)}tok/s",
+                        "Prefill": f"{int(self.prefill_throughput)}tok/s",
+                        "Decode": f"{int(self.decode_throughput)}tok/s",
                     })
-                for seq_id, token_ids in output:
-                    outputs[seq_id] = token_ids
-                    if use_tqdm:
-                        pbar.update(1)
-        except Exception:
-            # Clean up on exception to prevent block leaks
-            self.reset()
+                    pbar.update(1)
+        except BaseException as exc:
+            # Free this request's blocks if the caller is interrupted while waiting
+            if not request.done():
+                self.abort(request, exc)
             raise
         finally:
             if use_tqdm:
                 pbar.close()
-        
-        outputs = [outputs[seq_id] for seq_id in sorted(outputs.keys())]
-        outputs = [{"text": self.tokenizer.decode(token_ids), "token_ids": token_ids} for token_ids in outputs]
-        return outputs
+        return request.result()
@@ -0,0 +1,251 @@
+"""Tests for the continuous-batching engine loop and mixed-batch scheduling.
+
+The engine is built around a stub model runner and a small real scheduler,
+so the whole submit / step / postprocess path runs on the CPU.
+"""
+
+import threading
+import unittest
+from types import SimpleNamespace
+
+from nanovllm.engine.llm_engine import LLMEngine
+from nanovllm.engine.scheduler import Scheduler
+from nanovllm.engine.sequence import Sequence, SequenceStatus
+from nanovllm.sampling_params import SamplingParams
+
+_BLOCK_SIZE = 4
+_EOS = 0
+_TOKEN = 7
+
+
+def _config(num_blocks=64, max_num_seqs=16):
+    """Scheduler config with a tiny block size."""
+    return SimpleNamespace(
+        max_num_seqs=max_num_seqs,
+        max_num_batched_tokens=4096,
+        eos=_EOS,
+        num_kvcache_blocks=num_blocks,
+        kvcache_block_size=_BLOCK_SIZE,
+    )
+
+
+class _Tokenizer:
+    """Tokenizer stand-in: one token per character, decoded as a count."""
+
+    def encode(self, text):
+        return [ord(c) for c in text]
+
+    def decode(self, token_ids):
+        return f"{len(token_ids)} tokens"
+
+
+class _Runner:
+    """Model runner stand-in that samples a fixed token for every sequence.
+
+    ``pause_at`` blocks the given step until ``resume`` is set, so a test
+    can act while a step is in flight.  Released sequence ids are recorded
+    in ``released``.
+    """
+
+    rank = 0
+
+    def __init__(self, pause_at=None, fail_at=None):
+        self.batches = []
+        self.released = []
+        self.pause_at = pause_at
+        self.fail_at = fail_at
+        self.paused = threading.Event()
+        self.resume = threading.Event()
+
+    def call(self, method, *args):
+        if method == "release_sequences":
+            self.released.extend(args[0])
+            return None
+        assert method == "run"
+        seqs, is_prefill = args
+        self.batches.append(([s.seq_id for s in seqs], is_prefill))
+        step = len(self.batches)
+        if step == self.pause_at:
+            self.paused.set()
+            self.resume.wait(5)
+        if step == self.fail_at:
+            raise RuntimeError("device lost")
+        return [_TOKEN for s in seqs if not s.is_unconditional]
+
+
+def _engine(runner, num_blocks=64):
+    """LLMEngine wired to ``runner`` without loading a model."""
+    engine = LLMEngine.__new__(LLMEngine)
+    engine._step_lock = threading.RLock()
+    engine._loop_cond = threading.Condition()
+    engine._pending = []
+    engine._active = {}
+    engine._loop_thread = None
+    engine._stop_loop = False
+    engine.prefill_throughput = 0.
+    engine.decode_throughput = 0.
+    engine.model_runner = runner
+    engine.tokenizer = _Tokenizer()
+    engine.scheduler = Scheduler(_config(num_blocks))
+    return engine
+
+
+class _BlockSizeMixin:
+    """Run with a 4-token KV block so tests stay small."""
+
+    def setUp(self):
+        self._block_size = Sequence.block_size
+        Sequence.block_size = _BLOCK_SIZE
+
+    def tearDown(self):
+        Sequence.block_size = self._block_size
+
+
+class EngineLoopTests(_BlockSizeMixin, unittest.TestCase):
+    """Tests for LLMEngine.submit / GenerationRequest / abort."""
+
+    def tearDown(self):
+        self.engine._stop_engine_loop()
+        super().tearDown()
+
+    def test_concurrent_submissions_share_decode_batches(self):
+        """Two requests are admitted together and decoded in the same steps."""
+        runner = _Runner(pause_at=1)
+        self.engine = _engine(runner)
+        first = self.engine.submit([[1, 2, 3]], SamplingParams(max_tokens=5))
+        runner.paused.wait(5)
+        second = self.engine.submit([[4, 5, 6]], SamplingParams(max_tokens=3))
+        runner.resume.set()
+        self.assertEqual(first.result(5)[0]["token_ids"], [_TOKEN] * 5)
+        self.assertEqual(second.result(5)[0], {"text": "3 tokens", "token_ids": [_TOKEN] * 3})
+        self.assertTrue(any(len(ids) == 2 and not prefill for ids, prefill in runner.batches))
+        self.assertEqual(sorted(runner.released), sorted({i for ids, _ in runner.batches for i in ids}))
+        manager = self.engine.scheduler.block_manager
+        self.assertEqual(manager.num_free_blocks, len(manager.blocks))
+
+    def test_stream_yields_outputs_in_completion_order(self):
+        """stream() reports each prompt as soon as it finishes."""
+        self.engine = _engine(_Runner())
+        params = [SamplingParams(max_tokens=n) for n in (6, 2, 4)]
+        request = self.engine.submit([[1, 2], [3, 4], [5, 6]], params)
+        order = [index for index, _ in request.stream(timeout=5)]
+        self.assertEqual(order, [1, 2, 0])
+        self.assertEqual([len(o["token_ids"]) for o in request.result()], [6, 2, 4])
+
+    def test_abort_mid_generation_frees_blocks_and_keeps_others_running(self):
+        """An aborted request fails at once, releases its KV blocks and stops decoding."""
+        runner = _Runner(pause_at=3)
+        self.engine = _engine(runner)
+        doomed = self.engine.submit([[1, 2, 3]], SamplingParams(max_tokens=50, cfg_scale=2.0))
+        survivor = self.engine.submit([[4, 5, 6]], SamplingParams(max_tokens=6))
+        runner.paused.wait(5)
+        # Holding _loop_cond parks the loop right after the paused step, so
+        # abort() runs between two steps of the doomed request.
+        with self.engine._loop_cond:
+            runner.resume.set()
+            self.engine.abort(doomed)
+        with self.assertRaises(RuntimeError):
+            doomed.result(5)
+        self.assertEqual(len(survivor.result(5)[0]["token_ids"]), 6)
+        self.assertLess(len(runner.batches), 10)
+        self.assertEqual(set(runner.released), {i for ids, _ in runner.batches for i in ids})
+        manager = self.engine.scheduler.block_manager
+        self.assertEqual(manager.num_free_blocks, len(manager.blocks))
+        self.assertTrue(self.engine.scheduler.is_finished())
+
+    def test_step_failure_fails_every_request(self):
+        """A runner error reaches all in-flight requests and frees all blocks."""
+        # Step 1 prefills the first request, step 2 the second, step 3 decodes both
+        runner = _Runner(pause_at=1, fail_at=3)
+        self.engine = _engine(runner)
+        requests = [self.engine.submit([[1, 2]], SamplingParams(max_tokens=9))]
+        runner.paused.wait(5)
+        requests.append(self.engine.submit([[5, 6]], SamplingParams(max_tokens=9)))
+        runner.resume.set()
+        for request in requests:
+            with self.assertRaisesRegex(RuntimeError, "device lost"):
+                request.result(5)
+        manager = self.engine.scheduler.block_manager
+        self.assertEqual(manager.num_free_blocks, len(manager.blocks))
+
+    def test_prefix_cache_stats_do_not_wait_for_a_step(self):
+        """Stats are readable while a step holds the step lock."""
+        self.engine = _engine(_Runner())
+        result = []
+        with self.engine._step_lock:
+            reader = threading.Thread(target=lambda: result.append(self.engine.get_prefix_cache_stats()))
+            reader.start()
+            reader.join(5)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["total_blocks"], 64)
+
+    def test_generate_blocks_until_done(self):
+        """generate() is a blocking wrapper around submit()."""
+        self.engine = _engine(_Runner())
+        outputs = self.engine.generate(["ab", "cd"], SamplingParams(max_tokens=2), use_tqdm=False)
+        self.assertEqual([o["text"] for o in outputs], ["2 tokens", "2 tokens"])
+
+
+class SchedulerTests(_BlockSizeMixin, unittest.TestCase):
+    """Tests for per-pair postprocess and CFG-aware preemption."""
+
+    @staticmethod
+    def _pair(prompt, max_tokens=10):
+        """Linked conditional / unconditional CFG sequences."""
+        params = SamplingParams(max_tokens=max_tokens, cfg_scale=2.0)
+        uncond = Sequence(prompt, params, is_unconditional=True)
+        cond = Sequence(prompt, params, conditional_seq=uncond)
+        uncond.paired_seq = cond
+        return cond, uncond
+
+    def test_postprocess_mixed_batch_finishes_pair_together(self):
+        """One sampled token per plain sequence and per pair; a finished pair frees both halves."""
+        scheduler = Scheduler(_config())
+        plain = Sequence([1, 2, 3], SamplingParams(max_tokens=5))
+        cond, uncond = self._pair([4, 5, 6], max_tokens=1)
+        for seq in (plain, cond, uncond):
+            scheduler.add(seq)
+        seqs, is_prefill = scheduler.schedule()
+        self.assertTrue(is_prefill)
+        self.assertEqual(seqs, [plain, cond, uncond])
+        scheduler.postprocess(seqs, [11, 12])
+        self.assertEqual(plain.completion_token_ids, [11])
+        self.assertEqual(cond.completion_token_ids, [12])
+        self.assertEqual(uncond.completion_token_ids, [12])
+        self.assertTrue(cond.is_finished and uncond.is_finished)
+        self.assertEqual((cond.block_table, uncond.block_table), ([], []))
+        self.assertEqual(list(scheduler.running), [plain])
+
+    def test_preemption_moves_cfg_pair_together(self):
+        """Out of blocks, the victim CFG pair goes back to waiting conditional-first."""
+        scheduler = Scheduler(_config(num_blocks=3))
+        plain = Sequence([1, 2, 3], SamplingParams(max_tokens=10))
+        cond, uncond = self._pair([4, 5, 6])
+        for seq in (plain, cond, uncond):
+            scheduler.add(seq)
+        for _ in range(2):
+            seqs, _ = scheduler.schedule()
+            scheduler.postprocess(seqs, [_TOKEN] * 2)
+        # Every sequence now needs a fresh block and none is free
+        seqs, is_prefill = scheduler.schedule()
+        self.assertFalse(is_prefill)
+        self.assertEqual(seqs, [plain])
+        self.assertEqual(list(scheduler.waiting), [cond, uncond])
+        self.assertTrue(all(s.status == SequenceStatus.WAITING and not s.block_table for s in (cond, uncond)))
+
+    def test_pair_with_nothing_to_preempt_does_not_spin(self):
+        """A lone pair that cannot grow is re-queued and reported instead of looping forever."""
+        scheduler = Scheduler(_config(num_blocks=2))
+        cond, uncond = self._pair([1, 2, 3])
+        scheduler.add(cond)
+        scheduler.add(uncond)
+        for _ in range(2):
+            seqs, _ = scheduler.schedule()
+            scheduler.postprocess(seqs, [_TOKEN])
+        with self.assertRaisesRegex(RuntimeError, "Insufficient KV cache"):
+            scheduler.schedule()
+        self.assertEqual(list(scheduler.waiting), [cond, uncond])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -176,6 +176,14 @@ class ModelRunner:
         # Pre-allocate buffer for sequence token IDs (used in logits processor and sampler)
         # Max length is max_model_len since sequences can be that long
         self._seq_token_ids_buffer = torch.zeros(max_bs, self.config.max_model_len, dtype=torch.int64, device="cpu", pin_memory=True)
+        
+        # Completion token counts for the repetition penalty, one device row per penalized
+        # sequence. Rows are assigned on demand, updated incrementally after each sampling
+        # step instead of being rebuilt from token lists, and freed by release_sequences()
+        # when a sequence finishes or is aborted; the table is sized to the live rows.
+        self._token_counts: torch.Tensor | None = None
+        self._token_count_rows: dict[int, int] = {}  # seq_id -> row in _token_counts
+        self._token_count_lens: dict[int, int] = {}  # seq_id -> completion tokens counted
         debug_end("_allocate_sample_buffers", _t0, prefix="tensor.vllm")
 
     def exit(self):
@@ -399,10 +407,10 @@ class ModelRunner:
             if seq.top_k is not None and seq.top_k > 0:
                 top_ks_is_zero = False
             self._cpu_top_ps[i] = seq.top_p if seq.top_p is not None else 1.0
-            if seq.top_p is not None and seq.top_p == 1.0:
+            if seq.top_p is not None and seq.top_p != 1.0:
                 top_ps_is_one = False
             self._cpu_repetition_penalties[i] = seq.repetition_penalty if seq.repetition_penalty is not None else 1.0
-            if seq.repetition_penalty is not None and seq.repetition_penalty == 1.0:
+            if seq.repetition_penalty is not None and seq.repetition_penalty != 1.0:
                 repetition_penalties_is_one = False
         
         # Transfer to GPU using sliced views (single batched transfer)
@@ -490,166 +498,220 @@ class ModelRunner:
             return out
 
     def run(self, seqs: list[Sequence], is_prefill: bool) -> list[int]:
-        """Run model forward and sampling. For CFG sequences, batch is structured as:
-        [cond_seq1, cond_seq2, ..., uncond_seq1, uncond_seq2, ...]
-        where uncond_seqi is the paired unconditional sequence of cond_seqi."""
+        """Run model forward and sampling. The scheduler may mix requests, so a batch is laid out as:
+        [plain_seq1, ..., cond_seq1, cond_seq2, ..., uncond_seq1, uncond_seq2, ...]
+        where uncond_seqi is the paired unconditional sequence of cond_seqi. One token is returned
+        per non-unconditional sequence, in batch order."""
         _debug_log(f"run: num_seqs={len(seqs)}, is_prefill={is_prefill}")
         for i, seq in enumerate(seqs):
             _debug_log(f"  seq[{i}]: len={len(seq)}, num_blocks={seq.num_blocks}, "
                       f"cfg_scale={seq.cfg_scale}, is_uncond={seq.is_unconditional}, "
                       f"block_table={seq.block_table}")
         
-        # Check if this is a CFG batch (contains paired conditional and unconditional sequences)
-        is_cfg_batch = seqs[0].cfg_scale > 1.0 and seqs[0].paired_seq is not None
-        _debug_log(f"  is_cfg_batch={is_cfg_batch}")
-        if is_cfg_batch:
-            # CFG batch: seqs = [cond_seq1, cond_seq2, ..., uncond_seq1, uncond_seq2, ...]
-            num_cond = len(seqs) // 2
-            cond_seqs = seqs[:num_cond]
-            # uncond_seqs = seqs[num_cond:]
-            
-            # Prepare inputs for both conditional and unconditional (they're already in the batch)
-            input_ids, positions = (self.prepare_prefill(seqs) if is_prefill else self.prepare_decode(seqs))
-            sample_params = self.prepare_sample(seqs, is_cfg_batch=True) if self.rank == 0 else None
-            if sample_params is not None:
-                temperatures, cfg_scales, top_ks, top_ps, repetition_penalties = sample_params
-            else:
-                temperatures = cfg_scales = top_ks = top_ps = repetition_penalties = None
-            
-            # Run model forward (processes entire batch: cond + uncond)
-            logits_all = self.run_model(input_ids, positions, is_prefill)
-            reset_context()
-            
-            if self.rank == 0:
-                # Split logits: first half is conditional, second half is unconditional
-                logits_cond = logits_all[:num_cond]
-                logits_uncond = logits_all[num_cond:]
-                
-                # Apply repetition penalty to conditional logits (before CFG)
-                if repetition_penalties is not None:
-                    for i, seq in enumerate(cond_seqs):
-                        penalty = repetition_penalties[i].item()
-                        if penalty != 1.0:
-                            # Only penalize completion tokens (not prompt tokens)
-                            completion_tokens = torch.tensor(seq.completion_token_ids, device=logits_cond.device)
-                            if len(completion_tokens) > 0:
-                                # Create token mask: mark tokens that appeared in completion
-                                token_mask = torch.zeros(logits_cond.shape[1], dtype=torch.bool, device=logits_cond.device)
-                                token_mask[completion_tokens] = True
-                                
-                                # Apply standard repetition penalty formula (matching transformers implementation):
-                                # For tokens in completion: if score < 0 then score * penalty, else score / penalty
-                                penalty_scores = torch.where(
-                                    logits_cond[i] < 0,
-                                    logits_cond[i] * penalty,
-                                    logits_cond[i] / penalty
-                                )
-                                # Only apply penalty to tokens that appeared in completion
-                                logits_cond[i] = torch.where(token_mask, penalty_scores, logits_cond[i])
-                
-                # Apply CFG formula: logits_cfg = logits_uncond + cfg_scale * (logits_cond - logits_uncond)
-                cfg_scales_tensor = cfg_scales.unsqueeze(1)  # [num_cond, 1]
-                logits_cfg = logits_uncond + cfg_scales_tensor * (logits_cond - logits_uncond)
-                
-                # Apply logits processor for constrained decoding (if any sequence has one)
-                for i, seq in enumerate(cond_seqs):
-                    if seq.logits_processor is not None:
-                        # Create input_ids tensor for this sequence
-                        seq_input_ids = torch.tensor([seq.token_ids], device=logits_cfg.device)
-                        # Apply processor to this sequence's logits
-                        logits_cfg[i:i+1] = seq.logits_processor(seq_input_ids, logits_cfg[i:i+1])
-                
-                # Prepare input_ids for sampler (for repetition penalty, though we already applied it)
-                # cond_input_ids = torch.tensor([seq.token_ids for seq in cond_seqs], device=logits_cfg.device)
-                
-                # Sample from CFG logits
-                token_ids_cfg = self.sampler(
-                    logits_cfg, 
-                    temperatures,
-                    top_ks=top_ks if top_ks is not None else None,
-                    top_ps=top_ps if top_ps is not None else None,
-                    repetition_penalties=None,  # Already applied above
-                    # input_ids=cond_input_ids,
-                ).tolist()
-                
-                # Update logits processor state after sampling
-                # NOTE: Only update for the first sequence since all sequences share the same processor
-                # Updating multiple times would cause duplicate state updates (e.g., codes_count += N instead of += 1)
-                if cond_seqs and cond_seqs[0].logits_processor_update_state is not None:
-                    cond_seqs[0].logits_processor_update_state(token_ids_cfg[0])
-                
-                # Return token_ids (will be applied to both conditional and unconditional sequences)
-                return token_ids_cfg
-            else:
-                return None
+        # Unconditional sequences trail the batch and mirror the last num_uncond sampled rows
+        num_uncond = sum(1 for seq in seqs if seq.is_unconditional)
+        num_sampled = len(seqs) - num_uncond
+        num_plain = num_sampled - num_uncond
+        sampled_seqs = seqs[:num_sampled]
+        _debug_log(f"  num_plain={num_plain}, num_cfg_pairs={num_uncond}")
+        
+        input_ids, positions = (self.prepare_prefill(seqs) if is_prefill else self.prepare_decode(seqs))
+        sample_params = self.prepare_sample(sampled_seqs) if self.rank == 0 else None
+        if sample_params is not None:
+            temperatures, cfg_scales, top_ks, top_ps, repetition_penalties = sample_params
         else:
-            # Normal batch (non-CFG)
-            input_ids, positions = (self.prepare_prefill(seqs) if is_prefill 
-                                   else self.prepare_decode(seqs))
-            sample_params = self.prepare_sample(seqs, is_cfg_batch=False) if self.rank == 0 else None
-            if sample_params is not None:
-                temperatures, cfg_scales, top_ks, top_ps, repetition_penalties = sample_params
+            temperatures = cfg_scales = top_ks = top_ps = repetition_penalties = None
+        
+        # Run model forward (processes entire batch: plain + cond + uncond)
+        logits_all = self.run_model(input_ids, positions, is_prefill)
+        reset_context()
+        
+        if self.rank != 0:
+            return None
+        
+        # Clone logits to avoid in-place update issues in inference mode
+        logits = logits_all[:num_sampled].clone()
+        
+        # Apply repetition penalty (before CFG for conditional rows)
+        penalty_seqs = []
+        if repetition_penalties is not None:
+            penalty_rows = [i for i, seq in enumerate(sampled_seqs)
+                            if seq.repetition_penalty is not None and seq.repetition_penalty != 1.0]
+            penalty_seqs = [sampled_seqs[i] for i in penalty_rows]
+            penalty_rows = torch.tensor(penalty_rows, dtype=torch.int64, device=logits.device)
+            count_rows = self._get_token_count_rows(penalty_seqs, logits.shape[1], logits.device)
+            self._apply_repetition_penalty(logits, penalty_rows, count_rows, repetition_penalties)
+        
+        # Apply CFG formula on the conditional rows: logits_uncond + cfg_scale * (logits_cond - logits_uncond)
+        if num_uncond > 0:
+            logits_cond = logits[num_plain:]
+            logits_uncond = logits_all[num_sampled:]
+            cfg_scales_tensor = cfg_scales[num_plain:].unsqueeze(1)  # [num_cond, 1]
+            logits[num_plain:] = logits_uncond + cfg_scales_tensor * (logits_cond - logits_uncond)
+        
+        # Apply logits processors for constrained decoding (if any sequence has one).
+        # Processors exposing process_batch()/update_states() keep FSM state per sequence
+        # and handle all of their rows in a single call, keyed by seq_id; others are
+        # called once per row.
+        batched_processors = {}
+        for i, seq in enumerate(sampled_seqs):
+            processor = seq.logits_processor
+            if processor is None:
+                continue
+            if hasattr(processor, "process_batch") and hasattr(processor, "update_states"):
+                batched_processors.setdefault(id(processor), (processor, []))[1].append(i)
             else:
-                temperatures = cfg_scales = top_ks = top_ps = repetition_penalties = None
-            logits = self.run_model(input_ids, positions, is_prefill)
-            reset_context()
-            
-            if self.rank == 0:
-                # Apply repetition penalty to logits
-                if repetition_penalties is not None:
-                    for i, seq in enumerate(seqs):
-                        penalty = repetition_penalties[i].item()
-                        if penalty != 1.0:
-                            # Only penalize completion tokens (not prompt tokens)
-                            completion_tokens = torch.tensor(seq.completion_token_ids, device=logits.device)
-                            if len(completion_tokens) > 0:
-                                # Create token mask: mark tokens that appeared in completion
-                                token_mask = torch.zeros(logits.shape[1], dtype=torch.bool, device=logits.device)
-                                token_mask[completion_tokens] = True
-                                
-                                # Apply standard repetition penalty formula (matching transformers implementation):
-                                # For tokens in completion: if score < 0 then score * penalty, else score / penalty
-                                penalty_scores = torch.where(
-                                    logits[i] < 0,
-                                    logits[i] * penalty,
-                                    logits[i] / penalty
-                                )
-                                # Only apply penalty to tokens that appeared in completion
-                                logits[i] = torch.where(token_mask, penalty_scores, logits[i])
-                
-                # Apply logits processor for constrained decoding (if any sequence has one)
-                # Clone logits to avoid in-place update issues in inference mode
-                logits = logits.clone()
-                for i, seq in enumerate(seqs):
-                    if seq.logits_processor is not None:
-                        # Create input_ids tensor for this sequence
-                        seq_input_ids = torch.tensor([seq.token_ids], device=logits.device)
-                        # Apply processor to this sequence's logits (clone to avoid inference mode issues)
-                        processed = seq.logits_processor(seq_input_ids, logits[i:i+1].clone())
-                        logits[i] = processed[0]
-                
-                # Prepare input_ids for sampler
-                # seq_input_ids = torch.tensor([seq.token_ids for seq in seqs], device=logits.device)
-                
-                token_ids = self.sampler(
-                    logits, 
-                    temperatures,
-                    top_ks=top_ks if top_ks is not None else None,
-                    top_ps=top_ps if top_ps is not None else None,
-                    repetition_penalties=None,  # Already applied above
-                    # input_ids=seq_input_ids,
-                ).tolist()
-                
-                # Update logits processor state after sampling
-                # NOTE: Only update for the first sequence since all sequences may share the same processor
-                # (when using a single SamplingParams for batch generation)
-                # Updating multiple times would cause duplicate state updates (e.g., codes_count += N instead of += 1)
-                if seqs and seqs[0].logits_processor_update_state is not None:
-                    seqs[0].logits_processor_update_state(token_ids[0])
-                
-                return token_ids
+                # Create input_ids tensor for this sequence
+                seq_input_ids = torch.tensor([seq.token_ids], device=logits.device)
+                # Apply processor to this sequence's logits (clone to avoid inference mode issues)
+                processed = seq.logits_processor(seq_input_ids, logits[i:i+1].clone())
+                logits[i] = processed[0]
+        for processor, rows in batched_processors.values():
+            row_seqs = [sampled_seqs[i] for i in rows]
+            if rows[-1] - rows[0] + 1 == len(rows):
+                # Contiguous rows (the common case): operate on a slice
+                row_slice = slice(rows[0], rows[-1] + 1)
+                logits[row_slice] = processor.process_batch(
+                    logits[row_slice],
+                    input_ids=[seq.token_ids for seq in row_seqs],
+                    seq_keys=[seq.seq_id for seq in row_seqs],
+                )
             else:
-                return None
+                row_index = torch.tensor(rows, device=logits.device)
+                processed = processor.process_batch(
+                    logits.index_select(0, row_index),
+                    input_ids=[seq.token_ids for seq in row_seqs],
+                    seq_keys=[seq.seq_id for seq in row_seqs],
+                )
+                logits.index_copy_(0, row_index, processed.to(logits.dtype))
+        
+        token_ids = self.sampler(
+            logits,
+            temperatures,
+            top_ks=top_ks if top_ks is not None else None,
+            top_ps=top_ps if top_ps is not None else None,
+            repetition_penalties=None,  # Already applied above
+        )
+        if penalty_seqs:
+            # Sampled tokens are appended to their sequences by the scheduler
+            self._count_sampled_tokens(count_rows, token_ids.index_select(0, penalty_rows), penalty_seqs)
+        token_ids = token_ids.tolist()
+        
+        # Update logits processor state after sampling.
+        # Per-sequence (batched) processors get every row's token. Legacy processors keep a
+        # single state shared by all sequences of one generate() call, so each distinct
+        # callback is updated once (with its first sequence's token); updating it per sequence
+        # would cause duplicate state updates (e.g., codes_count += N instead of += 1).
+        for processor, rows in batched_processors.values():
+            processor.update_states(
+                [token_ids[i] for i in rows],
+                seq_keys=[sampled_seqs[i].seq_id for i in rows],
+            )
+        updated_callbacks = set()
+        for seq, token_id in zip(sampled_seqs, token_ids):
+            if seq.logits_processor is not None and id(seq.logits_processor) in batched_processors:
+                continue
+            callback = seq.logits_processor_update_state
+            if callback is not None and callback not in updated_callbacks:
+                updated_callbacks.add(callback)
+                callback(token_id)
+        
+        return token_ids
+
+    def _get_token_count_rows(self, seqs: list[Sequence], vocab_size: int, device: torch.device) -> torch.Tensor:
+        """Return the _token_counts row of each sequence, assigning and (re)building rows as needed.
+        
+        A row is rebuilt from the sequence's completion tokens when the sequence is new to the
+        runner or its counted length no longer matches (e.g. the row was evicted meanwhile).
+        """
+        if self._token_counts is None or self._token_counts.size(1) != vocab_size:
+            self._token_counts = torch.zeros(0, vocab_size, dtype=torch.int32, device=device)
+            self._token_count_rows.clear()
+            self._token_count_lens.clear()
+        rows = []
+        stale = []
+        live_ids = {seq.seq_id for seq in seqs}
+        for seq in seqs:
+            row = self._token_count_rows.get(seq.seq_id)
+            if row is None:
+                row = self._assign_token_count_row(seq.seq_id, live_ids)
+                stale.append((seq, row))
+            elif self._token_count_lens[seq.seq_id] != seq.num_completion_tokens:
+                stale.append((seq, row))
+            rows.append(row)
+        for seq, row in stale:
+            completion = torch.tensor(seq.completion_token_ids, dtype=torch.int64, device=device)
+            self._token_counts[row] = torch.bincount(completion, minlength=vocab_size)[:vocab_size]
+            self._token_count_lens[seq.seq_id] = seq.num_completion_tokens
+        return torch.tensor(rows, dtype=torch.int64, device=device)
+
+    def _assign_token_count_row(self, seq_id: int, live_ids: set[int]) -> int:
+        """Give seq_id a free _token_counts row, growing the table or evicting sequences not in the batch."""
+        capacity = self._token_counts.size(0)
+        if len(self._token_count_rows) >= capacity:
+            if capacity < self.config.max_num_seqs:
+                self._resize_token_counts(min(max(2 * capacity, 8), self.config.max_num_seqs))
+            else:
+                # Preempted sequences still holding rows; they are rebuilt when they return
+                for stale_id in [i for i in self._token_count_rows if i not in live_ids]:
+                    del self._token_count_rows[stale_id]
+                    del self._token_count_lens[stale_id]
+        used = set(self._token_count_rows.values())
+        row = next(r for r in range(self._token_counts.size(0)) if r not in used)
+        self._token_count_rows[seq_id] = row
+        return row
+
+    def release_sequences(self, seq_ids: list[int]):
+        """Free the _token_counts rows of finished or aborted sequences.
+        
+        The table is dropped once no row is live and halved while at most a quarter of
+        it is in use, so it never stays at max_num_seqs x vocab after a large batch.
+        """
+        if self._token_counts is None:
+            return
+        for seq_id in seq_ids:
+            if self._token_count_rows.pop(seq_id, None) is not None:
+                del self._token_count_lens[seq_id]
+        if not self._token_count_rows:
+            self._token_counts = None
+            return
+        capacity = self._token_counts.size(0)
+        if capacity > 8 and len(self._token_count_rows) <= capacity // 4:
+            self._resize_token_counts(max(capacity // 2, 8))
+
+    def _resize_token_counts(self, capacity: int):
+        """Reallocate _token_counts with `capacity` rows, packing live rows to the front."""
+        resized = self._token_counts.new_zeros(capacity, self._token_counts.size(1))
+        if self._token_count_rows:
+            seq_ids = list(self._token_count_rows)
+            old_rows = [self._token_count_rows[i] for i in seq_ids]
+            index = torch.tensor(old_rows, dtype=torch.int64, device=resized.device)
+            resized[:len(seq_ids)] = self._token_counts.index_select(0, index)
+            self._token_count_rows = {seq_id: row for row, seq_id in enumerate(seq_ids)}
+        self._token_counts = resized
+
+    def _apply_repetition_penalty(self, logits: torch.Tensor, rows: torch.Tensor, count_rows: torch.Tensor,
+                                  repetition_penalties: torch.Tensor):
+        """Apply the repetition penalty to all penalized rows at once (in place).
+        
+        Standard formula (matching transformers): for tokens already in the completion,
+        score * penalty if score < 0 else score / penalty. Prompt tokens are not penalized.
+        """
+        if rows.numel() == 0:
+            return
+        scores = logits.index_select(0, rows)
+        penalties = repetition_penalties.index_select(0, rows).unsqueeze(1)
+        seen = self._token_counts.index_select(0, count_rows) > 0
+        penalized = torch.where(scores < 0, scores * penalties, scores / penalties)
+        logits.index_copy_(0, rows, torch.where(seen, penalized, scores).to(logits.dtype))
+
+    def _count_sampled_tokens(self, count_rows: torch.Tensor, token_ids: torch.Tensor, seqs: list[Sequence]):
+        """Add one sampled token per penalized sequence to its counts row."""
+        self._token_counts.index_put_((count_rows, token_ids.to(count_rows.dtype)),
+                                      torch.ones_like(count_rows, dtype=self._token_counts.dtype),
+                                      accumulate=True)
+        for seq in seqs:
+            self._token_count_lens[seq.seq_id] += 1
 
     @torch.inference_mode()
     def capture_cudagraph(self):
@@ -0,0 +1,78 @@
+"""Tests for the repetition-penalty token-count rows of ModelRunner."""
+
+import unittest
+from types import SimpleNamespace
+
+import torch
+
+from nanovllm.engine.model_runner import ModelRunner
+from nanovllm.engine.sequence import Sequence
+
+_VOCAB = 11
+
+
+def _runner(max_num_seqs=32):
+    """ModelRunner with only the token-count state set up."""
+    runner = ModelRunner.__new__(ModelRunner)
+    runner.config = SimpleNamespace(max_num_seqs=max_num_seqs)
+    runner._token_counts = None
+    runner._token_count_rows = {}
+    runner._token_count_lens = {}
+    return runner
+
+
+def _seq(completion):
+    """Sequence with a one-token prompt and the given completion tokens."""
+    seq = Sequence([1])
+    for token_id in completion:
+        seq.append_token(token_id)
+    return seq
+
+
+class TokenCountRowTests(unittest.TestCase):
+    """Tests for _get_token_count_rows / release_sequences."""
+
+    def _assert_counts(self, runner, seqs):
+        rows = runner._get_token_count_rows(seqs, _VOCAB, torch.device("cpu"))
+        for seq, row in zip(seqs, rows.tolist()):
+            expected = torch.bincount(torch.tensor(seq.completion_token_ids), minlength=_VOCAB)
+            self.assertTrue(torch.equal(runner._token_counts[row].long(), expected))
+
+    def test_table_grows_with_live_sequences_only(self):
+        """Rows are allocated on demand, not for max_num_seqs up front."""
+        runner = _runner()
+        seqs = [_seq([i % _VOCAB, 3]) for i in range(5)]
+        self._assert_counts(runner, seqs)
+        self.assertEqual(runner._token_counts.shape, (8, _VOCAB))
+
+    def test_release_frees_rows_and_shrinks_table(self):
+        """Finished sequences give their rows back; live rows keep their counts."""
+        runner = _runner()
+        seqs = [_seq([i % _VOCAB, i % 3, 4]) for i in range(20)]
+        self._assert_counts(runner, seqs)
+        self.assertEqual(runner._token_counts.size(0), 32)
+
+        runner.release_sequences([seq.seq_id for seq in seqs[4:]])
+        self.assertEqual(runner._token_counts.size(0), 16)
+        self.assertEqual(set(runner._token_count_rows), {seq.seq_id for seq in seqs[:4]})
+        self.assertEqual(sorted(runner._token_count_rows.values()), [0, 1, 2, 3])
+        self._assert_counts(runner, seqs[:4])
+
+        runner.release_sequences([seq.seq_id for seq in seqs[:4]] + [10**9])
+        self.assertIsNone(runner._token_counts)
+        self.assertEqual((runner._token_count_rows, runner._token_count_lens), ({}, {}))
+
+    def test_new_sequences_reuse_released_rows(self):
+        """Steady-state serving keeps the table at its working size."""
+        runner = _runner()
+        for _ in range(10):
+            seqs = [_seq([2, 5]) for _ in range(6)]
+            self._assert_counts(runner, seqs)
+            runner.release_sequences([seq.seq_id for seq in seqs[:3]])
+            self._assert_counts(runner, seqs[3:])
+            runner.release_sequences([seq.seq_id for seq in seqs[3:]])
+        self.assertIsNone(runner._token_counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
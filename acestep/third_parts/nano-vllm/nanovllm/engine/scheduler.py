@@ -32,7 +32,7 @@ class Scheduler:
 
     def schedule(self) -> tuple[list[Sequence], bool]:
         _debug_log(f"schedule: waiting={len(self.waiting)}, running={len(self.running)}, "
-                  f"free_blocks={len(self.block_manager.free_block_ids)}")
+                  f"free_blocks={self.block_manager.num_free_blocks}")
         
         # prefill
         scheduled_seqs = []
@@ -58,7 +58,7 @@ class Scheduler:
                 # The old check was wrong: it checked each sequence independently,
                 # but didn't account for the total blocks needed by both
                 total_blocks_needed = seq.num_blocks + paired_seq.num_blocks
-                can_allocate_both = len(self.block_manager.free_block_ids) >= total_blocks_needed
+                can_allocate_both = self.block_manager.num_free_blocks >= total_blocks_needed
                 
                 if num_batched_tokens + total_tokens > self.max_num_batched_tokens or not can_allocate_both:
                     break
@@ -123,26 +123,25 @@ class Scheduler:
                 blocks_needed_seq = 1 if len(seq) % block_size == 1 else 0
                 blocks_needed_paired = 1 if len(paired_seq) % block_size == 1 else 0
                 total_blocks_needed = blocks_needed_seq + blocks_needed_paired
-                can_append_both = len(self.block_manager.free_block_ids) >= total_blocks_needed
+                can_append_both = self.block_manager.num_free_blocks >= total_blocks_needed
                 
                 if not can_append_both:
                     # Try preempting other sequences
                     preempted = False
                     while not can_append_both and temp_running:
-                        other_seq = temp_running.pop(0)
+                        other_seq = temp_running[0]
                         if other_seq != seq and other_seq != paired_seq:
-                            self.preempt(other_seq)
+                            self._preempt_group(other_seq, temp_running)
                             # Recalculate with the same correct logic
-                            can_append_both = len(self.block_manager.free_block_ids) >= total_blocks_needed
+                            can_append_both = self.block_manager.num_free_blocks >= total_blocks_needed
                             preempted = True
                         else:
-                            temp_running.append(other_seq)
                             break
                     
                     if not can_append_both:
-                        # Can't schedule this pair right now
-                        temp_running.append(seq)
-                        temp_running.append(paired_seq)
+                        # Nothing left to preempt: send the pair itself back to waiting.
+                        # Re-queuing it in temp_running would spin forever.
+                        self._preempt_group(seq, temp_running)
                         continue
                 
                 # Schedule both sequences
@@ -161,16 +160,9 @@ class Scheduler:
                     
                 while not self.block_manager.can_append(seq):
                     if temp_running:
-                        other_seq = temp_running.pop(0)
-                        if other_seq != seq:
-                            self.preempt(other_seq)
-                        else:
-                            temp_running.append(other_seq)
-                            break
+                        self._preempt_group(temp_running[0], temp_running)
                     else:
-                        self.preempt(seq)
-                        if seq in self.running:
-                            self.running.remove(seq)
+                        self._preempt_group(seq, temp_running)
                         break
                 else:
                     num_seqs += 1
@@ -183,7 +175,7 @@ class Scheduler:
             # No sequences could be scheduled - provide informative error
             waiting_count = len(self.waiting)
             running_count = len(self.running)
-            free_blocks = len(self.block_manager.free_block_ids)
+            free_blocks = self.block_manager.num_free_blocks
             total_blocks = len(self.block_manager.blocks)
 
             if waiting_count > 0:
@@ -220,53 +212,48 @@ class Scheduler:
         self.block_manager.deallocate(seq)
         self.waiting.appendleft(seq)
 
+    def _preempt_group(self, seq: Sequence, temp_running: list[Sequence]):
+        """Preempt a running sequence together with its CFG partner.
+
+        Sequences from several callers share the running queue, so the victim
+        may belong to another request's CFG pair. Both halves must go back to
+        waiting (conditional first) or the pair can never be scheduled again.
+        """
+        group = [seq]
+        partner = seq.paired_seq
+        if seq.cfg_scale > 1.0 and partner is not None and partner.status == SequenceStatus.RUNNING:
+            group.append(partner)
+        # appendleft reverses order: push the unconditional half first so the
+        # conditional one ends up at the head of the waiting queue.
+        for s in sorted(group, key=lambda s: s.is_unconditional, reverse=True):
+            if s in temp_running:
+                temp_running.remove(s)
+            if s in self.running:
+                self.running.remove(s)
+            self.preempt(s)
+
     def postprocess(self, seqs: list[Sequence], token_ids: list[int]) -> list[bool]:
         _debug_log(f"postprocess: num_seqs={len(seqs)}, num_token_ids={len(token_ids) if token_ids else 0}")
         if token_ids:
             _debug_log(f"  token_ids: {token_ids[:10]}..." if len(token_ids) > 10 else f"  token_ids: {token_ids}")
-        
-        # Check if this is a CFG batch
-        is_cfg_batch = False
-        if len(seqs) > 0 and seqs[0].cfg_scale > 1.0 and seqs[0].paired_seq is not None:
-            num_cond = len(seqs) // 2
-            is_cfg_batch = (num_cond > 0 and 
-                           not seqs[0].is_unconditional and 
-                           seqs[num_cond].is_unconditional)
-        _debug_log(f"  is_cfg_batch={is_cfg_batch}")
-        
-        if is_cfg_batch:
-            # CFG batch: seqs = [cond_seq1, cond_seq2, ..., uncond_seq1, uncond_seq2, ...]
-            # token_ids correspond to conditional sequences only (sampled from CFG logits)
-            num_cond = len(seqs) // 2
-            cond_seqs = seqs[:num_cond]
-            uncond_seqs = seqs[num_cond:]
-            
-            # Apply the same sampled token to both conditional and unconditional sequences
-            for i, (cond_seq, uncond_seq, token_id) in enumerate(zip(cond_seqs, uncond_seqs, token_ids)):
-                cond_seq.append_token(token_id)
-                uncond_seq.append_token(token_id)  # Same token for unconditional
-                
-                # Check if either sequence is finished
-                cond_finished = ((not cond_seq.ignore_eos and token_id == self.eos) or 
-                                cond_seq.num_completion_tokens == cond_seq.max_tokens)
-                uncond_finished = ((not uncond_seq.ignore_eos and token_id == self.eos) or 
-                                  uncond_seq.num_completion_tokens == uncond_seq.max_tokens)
-                
-                if cond_finished or uncond_finished:
-                    # Mark both as finished
-                    cond_seq.status = SequenceStatus.FINISHED
-                    uncond_seq.status = SequenceStatus.FINISHED
-                    self.block_manager.deallocate(cond_seq)
-                    self.block_manager.deallocate(uncond_seq)
-                    if cond_seq in self.running:
-                        self.running.remove(cond_seq)
-                    if uncond_seq in self.running:
-                        self.running.remove(uncond_seq)
-        else:
-            # Normal batch
-            for seq, token_id in zip(seqs, token_ids):
-                seq.append_token(token_id)
-                if (not seq.ignore_eos and token_id == self.eos) or seq.num_completion_tokens == seq.max_tokens:
-                    seq.status = SequenceStatus.FINISHED
-                    self.block_manager.deallocate(seq)
-                    self.running.remove(seq)
+
+        # Batches are laid out as [non_cfg..., cfg_cond..., cfg_uncond...] and may
+        # mix sequences from several requests. token_ids has one entry per
+        # non-unconditional sequence (sampled from CFG logits for conditional ones);
+        # each CFG pair receives the same token on both halves.
+        sampled_seqs = [seq for seq in seqs if not seq.is_unconditional]
+        for seq, token_id in zip(sampled_seqs, token_ids):
+            paired_seq = seq.paired_seq if seq.cfg_scale > 1.0 else None
+            group = [seq] if paired_seq is None else [seq, paired_seq]
+            finished = False
+            for s in group:
+                s.append_token(token_id)
+                if (not s.ignore_eos and token_id == self.eos) or s.num_completion_tokens == s.max_tokens:
+                    finished = True
+            if finished:
+                # Finishing either half of a CFG pair finishes both
+                for s in group:
+                    s.status = SequenceStatus.FINISHED
+                    self.block_manager.deallocate(s)
+                    if s in self.running:
+                        self.running.remove(s)
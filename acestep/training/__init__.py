@@ -25,12 +25,19 @@ from acestep.training.data_module import (
     PreprocessedTensorDataset,
     PreprocessedDataModule,
     collate_preprocessed_batch,
+    open_preprocessed_dataset,
     # Legacy (raw audio)
     AceStepTrainingDataset,
     AceStepDataModule,
     collate_training_batch,
     load_dataset_from_json,
 )
+from acestep.training.length_bucketing import LengthBucketBatchSampler
+from acestep.training.packed_dataset import (
+    PackedTensorDataset,
+    PackedDatasetWriter,
+    convert_tensor_dir,
+)
 from acestep.training.trainer import (
     LoRATrainer,
     LoKRTrainer,
@@ -66,6 +73,11 @@ __all__ = [
     "PreprocessedTensorDataset",
     "PreprocessedDataModule",
     "collate_preprocessed_batch",
+    "open_preprocessed_dataset",
+    "PackedTensorDataset",
+    "PackedDatasetWriter",
+    "convert_tensor_dir",
+    "LengthBucketBatchSampler",
     # Data Module (Legacy)
     "AceStepTrainingDataset",
     "AceStepDataModule",
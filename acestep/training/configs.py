@@ -123,6 +123,8 @@ class TrainingConfig:
     prefetch_factor: int = 2
     persistent_workers: bool = True
     pin_memory_device: str = ""
+    length_bucketing: bool = True  # Batch samples of similar length together
+    max_frames_per_batch: int = 0  # >0: token-budgeted batches instead of batch_size
     
     # Logging
     log_every_n_steps: int = 10
@@ -157,6 +159,8 @@ class TrainingConfig:
             "prefetch_factor": self.prefetch_factor,
             "persistent_workers": self.persistent_workers,
             "pin_memory_device": self.pin_memory_device,
+            "length_bucketing": self.length_bucketing,
+            "max_frames_per_batch": self.max_frames_per_batch,
             "log_every_n_steps": self.log_every_n_steps,
             "val_split": self.val_split,
         }
@@ -11,6 +11,12 @@ import random
 from typing import Optional, List, Dict, Any, Tuple
 from loguru import logger
 
+from acestep.training.length_bucketing import (
+    LengthBucketBatchSampler,
+    lengths_from_paths,
+    log_padding_estimate,
+    sample_latent_lengths,
+)
 from acestep.training.path_safety import safe_path
 
 import torch
@@ -80,6 +86,7 @@ class PreprocessedTensorDataset(Dataset):
         
         # Validate paths exist on disk
         self.valid_paths = [p for p in self.sample_paths if os.path.exists(p)]
+        self._latent_lengths: Optional[List[int]] = None
         
         if len(self.valid_paths) != len(self.sample_paths):
             logger.warning(
@@ -129,6 +136,12 @@ class PreprocessedTensorDataset(Dataset):
 
     def __len__(self) -> int:
         return len(self.valid_paths)
+
+    def latent_lengths(self) -> List[int]:
+        """Latent frame count per sample, read from the tensor file headers."""
+        if self._latent_lengths is None:
+            self._latent_lengths = lengths_from_paths(self.valid_paths)
+        return self._latent_lengths
     
     def __getitem__(self, idx: int) -> Dict[str, torch.Tensor]:
         """Load a preprocessed tensor file.
@@ -149,71 +162,60 @@ class PreprocessedTensorDataset(Dataset):
         }
 
 
-def collate_preprocessed_batch(batch: List[Dict]) -> Dict[str, torch.Tensor]:
+def open_preprocessed_dataset(tensor_dir: str) -> Dataset:
+    """Open ``tensor_dir`` as a packed dataset if it has a current index, else as .pt files."""
+    from acestep.training.packed_dataset import (
+        PackedTensorDataset,
+        is_packed_dir,
+        packed_index_is_current,
+    )
+
+    validated_dir = safe_path(tensor_dir)
+    if is_packed_dir(validated_dir):
+        if packed_index_is_current(validated_dir):
+            return PackedTensorDataset(validated_dir)
+        logger.warning(
+            f"Packed index in {tensor_dir} does not match its .pt files; "
+            f"loading .pt files (re-run acestep.training.packed_dataset to repack)"
+        )
+    return PreprocessedTensorDataset(validated_dir)
+
+
+def _pad_stack(batch: List[Dict], key: str, length: int) -> torch.Tensor:
+    """Copy ``batch[i][key]`` into one zero-initialised ``[B, length, ...]`` buffer."""
+    first = batch[0][key]
+    out = first.new_zeros((len(batch), length) + tuple(first.shape[1:]))
+    for i, sample in enumerate(batch):
+        tensor = sample[key]
+        out[i, : tensor.shape[0]] = tensor
+    return out
+
+
+def collate_preprocessed_batch(batch: List[Dict]) -> Dict[str, Any]:
     """Collate function for preprocessed tensor batches.
     
     Handles variable-length tensors by padding to the longest in the batch.
+    Each output tensor is allocated once and filled in place.
     
     Args:
         batch: List of sample dictionaries with pre-computed tensors
         
     Returns:
-        Batched dictionary with all tensors stacked
+        Batched dictionary with all tensors stacked, plus ``padding_ratio``:
+        the fraction of latent frames in the batch that are padding
     """
-    # Get max lengths
-    max_latent_len = max(s["target_latents"].shape[0] for s in batch)
+    latent_lengths = [s["target_latents"].shape[0] for s in batch]
+    max_latent_len = max(latent_lengths)
     max_encoder_len = max(s["encoder_hidden_states"].shape[0] for s in batch)
     
-    # Pad and stack tensors
-    target_latents = []
-    attention_masks = []
-    encoder_hidden_states = []
-    encoder_attention_masks = []
-    context_latents = []
-    
-    for sample in batch:
-        # Pad target_latents [T, 64] -> [max_T, 64]
-        tl = sample["target_latents"]
-        if tl.shape[0] < max_latent_len:
-            pad = tl.new_zeros(max_latent_len - tl.shape[0], tl.shape[1])
-            tl = torch.cat([tl, pad], dim=0)
-        target_latents.append(tl)
-        
-        # Pad attention_mask [T] -> [max_T]
-        am = sample["attention_mask"]
-        if am.shape[0] < max_latent_len:
-            pad = am.new_zeros(max_latent_len - am.shape[0])
-            am = torch.cat([am, pad], dim=0)
-        attention_masks.append(am)
-        
-        # Pad context_latents [T, 65] -> [max_T, 65]
-        cl = sample["context_latents"]
-        if cl.shape[0] < max_latent_len:
-            pad = cl.new_zeros(max_latent_len - cl.shape[0], cl.shape[1])
-            cl = torch.cat([cl, pad], dim=0)
-        context_latents.append(cl)
-        
-        # Pad encoder_hidden_states [L, D] -> [max_L, D]
-        ehs = sample["encoder_hidden_states"]
-        if ehs.shape[0] < max_encoder_len:
-            pad = ehs.new_zeros(max_encoder_len - ehs.shape[0], ehs.shape[1])
-            ehs = torch.cat([ehs, pad], dim=0)
-        encoder_hidden_states.append(ehs)
-        
-        # Pad encoder_attention_mask [L] -> [max_L]
-        eam = sample["encoder_attention_mask"]
-        if eam.shape[0] < max_encoder_len:
-            pad = eam.new_zeros(max_encoder_len - eam.shape[0])
-            eam = torch.cat([eam, pad], dim=0)
-        encoder_attention_masks.append(eam)
-    
     return {
-        "target_latents": torch.stack(target_latents),  # [B, T, 64]
-        "attention_mask": torch.stack(attention_masks),  # [B, T]
-        "encoder_hidden_states": torch.stack(encoder_hidden_states),  # [B, L, D]
-        "encoder_attention_mask": torch.stack(encoder_attention_masks),  # [B, L]
-        "context_latents": torch.stack(context_latents),  # [B, T, 65]
+        "target_latents": _pad_stack(batch, "target_latents", max_latent_len),  # [B, T, 64]
+        "attention_mask": _pad_stack(batch, "attention_mask", max_latent_len),  # [B, T]
+        "encoder_hidden_states": _pad_stack(batch, "encoder_hidden_states", max_encoder_len),  # [B, L, D]
+        "encoder_attention_mask": _pad_stack(batch, "encoder_attention_mask", max_encoder_len),  # [B, L]
+        "context_latents": _pad_stack(batch, "context_latents", max_latent_len),  # [B, T, 65]
         "metadata": [s["metadata"] for s in batch],
+        "padding_ratio": 1.0 - sum(latent_lengths) / (len(batch) * max_latent_len),
     }
 
 
@@ -234,6 +236,8 @@ class PreprocessedDataModule(LightningDataModule if LIGHTNING_AVAILABLE else obj
         persistent_workers: bool = True,
         pin_memory_device: str = "",
         val_split: float = 0.0,
+        length_bucketing: bool = True,
+        max_frames_per_batch: int = 0,
     ):
         """Initialize the data module.
         
@@ -243,6 +247,10 @@ class PreprocessedDataModule(LightningDataModule if LIGHTNING_AVAILABLE else obj
             num_workers: Number of data loading workers
             pin_memory: Whether to pin memory for faster GPU transfer
             val_split: Fraction of data for validation (0 = no validation)
+            length_bucketing: Batch samples of similar length together
+                (see ``LengthBucketBatchSampler``)
+            max_frames_per_batch: If > 0, size batches by padded latent
+                frames instead of ``batch_size`` (implies length bucketing)
         """
         if LIGHTNING_AVAILABLE:
             super().__init__()
@@ -255,6 +263,8 @@ class PreprocessedDataModule(LightningDataModule if LIGHTNING_AVAILABLE else obj
         self.persistent_workers = persistent_workers
         self.pin_memory_device = pin_memory_device
         self.val_split = val_split
+        self.length_bucketing = length_bucketing
+        self.max_frames_per_batch = max_frames_per_batch
         
         self.train_dataset = None
         self.val_dataset = None
@@ -263,7 +273,7 @@ class PreprocessedDataModule(LightningDataModule if LIGHTNING_AVAILABLE else obj
         """Setup datasets."""
         if stage == 'fit' or stage is None:
             # Create full dataset
-            full_dataset = PreprocessedTensorDataset(self.tensor_dir)
+            full_dataset = open_preprocessed_dataset(self.tensor_dir)
             
             # Split if validation requested
             if self.val_split > 0 and len(full_dataset) > 1:
@@ -277,21 +287,35 @@ class PreprocessedDataModule(LightningDataModule if LIGHTNING_AVAILABLE else obj
                 self.train_dataset = full_dataset
                 self.val_dataset = None
     
+    def _bucket_sampler(self, dataset, shuffle: bool) -> Optional[LengthBucketBatchSampler]:
+        """Length-bucketed batch sampler for ``dataset``, or None if batching is trivial."""
+        if not (self.max_frames_per_batch > 0 or (self.length_bucketing and self.batch_size > 1)):
+            return None
+        return LengthBucketBatchSampler(
+            sample_latent_lengths(dataset),
+            batch_size=self.batch_size,
+            max_frames_per_batch=self.max_frames_per_batch,
+            shuffle=shuffle,
+        )
+
     def train_dataloader(self) -> DataLoader:
         """Create training dataloader."""
         prefetch_factor = None if self.num_workers == 0 else self.prefetch_factor
         persistent_workers = False if self.num_workers == 0 else self.persistent_workers
         kwargs = dict(
             dataset=self.train_dataset,
-            batch_size=self.batch_size,
-            shuffle=True,
             num_workers=self.num_workers,
             pin_memory=self.pin_memory,
             collate_fn=collate_preprocessed_batch,
-            drop_last=False,
             prefetch_factor=prefetch_factor,
             persistent_workers=persistent_workers,
         )
+        sampler = self._bucket_sampler(self.train_dataset, shuffle=True)
+        if sampler is not None:
+            log_padding_estimate(sampler, self.batch_size)
+            kwargs["batch_sampler"] = sampler
+        else:
+            kwargs.update(batch_size=self.batch_size, shuffle=True, drop_last=False)
         if self.pin_memory_device:
             kwargs["pin_memory_device"] = self.pin_memory_device
         return DataLoader(**kwargs)
@@ -304,14 +328,17 @@ class PreprocessedDataModule(LightningDataModule if LIGHTNING_AVAILABLE else obj
         persistent_workers = False if self.num_workers == 0 else self.persistent_workers
         kwargs = dict(
             dataset=self.val_dataset,
-            batch_size=self.batch_size,
-            shuffle=False,
             num_workers=self.num_workers,
             pin_memory=self.pin_memory,
             collate_fn=collate_preprocessed_batch,
             prefetch_factor=prefetch_factor,
             persistent_workers=persistent_workers,
         )
+        sampler = self._bucket_sampler(self.val_dataset, shuffle=False)
+        if sampler is not None:
+            kwargs["batch_sampler"] = sampler
+        else:
+            kwargs.update(batch_size=self.batch_size, shuffle=False)
         if self.pin_memory_device:
             kwargs["pin_memory_device"] = self.pin_memory_device
         return DataLoader(**kwargs)
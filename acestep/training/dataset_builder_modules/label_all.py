@@ -1,7 +1,41 @@
-from typing import List, Tuple
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
 
+from loguru import logger
+
+from .label_utils import apply_format_result, apply_understanding, get_audio_codes, labeled_status
 from .models import AudioSample
 
+CHECKPOINT_VERSION = 1
+
+
+def _load_checkpoint(checkpoint_path: Optional[str], options: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Return ``audio_path -> sample dict`` of a previous run with the same options."""
+    if not checkpoint_path or not os.path.isfile(checkpoint_path):
+        return {}
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        logger.warning(f"Ignoring unreadable labeling checkpoint: {checkpoint_path}")
+        return {}
+    if data.get("version") != CHECKPOINT_VERSION or data.get("options") != options:
+        logger.info(f"Labeling checkpoint {checkpoint_path} was written with other options; starting over")
+        return {}
+    return data.get("done", {})
+
+
+def _save_checkpoint(checkpoint_path: str, options: Dict[str, Any], done: Dict[str, Dict[str, Any]]) -> None:
+    """Atomically write labeling progress to ``checkpoint_path``."""
+    parent = os.path.dirname(checkpoint_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": CHECKPOINT_VERSION, "options": options, "done": done}, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_path)
+
 
 class LabelAllMixin:
     """Label all samples in the dataset."""
@@ -15,8 +49,23 @@ class LabelAllMixin:
         skip_metas: bool = False,
         only_unlabeled: bool = False,
         progress_callback=None,
+        chunk_size: int = 16,
+        batch_size: int = 1,
+        num_workers: int = 4,
+        checkpoint_path: Optional[str] = None,
+        sample_labeled_callback=None,
     ) -> Tuple[List[AudioSample], str]:
-        """Label all samples in the dataset."""
+        """Label all samples in the dataset.
+
+        Samples are processed in chunks of ``chunk_size``: audio files of a
+        chunk are decoded by ``num_workers`` threads and encoded to codes in
+        one pass, then understood by the LM ``batch_size`` prompts at a time.
+        With ``checkpoint_path`` set, progress is saved after every chunk and
+        a rerun with the same options restores finished samples instead of
+        labeling them again; the checkpoint is removed once every sample
+        succeeded. ``sample_labeled_callback(index, sample, status)`` is called
+        for each sample as soon as its result is known.
+        """
         if not self.samples:
             return [], "❌ No samples to label. Please scan a directory first."
 
@@ -30,33 +79,176 @@ class LabelAllMixin:
         if not samples_to_label:
             return self.samples, "✅ All samples already labeled"
 
+        options = {
+            "format_lyrics": format_lyrics,
+            "transcribe_lyrics": transcribe_lyrics,
+            "skip_metas": skip_metas,
+        }
+        done = _load_checkpoint(checkpoint_path, options)
+
         success_count = 0
         fail_count = 0
+        resumed_count = 0
         total = len(samples_to_label)
 
-        for idx, (i, sample) in enumerate(samples_to_label):
-            if progress_callback:
-                progress_callback(f"Labeling {idx+1}/{total}: {sample.filename}")
+        def report(i: int, sample: AudioSample, status: str) -> None:
+            nonlocal success_count, fail_count
+            if "✅" in status:
+                success_count += 1
+                done[sample.audio_path] = sample.to_dict()
+            else:
+                fail_count += 1
+            if sample_labeled_callback:
+                sample_labeled_callback(i, sample, status)
 
-            _, status = self.label_sample(
-                i,
+        pending = []
+        for i, sample in samples_to_label:
+            saved = done.get(sample.audio_path)
+            if saved is None:
+                pending.append((i, sample))
+                continue
+            restored = AudioSample.from_dict({**saved, "id": sample.id})
+            self.samples[i] = restored
+            resumed_count += 1
+            report(i, restored, f"✅ Labeled: {restored.filename} (resumed)")
+
+        chunk_size = max(1, chunk_size)
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start : start + chunk_size]
+            if progress_callback:
+                progress_callback(
+                    f"Labeling {resumed_count + start + 1}-{resumed_count + start + len(chunk)}/{total}: "
+                    f"{chunk[0][1].filename}"
+                )
+            self._label_chunk(
+                chunk,
                 dit_handler,
                 llm_handler,
                 format_lyrics,
                 transcribe_lyrics,
                 skip_metas,
-                progress_callback,
+                max(1, batch_size),
+                num_workers,
+                report,
             )
+            if checkpoint_path:
+                try:
+                    _save_checkpoint(checkpoint_path, options, done)
+                except OSError:
+                    logger.exception(f"Failed to save labeling checkpoint: {checkpoint_path}")
 
-            if "✅" in status:
-                success_count += 1
-            else:
-                fail_count += 1
+        if checkpoint_path and fail_count == 0 and os.path.isfile(checkpoint_path):
+            try:
+                os.remove(checkpoint_path)
+            except OSError:
+                logger.warning(f"Failed to remove labeling checkpoint: {checkpoint_path}")
 
         status_msg = f"✅ Labeled {success_count}/{total} samples"
         if fail_count > 0:
             status_msg += f" ({fail_count} failed)"
+        if resumed_count > 0:
+            status_msg += f" ({resumed_count} resumed from checkpoint)"
         if only_unlabeled:
             status_msg += f" (unlabeled only, {len(self.samples)} total)"
 
         return self.samples, status_msg
+
+    def _label_chunk(
+        self,
+        chunk: List[Tuple[int, AudioSample]],
+        dit_handler,
+        llm_handler,
+        format_lyrics: bool,
+        transcribe_lyrics: bool,
+        skip_metas: bool,
+        batch_size: int,
+        num_workers: int,
+        report,
+    ) -> None:
+        """Label one chunk: encode its audio, then run the LM in batches."""
+        # Samples whose preloaded lyrics get formatted never use the audio codes
+        format_items = []
+        understand_items = []
+        for i, sample in chunk:
+            if format_lyrics and sample.has_raw_lyrics() and not sample.is_instrumental:
+                format_items.append((i, sample))
+            else:
+                understand_items.append((i, sample))
+
+        for i, sample in format_items:
+            report(i, sample, self._format_one(i, sample, llm_handler, skip_metas))
+
+        if not understand_items:
+            return
+
+        paths = [sample.audio_path for _, sample in understand_items]
+        if hasattr(dit_handler, "convert_src_audios_to_codes"):
+            try:
+                codes_list = dit_handler.convert_src_audios_to_codes(paths, num_workers=num_workers)
+            except Exception:
+                logger.exception("Batch audio encoding failed")
+                codes_list = ["❌"] * len(paths)
+            codes_list = [c if c and not c.startswith("❌") else None for c in codes_list]
+        else:
+            codes_list = [get_audio_codes(path, dit_handler) for path in paths]
+
+        encoded = []
+        for (i, sample), codes in zip(understand_items, codes_list):
+            if codes:
+                encoded.append((i, sample, codes))
+            else:
+                report(i, sample, f"❌ Failed to encode audio: {sample.filename}")
+
+        for start in range(0, len(encoded), batch_size):
+            batch = encoded[start : start + batch_size]
+            try:
+                if len(batch) > 1 and hasattr(llm_handler, "understand_audio_from_codes_batch"):
+                    outputs = llm_handler.understand_audio_from_codes_batch(
+                        [codes for _, _, codes in batch],
+                        temperature=0.7,
+                        use_constrained_decoding=True,
+                    )
+                else:
+                    outputs = [
+                        llm_handler.understand_audio_from_codes(
+                            audio_codes=codes,
+                            temperature=0.7,
+                            use_constrained_decoding=True,
+                        )
+                        for _, _, codes in batch
+                    ]
+            except Exception as e:
+                logger.exception("Error running LLM labeling batch")
+                outputs = [({}, f"❌ Error: {str(e)}")] * len(batch)
+
+            for (i, sample, _), (metadata, status) in zip(batch, outputs):
+                if not metadata:
+                    report(i, sample, f"❌ LLM labeling failed: {status}")
+                    continue
+                status_suffix = apply_understanding(sample, metadata, transcribe_lyrics, skip_metas)
+                self.samples[i] = sample
+                report(i, sample, labeled_status(sample, skip_metas, status_suffix))
+
+    def _format_one(self, sample_idx: int, sample: AudioSample, llm_handler, skip_metas: bool) -> str:
+        """Label a sample with preloaded lyrics through ``format_sample``."""
+        from acestep.inference import format_sample
+
+        try:
+            result = format_sample(
+                llm_handler=llm_handler,
+                caption="",
+                lyrics=sample.raw_lyrics,
+                user_metadata=None,
+                temperature=0.85,
+                use_constrained_decoding=True,
+            )
+        except Exception as e:
+            logger.exception(f"Error labeling sample {sample.filename}")
+            return f"❌ Error: {str(e)}"
+
+        if not result.success:
+            return f"❌ LLM format failed: {result.error}"
+
+        status_suffix = apply_format_result(sample, result, skip_metas)
+        self.samples[sample_idx] = sample
+        return labeled_status(sample, skip_metas, status_suffix)
@@ -0,0 +1,123 @@
+"""Unit tests for the batched, checkpointed auto-labeling pipeline."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from acestep.training.dataset_builder_modules.label_all import LabelAllMixin
+from acestep.training.dataset_builder_modules.models import AudioSample
+
+
+class _Builder(LabelAllMixin):
+    """Minimal host holding the samples list."""
+
+    def __init__(self, samples):
+        self.samples = samples
+
+
+class _DitHandler:
+    """Fake DiT handler encoding every path in one batch call."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def convert_src_audios_to_codes(self, audio_files, num_workers=4):
+        self.calls.append(list(audio_files))
+        return ["❌ Failed" if path in self.failing else f"<|audio_code_{len(path)}|>" for path in audio_files]
+
+
+class _LlmHandler:
+    """Fake LM handler answering a caption per codes string."""
+
+    def __init__(self, fail_after=None):
+        self.batches = []
+        self.fail_after = fail_after
+
+    def understand_audio_from_codes_batch(self, audio_codes_list, **kwargs):
+        del kwargs
+        if self.fail_after is not None and len(self.batches) >= self.fail_after:
+            raise KeyboardInterrupt
+        self.batches.append(list(audio_codes_list))
+        return [({"caption": f"cap {codes}", "bpm": "120", "lyrics": "la"}, "✅") for codes in audio_codes_list]
+
+    def understand_audio_from_codes(self, audio_codes, **kwargs):
+        return self.understand_audio_from_codes_batch([audio_codes], **kwargs)[0]
+
+
+def _samples(count):
+    """Build ``count`` unlabeled instrumental samples."""
+    return [AudioSample(audio_path=f"/data/song{i}.wav", filename=f"song{i}.wav") for i in range(count)]
+
+
+class LabelAllSamplesTests(unittest.TestCase):
+    """Tests for LabelAllMixin.label_all_samples."""
+
+    def test_chunks_encode_together_and_lm_runs_in_batches(self):
+        """Each chunk is encoded in one call and understood batch_size prompts at a time."""
+        builder = _Builder(_samples(5))
+        dit, llm = _DitHandler(), _LlmHandler()
+        _, status = builder.label_all_samples(dit, llm, chunk_size=4, batch_size=2)
+        self.assertEqual([len(c) for c in dit.calls], [4, 1])
+        self.assertEqual([len(b) for b in llm.batches], [2, 2, 1])
+        self.assertTrue(all(s.labeled and s.bpm == 120 for s in builder.samples))
+        self.assertEqual(builder.samples[0].lyrics, "[Instrumental]")
+        self.assertEqual(status, "✅ Labeled 5/5 samples")
+
+    def test_failed_encodes_are_reported_per_sample(self):
+        """A file that cannot be encoded fails alone and reaches the callback."""
+        builder = _Builder(_samples(3))
+        seen = []
+        _, status = builder.label_all_samples(
+            _DitHandler(failing={"/data/song1.wav"}),
+            _LlmHandler(),
+            batch_size=4,
+            sample_labeled_callback=lambda i, s, st: seen.append((i, st.startswith("✅"))),
+        )
+        self.assertEqual(sorted(seen), [(0, True), (1, False), (2, True)])
+        self.assertFalse(builder.samples[1].labeled)
+        self.assertIn("(1 failed)", status)
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        """Finished chunks are restored from the checkpoint instead of relabeled."""
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = os.path.join(tmp, "labels.ckpt.json")
+            first = _Builder(_samples(4))
+            with self.assertRaises(KeyboardInterrupt):
+                first.label_all_samples(
+                    _DitHandler(), _LlmHandler(fail_after=1), chunk_size=2, batch_size=2, checkpoint_path=checkpoint
+                )
+            with open(checkpoint, "r", encoding="utf-8") as f:
+                self.assertEqual(len(json.load(f)["done"]), 2)
+
+            second = _Builder(_samples(4))
+            dit = _DitHandler()
+            _, status = second.label_all_samples(
+                dit, _LlmHandler(), chunk_size=2, batch_size=2, checkpoint_path=checkpoint
+            )
+            self.assertEqual(dit.calls, [["/data/song2.wav", "/data/song3.wav"]])
+            self.assertTrue(all(s.labeled for s in second.samples))
+            self.assertIn("(2 resumed from checkpoint)", status)
+            self.assertFalse(os.path.exists(checkpoint))
+
+    def test_checkpoint_with_other_options_is_ignored(self):
+        """Progress saved with different labeling options is not reused."""
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = os.path.join(tmp, "labels.ckpt.json")
+            with open(checkpoint, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "version": 1,
+                        "options": {"format_lyrics": True, "transcribe_lyrics": False, "skip_metas": False},
+                        "done": {"/data/song0.wav": {"caption": "stale", "labeled": True}},
+                    },
+                    f,
+                )
+            builder = _Builder(_samples(1))
+            builder.label_all_samples(_DitHandler(), _LlmHandler(), checkpoint_path=checkpoint)
+            self.assertEqual(builder.samples[0].caption, "cap <|audio_code_15|>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,4 @@
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 
 from loguru import logger
 
@@ -29,3 +29,74 @@ def parse_int(value: Any) -> Optional[int]:
         return int(value)
     except (ValueError, TypeError):
         return None
+
+
+def apply_format_result(sample, result, skip_metas: bool) -> str:
+    """Copy a ``format_sample`` result onto ``sample``; returns the status suffix."""
+    has_csv_bpm = sample.bpm is not None
+    has_csv_key = bool(sample.keyscale)
+
+    sample.caption = result.caption or ""
+    if not skip_metas:
+        if not has_csv_bpm:
+            sample.bpm = result.bpm
+        if not has_csv_key:
+            sample.keyscale = result.keyscale or ""
+        sample.timesignature = result.timesignature or ""
+    sample.language = result.language or "unknown"
+    sample.formatted_lyrics = result.lyrics or ""
+    sample.lyrics = sample.formatted_lyrics if sample.formatted_lyrics else sample.raw_lyrics
+    sample.labeled = True
+    return "(lyrics formatted by LM)"
+
+
+def apply_understanding(sample, metadata: Dict[str, Any], transcribe_lyrics: bool, skip_metas: bool) -> str:
+    """Copy LM understanding metadata onto ``sample``; returns the status suffix."""
+    has_preloaded_lyrics = sample.has_raw_lyrics() and not sample.is_instrumental
+    has_csv_bpm = sample.bpm is not None
+    has_csv_key = bool(sample.keyscale)
+
+    sample.caption = metadata.get("caption", "")
+    sample.genre = metadata.get("genres", "")
+
+    if not skip_metas:
+        if not has_csv_bpm:
+            sample.bpm = parse_int(metadata.get("bpm"))
+        if not has_csv_key:
+            sample.keyscale = metadata.get("keyscale", "")
+        sample.timesignature = metadata.get("timesignature", "")
+
+    sample.language = metadata.get("vocal_language", "unknown")
+
+    llm_lyrics = metadata.get("lyrics", "")
+
+    if sample.is_instrumental:
+        sample.lyrics = "[Instrumental]"
+        sample.language = "unknown"
+        sample.formatted_lyrics = ""
+        status_suffix = "(instrumental)"
+    elif transcribe_lyrics:
+        sample.formatted_lyrics = llm_lyrics
+        sample.lyrics = llm_lyrics
+        status_suffix = "(lyrics transcribed by LM)"
+    elif has_preloaded_lyrics:
+        sample.lyrics = sample.raw_lyrics
+        sample.formatted_lyrics = ""
+        status_suffix = "(using raw lyrics)"
+    else:
+        sample.lyrics = llm_lyrics
+        sample.formatted_lyrics = llm_lyrics
+        status_suffix = ""
+
+    sample.labeled = True
+    return status_suffix
+
+
+def labeled_status(sample, skip_metas: bool, status_suffix: str) -> str:
+    """Build the success message reported for a labeled sample."""
+    status_msg = f"✅ Labeled: {sample.filename}"
+    if skip_metas:
+        status_msg += " (skip metas)"
+    if status_suffix:
+        status_msg += f" {status_suffix}"
+    return status_msg
@@ -53,6 +53,7 @@ class PreprocessMixin:
         max_duration: float = 240.0,
         preprocess_mode: str = "lora",
         progress_callback=None,
+        pack: bool = False,
     ) -> Tuple[List[str], str]:
         """Preprocess all labeled samples to tensor files for efficient training.
 
@@ -66,6 +67,8 @@ class PreprocessMixin:
             max_duration: Maximum audio duration in seconds.
             preprocess_mode: ``"lora"`` or ``"lokr"``.
             progress_callback: Optional ``(message) -> None`` callback.
+            pack: Also write a packed, memory-mapped copy of the output
+                (see ``acestep.training.packed_dataset``).
 
         Returns:
             ``(output_paths, status_message)`` tuple.
@@ -285,6 +288,13 @@ class PreprocessMixin:
         save_manifest(output_dir, self.metadata, output_paths)
         debug_end_verbose_for("dataset", "save_manifest", t0)
 
+        if pack and output_paths:
+            from acestep.training.packed_dataset import convert_tensor_dir
+
+            if progress_callback:
+                progress_callback("Packing tensors into memory-mapped shards...")
+            convert_tensor_dir(output_dir)
+
         status = f"✅ Preprocessed {success_count}/{len(labeled_samples)} samples to {output_dir}"
         if fail_count > 0:
             status += f" ({fail_count} failed)"
@@ -0,0 +1,191 @@
+"""
+Length-bucketed batching for preprocessed training data.
+
+``collate_preprocessed_batch`` pads every sample to the longest one in
+its batch, so a random batch mixing a 10 s clip with a 240 s track is
+mostly padding.  ``LengthBucketBatchSampler`` shuffles the dataset,
+sorts each large pool of samples by latent length and cuts the pools
+into batches of similar-length samples, then shuffles the batch order.
+With ``max_frames_per_batch`` the batches are token-budgeted instead of
+fixed-size: short clips are grouped more densely than long tracks.
+"""
+
+import os
+from typing import Iterator, List, Optional, Sequence
+
+import torch
+from loguru import logger
+from torch.utils.data import Dataset, Sampler, Subset
+
+
+def sample_latent_lengths(dataset: Dataset) -> List[int]:
+    """Latent frame count (``target_latents.shape[0]``) of every sample.
+
+    Uses the dataset's own ``latent_lengths()`` when it has one (packed
+    and .pt datasets both do) and follows ``Subset`` wrappers such as
+    those produced by ``random_split``.
+    """
+    if isinstance(dataset, Subset):
+        base = sample_latent_lengths(dataset.dataset)
+        return [base[i] for i in dataset.indices]
+    if hasattr(dataset, "latent_lengths"):
+        return list(dataset.latent_lengths())
+    return [dataset[i]["target_latents"].shape[0] for i in range(len(dataset))]
+
+
+def read_latent_length(tensor_path: str) -> int:
+    """Latent frame count of one preprocessed .pt file.
+
+    The file is memory-mapped so only the tensor header is read; files
+    written in the legacy (non-zip) format are loaded in full.
+    """
+    try:
+        data = torch.load(tensor_path, map_location="cpu", weights_only=True, mmap=True)
+    except (RuntimeError, TypeError):
+        data = torch.load(tensor_path, map_location="cpu", weights_only=True)
+    return int(data["target_latents"].shape[0])
+
+
+def padding_ratio(lengths: Sequence[int], batches: Sequence[Sequence[int]]) -> float:
+    """Fraction of padded latent frames when ``batches`` are collated."""
+    total = sum(len(b) * max(lengths[i] for i in b) for b in batches if b)
+    if total == 0:
+        return 0.0
+    return 1.0 - sum(lengths[i] for b in batches for i in b) / total
+
+
+class LengthBucketBatchSampler(Sampler[List[int]]):
+    """Batch sampler that groups samples of similar latent length.
+
+    Each epoch the indices are shuffled and split into pools of
+    ``batch_size * bucket_multiplier`` samples; every pool is sorted by
+    length and cut into batches, and the batch order is shuffled again so
+    long and short batches alternate.  Without shuffling the whole
+    dataset is one sorted pool (deterministic, for validation).
+
+    Args:
+        lengths: Latent frame count of every sample.
+        batch_size: Samples per batch when ``max_frames_per_batch`` is 0.
+        max_frames_per_batch: If > 0, grow each batch while
+            ``len(batch) * longest`` stays within this many padded latent
+            frames (a sample longer than the budget gets its own batch).
+        shuffle: Shuffle pools and batch order every epoch.
+        bucket_multiplier: Pool size in batches; larger pools pad less
+            but make batch composition less random.
+        seed: Base seed; defaults to a draw from torch's global RNG so
+            ``torch.manual_seed`` makes runs reproducible.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int = 1,
+        max_frames_per_batch: int = 0,
+        shuffle: bool = True,
+        bucket_multiplier: int = 50,
+        seed: Optional[int] = None,
+    ):
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+        self.lengths = [int(n) for n in lengths]
+        self.batch_size = batch_size
+        self.max_frames_per_batch = max(0, int(max_frames_per_batch or 0))
+        self.shuffle = shuffle
+        self.bucket_multiplier = max(1, bucket_multiplier)
+        if seed is None:
+            seed = int(torch.empty((), dtype=torch.int64).random_().item())
+        self.seed = seed
+        self.epoch = 0
+        self._plan_epoch: Optional[int] = None
+        self._plan_batches: List[List[int]] = []
+
+    def set_epoch(self, epoch: int) -> None:
+        """Select the shuffle used by the next ``__iter__``."""
+        self.epoch = epoch
+
+    def _batches(self) -> List[List[int]]:
+        if self._plan_epoch != self.epoch:
+            self._plan_batches = self._build(self.epoch)
+            self._plan_epoch = self.epoch
+        return self._plan_batches
+
+    def _build(self, epoch: int) -> List[List[int]]:
+        n = len(self.lengths)
+        if self.shuffle:
+            gen = torch.Generator().manual_seed(self.seed + epoch)
+            order = torch.randperm(n, generator=gen).tolist()
+            pool_size = self.batch_size * self.bucket_multiplier
+        else:
+            order = list(range(n))
+            pool_size = max(n, 1)
+
+        batches: List[List[int]] = []
+        for start in range(0, n, pool_size):
+            pool = sorted(order[start:start + pool_size], key=self.lengths.__getitem__)
+            batches.extend(self._cut(pool))
+
+        if self.shuffle:
+            perm = torch.randperm(len(batches), generator=gen).tolist()
+            batches = [batches[i] for i in perm]
+        return batches
+
+    def _cut(self, pool: List[int]) -> List[List[int]]:
+        if not self.max_frames_per_batch:
+            return [pool[i:i + self.batch_size] for i in range(0, len(pool), self.batch_size)]
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        for idx in pool:
+            # pool is sorted ascending, so idx is the longest so far
+            if batch and (len(batch) + 1) * self.lengths[idx] > self.max_frames_per_batch:
+                batches.append(batch)
+                batch = []
+            batch.append(idx)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self._batches()
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self) -> int:
+        # Token-budgeted epochs can differ by a batch or two; this is the
+        # count for the upcoming epoch.
+        return len(self._batches())
+
+    def padding_ratio(self) -> float:
+        """Padding fraction of the upcoming epoch's batches."""
+        return padding_ratio(self.lengths, self._batches())
+
+
+def log_padding_estimate(sampler: LengthBucketBatchSampler, batch_size: int) -> None:
+    """Log the sampler's padding next to that of plain random batches."""
+    lengths = sampler.lengths
+    if len(lengths) < 2:
+        return
+    order = torch.randperm(len(lengths), generator=torch.Generator().manual_seed(sampler.seed)).tolist()
+    random_size = max(batch_size, round(len(lengths) / max(len(sampler), 1)))
+    random_batches = [order[i:i + random_size] for i in range(0, len(order), random_size)]
+    budget = (
+        f", max {sampler.max_frames_per_batch} frames/batch"
+        if sampler.max_frames_per_batch
+        else ""
+    )
+    logger.info(
+        f"Length bucketing: {len(sampler)} batches{budget}, "
+        f"padding {sampler.padding_ratio():.1%} "
+        f"(random batches: {padding_ratio(lengths, random_batches):.1%})"
+    )
+
+
+def lengths_from_paths(paths: Sequence[str]) -> List[int]:
+    """``read_latent_length`` for each path, logging unreadable files as length 0."""
+    out: List[int] = []
+    for path in paths:
+        try:
+            out.append(read_latent_length(path))
+        except Exception as exc:
+            logger.warning(f"Could not read latent length of {os.path.basename(path)}: {exc}")
+            out.append(0)
+    return out
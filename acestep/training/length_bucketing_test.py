@@ -0,0 +1,102 @@
+"""Tests for length-bucketed batching and the preallocated collate."""
+
+import os
+import tempfile
+import unittest
+
+import torch
+from torch.utils.data import Subset
+
+from acestep.training.data_module import (
+    PreprocessedDataModule,
+    PreprocessedTensorDataset,
+    collate_preprocessed_batch,
+)
+from acestep.training.length_bucketing import (
+    LengthBucketBatchSampler,
+    padding_ratio,
+    sample_latent_lengths,
+)
+from acestep.training.path_safety import set_safe_root
+
+
+def _sample(length, enc_length=5):
+    """Build a preprocessed sample with ``length`` latent frames."""
+    return {
+        "target_latents": torch.full((length, 4), float(length)),
+        "attention_mask": torch.ones(length),
+        "encoder_hidden_states": torch.ones(enc_length, 3),
+        "encoder_attention_mask": torch.ones(enc_length),
+        "context_latents": torch.ones(length, 6),
+        "metadata": {"length": length},
+    }
+
+
+class LengthBucketBatchSamplerTests(unittest.TestCase):
+    """Tests for LengthBucketBatchSampler."""
+
+    def test_every_index_once_and_less_padding_than_random(self):
+        """An epoch covers the dataset exactly once with far less padding."""
+        lengths = [10 + (i * 37) % 230 for i in range(200)]
+        sampler = LengthBucketBatchSampler(lengths, batch_size=4, seed=0)
+        batches = list(sampler)
+        self.assertEqual(sorted(i for b in batches for i in b), list(range(200)))
+        self.assertEqual(len(batches), 50)
+        random_batches = [list(range(i, i + 4)) for i in range(0, 200, 4)]
+        self.assertLess(padding_ratio(lengths, batches), padding_ratio(lengths, random_batches) / 3)
+
+    def test_epochs_reshuffle_reproducibly(self):
+        """Each epoch uses a new order; the same seed replays the same orders."""
+        lengths = list(range(1, 41))
+        a = LengthBucketBatchSampler(lengths, batch_size=2, bucket_multiplier=2, seed=7)
+        b = LengthBucketBatchSampler(lengths, batch_size=2, bucket_multiplier=2, seed=7)
+        first, second = list(a), list(a)
+        self.assertNotEqual(first, second)
+        self.assertEqual([first, second], [list(b), list(b)])
+
+    def test_frame_budget_sizes_batches_by_length(self):
+        """Short clips share batches under the budget; over-long clips go alone."""
+        lengths = [10] * 8 + [100, 300]
+        sampler = LengthBucketBatchSampler(lengths, max_frames_per_batch=200, shuffle=False)
+        batches = list(sampler)
+        self.assertEqual(len(sampler), len(batches))
+        for batch in batches:
+            longest = max(lengths[i] for i in batch)
+            self.assertTrue(len(batch) * longest <= 200 or len(batch) == 1)
+        self.assertIn([9], batches)
+        self.assertIn(list(range(8)), batches)
+
+
+class CollateAndDataModuleTests(unittest.TestCase):
+    """Tests for collate_preprocessed_batch and bucketed data loading."""
+
+    def test_collate_pads_in_place_and_reports_padding(self):
+        """Samples are zero-padded to the longest one and padding is measured."""
+        batch = collate_preprocessed_batch([_sample(3, 2), _sample(1, 4)])
+        self.assertEqual(tuple(batch["target_latents"].shape), (2, 3, 4))
+        self.assertEqual(tuple(batch["encoder_hidden_states"].shape), (2, 4, 3))
+        self.assertTrue(torch.equal(batch["attention_mask"][1], torch.tensor([1.0, 0.0, 0.0])))
+        self.assertEqual(batch["target_latents"][1, 1:].abs().sum().item(), 0.0)
+        self.assertAlmostEqual(batch["padding_ratio"], 1 - 4 / 6)
+
+    def test_data_module_buckets_pt_directory(self):
+        """The data module reads lengths from .pt headers, also through a Subset."""
+        set_safe_root(tempfile.gettempdir())
+        with tempfile.TemporaryDirectory() as d:
+            for i, n in enumerate((5, 50, 6, 48)):
+                torch.save(_sample(n), os.path.join(d, f"s{i}.pt"))
+            dataset = PreprocessedTensorDataset(d)
+            lengths = sample_latent_lengths(dataset)
+            self.assertEqual(sorted(lengths), [5, 6, 48, 50])
+            self.assertEqual(sample_latent_lengths(Subset(dataset, [2, 0])), [lengths[2], lengths[0]])
+
+            dm = PreprocessedDataModule(d, batch_size=2, num_workers=0, pin_memory=False)
+            dm.setup("fit")
+            sizes = sorted(
+                tuple(sorted(m["length"] for m in b["metadata"])) for b in dm.train_dataloader()
+            )
+            self.assertEqual(sizes, [(5, 6), (48, 50)])
+
+
+if __name__ == "__main__":
+    unittest.main()
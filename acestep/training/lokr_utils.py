@@ -193,6 +193,33 @@ def save_lokr_weights(
     os.makedirs(output_dir, exist_ok=True)
     weights_path = os.path.join(output_dir, "lokr_weights.safetensors")
 
+    lycoris_net.save_weights(weights_path, dtype=dtype, metadata=_lokr_save_metadata(metadata))
+    logger.info(f"LoKr weights saved to {weights_path}")
+    return weights_path
+
+
+def save_lokr_state_dict(
+    state_dict: Dict[str, torch.Tensor],
+    output_dir: str,
+    metadata: Optional[Dict[str, str]] = None,
+) -> str:
+    """Save an already-captured ``lycoris_net.state_dict()`` like ``save_lokr_weights``.
+
+    Lets a caller snapshot the weights while training and write them later
+    (e.g. from a background thread) without touching the live network.
+    """
+    from safetensors.torch import save_file
+
+    output_dir = safe_path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    weights_path = os.path.join(output_dir, "lokr_weights.safetensors")
+    save_file(state_dict, weights_path, metadata=_lokr_save_metadata(metadata))
+    logger.info(f"LoKr weights saved to {weights_path}")
+    return weights_path
+
+
+def _lokr_save_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """safetensors metadata for LoKr weights: string values, JSON-encoded otherwise."""
     save_metadata: Dict[str, str] = {"algo": "lokr", "format": "lycoris"}
     if metadata:
         for key, value in metadata.items():
@@ -202,10 +229,7 @@ def save_lokr_weights(
                 save_metadata[key] = value
             else:
                 save_metadata[key] = json.dumps(value, ensure_ascii=True)
-
-    lycoris_net.save_weights(weights_path, dtype=dtype, metadata=save_metadata)
-    logger.info(f"LoKr weights saved to {weights_path}")
-    return weights_path
+    return save_metadata
 
 
 def load_lokr_weights(lycoris_net: "LycorisNetwork", weights_path: str) -> Dict[str, Any]:
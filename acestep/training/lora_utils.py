@@ -198,6 +198,20 @@ def inject_lora_into_dit(
     return model, info
 
 
+def _unwrap_decoder(model) -> nn.Module:
+    """Return ``model.decoder`` without Fabric or ``torch.compile`` wrappers.
+
+    PEFT wrappers are kept, so the result still has ``save_pretrained``
+    when LoRA was injected.
+    """
+    decoder = model.decoder if hasattr(model, "decoder") else model
+    while hasattr(decoder, "_forward_module"):
+        decoder = decoder._forward_module
+    if hasattr(decoder, "_orig_mod"):
+        decoder = decoder._orig_mod
+    return decoder
+
+
 def save_lora_weights(
     model,
     output_dir: str,
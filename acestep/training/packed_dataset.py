@@ -0,0 +1,397 @@
+"""
+Packed, memory-mapped tensor dataset for LoRA/LoKr training.
+
+Instead of one ``.pt`` file per sample, tensors are appended to a few large
+shard files and located through a JSON index::
+
+    packed_index.json     shard names, per-sample offsets/shapes/dtypes, metadata, source size/mtime
+    packed_shared.bin     tensors referenced by many samples, stored once
+    packed_00000.bin ...  per-sample tensors, back to back
+
+Tensors that are a prefix of a shared tensor (the silence-derived
+``context_latents`` of text2music samples, all-ones attention masks) are
+not written per sample; the reader returns a slice of the shared copy.
+
+``PackedTensorDataset`` memory-maps the shards and returns zero-copy
+views, so loading a sample costs no unpickling and no small-file reads.
+``convert_tensor_dir`` packs an existing directory of ``.pt`` files.
+
+Usage:
+    python -m acestep.training.packed_dataset ./datasets/tensors --dtype bf16
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+from loguru import logger
+from torch.utils.data import Dataset
+
+from acestep.training.path_safety import safe_path
+
+PACKED_INDEX = "packed_index.json"
+PACKED_SHARED = "packed_shared.bin"
+PACKED_VERSION = 1
+
+# Tensor keys consumed by the trainers (see PreprocessedTensorDataset)
+TENSOR_KEYS = (
+    "target_latents",
+    "attention_mask",
+    "encoder_hidden_states",
+    "encoder_attention_mask",
+    "context_latents",
+)
+
+_ALIGN = 64
+_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+    "int64": torch.int64,
+    "int32": torch.int32,
+    "bool": torch.bool,
+}
+_DTYPE_ALIASES = {"fp32": "float32", "fp16": "float16", "bf16": "bfloat16"}
+
+
+def _dtype_name(dtype: torch.dtype) -> str:
+    name = str(dtype).replace("torch.", "")
+    if name not in _DTYPES:
+        raise ValueError(f"Unsupported tensor dtype for packing: {dtype}")
+    return name
+
+
+def resolve_pack_dtype(name: Optional[str]) -> Optional[torch.dtype]:
+    """Map ``"fp16"``/``"bf16"``/``"fp32"`` (or ``None``) to a torch dtype."""
+    if not name:
+        return None
+    key = _DTYPE_ALIASES.get(name.lower(), name.lower())
+    if key not in ("float32", "float16", "bfloat16"):
+        raise ValueError(f"Unsupported pack dtype: {name}")
+    return _DTYPES[key]
+
+
+class _ShardFile:
+    """Append-only binary file that keeps every tensor 64-byte aligned."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "wb")
+        self.size = 0
+
+    def write(self, tensor: torch.Tensor) -> Dict[str, Any]:
+        pad = (-self.size) % _ALIGN
+        if pad:
+            self._f.write(b"\0" * pad)
+            self.size += pad
+        data = tensor.detach().contiguous().cpu()
+        raw = data.view(torch.uint8) if data.dtype != torch.bool else data.to(torch.uint8)
+        buf = raw.reshape(-1).numpy().tobytes()
+        entry = {"offset": self.size, "dtype": _dtype_name(tensor.dtype), "shape": list(tensor.shape)}
+        self._f.write(buf)
+        self.size += len(buf)
+        return entry
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class PackedDatasetWriter:
+    """Stream samples into a packed dataset directory.
+
+    Args:
+        output_dir: Directory for the index and shard files.
+        shard_size_mb: Start a new shard once the current one exceeds this size.
+        dtype: Optional floating dtype (e.g. ``torch.bfloat16``) applied to
+            all floating tensors; ``None`` keeps the stored dtypes.
+    """
+
+    def __init__(self, output_dir: str, shard_size_mb: int = 1024, dtype: Optional[torch.dtype] = None):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.shard_bytes = max(1, shard_size_mb) * 1024 * 1024
+        self.dtype = dtype
+        self._shards: List[str] = []
+        self._shard: Optional[_ShardFile] = None
+        self._samples: List[Dict[str, Any]] = []
+        # key -> longest tensor every shared reference is a prefix of
+        self._shared: Dict[str, torch.Tensor] = {}
+
+    def _cast(self, tensor: torch.Tensor) -> torch.Tensor:
+        if self.dtype is not None and tensor.is_floating_point():
+            return tensor.to(self.dtype)
+        return tensor
+
+    def _try_share(self, key: str, tensor: torch.Tensor) -> bool:
+        """Reference ``tensor`` as a prefix of the shared copy for ``key`` if possible."""
+        shared = self._shared.get(key)
+        if shared is None:
+            self._shared[key] = tensor.clone()
+            return True
+        if shared.shape[1:] != tensor.shape[1:] or shared.dtype != tensor.dtype:
+            return False
+        n = min(shared.shape[0], tensor.shape[0])
+        if not torch.equal(shared[:n], tensor[:n]):
+            return False
+        if tensor.shape[0] > shared.shape[0]:
+            self._shared[key] = tensor.clone()
+        return True
+
+    def _current_shard(self) -> _ShardFile:
+        if self._shard is None or self._shard.size >= self.shard_bytes:
+            if self._shard is not None:
+                self._shard.close()
+            name = f"packed_{len(self._shards):05d}.bin"
+            self._shards.append(name)
+            self._shard = _ShardFile(os.path.join(self.output_dir, f"{name}.tmp"))
+        return self._shard
+
+    def add(
+        self,
+        sample: Dict[str, Any],
+        source: Optional[str] = None,
+        source_stat: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Append one sample (a dict with ``TENSOR_KEYS`` and ``metadata``).
+
+        ``source`` names the ``.pt`` file the sample came from and
+        ``source_stat`` is its ``source_signature``; both are used to
+        detect a stale index.
+        """
+        shard = self._current_shard()
+        tensors: Dict[str, Any] = {}
+        for key in TENSOR_KEYS:
+            tensor = self._cast(sample[key])
+            # Only masks and context latents are candidates for sharing;
+            # latents and encoder states are unique per sample.
+            if key in ("attention_mask", "encoder_attention_mask", "context_latents") and self._try_share(key, tensor):
+                tensors[key] = {"shared": key, "length": int(tensor.shape[0])}
+            else:
+                tensors[key] = shard.write(tensor)
+        self._samples.append({
+            "shard": len(self._shards) - 1,
+            "tensors": tensors,
+            "latent_length": int(sample["target_latents"].shape[0]),
+            "source": source,
+            "source_stat": source_stat,
+            "metadata": sample.get("metadata", {}),
+        })
+
+    def close(self) -> str:
+        """Write the shared tensors and the index; returns the index path."""
+        if self._shard is not None:
+            self._shard.close()
+        shared_file = _ShardFile(os.path.join(self.output_dir, f"{PACKED_SHARED}.tmp"))
+        shared = {key: shared_file.write(tensor) for key, tensor in self._shared.items()}
+        shared_file.close()
+
+        # Shards are written under .tmp names and only renamed here, right
+        # before the index, so an interrupted run leaves no partial files
+        # behind a valid index.
+        for name in self._shards + [PACKED_SHARED]:
+            path = os.path.join(self.output_dir, name)
+            os.replace(f"{path}.tmp", path)
+        index = {
+            "version": PACKED_VERSION,
+            "shards": self._shards,
+            "shared": shared,
+            "samples": self._samples,
+        }
+        index_path = os.path.join(self.output_dir, PACKED_INDEX)
+        with open(f"{index_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(f"{index_path}.tmp", index_path)
+        return index_path
+
+
+def is_packed_dir(tensor_dir: str) -> bool:
+    """Return True if ``tensor_dir`` holds a packed dataset index."""
+    return os.path.isfile(os.path.join(tensor_dir, PACKED_INDEX))
+
+
+def source_signature(path: str) -> Dict[str, int]:
+    """Size and modification time of a source ``.pt`` file, as stored in the index."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def packed_index_is_current(tensor_dir: str) -> bool:
+    """Return True if the packed index covers exactly the samples of ``tensor_dir``.
+
+    The samples are those listed in ``manifest.json`` or, without a
+    manifest, the ``.pt`` files present; each must still have the size
+    and mtime recorded when it was packed.  Directories packed without
+    keeping their ``.pt`` files count as current.
+    """
+    try:
+        with open(os.path.join(tensor_dir, PACKED_INDEX), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return False
+    present = {f for f in os.listdir(tensor_dir) if f.endswith(".pt")}
+    manifest_path = os.path.join(tensor_dir, "manifest.json")
+    if present and os.path.isfile(manifest_path):
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                present = {os.path.basename(p) for p in json.load(f).get("samples", [])}
+        except (OSError, ValueError):
+            return False
+    if not present:
+        return True
+    packed = {os.path.basename(s["source"]): s.get("source_stat") for s in index.get("samples", []) if s.get("source")}
+    if present != set(packed):
+        return False
+    for name, stat in packed.items():
+        try:
+            if stat != source_signature(os.path.join(tensor_dir, name)):
+                return False
+        except OSError:
+            return False
+    return True
+
+
+class PackedTensorDataset(Dataset):
+    """Dataset over a packed directory written by ``PackedDatasetWriter``.
+
+    Returns the same dictionaries as ``PreprocessedTensorDataset``; tensors
+    are views into read-only-shared (copy-on-write) memory maps.
+    """
+
+    def __init__(self, tensor_dir: str):
+        validated_dir = safe_path(tensor_dir)
+        index_path = safe_path(PACKED_INDEX, base=validated_dir)
+        if not os.path.isfile(index_path):
+            raise ValueError(f"No packed dataset index in: {tensor_dir}")
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != PACKED_VERSION:
+            raise ValueError(f"Unsupported packed dataset version: {index.get('version')}")
+
+        self.tensor_dir = validated_dir
+        self.shards: List[str] = [safe_path(name, base=validated_dir) for name in index["shards"]]
+        self.shared_path = safe_path(PACKED_SHARED, base=validated_dir)
+        self.shared_entries: Dict[str, Dict[str, Any]] = index.get("shared", {})
+        self.samples: List[Dict[str, Any]] = index["samples"]
+        self._maps: Dict[str, np.memmap] = {}
+        self._shared: Dict[str, torch.Tensor] = {}
+        logger.info(
+            f"PackedTensorDataset: {len(self.samples)} samples in "
+            f"{len(self.shards)} shard(s) from {self.tensor_dir}"
+        )
+
+    def __getstate__(self):
+        # Memory maps are reopened lazily in each DataLoader worker
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        state["_shared"] = {}
+        return state
+
+    def _map(self, path: str) -> np.memmap:
+        mm = self._maps.get(path)
+        if mm is None:
+            mm = np.memmap(path, dtype=np.uint8, mode="c")
+            self._maps[path] = mm
+        return mm
+
+    def _view(self, path: str, entry: Dict[str, Any]) -> torch.Tensor:
+        dtype = _DTYPES[entry["dtype"]]
+        shape = entry["shape"]
+        numel = int(np.prod(shape)) if shape else 1
+        nbytes = numel * torch.empty((), dtype=dtype).element_size()
+        start = entry["offset"]
+        raw = torch.from_numpy(self._map(path)[start : start + nbytes])
+        if dtype == torch.bool:
+            return raw.view(shape).bool()
+        return raw.view(dtype).view(shape)
+
+    def _shared_tensor(self, key: str) -> torch.Tensor:
+        tensor = self._shared.get(key)
+        if tensor is None:
+            tensor = self._view(self.shared_path, self.shared_entries[key])
+            self._shared[key] = tensor
+        return tensor
+
+    def latent_lengths(self) -> List[int]:
+        """Latent frame count per sample, without touching the shards."""
+        return [s["latent_length"] for s in self.samples]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        sample = self.samples[idx]
+        shard = self.shards[sample["shard"]]
+        out: Dict[str, Any] = {}
+        for key, entry in sample["tensors"].items():
+            if "shared" in entry:
+                out[key] = self._shared_tensor(entry["shared"])[: entry["length"]]
+            else:
+                out[key] = self._view(shard, entry)
+        out["metadata"] = sample.get("metadata", {})
+        return out
+
+
+def convert_tensor_dir(
+    tensor_dir: str,
+    output_dir: Optional[str] = None,
+    dtype: Optional[torch.dtype] = None,
+    shard_size_mb: int = 1024,
+) -> Dict[str, Any]:
+    """Pack the ``.pt`` files of ``tensor_dir`` (manifest order if present).
+
+    Args:
+        tensor_dir: Directory of preprocessed ``.pt`` files.
+        output_dir: Destination directory (default: ``tensor_dir``).
+        dtype: Optional floating dtype for the packed tensors.
+        shard_size_mb: Target shard size in MiB.
+
+    Returns:
+        Dict with keys ``packed``, ``failed``, ``shards``, ``index``.
+    """
+    from acestep.training.data_module import PreprocessedTensorDataset
+
+    source = PreprocessedTensorDataset(tensor_dir)
+    writer = PackedDatasetWriter(output_dir or source.tensor_dir, shard_size_mb=shard_size_mb, dtype=dtype)
+    packed = 0
+    failed = 0
+    for path in source.valid_paths:
+        try:
+            # Stat before loading so a file rewritten meanwhile reads as stale
+            stat = source_signature(path)
+            data = torch.load(path, map_location="cpu", weights_only=True)
+            writer.add(data, source=os.path.basename(path), source_stat=stat)
+            packed += 1
+        except Exception as exc:
+            failed += 1
+            logger.error(f"Failed to pack {path}: {exc}")
+    index_path = writer.close()
+    logger.info(f"Packed {packed} samples into {len(writer._shards)} shard(s): {index_path}")
+    return {"packed": packed, "failed": failed, "shards": len(writer._shards), "index": index_path}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pack a directory of preprocessed .pt files")
+    parser.add_argument("tensor_dir", type=str, help="Directory containing preprocessed .pt files")
+    parser.add_argument("--output-dir", type=str, default=None, help="Destination directory (default: tensor_dir)")
+    parser.add_argument("--dtype", type=str, default=None, help="Store floating tensors as fp16, bf16 or fp32")
+    parser.add_argument("--shard-size-mb", type=int, default=1024, help="Target shard size in MiB (default: 1024)")
+    args = parser.parse_args()
+
+    result = convert_tensor_dir(
+        args.tensor_dir,
+        output_dir=args.output_dir,
+        dtype=resolve_pack_dtype(args.dtype),
+        shard_size_mb=args.shard_size_mb,
+    )
+    print(f"[OK] Packed {result['packed']} samples ({result['failed']} failed) -> {result['index']}")
+    return 0 if result["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
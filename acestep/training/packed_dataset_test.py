@@ -0,0 +1,131 @@
+"""Tests for the packed, memory-mapped tensor dataset."""
+
+import json
+import os
+import tempfile
+import unittest
+
+import torch
+
+from acestep.training.data_module import PreprocessedTensorDataset, open_preprocessed_dataset
+from acestep.training.packed_dataset import (
+    PACKED_INDEX,
+    PackedDatasetWriter,
+    PackedTensorDataset,
+    convert_tensor_dir,
+    packed_index_is_current,
+)
+from acestep.training.path_safety import set_safe_root
+
+
+def _sample(length, seed, dtype=torch.float32):
+    """Build a preprocessed sample whose context latents derive from a fixed silence."""
+    gen = torch.Generator().manual_seed(seed)
+    silence = torch.arange(300 * 64, dtype=dtype).reshape(300, 64)
+    return {
+        "target_latents": torch.randn(length, 64, generator=gen).to(dtype),
+        "attention_mask": torch.ones(length, dtype=dtype),
+        "encoder_hidden_states": torch.randn(7, 16, generator=gen).to(dtype),
+        "encoder_attention_mask": torch.ones(7, dtype=dtype),
+        "context_latents": torch.cat([silence[:length], torch.ones(length, 64, dtype=dtype)], dim=-1),
+        "metadata": {"filename": f"s{seed}.wav"},
+    }
+
+
+class PackedTensorDatasetTests(unittest.TestCase):
+    """Tests for PackedDatasetWriter, PackedTensorDataset and the converter."""
+
+    def setUp(self):
+        """Allow temporary directories as dataset roots."""
+        set_safe_root(tempfile.gettempdir())
+
+    def test_round_trip_matches_source_tensors(self):
+        """Every tensor read back equals the one written, across several shards."""
+        samples = [_sample(n, i) for i, n in enumerate((50, 120, 80))]
+        with tempfile.TemporaryDirectory() as d:
+            writer = PackedDatasetWriter(d, shard_size_mb=1)
+            writer.shard_bytes = 20_000
+            for s in samples:
+                writer.add(s)
+            writer.close()
+            ds = PackedTensorDataset(d)
+            self.assertGreater(len(ds.shards), 1)
+            self.assertEqual(ds.latent_lengths(), [50, 120, 80])
+            for original, packed in zip(samples, ds):
+                for key, value in original.items():
+                    if key == "metadata":
+                        self.assertEqual(packed[key], value)
+                    else:
+                        self.assertTrue(torch.equal(packed[key], value), key)
+
+    def test_shared_prefixes_are_stored_once(self):
+        """Silence-derived context latents and masks are slices of one shared copy."""
+        with tempfile.TemporaryDirectory() as d:
+            writer = PackedDatasetWriter(d)
+            for i, n in enumerate((50, 120, 80)):
+                writer.add(_sample(n, i))
+            writer.close()
+            with open(os.path.join(d, PACKED_INDEX)) as f:
+                index = json.load(f)
+            self.assertEqual(index["shared"]["context_latents"]["shape"], [120, 128])
+            for entry in index["samples"]:
+                self.assertIn("shared", entry["tensors"]["context_latents"])
+                self.assertNotIn("shared", entry["tensors"]["target_latents"])
+            ds = PackedTensorDataset(d)
+            a, b = ds[0]["context_latents"], ds[1]["context_latents"]
+            self.assertEqual(a.data_ptr(), b.data_ptr())
+
+    def test_bf16_views_are_zero_copy(self):
+        """bf16 tensors come back as views into the shard memory map."""
+        with tempfile.TemporaryDirectory() as d:
+            writer = PackedDatasetWriter(d, dtype=torch.bfloat16)
+            writer.add(_sample(40, 0))
+            writer.close()
+            ds = PackedTensorDataset(d)
+            item = ds[0]
+            again = ds[0]
+            self.assertEqual(item["target_latents"].dtype, torch.bfloat16)
+            self.assertEqual(item["target_latents"].data_ptr(), again["target_latents"].data_ptr())
+
+    def test_converter_packs_pt_dir_and_data_module_prefers_it(self):
+        """convert_tensor_dir packs .pt files; a stale index falls back to .pt files."""
+        with tempfile.TemporaryDirectory() as d:
+            for i, n in enumerate((30, 60)):
+                torch.save(_sample(n, i), os.path.join(d, f"s{i}.pt"))
+            result = convert_tensor_dir(d)
+            self.assertEqual(result["packed"], 2)
+            self.assertIsInstance(open_preprocessed_dataset(d), PackedTensorDataset)
+            torch.save(_sample(10, 9), os.path.join(d, "late.pt"))
+            self.assertIsInstance(open_preprocessed_dataset(d), PreprocessedTensorDataset)
+
+    def test_rewritten_or_legacy_sources_make_index_stale(self):
+        """A .pt file replaced under the same name, or an index without file stats, is stale."""
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "s0.pt")
+            torch.save(_sample(30, 0), path)
+            convert_tensor_dir(d)
+            self.assertTrue(packed_index_is_current(d))
+
+            torch.save(_sample(31, 1), path)
+            self.assertFalse(packed_index_is_current(d))
+            self.assertIsInstance(open_preprocessed_dataset(d), PreprocessedTensorDataset)
+
+            convert_tensor_dir(d)
+            self.assertTrue(packed_index_is_current(d))
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            self.assertFalse(packed_index_is_current(d))
+
+            convert_tensor_dir(d)
+            index_path = os.path.join(d, PACKED_INDEX)
+            with open(index_path) as f:
+                index = json.load(f)
+            for entry in index["samples"]:
+                del entry["source_stat"]
+            with open(index_path, "w") as f:
+                json.dump(index, f)
+            self.assertFalse(packed_index_is_current(d))
+
+
+if __name__ == "__main__":
+    unittest.main()
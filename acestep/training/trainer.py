@@ -590,6 +590,8 @@ class LoRATrainer:
                 prefetch_factor=self.training_config.prefetch_factor,
                 persistent_workers=self.training_config.persistent_workers,
                 pin_memory_device=self.training_config.pin_memory_device,
+                length_bucketing=getattr(self.training_config, "length_bucketing", True),
+                max_frames_per_batch=getattr(self.training_config, "max_frames_per_batch", 0),
                 val_split=getattr(self.training_config, "val_split", 0.0),
             )
             
@@ -1278,6 +1280,8 @@ class LoKRTrainer:
                 prefetch_factor=self.training_config.prefetch_factor,
                 persistent_workers=self.training_config.persistent_workers,
                 pin_memory_device=self.training_config.pin_memory_device,
+                length_bucketing=getattr(self.training_config, "length_bucketing", True),
+                max_frames_per_batch=getattr(self.training_config, "max_frames_per_batch", 0),
                 val_split=self.training_config.val_split,
             )
             data_module.setup('fit')
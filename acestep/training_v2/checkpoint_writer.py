@@ -0,0 +1,177 @@
+"""
+Background checkpoint writer for FixedLoRATrainer.
+
+``submit`` takes tensors that were copied into reusable host buffers
+(pinned when they come from CUDA, so the device-to-host copy is queued
+on the compute stream instead of stalling it) and hands the file writes
+to a worker thread.  Each checkpoint is written into a temporary sibling
+directory and renamed into place, so a checkpoint directory on disk is
+always complete.  With ``keep_last > 0`` older ``<name>_<N>`` siblings
+are pruned after every successful write.
+
+Extracted from ``trainer_helpers.py`` to keep that module under the LOC
+limit.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+_NUMBERED_DIR = re.compile(r"^(.*)_(\d+)$")
+
+
+class CheckpointWriter:
+    """Single-slot asynchronous checkpoint writer.
+
+    At most one checkpoint is in flight.  Callers must ``wait`` before
+    snapshotting, because the host buffers are reused; by the next
+    ``save_every_n_epochs`` boundary the previous write is normally long
+    done, so the wait is free.
+    """
+
+    def __init__(self, keep_last: int = 0):
+        self.keep_last = max(0, keep_last)
+        self.failures = 0
+        self._buffers: Dict[str, torch.Tensor] = {}
+        self._needs_sync = False
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._unreported: List[Tuple[str, BaseException]] = []
+
+    # ------------------------------------------------------------------
+    # Snapshotting (training thread)
+    # ------------------------------------------------------------------
+
+    def host_copy(self, key: str, tensor: torch.Tensor) -> torch.Tensor:
+        """Copy *tensor* into the host buffer reserved for *key*."""
+        tensor = tensor.detach()
+        buf = self._buffers.get(key)
+        if buf is None or buf.shape != tensor.shape or buf.dtype != tensor.dtype:
+            buf = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=tensor.is_cuda)
+            self._buffers[key] = buf
+        buf.copy_(tensor, non_blocking=tensor.is_cuda)
+        self._needs_sync = self._needs_sync or tensor.is_cuda
+        return buf
+
+    def snapshot(self, key: str, obj: Any) -> Any:
+        """Rebuild *obj* (nested dicts / lists / tuples) with tensors copied to host."""
+        if isinstance(obj, torch.Tensor):
+            return self.host_copy(key, obj)
+        if isinstance(obj, dict):
+            return {k: self.snapshot(f"{key}/{k}", v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self.snapshot(f"{key}/{i}", v) for i, v in enumerate(obj))
+        return obj
+
+    def submit(self, ckpt_dir: str, write: Callable[[str], None]) -> None:
+        """Write a checkpoint in the background.
+
+        *write* receives a temporary directory and must fill it using
+        only snapshotted data; the directory is renamed to *ckpt_dir*
+        once it returns.
+        """
+        self.wait()
+        event = None
+        if self._needs_sync:
+            event = torch.cuda.Event()
+            event.record()
+            self._needs_sync = False
+        self._thread = threading.Thread(
+            target=self._run, args=(ckpt_dir, write, event),
+            name="checkpoint-writer", daemon=False,
+        )
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Completion
+    # ------------------------------------------------------------------
+
+    def wait(self) -> Optional[BaseException]:
+        """Block until the in-flight checkpoint is written; return its error, if any."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        error, self._error = self._error, None
+        return error
+
+    def take_failures(self) -> List[Tuple[str, BaseException]]:
+        """Return ``(checkpoint_dir, error)`` of failed writes not reported yet.
+
+        Never blocks: a write still in flight is reported by a later call.
+        """
+        with self._lock:
+            failures, self._unreported = self._unreported, []
+        return failures
+
+    def close(self) -> int:
+        """Finish pending writes, release host buffers and return the failure count."""
+        self.wait()
+        self._buffers.clear()
+        return self.failures
+
+    # ------------------------------------------------------------------
+    # Worker thread
+    # ------------------------------------------------------------------
+
+    def _run(self, ckpt_dir: str, write: Callable[[str], None], event: Any) -> None:
+        final = Path(ckpt_dir)
+        tmp = final.with_name(final.name + ".tmp")
+        try:
+            if event is not None:
+                event.synchronize()
+            if tmp.exists():
+                shutil.rmtree(tmp)
+            tmp.mkdir(parents=True)
+            write(str(tmp))
+            _replace_dir(tmp, final)
+            logger.info("Checkpoint written to %s", final)
+            if self.keep_last:
+                _prune_numbered_siblings(final, self.keep_last)
+        except Exception as exc:
+            self.failures += 1
+            self._error = exc
+            with self._lock:
+                self._unreported.append((str(final), exc))
+            logger.error("[FAIL] Writing checkpoint %s failed: %s", final, exc)
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _replace_dir(src: Path, dst: Path) -> None:
+    """Move *src* to *dst*, replacing an existing *dst* directory."""
+    old = None
+    if dst.exists():
+        old = dst.with_name(dst.name + ".old")
+        if old.exists():
+            shutil.rmtree(old)
+        os.replace(dst, old)
+    os.replace(src, dst)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def _prune_numbered_siblings(latest: Path, keep_last: int) -> None:
+    """Delete all but the *keep_last* highest-numbered ``<name>_<N>`` siblings of *latest*."""
+    match = _NUMBERED_DIR.match(latest.name)
+    if match is None:
+        return
+    prefix = match.group(1)
+    numbered = []
+    for child in latest.parent.iterdir():
+        m = _NUMBERED_DIR.match(child.name)
+        if child.is_dir() and m is not None and m.group(1) == prefix:
+            numbered.append((int(m.group(2)), child))
+    numbered.sort()
+    for _, stale in numbered[:-keep_last]:
+        shutil.rmtree(stale, ignore_errors=True)
+        logger.info("Removed old checkpoint %s (keeping last %d)", stale, keep_last)
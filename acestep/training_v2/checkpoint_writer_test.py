@@ -0,0 +1,150 @@
+"""Tests for the background checkpoint writer."""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+
+from acestep.training_v2.checkpoint_writer import (
+    CheckpointWriter,
+    _prune_numbered_siblings,
+    _replace_dir,
+)
+from acestep.training_v2.trainer_helpers import checkpoint_failure_updates
+
+
+def _save_state(state):
+    """Return a write function that saves ``state`` into the checkpoint directory."""
+    return lambda out_dir: torch.save(state, os.path.join(out_dir, "state.pt"))
+
+
+class CheckpointWriterTests(unittest.TestCase):
+    """Tests for CheckpointWriter.snapshot / submit / take_failures."""
+
+    def test_host_buffers_are_reused_across_submits(self):
+        """Each submit reuses the same host buffers and writes the values of its own snapshot."""
+        writer = CheckpointWriter()
+        weights = {"a": torch.zeros(4), "b": [torch.ones(2, 3)]}
+        with tempfile.TemporaryDirectory() as d:
+            first = writer.snapshot("adapter", weights)
+            writer.submit(os.path.join(d, "epoch_1"), _save_state(first))
+            self.assertIsNone(writer.wait())
+
+            weights["a"] += 5
+            second = writer.snapshot("adapter", weights)
+            self.assertIs(second["a"], first["a"])
+            self.assertIs(second["b"][0], first["b"][0])
+            writer.submit(os.path.join(d, "epoch_2"), _save_state(second))
+            self.assertEqual(writer.close(), 0)
+
+            self.assertEqual(torch.load(os.path.join(d, "epoch_1", "state.pt"))["a"].sum().item(), 0.0)
+            self.assertEqual(torch.load(os.path.join(d, "epoch_2", "state.pt"))["a"].sum().item(), 20.0)
+            self.assertEqual(sorted(os.listdir(d)), ["epoch_1", "epoch_2"])
+
+    def test_snapshot_reallocates_on_shape_change(self):
+        """A tensor of a new shape gets a fresh buffer instead of a mismatched copy."""
+        writer = CheckpointWriter()
+        first = writer.host_copy("w", torch.zeros(3))
+        second = writer.host_copy("w", torch.zeros(5))
+        self.assertIsNot(first, second)
+        self.assertEqual(tuple(second.shape), (5,))
+
+    def test_failed_write_leaves_no_partial_directory(self):
+        """A failing write removes its temp dir, keeps the old checkpoint and is reported once."""
+        def write(out_dir):
+            Path(out_dir, "half.bin").write_bytes(b"x")
+            raise OSError("disk full")
+
+        writer = CheckpointWriter()
+        with tempfile.TemporaryDirectory() as d:
+            final = os.path.join(d, "epoch_2")
+            os.mkdir(final)
+            Path(final, "old.pt").write_bytes(b"old")
+            writer.submit(final, write)
+            error = writer.wait()
+            self.assertIsInstance(error, OSError)
+            self.assertEqual(sorted(os.listdir(d)), ["epoch_2"])
+            self.assertEqual(os.listdir(final), ["old.pt"])
+            self.assertEqual(writer.failures, 1)
+            self.assertEqual([(p, str(e)) for p, e in writer.take_failures()], [(final, "disk full")])
+            self.assertEqual(writer.take_failures(), [])
+
+    def test_failures_surface_as_training_warnings(self):
+        """checkpoint_failure_updates turns a failed background write into a warn update."""
+        def write(out_dir):
+            raise RuntimeError("boom")
+
+        writer = CheckpointWriter()
+        trainer = SimpleNamespace(checkpoint_writer=writer)
+        with tempfile.TemporaryDirectory() as d:
+            writer.submit(os.path.join(d, "epoch_1"), write)
+            writer.wait()
+            updates = list(checkpoint_failure_updates(trainer, 7, 0.5))
+        self.assertEqual(len(updates), 1)
+        self.assertEqual((updates[0].kind, updates[0].step), ("warn", 7))
+        self.assertIn("epoch_1", updates[0].msg)
+        self.assertIn("boom", updates[0].msg)
+        self.assertEqual(list(checkpoint_failure_updates(trainer, 8, 0.5)), [])
+        self.assertEqual(list(checkpoint_failure_updates(SimpleNamespace(), 8, 0.5)), [])
+
+    def test_keep_last_prunes_after_successful_writes(self):
+        """With keep_last=2 only the two newest numbered checkpoints remain."""
+        writer = CheckpointWriter(keep_last=2)
+        with tempfile.TemporaryDirectory() as d:
+            for epoch in range(1, 5):
+                writer.submit(os.path.join(d, f"epoch_{epoch}"), _save_state({"epoch": epoch}))
+            writer.close()
+            self.assertEqual(sorted(os.listdir(d)), ["epoch_3", "epoch_4"])
+
+
+class DirectoryHelperTests(unittest.TestCase):
+    """Tests for _replace_dir and _prune_numbered_siblings."""
+
+    def test_replace_dir_swaps_in_new_contents(self):
+        """An existing destination is replaced without leaving the old copy behind."""
+        with tempfile.TemporaryDirectory() as d:
+            src, dst = Path(d, "new.tmp"), Path(d, "ckpt")
+            src.mkdir()
+            Path(src, "a.pt").write_bytes(b"new")
+            dst.mkdir()
+            Path(dst, "b.pt").write_bytes(b"old")
+            Path(d, "ckpt.old").mkdir()
+            _replace_dir(src, dst)
+            self.assertEqual(sorted(os.listdir(d)), ["ckpt"])
+            self.assertEqual(os.listdir(dst), ["a.pt"])
+
+    def test_replace_dir_without_existing_destination(self):
+        """A missing destination is simply created by the rename."""
+        with tempfile.TemporaryDirectory() as d:
+            src, dst = Path(d, "new.tmp"), Path(d, "ckpt")
+            src.mkdir()
+            _replace_dir(src, dst)
+            self.assertEqual(os.listdir(d), ["ckpt"])
+
+    def test_prune_keeps_highest_numbers_of_same_prefix(self):
+        """Numbered siblings are ordered numerically; other names and files are left alone."""
+        with tempfile.TemporaryDirectory() as d:
+            for n in (1, 2, 9, 10, 11):
+                Path(d, f"epoch_{n}").mkdir()
+            Path(d, "epoch_best").mkdir()
+            Path(d, "step_3").mkdir()
+            Path(d, "epoch_12").write_bytes(b"not a dir")
+            _prune_numbered_siblings(Path(d, "epoch_11"), keep_last=2)
+            self.assertEqual(
+                sorted(os.listdir(d)), ["epoch_10", "epoch_11", "epoch_12", "epoch_best", "step_3"],
+            )
+
+    def test_prune_ignores_unnumbered_checkpoint(self):
+        """A checkpoint name without a numeric suffix prunes nothing."""
+        with tempfile.TemporaryDirectory() as d:
+            for name in ("epoch_1", "epoch_2", "final"):
+                Path(d, name).mkdir()
+            _prune_numbered_siblings(Path(d, "final"), keep_last=1)
+            self.assertEqual(sorted(os.listdir(d)), ["epoch_1", "epoch_2", "final"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -201,6 +201,18 @@ def _add_common_training_args(parser: argparse.ArgumentParser) -> None:
         default=_DEFAULT_NUM_WORKERS > 0,
         help="Keep workers alive between epochs (default: True; False on Windows)",
     )
+    g_data.add_argument(
+        "--length-bucketing",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Batch samples of similar length together to cut padding (default: True)",
+    )
+    g_data.add_argument(
+        "--max-frames-per-batch",
+        type=int,
+        default=0,
+        help="Size batches by padded latent frames instead of --batch-size (default: 0 = off)",
+    )
 
     # -- Training hyperparams ------------------------------------------------
     g_train = parser.add_argument_group("Training")
@@ -247,6 +259,7 @@ def _add_common_training_args(parser: argparse.ArgumentParser) -> None:
     g_ckpt.add_argument("--output-dir", type=str, required=True, help="Output directory for LoRA weights")
     g_ckpt.add_argument("--save-every", type=int, default=10, help="Save checkpoint every N epochs (default: 10)")
     g_ckpt.add_argument("--resume-from", type=str, default=None, help="Path to checkpoint dir to resume from")
+    g_ckpt.add_argument("--keep-checkpoints", type=int, default=0, help="Keep only the N most recent epoch checkpoints (default: 0 = keep all)")
 
     # -- Logging / TensorBoard -----------------------------------------------
     g_log = parser.add_argument_group("Logging / TensorBoard")
@@ -262,6 +275,10 @@ def _add_common_training_args(parser: argparse.ArgumentParser) -> None:
     g_pre.add_argument("--dataset-json", type=str, default=None, help="Labeled dataset JSON file (preprocessing)")
     g_pre.add_argument("--tensor-output", type=str, default=None, help="Output directory for .pt tensor files (preprocessing)")
     g_pre.add_argument("--max-duration", type=float, default=240.0, help="Max audio duration in seconds (default: 240)")
+    g_pre.add_argument("--preprocess-workers", type=int, default=2, help="Threads decoding audio ahead of the encoder; 0=inline (default: 2)")
+    g_pre.add_argument("--preprocess-batch-size", type=int, default=1, help="Max short clips VAE/text-encoded together; padding slightly changes the last latent frames (default: 1)")
+    g_pre.add_argument("--pack-tensors", action="store_true", default=False, help="Also write a packed, memory-mapped copy of the tensors (preprocessing)")
+    g_pre.add_argument("--pack-dtype", type=str, default=None, choices=["fp16", "bf16", "fp32"], help="Storage dtype of the packed tensors (default: unchanged)")
 
 
 def _add_fixed_args(parser: argparse.ArgumentParser) -> None:
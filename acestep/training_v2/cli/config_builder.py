@@ -151,6 +151,8 @@ def build_configs(args: argparse.Namespace) -> Tuple[AdapterConfig, TrainingConf
         pin_memory=args.pin_memory,
         prefetch_factor=prefetch_factor,
         persistent_workers=persistent_workers,
+        length_bucketing=getattr(args, "length_bucketing", True),
+        max_frames_per_batch=getattr(args, "max_frames_per_batch", 0),
         # V2 extensions
         adapter_type=adapter_type,
         optimizer_type=getattr(args, "optimizer_type", "adamw"),
@@ -167,6 +169,7 @@ def build_configs(args: argparse.Namespace) -> Tuple[AdapterConfig, TrainingConf
         device=gpu_info.device,
         precision=gpu_info.precision,
         resume_from=args.resume_from,
+        keep_last_n_checkpoints=getattr(args, "keep_checkpoints", 0),
         log_dir=args.log_dir,
         log_every=args.log_every,
         log_heavy_every=args.log_heavy_every,
@@ -186,6 +186,8 @@ def run_vanilla(args: argparse.Namespace) -> int:
         pin_memory=args.pin_memory,
         prefetch_factor=args.prefetch_factor,
         persistent_workers=args.persistent_workers,
+        length_bucketing=getattr(args, "length_bucketing", True),
+        max_frames_per_batch=getattr(args, "max_frames_per_batch", 0),
         log_every_n_steps=args.log_every,
     )
 
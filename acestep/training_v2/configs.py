@@ -119,6 +119,12 @@ class TrainingConfigV2(TrainingConfig):
     pin_memory_device: str = ""
     """Device for pinned memory ("" = default CUDA device)."""
 
+    length_bucketing: bool = True
+    """Batch samples of similar latent length together to cut padding."""
+
+    max_frames_per_batch: int = 0
+    """If > 0, size batches by padded latent frames instead of batch_size."""
+
     # --- Optimizer / Scheduler ------------------------------------------------
     optimizer_type: str = "adamw"
     """Optimizer: 'adamw', 'adamw8bit', 'adafactor', 'prodigy'."""
@@ -176,6 +182,9 @@ class TrainingConfigV2(TrainingConfig):
     resume_from: Optional[str] = None
     """Path to checkpoint directory to resume training from."""
 
+    keep_last_n_checkpoints: int = 0
+    """Keep only the N most recent epoch checkpoints (0 = keep all)."""
+
     # --- Extended TensorBoard logging ---------------------------------------
     log_dir: Optional[str] = None
     """TensorBoard log directory.  Defaults to {output_dir}/runs."""
@@ -246,6 +255,8 @@ class TrainingConfigV2(TrainingConfig):
                 "prefetch_factor": self.prefetch_factor,
                 "persistent_workers": self.persistent_workers,
                 "pin_memory_device": self.pin_memory_device,
+                "length_bucketing": self.length_bucketing,
+                "max_frames_per_batch": self.max_frames_per_batch,
                 "optimizer_type": self.optimizer_type,
                 "scheduler_type": self.scheduler_type,
                 "gradient_checkpointing": self.gradient_checkpointing,
@@ -262,6 +273,7 @@ class TrainingConfigV2(TrainingConfig):
                 "device": self.device,
                 "precision": self.precision,
                 "resume_from": self.resume_from,
+                "keep_last_n_checkpoints": self.keep_last_n_checkpoints,
                 "log_dir": self.log_dir,
                 "log_every": self.log_every,
                 "log_heavy_every": self.log_heavy_every,
@@ -33,11 +33,22 @@ from acestep.training_v2.preprocess_prompt import (
 )
 from acestep.training_v2.preprocess_vae import (
     TARGET_SR as _TARGET_SR,
+    latent_frames as _latent_frames,
     tiled_vae_encode as _tiled_vae_encode,
 )
+from acestep.training_v2.preprocess_pipeline import (
+    BackgroundWriter as _BackgroundWriter,
+    batch_short_clips as _batch_short_clips,
+    prefetch_audio as _prefetch_audio,
+    split_latents as _split_latents,
+    stack_padded as _stack_padded,
+)
 
 logger = logging.getLogger(__name__)
 
+# Padded length x batch size of one short-clip VAE batch (one small-GPU tile)
+_BATCH_BUDGET_SECONDS = 15.0
+
 
 # ---------------------------------------------------------------------------
 # Public API
@@ -54,6 +65,10 @@ def preprocess_audio_files(
     precision: str = "auto",
     progress_callback: Optional[Callable] = None,
     cancel_check: Optional[Callable] = None,
+    num_workers: int = 2,
+    encode_batch_size: int = 1,
+    pack: bool = False,
+    pack_dtype: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Preprocess audio files into .pt tensor format (two-pass pipeline).
 
@@ -81,6 +96,14 @@ def preprocess_audio_files(
         precision: Target precision (``"auto"`` to auto-detect).
         progress_callback: ``(current, total, message) -> None``.
         cancel_check: ``() -> bool`` -- return True to cancel.
+        num_workers: Threads decoding and resampling audio ahead of the
+            encoder in pass 1 (``0`` = decode inline).
+        encode_batch_size: Maximum number of short clips encoded together
+            in pass 1 (``1`` = one file per encoder call).
+        pack: Also write a packed, memory-mapped copy of the output
+            directory (see ``acestep.training.packed_dataset``).
+        pack_dtype: Optional ``"fp16"``/``"bf16"`` storage dtype for the
+            packed copy (default: keep the tensors' dtype).
 
     Returns:
         Dict with keys: ``processed``, ``failed``, ``total``, ``output_dir``.
@@ -127,6 +150,8 @@ def preprocess_audio_files(
         max_duration=max_duration,
         progress_callback=progress_callback,
         cancel_check=cancel_check,
+        num_workers=num_workers,
+        encode_batch_size=encode_batch_size,
     )
 
     # -- Pass 2: DIT Encoder ------------------------------------------------
@@ -142,6 +167,14 @@ def preprocess_audio_files(
     )
 
     failed = pass1_failed + pass2_failed
+
+    # -- Optional: pack all .pt files in the output directory ---------------
+    if pack and any(out_path.glob("*.pt")):
+        from acestep.training.packed_dataset import convert_tensor_dir, resolve_pack_dtype
+
+        logger.info("[Side-Step] Packing tensors into memory-mapped shards ...")
+        convert_tensor_dir(str(out_path), dtype=resolve_pack_dtype(pack_dtype))
+
     result = {
         "processed": processed,
         "failed": failed,
@@ -171,9 +204,15 @@ def _pass1_light(
     max_duration: float,
     progress_callback: Optional[Callable],
     cancel_check: Optional[Callable],
+    num_workers: int = 2,
+    encode_batch_size: int = 1,
 ) -> tuple[List[Path], int]:
     """Load audio, VAE-encode, text-encode, save intermediates.
 
+    Decoding runs ``num_workers`` files ahead of the encoder, consecutive
+    short clips are encoded up to ``encode_batch_size`` at a time, and the
+    intermediate files are written by a background thread.
+
     Args:
         ds_meta: Dataset-level metadata (``tag_position``, ``genre_ratio``,
             ``custom_tag``) from the JSON's top-level ``metadata`` block.
@@ -214,90 +253,107 @@ def _pass1_light(
     if tag_position != "prepend":
         logger.info("[Side-Step] tag_position=%s (from dataset metadata)", tag_position)
 
+    # Skip files whose final .pt already exists (resumable) before decoding
+    todo = []
+    for i, af in enumerate(audio_files):
+        if (out_path / f"{af.stem}.pt").exists():
+            logger.info("[Side-Step] Skipping (final exists): %s", af.name)
+        else:
+            todo.append((i, af))
+
+    clips = _prefetch_audio(
+        todo,
+        lambda af: load_audio_stereo(str(af), _TARGET_SR, max_duration)[0],
+        num_workers=num_workers,
+        lookahead=max(2 * num_workers, encode_batch_size),
+    )
+    writer = _BackgroundWriter()
+    silence_cpu = silence_latent.cpu()
+
     try:
-        for i, af in enumerate(audio_files):
+        for batch in _batch_short_clips(clips, encode_batch_size, int(_BATCH_BUDGET_SECONDS * _TARGET_SR)):
             if cancel_check and cancel_check():
-                logger.info("[Side-Step] Cancelled at %d/%d", i, total)
+                logger.info("[Side-Step] Cancelled at %d/%d", batch[0][0], total)
                 break
 
-            if progress_callback:
-                progress_callback(i, total, f"[Pass 1] {af.name}")
-
-            # Skip if final .pt already exists (resumable)
-            final_pt = out_path / f"{af.stem}.pt"
-            if final_pt.exists():
-                logger.info("[Side-Step] Skipping (final exists): %s", af.name)
+            for i, af, _audio, exc in batch:
+                if progress_callback:
+                    progress_callback(i, total, f"[Pass 1] {af.name}")
+                if exc is not None:
+                    failed += 1
+                    logger.error("[Side-Step] Pass 1 FAIL %s: %s", af.name, exc)
+            batch = [clip for clip in batch if clip[3] is None]
+            if not batch:
                 continue
 
             try:
-                # 1. Load audio (stereo, 48 kHz)
-                audio, _sr = load_audio_stereo(str(af), _TARGET_SR, max_duration)
-                audio = audio.unsqueeze(0).to(device=device, dtype=vae.dtype)
-
-                # 2. VAE encode (tiled for long audio)
+                # 1. VAE encode (tiled for long audio, padded batch for short clips)
+                audios = [clip[2] for clip in batch]
+                frames = [_latent_frames(vae, a.shape[-1]) for a in audios]
+                audio = _stack_padded(audios).to(device=device, dtype=vae.dtype)
+                del audios
                 with torch.no_grad():
-                    target_latents = _tiled_vae_encode(vae, audio, dtype)
+                    latents = _split_latents(_tiled_vae_encode(vae, audio, dtype), frames)
 
                 # Free raw audio immediately -- no longer needed after VAE encode
                 del audio
 
-                latent_length = target_latents.shape[1]
-                attention_mask = torch.ones(1, latent_length, device=device, dtype=dtype)
-
-                # 3. Text encode
-                sm = sample_meta.get(af.name, {})
-                caption = sm.get("caption", af.stem)
-                lyrics = sm.get("lyrics", "[Instrumental]")
-
-                # Build text prompt using dataset-level tag_position and genre_ratio
-                use_genre = i in genre_indices
-                text_prompt = _build_simple_prompt(sm, tag_position=tag_position, use_genre=use_genre)
+                # 2. Text encode, one call per batch
+                metas = [sample_meta.get(af.name, {}) for _, af, _, _ in batch]
+                lyrics_list = [sm.get("lyrics", "[Instrumental]") for sm in metas]
+                # Build text prompts using dataset-level tag_position and genre_ratio
+                text_prompts = [
+                    _build_simple_prompt(sm, tag_position=tag_position, use_genre=i in genre_indices)
+                    for (i, _, _, _), sm in zip(batch, metas)
+                ]
 
                 with torch.no_grad():
-                    text_hs, text_mask = encode_text(text_enc, tokenizer, text_prompt, device, dtype)
-                    lyric_hs, lyric_mask = encode_lyrics(text_enc, tokenizer, lyrics, device, dtype)
-
-                # 4. Save intermediate
-                tmp_path = out_path / f"{af.stem}.tmp.pt"
-                torch.save({
-                    "target_latents": target_latents.squeeze(0).cpu(),
-                    "attention_mask": attention_mask.squeeze(0).cpu(),
-                    "text_hidden_states": text_hs.cpu(),
-                    "text_attention_mask": text_mask.cpu(),
-                    "lyric_hidden_states": lyric_hs.cpu(),
-                    "lyric_attention_mask": lyric_mask.cpu(),
-                    "silence_latent": silence_latent.cpu(),
-                    "latent_length": latent_length,
-                    "metadata": {
-                        "audio_path": str(af),
-                        "filename": af.name,
-                        "caption": caption,
-                        "lyrics": lyrics,
-                        "duration": sm.get("duration", 0),
-                        "bpm": sm.get("bpm"),
-                        "keyscale": sm.get("keyscale", ""),
-                        "timesignature": sm.get("timesignature", ""),
-                        "genre": sm.get("genre", ""),
-                        "is_instrumental": sm.get("is_instrumental", True),
-                        "custom_tag": sm.get("custom_tag", ""),
-                        "prompt_override": sm.get("prompt_override"),
-                    },
-                }, tmp_path)
-
-                # Free GPU tensors from this iteration before the next one
-                del target_latents, attention_mask, text_hs, text_mask
-                del lyric_hs, lyric_mask
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-
-                intermediates.append(tmp_path)
-                logger.info("[Side-Step] Pass 1 OK: %s", af.name)
+                    text_hs, text_mask = encode_text(text_enc, tokenizer, text_prompts, device, dtype)
+                    lyric_hs, lyric_mask = encode_lyrics(text_enc, tokenizer, lyrics_list, device, dtype)
+                text_hs, text_mask = text_hs.cpu(), text_mask.cpu()
+                lyric_hs, lyric_mask = lyric_hs.cpu(), lyric_mask.cpu()
+
+                # 3. Queue intermediates for the background writer
+                for j, ((_, af, _, _), sm, target_latents) in enumerate(zip(batch, metas, latents)):
+                    latent_length = target_latents.shape[1]
+                    writer.submit({
+                        "target_latents": target_latents.squeeze(0).cpu(),
+                        "attention_mask": torch.ones(latent_length, dtype=dtype),
+                        "text_hidden_states": text_hs[j : j + 1].clone(),
+                        "text_attention_mask": text_mask[j : j + 1].clone(),
+                        "lyric_hidden_states": lyric_hs[j : j + 1].clone(),
+                        "lyric_attention_mask": lyric_mask[j : j + 1].clone(),
+                        "silence_latent": silence_cpu,
+                        "latent_length": latent_length,
+                        "metadata": {
+                            "audio_path": str(af),
+                            "filename": af.name,
+                            "caption": sm.get("caption", af.stem),
+                            "lyrics": lyrics_list[j],
+                            "duration": sm.get("duration", 0),
+                            "bpm": sm.get("bpm"),
+                            "keyscale": sm.get("keyscale", ""),
+                            "timesignature": sm.get("timesignature", ""),
+                            "genre": sm.get("genre", ""),
+                            "is_instrumental": sm.get("is_instrumental", True),
+                            "custom_tag": sm.get("custom_tag", ""),
+                            "prompt_override": sm.get("prompt_override"),
+                        },
+                    }, out_path / f"{af.stem}.tmp.pt")
+                    logger.info("[Side-Step] Pass 1 OK: %s", af.name)
+
+                del latents, text_hs, text_mask, lyric_hs, lyric_mask
 
             except Exception as exc:
-                failed += 1
-                logger.error("[Side-Step] Pass 1 FAIL %s: %s", af.name, exc)
+                failed += len(batch)
+                names = ", ".join(af.name for _, af, _, _ in batch)
+                logger.error("[Side-Step] Pass 1 FAIL %s: %s", names, exc)
 
     finally:
+        clips.close()
+        written, write_failed = writer.close()
+        intermediates.extend(written)
+        failed += write_failed
         logger.info("[Side-Step] Unloading VAE + Text Encoder ...")
         unload_models(vae, text_enc, tokenizer, silence_latent)
 
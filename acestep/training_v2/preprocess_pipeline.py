@@ -0,0 +1,170 @@
+"""
+Producer/consumer helpers for Pass 1 preprocessing.
+
+``prefetch_audio`` decodes and resamples upcoming files on a worker pool
+while the accelerator encodes the current ones, ``batch_short_clips``
+groups consecutive short clips so they share one VAE / text-encoder call,
+and ``BackgroundWriter`` moves the intermediate ``torch.save`` calls off
+the encode loop.
+
+Extracted from ``preprocess.py`` to keep that module under the LOC limit.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# (index, path, audio [C, S] or None, error or None)
+DecodedClip = Tuple[int, Path, Optional[torch.Tensor], Optional[BaseException]]
+
+
+def prefetch_audio(
+    items: Iterable[Tuple[int, Path]],
+    decode: Callable[[Path], torch.Tensor],
+    num_workers: int = 2,
+    lookahead: int = 4,
+) -> Iterator[DecodedClip]:
+    """Decode ``items`` ahead of the consumer, yielding results in input order.
+
+    At most ``lookahead`` files are decoded or waiting at any time, which
+    bounds host memory.  Decode errors are yielded, not raised, so one bad
+    file does not stop the run.  With ``num_workers <= 0`` files are
+    decoded inline.
+    """
+    if num_workers <= 0:
+        for index, path in items:
+            try:
+                yield index, path, decode(path), None
+            except Exception as exc:
+                yield index, path, None, exc
+        return
+
+    lookahead = max(lookahead, num_workers)
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="preprocess-decode") as pool:
+        pending: deque = deque()
+        it = iter(items)
+        try:
+            for index, path in it:
+                pending.append((index, path, pool.submit(decode, path)))
+                if len(pending) >= lookahead:
+                    yield _collect(pending.popleft())
+            while pending:
+                yield _collect(pending.popleft())
+        finally:
+            # Consumer stopped early (cancel/break): drop queued decodes
+            for _, _, future in pending:
+                future.cancel()
+
+
+def _collect(entry: Tuple[int, Path, Any]) -> DecodedClip:
+    index, path, future = entry
+    try:
+        return index, path, future.result(), None
+    except Exception as exc:
+        return index, path, None, exc
+
+
+def batch_short_clips(
+    clips: Iterable[DecodedClip],
+    max_batch: int,
+    budget_samples: int,
+) -> Iterator[List[DecodedClip]]:
+    """Group consecutive short clips into padded batches.
+
+    A clip joins the open batch while ``len(batch) * longest_clip`` stays
+    within ``budget_samples`` (so a padded batch is never larger than one
+    VAE tile) and the batch holds fewer than ``max_batch`` clips.  Long
+    clips and failed decodes are yielded alone; output order matches
+    input order.
+    """
+    batch: List[DecodedClip] = []
+    longest = 0
+    for clip in clips:
+        audio = clip[2]
+        length = audio.shape[-1] if audio is not None else 0
+        if max_batch > 1 and audio is not None and 2 * length <= budget_samples:
+            if batch and (len(batch) >= max_batch or (len(batch) + 1) * max(longest, length) > budget_samples):
+                yield batch
+                batch, longest = [], 0
+            batch.append(clip)
+            longest = max(longest, length)
+            continue
+        if batch:
+            yield batch
+            batch, longest = [], 0
+        yield [clip]
+    if batch:
+        yield batch
+
+
+def stack_padded(audios: List[torch.Tensor]) -> torch.Tensor:
+    """Right-pad ``[C, S]`` clips with silence and stack them to ``[B, C, S_max]``."""
+    if len(audios) == 1:
+        return audios[0].unsqueeze(0)
+    length = max(a.shape[-1] for a in audios)
+    out = audios[0].new_zeros(len(audios), audios[0].shape[0], length)
+    for i, audio in enumerate(audios):
+        out[i, :, : audio.shape[-1]] = audio
+    return out
+
+
+def split_latents(latents: torch.Tensor, frames: List[int]) -> List[torch.Tensor]:
+    """Cut padded ``[B, T, D]`` latents back to each clip's own length.
+
+    ``frames`` are the clips' latent frame counts (see
+    ``preprocess_vae.latent_frames``), i.e. what encoding each clip on
+    its own would have produced.
+    """
+    if latents.shape[0] == 1:
+        return [latents]
+    return [latents[i : i + 1, :n] for i, n in enumerate(frames)]
+
+
+class BackgroundWriter:
+    """Single thread that runs ``torch.save`` for queued payloads.
+
+    ``submit`` blocks once ``max_pending`` payloads are waiting, so a slow
+    disk throttles the encoder instead of growing host memory.  ``close``
+    waits for the queue to drain and returns ``(written_paths, failures)``
+    in submission order.
+    """
+
+    def __init__(self, max_pending: int = 8):
+        self._queue: "queue.Queue[Optional[Tuple[Dict[str, Any], Path]]]" = queue.Queue(maxsize=max(1, max_pending))
+        self._written: List[Path] = []
+        self._failed = 0
+        self._thread = threading.Thread(target=self._run, name="preprocess-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Dict[str, Any], path: Path) -> None:
+        """Queue ``payload`` to be saved at ``path``."""
+        self._queue.put((payload, path))
+
+    def close(self) -> Tuple[List[Path], int]:
+        """Flush pending writes and stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+        return self._written, self._failed
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            payload, path = item
+            try:
+                torch.save(payload, path)
+                self._written.append(path)
+            except Exception as exc:
+                self._failed += 1
+                logger.error("[Side-Step] Pass 1 FAIL writing %s: %s", path.name, exc)
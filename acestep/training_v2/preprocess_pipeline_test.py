@@ -0,0 +1,176 @@
+"""Tests for the pass-1 preprocessing pipeline helpers."""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+import torch.nn.functional as F
+
+from acestep.training_v2.preprocess_pipeline import (
+    BackgroundWriter,
+    batch_short_clips,
+    prefetch_audio,
+    split_latents,
+    stack_padded,
+)
+from acestep.training_v2.preprocess_vae import latent_frames, tiled_vae_encode
+
+try:
+    from diffusers import AutoencoderOobleck
+except ImportError as exc:  # pragma: no cover - optional in minimal test envs
+    AutoencoderOobleck = None
+    _IMPORT_ERROR = exc
+else:
+    _IMPORT_ERROR = None
+
+_HOP = 8
+
+
+class _PoolingVAE(torch.nn.Module):
+    """VAE stand-in: every latent frame is the mean of its own ``_HOP`` samples.
+
+    Frames never see neighbouring samples, so a padded batch must
+    reproduce solo encodes exactly once trimmed to the right length.
+    """
+
+    config = SimpleNamespace(downsampling_ratios=[2, 4])
+
+    def __init__(self):
+        super().__init__()
+        self.scale = torch.nn.Parameter(torch.ones(()))
+
+    @property
+    def dtype(self):
+        return self.scale.dtype
+
+    def encode(self, audio):
+        latents = F.avg_pool1d(audio, _HOP) * self.scale
+        return SimpleNamespace(latent_dist=SimpleNamespace(sample=lambda: latents))
+
+
+def _clip(index, length, error=None):
+    """A decoded clip tuple with ``length`` samples (or a failed decode)."""
+    audio = None if error else torch.randn(2, length)
+    return index, Path(f"clip{index}.wav"), audio, error
+
+
+class BatchShortClipsTests(unittest.TestCase):
+    """Tests for batch_short_clips."""
+
+    def test_groups_short_clips_within_budget_and_keeps_order(self):
+        """Short clips share batches; long clips and failed decodes go alone."""
+        clips = [_clip(0, 10), _clip(1, 20), _clip(2, 30), _clip(3, 80), _clip(4, 5, OSError("bad")), _clip(5, 10)]
+        batches = list(batch_short_clips(clips, max_batch=4, budget_samples=60))
+        self.assertEqual([[c[0] for c in b] for b in batches], [[0, 1], [2], [3], [4], [5]])
+        for batch in batches:
+            if len(batch) > 1:
+                self.assertLessEqual(len(batch) * max(c[2].shape[-1] for c in batch), 60)
+
+    def test_max_batch_one_disables_batching(self):
+        """With max_batch=1 every clip is its own batch."""
+        batches = list(batch_short_clips([_clip(i, 4) for i in range(3)], max_batch=1, budget_samples=1000))
+        self.assertEqual([len(b) for b in batches], [1, 1, 1])
+
+
+class StackAndSplitTests(unittest.TestCase):
+    """Tests for stack_padded, split_latents and latent_frames."""
+
+    def test_stack_padded_zero_pads_to_longest(self):
+        """Clips are right-padded with silence to the longest one."""
+        a, b = torch.ones(2, 3), torch.full((2, 5), 2.0)
+        out = stack_padded([a, b])
+        self.assertEqual(tuple(out.shape), (2, 2, 5))
+        self.assertTrue(torch.equal(out[0, :, :3], a))
+        self.assertEqual(out[0, :, 3:].abs().sum().item(), 0.0)
+        self.assertTrue(torch.equal(out[1], b))
+        self.assertEqual(tuple(stack_padded([a]).shape), (1, 2, 3))
+
+    def test_batched_latents_match_solo_encodes(self):
+        """Split batched latents have the solo lengths and values for any clip length."""
+        vae = _PoolingVAE()
+        audios = [torch.randn(2, n) for n in (87, 120, 95, 9, 8)]
+        frames = [latent_frames(vae, a.shape[-1]) for a in audios]
+        with torch.no_grad():
+            batched = split_latents(tiled_vae_encode(vae, stack_padded(audios), torch.float32), frames)
+            solo = [tiled_vae_encode(vae, a.unsqueeze(0), torch.float32) for a in audios]
+        self.assertEqual(frames, [10, 15, 11, 1, 1])
+        for got, want in zip(batched, solo):
+            self.assertEqual(got.shape, want.shape)
+            self.assertTrue(torch.allclose(got, want))
+
+    def test_split_latents_keeps_single_clip_untouched(self):
+        """A batch of one is returned as is."""
+        latents = torch.randn(1, 7, 4)
+        self.assertIs(split_latents(latents, [3])[0], latents)
+
+    @unittest.skipIf(AutoencoderOobleck is None, f"diffusers import unavailable: {_IMPORT_ERROR}")
+    def test_latent_frames_matches_oobleck_encoder(self):
+        """latent_frames reproduces the real VAE encoder's output length."""
+        torch.manual_seed(0)
+        vae = AutoencoderOobleck(
+            encoder_hidden_size=4, downsampling_ratios=[2, 4, 4, 6, 10], channel_multiples=[1, 1, 1, 1, 1],
+            decoder_channels=4, decoder_input_channels=4,
+        ).eval()
+        for n in (3839, 3840, 3841, 5759, 7000):
+            with torch.no_grad():
+                got = vae.encode(torch.randn(1, 2, n)).latent_dist.mean.shape[-1]
+            self.assertEqual(latent_frames(vae, n), got, n)
+
+
+class PrefetchAudioTests(unittest.TestCase):
+    """Tests for prefetch_audio."""
+
+    def test_yields_in_input_order_and_reports_errors(self):
+        """Results keep input order; a failing decode is yielded, not raised."""
+        def decode(path):
+            if path.name == "bad.wav":
+                raise ValueError("corrupt")
+            return torch.full((1, 1), float(path.stem))
+
+        items = [(0, Path("3.wav")), (1, Path("bad.wav")), (2, Path("5.wav"))]
+        for workers in (0, 2):
+            out = list(prefetch_audio(items, decode, num_workers=workers, lookahead=2))
+            self.assertEqual([i for i, _, _, _ in out], [0, 1, 2])
+            self.assertEqual(out[0][2].item(), 3.0)
+            self.assertIsNone(out[1][2])
+            self.assertIsInstance(out[1][3], ValueError)
+
+    def test_lookahead_bounds_decodes_in_flight(self):
+        """No more than ``lookahead`` files are decoded ahead of the consumer."""
+        started = []
+        lock = threading.Lock()
+
+        def decode(path):
+            with lock:
+                started.append(path)
+            return torch.zeros(1, 1)
+
+        items = [(i, Path(f"{i}.wav")) for i in range(20)]
+        gen = prefetch_audio(items, decode, num_workers=2, lookahead=3)
+        next(gen)
+        self.assertLessEqual(len(started), 3)
+        gen.close()
+
+
+class BackgroundWriterTests(unittest.TestCase):
+    """Tests for BackgroundWriter."""
+
+    def test_writes_in_order_and_counts_failures(self):
+        """Payloads are saved in submission order; unwritable paths are counted."""
+        with tempfile.TemporaryDirectory() as d:
+            writer = BackgroundWriter(max_pending=1)
+            paths = [Path(d) / f"{i}.pt" for i in range(3)]
+            for i, path in enumerate(paths):
+                writer.submit({"x": torch.tensor([i])}, path)
+            writer.submit({"x": torch.tensor([9])}, Path(d) / "missing" / "x.pt")
+            written, failed = writer.close()
+            self.assertEqual(written, paths)
+            self.assertEqual(failed, 1)
+            self.assertEqual(torch.load(paths[2])["x"].item(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
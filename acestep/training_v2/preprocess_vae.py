@@ -17,6 +17,21 @@ import torch
 # Target sample rate for ACE-Step models
 TARGET_SR = 48000
 
+# Audio samples per latent frame of the ACE-Step VAE
+VAE_HOP_LENGTH = 1920
+
+
+def latent_frames(vae: Any, num_samples: int) -> int:
+    """Latent frames ``vae.encode`` produces for *num_samples* audio samples.
+
+    Every encoder stage floors its output length, so the frame count is
+    ``num_samples // hop`` with ``hop`` the product of the VAE's
+    ``downsampling_ratios`` (:data:`VAE_HOP_LENGTH` when it has no config).
+    """
+    ratios = getattr(getattr(vae, "config", None), "downsampling_ratios", None)
+    hop = math.prod(ratios) if ratios else VAE_HOP_LENGTH
+    return max(1, num_samples // hop)
+
 
 def tiled_vae_encode(
     vae: Any,
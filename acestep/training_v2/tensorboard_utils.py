@@ -72,6 +72,9 @@ class TrainingLogger:
     def log_epoch_loss(self, loss: float, epoch: int) -> None:
         self.log_scalar("train/epoch_loss", loss, epoch)
 
+    def log_padding_ratio(self, ratio: float, epoch: int) -> None:
+        self.log_scalar("train/padding_ratio", ratio, epoch)
+
     def log_grad_norm(self, norm: float, step: int) -> None:
         self.log_scalar("train/grad_norm", norm, step)
 
@@ -20,7 +20,12 @@ import torch
 
 from acestep.training_v2.optim import build_optimizer, build_scheduler
 from acestep.training_v2.tensorboard_utils import TrainingLogger
-from acestep.training_v2.trainer_helpers import configure_memory_features, save_checkpoint, save_final
+from acestep.training_v2.trainer_helpers import (
+    checkpoint_failure_updates,
+    configure_memory_features,
+    save_checkpoint,
+    save_final,
+)
 from acestep.training_v2.ui import TrainingUpdate
 
 logger = logging.getLogger(__name__)
@@ -172,6 +177,8 @@ def run_basic_training_loop(
     for epoch in range(start_epoch, cfg.max_epochs):
         epoch_loss = 0.0
         num_updates = 0
+        epoch_padding = 0.0
+        num_batches = 0
         epoch_start = time.time()
 
         for batch in train_loader:
@@ -181,6 +188,8 @@ def run_basic_training_loop(
                 tb.close()
                 return
 
+            epoch_padding += batch.get("padding_ratio", 0.0)
+            num_batches += 1
             loss = module.training_step(batch)
             loss = loss / cfg.gradient_accumulation_steps
             loss.backward()
@@ -218,22 +227,29 @@ def run_basic_training_loop(
 
         epoch_time = time.time() - epoch_start
         avg_epoch_loss = epoch_loss / max(num_updates, 1)
+        avg_padding = epoch_padding / max(num_batches, 1)
         tb.log_epoch_loss(avg_epoch_loss, epoch + 1)
+        tb.log_padding_ratio(avg_padding, epoch + 1)
+        pad_msg = f", Padding: {avg_padding:.1%}" if cfg.batch_size > 1 or cfg.max_frames_per_batch > 0 else ""
         yield TrainingUpdate(
             step=global_step, loss=avg_epoch_loss,
-            msg=f"[OK] Epoch {epoch + 1}/{cfg.max_epochs} in {epoch_time:.1f}s",
+            msg=f"[OK] Epoch {epoch + 1}/{cfg.max_epochs} in {epoch_time:.1f}s{pad_msg}",
             kind="epoch", epoch=epoch + 1, max_epochs=cfg.max_epochs, epoch_time=epoch_time,
         )
 
         if (epoch + 1) % cfg.save_every_n_epochs == 0:
             ckpt_dir = str(output_dir / "checkpoints" / f"epoch_{epoch + 1}")
             save_checkpoint(trainer, optimizer, scheduler, epoch + 1, global_step, ckpt_dir)
+            # The save waited for the previous write, so its outcome is known
+            yield from checkpoint_failure_updates(trainer, global_step, avg_epoch_loss)
             yield TrainingUpdate(
                 step=global_step, loss=avg_epoch_loss,
-                msg=f"[OK] Checkpoint saved at epoch {epoch + 1}",
+                msg=f"[OK] Checkpoint at epoch {epoch + 1} is being written in the background",
                 kind="checkpoint", epoch=epoch + 1, max_epochs=cfg.max_epochs,
                 checkpoint_path=ckpt_dir,
             )
+        else:
+            yield from checkpoint_failure_updates(trainer, global_step, avg_epoch_loss)
 
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
@@ -257,6 +273,7 @@ def run_basic_training_loop(
     final_path = str(output_dir / "final")
     save_final(trainer, final_path)
     final_loss = module.training_losses[-1] if module.training_losses else 0.0
+    yield from checkpoint_failure_updates(trainer, global_step, final_loss)
 
     adapter_label = "LoKR" if trainer.adapter_type == "lokr" else "LoRA"
     tb.flush()
@@ -29,6 +29,7 @@ from acestep.training_v2.optim import build_optimizer, build_scheduler
 from acestep.training.data_module import PreprocessedDataModule
 
 # V2 modules
+from acestep.training_v2.checkpoint_writer import CheckpointWriter
 from acestep.training_v2.configs import TrainingConfigV2
 from acestep.training_v2.tensorboard_utils import TrainingLogger
 from acestep.training_v2.ui import TrainingUpdate
@@ -42,6 +43,7 @@ from acestep.training_v2.fixed_lora_module import (
     _select_fabric_precision,
 )
 from acestep.training_v2.trainer_helpers import (
+    checkpoint_failure_updates,
     configure_memory_features,
     offload_non_decoder,
     resume_checkpoint,
@@ -92,6 +94,7 @@ class FixedLoRATrainer:
 
         self.module: Optional[FixedLoRAModule] = None
         self.fabric: Optional[Any] = None
+        self.checkpoint_writer: Optional[CheckpointWriter] = None
         self.is_training = False
 
     # ------------------------------------------------------------------
@@ -149,6 +152,8 @@ class FixedLoRATrainer:
                 prefetch_factor=cfg.prefetch_factor if num_workers > 0 else None,
                 persistent_workers=cfg.persistent_workers if num_workers > 0 else False,
                 pin_memory_device=cfg.pin_memory_device,
+                length_bucketing=cfg.length_bucketing,
+                max_frames_per_batch=cfg.max_frames_per_batch,
             )
             data_module.setup("fit")
 
@@ -159,6 +164,9 @@ class FixedLoRATrainer:
             yield TrainingUpdate(0, 0.0, f"[OK] Loaded {len(data_module.train_dataset)} preprocessed samples", kind="info")
 
             # -- Dispatch to Fabric or basic loop ---------------------------
+            # Checkpoints are written on a background thread so the
+            # epoch loop does not wait for serialization.
+            self.checkpoint_writer = CheckpointWriter(keep_last=cfg.keep_last_n_checkpoints)
             if _FABRIC_AVAILABLE:
                 yield from self._train_fabric(data_module, training_state)
             else:
@@ -168,6 +176,9 @@ class FixedLoRATrainer:
             logger.exception("Training failed")
             yield TrainingUpdate(0, 0.0, f"[FAIL] Training failed: {exc}", kind="fail")
         finally:
+            if self.checkpoint_writer is not None:
+                self.checkpoint_writer.close()
+                self.checkpoint_writer = None
             self.is_training = False
 
     def stop(self) -> None:
@@ -352,6 +363,8 @@ class FixedLoRATrainer:
         for epoch in range(start_epoch, cfg.max_epochs):
             epoch_loss = 0.0
             num_updates = 0
+            epoch_padding = 0.0
+            num_batches = 0
             epoch_start = time.time()
 
             for _batch_idx, batch in enumerate(train_loader):
@@ -365,6 +378,8 @@ class FixedLoRATrainer:
                     tb.close()
                     return
 
+                epoch_padding += batch.get("padding_ratio", 0.0)
+                num_batches += 1
                 loss = self.module.training_step(batch)
                 loss = loss / cfg.gradient_accumulation_steps
                 self.fabric.backward(loss)
@@ -436,10 +451,13 @@ class FixedLoRATrainer:
             # End of epoch
             epoch_time = time.time() - epoch_start
             avg_epoch_loss = epoch_loss / max(num_updates, 1)
+            avg_padding = epoch_padding / max(num_batches, 1)
             tb.log_epoch_loss(avg_epoch_loss, epoch + 1)
+            tb.log_padding_ratio(avg_padding, epoch + 1)
+            pad_msg = f", Padding: {avg_padding:.1%}" if cfg.batch_size > 1 or cfg.max_frames_per_batch > 0 else ""
             yield TrainingUpdate(
                 step=global_step, loss=avg_epoch_loss,
-                msg=f"[OK] Epoch {epoch + 1}/{cfg.max_epochs} in {epoch_time:.1f}s, Loss: {avg_epoch_loss:.4f}",
+                msg=f"[OK] Epoch {epoch + 1}/{cfg.max_epochs} in {epoch_time:.1f}s, Loss: {avg_epoch_loss:.4f}{pad_msg}",
                 kind="epoch", epoch=epoch + 1, max_epochs=cfg.max_epochs, epoch_time=epoch_time,
             )
 
@@ -447,12 +465,16 @@ class FixedLoRATrainer:
             if (epoch + 1) % cfg.save_every_n_epochs == 0:
                 ckpt_dir = str(output_dir / "checkpoints" / f"epoch_{epoch + 1}")
                 self._save_checkpoint(optimizer, scheduler, epoch + 1, global_step, ckpt_dir)
+                # The save waited for the previous write, so its outcome is known
+                yield from checkpoint_failure_updates(self, global_step, avg_epoch_loss)
                 yield TrainingUpdate(
                     step=global_step, loss=avg_epoch_loss,
-                    msg=f"[OK] Checkpoint saved at epoch {epoch + 1}",
+                    msg=f"[OK] Checkpoint at epoch {epoch + 1} is being written in the background",
                     kind="checkpoint", epoch=epoch + 1, max_epochs=cfg.max_epochs,
                     checkpoint_path=ckpt_dir,
                 )
+            else:
+                yield from checkpoint_failure_updates(self, global_step, avg_epoch_loss)
 
             # Clear CUDA cache AFTER checkpoint save so serialization
             # temporaries are also freed.
@@ -479,6 +501,7 @@ class FixedLoRATrainer:
         final_path = str(output_dir / "final")
         self._save_final(final_path)
         final_loss = self.module.training_losses[-1] if self.module.training_losses else 0.0
+        yield from checkpoint_failure_updates(self, global_step, final_loss)
 
         adapter_label = "LoKR" if self.adapter_type == "lokr" else "LoRA"
         tb.flush()
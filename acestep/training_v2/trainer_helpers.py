@@ -11,7 +11,7 @@ from __future__ import annotations
 import logging
 import os
 from pathlib import Path
-from typing import Any, Generator, Optional, Tuple
+from typing import Any, Callable, Dict, Generator, Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -22,9 +22,11 @@ from acestep.training.lora_utils import (
     save_lora_weights,
 )
 from acestep.training.lokr_utils import (
+    save_lokr_state_dict,
     save_lokr_weights,
     load_lokr_weights,
 )
+from acestep.training_v2.checkpoint_writer import CheckpointWriter
 from acestep.training_v2.ui import TrainingUpdate
 
 logger = logging.getLogger(__name__)
@@ -145,16 +147,7 @@ def save_adapter_flat(trainer: Any, output_dir: str) -> None:
     os.makedirs(output_dir, exist_ok=True)
 
     if trainer.adapter_type == "lokr":
-        if module.lycoris_net is None:
-            logger.error(
-                "[BUG] adapter_type is 'lokr' but lycoris_net is None -- "
-                "cannot save LoKR weights.  This indicates a configuration or "
-                "injection error.  Refusing to silently save as LoRA."
-            )
-            raise RuntimeError(
-                "LoKR adapter type was requested but no LyCORIS network is "
-                "attached to the training module.  Cannot save weights."
-            )
+        _require_lycoris_net(module)
         lokr_meta = {"lokr_config": module.adapter_config.to_dict()}
         save_lokr_weights(module.lycoris_net, output_dir, metadata=lokr_meta)
     else:
@@ -167,6 +160,20 @@ def save_adapter_flat(trainer: Any, output_dir: str) -> None:
             save_lora_weights(module.model, output_dir)
 
 
+def _require_lycoris_net(module: Any) -> None:
+    """Refuse to save a LoKR run whose LyCORIS network is missing."""
+    if module.lycoris_net is None:
+        logger.error(
+            "[BUG] adapter_type is 'lokr' but lycoris_net is None -- "
+            "cannot save LoKR weights.  This indicates a configuration or "
+            "injection error.  Refusing to silently save as LoRA."
+        )
+        raise RuntimeError(
+            "LoKR adapter type was requested but no LyCORIS network is "
+            "attached to the training module.  Cannot save weights."
+        )
+
+
 def save_checkpoint(
     trainer: Any, optimizer: Any, scheduler: Any,
     epoch: int, global_step: int, ckpt_dir: str,
@@ -177,41 +184,124 @@ def save_checkpoint(
     are saved flat in *ckpt_dir* (same layout as ``save_final``), so
     users can point inference tools directly at any checkpoint.
     ``training_state.pt`` is saved alongside for resume support.
+
+    If ``trainer.checkpoint_writer`` is a ``CheckpointWriter`` the state
+    is copied to host memory and written on its worker thread, and this
+    returns as soon as the copies are queued.  Otherwise the checkpoint
+    is written before returning.
     """
-    save_adapter_flat(trainer, ckpt_dir)
+    writer = getattr(trainer, "checkpoint_writer", None)
+    background = writer is not None
+    if not background:
+        writer = CheckpointWriter()
+
+    previous_error = writer.wait()
+    if previous_error is not None:
+        logger.warning("[WARN] Previous checkpoint was not saved: %s", previous_error)
 
-    # Save optimizer / scheduler / progress for resume
-    training_state = {
+    write_adapter = _snapshot_adapter(trainer, writer)
+    training_state = writer.snapshot("training_state", {
         "epoch": epoch,
         "global_step": global_step,
         "optimizer_state_dict": optimizer.state_dict(),
         "scheduler_state_dict": scheduler.state_dict(),
-    }
-    state_path = os.path.join(ckpt_dir, "training_state.pt")
-    torch.save(training_state, state_path)
+    })
+
+    def write(out_dir: str) -> None:
+        write_adapter(out_dir)
+        torch.save(training_state, os.path.join(out_dir, "training_state.pt"))
+        _write_progress_safetensors(out_dir, epoch, global_step)
+
+    writer.submit(ckpt_dir, write)
+    if background:
+        logger.info(
+            "Training checkpoint queued for %s (epoch %d, step %d)",
+            ckpt_dir, epoch, global_step,
+        )
+        return
+
+    error = writer.wait()
+    if error is not None:
+        raise error
+    logger.info(
+        "Training checkpoint saved to %s (epoch %d, step %d)",
+        ckpt_dir, epoch, global_step,
+    )
+
+
+def _snapshot_adapter(trainer: Any, writer: CheckpointWriter) -> Callable[[str], None]:
+    """Copy the adapter weights to host memory; return a function that writes them.
 
-    # Also write a safetensors file with epoch/global_step so that
-    # load_training_checkpoint (which reads .safetensors) can restore
-    # training progress metadata.
+    Mirrors ``save_adapter_flat`` but never reads the live model from
+    the returned function, so it is safe to call while training goes on.
+    """
+    module = trainer.module
+    assert module is not None
+
+    if trainer.adapter_type == "lokr":
+        _require_lycoris_net(module)
+        weights = writer.snapshot("adapter", module.lycoris_net.state_dict())
+        lokr_meta = {"lokr_config": module.adapter_config.to_dict()}
+        return lambda out_dir: save_lokr_state_dict(weights, out_dir, metadata=lokr_meta)
+
+    decoder = _unwrap_decoder(module.model)
+    if not hasattr(decoder, "save_pretrained"):
+        # Non-PEFT fallback: same file as ``save_lora_weights``.
+        staged: Dict[str, Any] = {}
+        for name, param in module.model.named_parameters():
+            if "lora_" in name:
+                staged[name] = writer.host_copy(f"adapter/{name}", param)
+        return lambda out_dir: torch.save(staged, os.path.join(out_dir, "lora_weights.pt"))
+
+    # Adapter tensors only: PEFT filters the same keys from a full state dict.
+    trainable = {name for name, param in decoder.named_parameters() if param.requires_grad}
+    weights = writer.snapshot("adapter", {
+        name: tensor for name, tensor in decoder.state_dict().items()
+        if "lora_" in name or name in trainable
+    })
+
+    def write_adapter(out_dir: str) -> None:
+        # PEFT only reads the adapter config from the model here.
+        decoder.save_pretrained(out_dir, state_dict=weights)
+        logger.info("[OK] LoRA adapter saved to %s", out_dir)
+
+    return write_adapter
+
+
+def _write_progress_safetensors(out_dir: str, epoch: int, global_step: int) -> None:
+    """Write ``training_state.safetensors`` with epoch / global_step.
+
+    ``load_training_checkpoint`` reads training progress from it.
+    """
     try:
         from safetensors.torch import save_file as _save_safetensors
         meta_tensors = {
             "epoch": torch.tensor([epoch], dtype=torch.int64),
             "global_step": torch.tensor([global_step], dtype=torch.int64),
         }
-        sf_path = os.path.join(ckpt_dir, "training_state.safetensors")
+        sf_path = os.path.join(out_dir, "training_state.safetensors")
         _save_safetensors(meta_tensors, sf_path)
     except Exception as exc:
         logger.debug("Could not write training_state.safetensors: %s", exc)
 
-    logger.info(
-        "Training checkpoint saved to %s (epoch %d, step %d)",
-        ckpt_dir, epoch, global_step,
-    )
+
+def checkpoint_failure_updates(trainer: Any, step: int, loss: float) -> Generator[TrainingUpdate, None, None]:
+    """Yield a warning for every background checkpoint write that failed since the last call."""
+    writer = getattr(trainer, "checkpoint_writer", None)
+    if writer is None:
+        return
+    for ckpt_dir, exc in writer.take_failures():
+        yield TrainingUpdate(step, loss, f"[WARN] Checkpoint {ckpt_dir} was not saved: {exc}", kind="warn")
 
 
 def save_final(trainer: Any, output_dir: str) -> None:
     """Save final adapter weights (inference-ready, no training state)."""
+    writer = getattr(trainer, "checkpoint_writer", None)
+    if writer is not None:
+        # Make "training complete" imply every checkpoint is on disk.
+        error = writer.wait()
+        if error is not None:
+            logger.warning("[WARN] Last checkpoint was not saved: %s", error)
     save_adapter_flat(trainer, output_dir)
     verify_saved_adapter(output_dir)
 
@@ -143,6 +143,8 @@ class VanillaTrainer:
             save_every_n_epochs=getattr(cfg, "save_every_n_epochs", 10),
             num_workers=num_workers,
             pin_memory=getattr(cfg, "pin_memory", True),
+            length_bucketing=getattr(cfg, "length_bucketing", True),
+            max_frames_per_batch=getattr(cfg, "max_frames_per_batch", 0),
         )
 
         return lora_cfg, train_cfg, num_workers
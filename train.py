@@ -184,6 +184,10 @@ def _run_preprocess(args) -> int:
             dataset_json=dataset_json,
             device=getattr(args, "device", "auto"),
             precision=getattr(args, "precision", "auto"),
+            num_workers=getattr(args, "preprocess_workers", 2),
+            encode_batch_size=getattr(args, "preprocess_batch_size", 1),
+            pack=getattr(args, "pack_tensors", False),
+            pack_dtype=getattr(args, "pack_dtype", None),
         )
     except Exception as exc:
         print(f"[FAIL] Preprocessing failed: {exc}", file=sys.stderr)
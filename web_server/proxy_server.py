@@ -21,7 +21,9 @@ import os
 import re
 import json
 import time
+import sqlite3
 import asyncio
+import threading
 from datetime import datetime
 from collections import deque
 from typing import Iterable, Tuple, List, Dict, Optional, Deque, Any
@@ -146,12 +148,16 @@ def _get_client() -> httpx.AsyncClient:
 
 @app.on_event("startup")
 async def _startup():
-    global _http_client, _song_refresh_task, _ai_radio_task, _eve_task
+    global _http_client, _song_refresh_task, _ai_radio_task, _eve_task, _state_snapshot_task
     _http_client = httpx.AsyncClient(timeout=TIMEOUT, follow_redirects=True)
     await _refresh_song_cache(force=True)
     _song_refresh_task = asyncio.create_task(_song_refresh_loop())
 
-    # ✅ start AI radio loop
+    # ✅ periodic snapshots of in-memory presence + chat user DB
+    _state_snapshot_task = asyncio.create_task(_state_snapshot_loop())
+
+    # ✅ start AI radio loop (+ its background duration prober)
+    await _get_prober().start()
     _ai_radio_task = asyncio.create_task(_ai_radio_loop())
 
     # ✅ start eve loop
@@ -161,7 +167,16 @@ async def _startup():
 
 @app.on_event("shutdown")
 async def _shutdown():
-    global _http_client, _song_refresh_task, _ai_radio_task, _eve_task
+    global _http_client, _song_refresh_task, _ai_radio_task, _eve_task, _state_snapshot_task
+
+    if _state_snapshot_task:
+        _state_snapshot_task.cancel()
+        _state_snapshot_task = None
+    try:
+        await _snapshot_presence()
+        await _snapshot_chat_user_db()
+    except Exception:
+        pass
 
     if _eve_task:
         _eve_task.cancel()
@@ -170,6 +185,7 @@ async def _shutdown():
     if _ai_radio_task:
         _ai_radio_task.cancel()
         _ai_radio_task = None
+    await _get_prober().stop()
 
     if _song_refresh_task:
         _song_refresh_task.cancel()
@@ -208,9 +224,8 @@ async def _shutdown():
 
 
 # ============================================================
-# Song cache (in-memory)
+# Song list (backed by the song catalog below)
 # ============================================================
-_song_cache: List[Dict] = []
 _song_cache_ts: float = 0.0
 _song_lock = asyncio.Lock()
 _song_refresh_task: Optional[asyncio.Task] = None
@@ -291,63 +306,58 @@ def _fmt_created_at(epoch: Optional[float]) -> str:
         return ""
 
 
-def _index_song_json_by_mp3() -> Dict[str, Dict]:
+def _song_meta_bits(meta: Optional[Dict]) -> Dict:
     """
-    Map mp3 filename -> json metadata.
-    Best match: json["audio_path"] basename == mp3 filename.
-    If multiple JSONs map to same mp3, keep newest created_at.
-    Fallback: json filename base -> {base}.mp3
+    Display fields of a song sidecar JSON: job_id, created_at (epoch), audio_index,
+    caption, metas, author, title. Empty values when there is no usable sidecar.
     """
-    out: Dict[str, Dict] = {}
-    if not os.path.isdir(AUDIO_DIR):
-        return out
-
-    try:
-        for fn in os.listdir(AUDIO_DIR):
-            if not fn.lower().endswith(".json"):
-                continue
-
-            full = _safe_join_under_audio_dir(fn)
-            if not full or not os.path.isfile(full):
-                continue
-
-            meta = _load_json(full)
-            if not isinstance(meta, dict):
-                continue
-
-            mp3_name: Optional[str] = None
-
-            audio_path = meta.get("audio_path")
-            if isinstance(audio_path, str) and audio_path:
-                bn = os.path.basename(audio_path)
-                if bn.lower().endswith(".mp3") and _is_safe_filename(bn):
-                    mp3_name = bn
+    def _as_str(v) -> str:
+        return v.strip() if isinstance(v, str) else ""
 
-            if mp3_name is None:
-                base = fn[:-5]  # strip .json
-                guess = f"{base}.mp3"
-                if _is_safe_filename(guess):
-                    mp3_name = guess
+    def _pick_str(*vals) -> str:
+        for v in vals:
+            s = _as_str(v)
+            if s:
+                return s
+        return ""
 
-            if mp3_name is None:
-                continue
+    bits: Dict[str, Any] = {
+        "job_id": None,
+        "created_at": None,
+        "audio_index": 0,
+        "caption": "",
+        "metas": {},
+        "author": "",
+        "title": "",
+    }
+    if not isinstance(meta, dict):
+        return bits
 
-            if mp3_name in out:
-                if _json_created_at(meta) > _json_created_at(out[mp3_name]):
-                    out[mp3_name] = meta
-            else:
-                out[mp3_name] = meta
+    bits["job_id"] = meta.get("job_id") or None
+    try:
+        if meta.get("created_at") is not None:
+            bits["created_at"] = float(meta.get("created_at"))
+    except Exception:
+        bits["created_at"] = None
 
-    except OSError:
-        return {}
+    try:
+        if meta.get("audio_index") is not None:
+            bits["audio_index"] = int(meta.get("audio_index"))
+    except Exception:
+        bits["audio_index"] = 0
 
-    return out
+    metas = meta.get("metas") if isinstance(meta.get("metas"), dict) else {}
+    cap = metas.get("caption")
+    bits["metas"] = metas
+    bits["caption"] = cap if isinstance(cap, str) else ""
+    bits["title"] = _pick_str(metas.get("title"), metas.get("song_title"), meta.get("title"), meta.get("song_title"))
+    bits["author"] = _pick_str(metas.get("author"), metas.get("artist"), meta.get("author"), meta.get("artist"))
+    return bits
 
 
-def _scan_audio_dir() -> List[Dict]:
+def _generated_song_item(fn: str, fs_mtime: float, meta: Optional[Dict]) -> Tuple[Dict, float]:
     """
-    Build a list of songs from AUDIO_DIR.
-    Files are named {audio_id}.mp3.
+    /songs item for {audio_id}.mp3 in AUDIO_DIR, plus its sort epoch.
 
     What your index.html expects for /songs:
       - item.label OR item.prompt  -> display label (else shows "Song")
@@ -359,132 +369,448 @@ def _scan_audio_dir() -> List[Dict]:
       - item.author, item.title    -> from JSON so it persists across reloads
       - item.metas                 -> full metas dict for metadata popup
     """
-    out: List[Dict] = []
+    audio_id = fn[:-4]  # strip .mp3
+    bits = _song_meta_bits(meta)
+    created_at_epoch = bits["created_at"]
+    sort_epoch = created_at_epoch if created_at_epoch is not None else fs_mtime
+    style_text = bits["caption"] or ""
 
-    if not os.path.isdir(AUDIO_DIR):
-        return out
+    item = {
+        "task_id": bits["job_id"] or audio_id,
+        "output_index": bits["audio_index"],
+        "created_at": _fmt_created_at(created_at_epoch) if created_at_epoch is not None else "",
+        "label": style_text,
+        "prompt": style_text,
 
-    meta_by_mp3 = _index_song_json_by_mp3()
+        "filename": fn,
+        "file": f"/api_audio/{quote(fn)}",
+        "mtime": int(sort_epoch),
 
-    def _as_str(v) -> str:
-        return v.strip() if isinstance(v, str) else ""
+        "author": bits["author"],
+        "title": bits["title"],
+        "metas": bits["metas"],
 
-    def _pick_str(*vals) -> str:
-        for v in vals:
-            s = _as_str(v)
-            if s:
-                return s
-        return ""
+        "job_id": bits["job_id"],
+        "audio_id": audio_id,
+        "caption": bits["caption"],
+    }
+    return item, float(sort_epoch)
 
-    try:
-        mp3_entries: List[Tuple[float, str]] = []
-        for fn in os.listdir(AUDIO_DIR):
-            if not fn.lower().endswith(".mp3"):
-                continue
-            full = _safe_join_under_audio_dir(fn)
-            if not full or not os.path.isfile(full):
-                continue
-            try:
-                fs_mtime = os.path.getmtime(full)
-            except OSError:
-                fs_mtime = 0.0
-            mp3_entries.append((fs_mtime, fn))
-
-        mp3_entries.sort(key=lambda x: x[0], reverse=True)
-
-        for fs_mtime, fn in mp3_entries:
-            audio_id = fn[:-4]  # strip .mp3
-            meta = meta_by_mp3.get(fn)
-
-            # fallback: same-basename json (audio_id.json)
-            if meta is None:
-                json_guess = f"{audio_id}.json"
-                json_path = _safe_join_under_audio_dir(json_guess)
-                if json_path and os.path.isfile(json_path):
-                    meta = _load_json(json_path)
-
-            job_id = None
-            created_at_epoch: Optional[float] = None
-            audio_index = 0
-            caption = ""
-            metas: Dict = {}
-            author = ""
-            title = ""
-
-            if isinstance(meta, dict):
-                job_id = meta.get("job_id") or None
 
-                try:
-                    if meta.get("created_at") is not None:
-                        created_at_epoch = float(meta.get("created_at"))
-                except Exception:
-                    created_at_epoch = None
+def _archive_mp3_item(rel: str, name: str, size: int, mtime: float, meta: Optional[Dict]) -> Dict:
+    """
+    /archive/browse item for an mp3; author/title/metas/caption come from {same_base}.json if present.
+    """
+    bits = _song_meta_bits(meta)
+    created_at_epoch = bits["created_at"]
+    return {
+        "type": "mp3",
+        "name": name,
+        "path": rel,
+        "size": size,
+        "mtime": int(mtime),
+        "file": f"/archive/api_audio/{quote(rel)}",
+        "task_id": bits["job_id"] or os.path.splitext(name)[0],
+        "output_index": bits["audio_index"],
+        "created_at": _fmt_created_at(created_at_epoch) if created_at_epoch is not None else "",
+        "label": bits["caption"],
+        "prompt": bits["caption"],
+        "author": bits["author"],
+        "title": bits["title"],
+        "metas": bits["metas"],
+    }
 
-                try:
-                    if meta.get("audio_index") is not None:
-                        audio_index = int(meta.get("audio_index"))
-                except Exception:
-                    audio_index = 0
 
-                metas = meta.get("metas") if isinstance(meta.get("metas"), dict) else {}
-                cap = metas.get("caption")
-                caption = cap if isinstance(cap, str) else ""
+# ============================================================
+# Song catalog (SQLite, updated incrementally)
+# ============================================================
+# /songs, /archive/browse and the AI radio pickers query this index instead of
+# rescanning directories. A sync only re-lists directories whose mtime changed
+# (sidecars are written atomically, so a new or rewritten song always touches its
+# directory) and only re-parses sidecar JSONs whose size/mtime changed. Each
+# directory is still re-listed once per process to catch in-place edits.
+#
+# Sources:
+#   "generated" -> AUDIO_DIR (flat). A sidecar belongs to the mp3 named by its
+#                  "audio_path" (else {json base}.mp3); newest created_at wins,
+#                  fallback {audio_id}.json.
+#   "archive"   -> ARCHIVE_DIR (recursive). {same_base}.json next to the mp3.
+#
+# The same DB holds the AI radio duration probes (see Mp3DurationProber).
+SONG_CATALOG_DB = os.getenv(
+    "ACESTEP_SONG_CATALOG_DB",
+    os.path.abspath(os.path.join(os.getcwd(), ".cache", "acestep", "song_catalog.sqlite3")),
+)
 
-                title = _pick_str(
-                    metas.get("title"),
-                    metas.get("song_title"),
-                    meta.get("title"),
-                    meta.get("song_title"),
-                )
-                author = _pick_str(
-                    metas.get("author"),
-                    metas.get("artist"),
-                    meta.get("author"),
-                    meta.get("artist"),
-                )
+# Directory mtimes this close to the scan time are not trusted (coarse fs timestamps)
+_CATALOG_MTIME_SLACK = 2.0
+
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    source TEXT PRIMARY KEY,
+    base TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    source TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (source, path)
+);
+CREATE TABLE IF NOT EXISTS sidecars (
+    source TEXT NOT NULL,
+    path TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    target TEXT,
+    created_at REAL,
+    meta TEXT,
+    PRIMARY KEY (source, path)
+);
+CREATE INDEX IF NOT EXISTS sidecars_by_dir ON sidecars (source, dir);
+CREATE TABLE IF NOT EXISTS entries (
+    source TEXT NOT NULL,
+    path TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sig TEXT NOT NULL,
+    sort_epoch REAL NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (source, path)
+);
+CREATE INDEX IF NOT EXISTS entries_by_dir ON entries (source, dir, kind, sort_epoch DESC);
+CREATE INDEX IF NOT EXISTS entries_by_kind ON entries (source, kind, sort_epoch DESC);
+CREATE TABLE IF NOT EXISTS probes (
+    key TEXT PRIMARY KEY,
+    validator TEXT NOT NULL,
+    duration REAL NOT NULL,
+    probed_at REAL NOT NULL
+);
+"""
 
-            visible_id = job_id or audio_id
 
-            created_at_str = _fmt_created_at(created_at_epoch) if created_at_epoch is not None else ""
-            sort_epoch = created_at_epoch if created_at_epoch is not None else fs_mtime
+def _join_rel(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
 
-            style_text = caption or ""
 
-            out.append(
-                {
-                    "task_id": visible_id,
-                    "output_index": audio_index,
-                    "created_at": created_at_str,
-                    "label": style_text,
-                    "prompt": style_text,
+def _sidecar_target(source: str, name: str, meta: Optional[Dict]) -> Optional[str]:
+    """mp3 filename a sidecar JSON describes (generated source only)."""
+    if source != "generated" or not isinstance(meta, dict):
+        return None
+    audio_path = meta.get("audio_path")
+    if isinstance(audio_path, str) and audio_path:
+        bn = os.path.basename(audio_path)
+        if bn.lower().endswith(".mp3") and _is_safe_filename(bn):
+            return bn
+    guess = f"{name[:-5]}.mp3"  # strip .json
+    return guess if _is_safe_filename(guess) else None
 
-                    "filename": fn,
-                    "file": f"/api_audio/{quote(fn)}",
-                    "mtime": int(sort_epoch),
 
-                    "author": author,
-                    "title": title,
-                    "metas": metas,
+class SongCatalog:
+    """
+    SQLite index of local songs (one connection per thread, WAL so reads never
+    wait on a sync). All methods block: call them via asyncio.to_thread.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._rescanned: set = set()  # (source, dir) listed at least once by this process
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._write_lock:
+            self._conn().executescript(_CATALOG_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------------------------
+    # Sync
+    # ---------------------------
+    def sync(self, source: str, base_dir: str, rel_dir: str = "", recursive: bool = True) -> bool:
+        """
+        Bring the catalog of `source` up to date for rel_dir (and below if recursive).
+        Returns False if the directory does not exist.
+        """
+        base_abs = os.path.abspath(base_dir)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                row = conn.execute("SELECT base FROM roots WHERE source = ?", (source,)).fetchone()
+                if row is None or row[0] != base_abs:
+                    # base dir moved (env change): start over
+                    self._drop_tree(conn, source, "")
+                    conn.execute("INSERT OR REPLACE INTO roots (source, base) VALUES (?, ?)", (source, base_abs))
+
+                started = time.time()
+                known = dict(conn.execute("SELECT path, mtime FROM dirs WHERE source = ?", (source,)))
+
+                start_full = os.path.join(base_abs, rel_dir) if rel_dir else base_abs
+                if not os.path.isdir(start_full):
+                    self._drop_tree(conn, source, rel_dir)
+                    return False
+
+                stack = [rel_dir]
+                while stack:
+                    rel = stack.pop()
+                    full = os.path.join(base_abs, rel) if rel else base_abs
+                    try:
+                        mtime = os.stat(full).st_mtime
+                    except OSError:
+                        continue
+
+                    if (source, rel) in self._rescanned and known.get(rel) == mtime:
+                        subdirs = [
+                            r[0] for r in conn.execute(
+                                "SELECT path FROM entries WHERE source = ? AND dir = ? AND kind = 'dir'",
+                                (source, rel),
+                            )
+                        ]
+                    else:
+                        try:
+                            subdirs = self._rescan_dir(conn, source, base_abs, rel, full)
+                        except OSError:
+                            continue
+                        self._rescanned.add((source, rel))
+                        trusted = mtime if mtime < started - _CATALOG_MTIME_SLACK else -1.0
+                        conn.execute(
+                            "INSERT OR REPLACE INTO dirs (source, path, mtime) VALUES (?, ?, ?)",
+                            (source, rel, trusted),
+                        )
+
+                    if recursive:
+                        stack.extend(subdirs)
+        return True
+
+    def _rescan_dir(self, conn: sqlite3.Connection, source: str, base_abs: str, rel: str, full: str) -> List[str]:
+        """Re-list one directory; only changed files are re-parsed / rewritten. Returns subdir paths."""
+        listing: Dict[str, Tuple[str, str, int, float]] = {}  # path -> (kind, name, size, mtime)
+        with os.scandir(full) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        kind = "dir"
+                    elif entry.is_file():
+                        lower = name.lower()
+                        if lower.endswith(".mp3"):
+                            kind = "mp3"
+                        elif lower.endswith(".json"):
+                            kind = "json"
+                        else:
+                            continue
+                    else:
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                listing[_join_rel(rel, name)] = (kind, name, int(st.st_size), float(st.st_mtime))
+
+        # 1) sidecars: parse only new/changed JSON files
+        old_sidecars = {
+            path: (size, mtime)
+            for path, size, mtime in conn.execute(
+                "SELECT path, size, mtime FROM sidecars WHERE source = ? AND dir = ?", (source, rel)
+            )
+        }
+        for path, (kind, name, size, mtime) in listing.items():
+            if kind != "json" or old_sidecars.get(path) == (size, mtime):
+                continue
+            meta = _load_json(os.path.join(base_abs, path))
+            if not isinstance(meta, dict):
+                meta = None
+            conn.execute(
+                "INSERT OR REPLACE INTO sidecars (source, path, dir, size, mtime, target, created_at, meta) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    source, path, rel, size, mtime,
+                    _sidecar_target(source, name, meta),
+                    _json_created_at(meta) if meta is not None else None,
+                    json.dumps(meta, ensure_ascii=False) if meta is not None else None,
+                ),
+            )
+        conn.executemany(
+            "DELETE FROM sidecars WHERE source = ? AND path = ?",
+            [(source, path) for path in old_sidecars if path not in listing],
+        )
+
+        sidecars: Dict[str, Tuple[int, float, bool]] = {}
+        best_by_target: Dict[str, Tuple[float, str]] = {}
+        for path, size, mtime, target, created_at, has_meta in conn.execute(
+            "SELECT path, size, mtime, target, created_at, meta IS NOT NULL FROM sidecars WHERE source = ? AND dir = ?",
+            (source, rel),
+        ):
+            sidecars[path] = (size, mtime, bool(has_meta))
+            if target and has_meta:
+                key = (float(created_at or 0.0), path)
+                if target not in best_by_target or key > best_by_target[target]:
+                    best_by_target[target] = key
+
+        def _sidecar_for(path: str, name: str) -> Optional[str]:
+            if source == "generated":
+                best = best_by_target.get(name)
+                if best is not None:
+                    return best[1]
+                guess = _join_rel(rel, f"{name[:-4]}.json")
+            else:
+                guess = os.path.splitext(path)[0] + ".json"
+            return guess if guess in sidecars and sidecars[guess][2] else None
+
+        # 2) entries: rebuild only rows whose signature changed
+        old_entries = {
+            path: (kind, sig)
+            for path, kind, sig in conn.execute(
+                "SELECT path, kind, sig FROM entries WHERE source = ? AND dir = ?", (source, rel)
+            )
+        }
+        subdirs: List[str] = []
+        for path, (kind, name, size, mtime) in listing.items():
+            sidecar = _sidecar_for(path, name) if kind == "mp3" else None
+            sig = f"{size}:{mtime}"
+            if sidecar is not None:
+                sig += f":{sidecar}:{sidecars[sidecar][0]}:{sidecars[sidecar][1]}"
+            if kind == "dir":
+                subdirs.append(path)
+            if old_entries.get(path) == (kind, sig):
+                continue
 
-                    "job_id": job_id,
-                    "audio_id": audio_id,
-                    "caption": caption,
-                    "_created_at_epoch": created_at_epoch,
+            if kind == "dir":
+                item, sort_epoch = {"type": "dir", "name": name, "path": path, "mtime": int(mtime)}, mtime
+            elif kind == "json":
+                item = {
+                    "type": "json",
+                    "name": name,
+                    "path": path,
+                    "size": size,
+                    "mtime": int(mtime),
+                    "file": f"/archive/api_audio/{quote(path)}",
                 }
+                sort_epoch = mtime
+            else:
+                meta = None
+                if sidecar is not None:
+                    row = conn.execute(
+                        "SELECT meta FROM sidecars WHERE source = ? AND path = ?", (source, sidecar)
+                    ).fetchone()
+                    meta = json.loads(row[0]) if row and row[0] else None
+                if source == "generated":
+                    item, sort_epoch = _generated_song_item(name, mtime, meta)
+                else:
+                    item, sort_epoch = _archive_mp3_item(path, name, size, mtime, meta), mtime
+
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (source, path, dir, name, kind, size, mtime, sig, sort_epoch, item) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, path, rel, name, kind, size, mtime, sig, sort_epoch, json.dumps(item, ensure_ascii=False)),
             )
 
-        out.sort(key=lambda s: float(s.get("_created_at_epoch") or s.get("mtime") or 0), reverse=True)
-        for s in out:
-            s.pop("_created_at_epoch", None)
+        for path, (kind, _sig) in old_entries.items():
+            if path in listing and listing[path][0] == kind:
+                continue
+            if kind == "dir":
+                self._drop_tree(conn, source, path)
+            elif path not in listing:
+                conn.execute("DELETE FROM entries WHERE source = ? AND path = ?", (source, path))
+        return subdirs
+
+    @staticmethod
+    def _drop_tree(conn: sqlite3.Connection, source: str, rel: str) -> None:
+        """Forget rel (a directory) and everything below it."""
+        for table in ("dirs", "sidecars", "entries"):
+            if rel == "":
+                conn.execute(f"DELETE FROM {table} WHERE source = ?", (source,))
+            else:
+                prefix = rel + "/"
+                conn.execute(
+                    f"DELETE FROM {table} WHERE source = ? AND (path = ? OR substr(path, 1, ?) = ?)",
+                    (source, rel, len(prefix), prefix),
+                )
 
-    except OSError:
-        return []
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    def songs(self, source: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Top-level mp3 items of `source`, newest first, and the total count."""
+        conn = self._conn()
+        total = conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE source = ? AND dir = '' AND kind = 'mp3'", (source,)
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT item FROM entries WHERE source = ? AND dir = '' AND kind = 'mp3' "
+            "ORDER BY sort_epoch DESC LIMIT ? OFFSET ?",
+            (source, -1 if limit is None else max(0, limit), max(0, offset)),
+        )
+        return [json.loads(r[0]) for r in rows], total
+
+    def browse(self, source: str, rel: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Entries of one directory (dirs first, then newest first) and the total count."""
+        conn = self._conn()
+        total = conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE source = ? AND dir = ?", (source, rel)
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT item FROM entries WHERE source = ? AND dir = ? "
+            "ORDER BY kind = 'dir' DESC, sort_epoch DESC, name LIMIT ? OFFSET ?",
+            (source, rel, -1 if limit is None else max(0, limit), max(0, offset)),
+        )
+        return [json.loads(r[0]) for r in rows], total
+
+    def random_song(self, source: str) -> Optional[Dict[str, Any]]:
+        """
+        A random mp3 of `source`: {"item", "path", "size", "mtime"}.
+        """
+        conn = self._conn()
+        total = conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE source = ? AND kind = 'mp3'", (source,)
+        ).fetchone()[0]
+        if not total:
+            return None
+        row = conn.execute(
+            "SELECT path, size, mtime, item FROM entries WHERE source = ? AND kind = 'mp3' "
+            "ORDER BY path LIMIT 1 OFFSET ?",
+            (source, secrets.randbelow(total)),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"path": row[0], "size": row[1], "mtime": row[2], "item": json.loads(row[3])}
+
+    def probes(self) -> List[Tuple[str, str, float, float]]:
+        """All stored (key, validator, duration, probed_at) probe results."""
+        return self._conn().execute("SELECT key, validator, duration, probed_at FROM probes").fetchall()
+
+    def set_probe(self, key: str, validator: str, duration: float, probed_at: float) -> None:
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO probes (key, validator, duration, probed_at) VALUES (?, ?, ?, ?)",
+                    (key, validator, float(duration), float(probed_at)),
+                )
 
-    return out
+
+_song_catalog: Optional[SongCatalog] = None
+
+
+def _get_catalog() -> SongCatalog:
+    global _song_catalog
+    if _song_catalog is None:
+        _song_catalog = SongCatalog(SONG_CATALOG_DB)
+    return _song_catalog
 
 
 async def _refresh_song_cache(force: bool = False) -> None:
-    global _song_cache, _song_cache_ts
+    global _song_cache_ts
     now = time.time()
     if (not force) and (now - _song_cache_ts) < SONG_REFRESH_SECONDS:
         return
@@ -493,7 +819,7 @@ async def _refresh_song_cache(force: bool = False) -> None:
         now2 = time.time()
         if (not force) and (now2 - _song_cache_ts) < SONG_REFRESH_SECONDS:
             return
-        _song_cache = _scan_audio_dir()
+        await asyncio.to_thread(_get_catalog().sync, "generated", AUDIO_DIR, "", False)
         _song_cache_ts = now2
 
 
@@ -556,9 +882,19 @@ async def favicon():
 
 
 @app.get("/songs")
-async def songs():
+async def songs(offset: int = 0, limit: Optional[int] = None):
     await _refresh_song_cache(force=False)
-    return JSONResponse({"songs": _song_cache, "dir": AUDIO_DIR, "refreshed_at": int(_song_cache_ts)})
+    items, total = await asyncio.to_thread(_get_catalog().songs, "generated", offset, limit)
+    return JSONResponse(
+        {
+            "songs": items,
+            "dir": AUDIO_DIR,
+            "refreshed_at": int(_song_cache_ts),
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+        }
+    )
 
 
 @app.get("/api_audio/{filename}")
@@ -582,64 +918,6 @@ async def api_audio(filename: str):
 # ✅ Archive endpoints (LOCAL + REMOTE ALIAS)
 # ============================================================
 
-def _archive_extract_meta_for_mp3(mp3_full_path: str) -> Dict:
-    """
-    If archive has {same_base}.json next to mp3, pull author/title/metas/caption/etc.
-    """
-    base_no_ext, _ = os.path.splitext(mp3_full_path)
-    json_path = base_no_ext + ".json"
-    meta = _load_json(json_path) if os.path.isfile(json_path) else None
-
-    def _as_str(v) -> str:
-        return v.strip() if isinstance(v, str) else ""
-
-    def _pick_str(*vals) -> str:
-        for v in vals:
-            s = _as_str(v)
-            if s:
-                return s
-        return ""
-
-    job_id = None
-    created_at_epoch: Optional[float] = None
-    audio_index = 0
-    caption = ""
-    metas: Dict = {}
-    author = ""
-    title = ""
-
-    if isinstance(meta, dict):
-        job_id = meta.get("job_id") or None
-        try:
-            if meta.get("created_at") is not None:
-                created_at_epoch = float(meta.get("created_at"))
-        except Exception:
-            created_at_epoch = None
-
-        try:
-            if meta.get("audio_index") is not None:
-                audio_index = int(meta.get("audio_index"))
-        except Exception:
-            audio_index = 0
-
-        metas = meta.get("metas") if isinstance(meta.get("metas"), dict) else {}
-        cap = metas.get("caption")
-        caption = cap if isinstance(cap, str) else ""
-
-        title = _pick_str(metas.get("title"), metas.get("song_title"), meta.get("title"), meta.get("song_title"))
-        author = _pick_str(metas.get("author"), metas.get("artist"), meta.get("author"), meta.get("artist"))
-
-    return {
-        "job_id": job_id,
-        "created_at": _fmt_created_at(created_at_epoch) if created_at_epoch is not None else "",
-        "output_index": audio_index,
-        "caption": caption,
-        "metas": metas,
-        "author": author,
-        "title": title,
-    }
-
-
 # ---------------------------
 # Remote alias: xtdevelopment.net/music/mp3s/
 # ---------------------------
@@ -916,101 +1194,73 @@ async def _remote_archive_browse(rel_path: str) -> Dict:
 # ---------------------------
 # Local archive browse
 # ---------------------------
-def _local_archive_browse(rel_path: str) -> Dict:
+def _local_archive_browse(rel_path: str, offset: int = 0, limit: Optional[int] = None) -> Dict:
+    """
+    Blocking (catalog sync + query): run via asyncio.to_thread.
+    Only re-lists the directory if it changed since the last sync.
+    """
     base_abs = os.path.abspath(ARCHIVE_DIR)
     if not os.path.isdir(base_abs):
-        return {"base": base_abs, "path": rel_path or "", "exists": False, "items": []}
+        return {"base": base_abs, "path": rel_path or "", "exists": False, "items": [], "total": 0}
 
     full_dir = _safe_join_under(base_abs, rel_path or "")
     if not full_dir or not os.path.isdir(full_dir):
         raise HTTPException(status_code=404, detail="Archive path not found")
 
-    items: List[Dict] = []
-    try:
-        with os.scandir(full_dir) as it:
-            for entry in it:
-                name = entry.name
-                if name.startswith("."):
-                    continue
+    rel_dir = os.path.relpath(full_dir, base_abs).replace("\\", "/")
+    if rel_dir == ".":
+        rel_dir = ""
 
-                rel_item = os.path.relpath(entry.path, base_abs).replace("\\", "/")
-                try:
-                    st = entry.stat()
-                    mtime = int(st.st_mtime)
-                    size = int(st.st_size)
-                except Exception:
-                    mtime = 0
-                    size = 0
-
-                if entry.is_dir(follow_symlinks=False):
-                    items.append({"type": "dir", "name": name, "path": rel_item, "mtime": mtime})
-                elif entry.is_file(follow_symlinks=False):
-                    lower = name.lower()
-                    if lower.endswith(".mp3"):
-                        meta_bits = _archive_extract_meta_for_mp3(entry.path)
-                        items.append(
-                            {
-                                "type": "mp3",
-                                "name": name,
-                                "path": rel_item,
-                                "size": size,
-                                "mtime": mtime,
-                                "file": f"/archive/api_audio/{quote(rel_item)}",
-                                "task_id": meta_bits.get("job_id") or os.path.splitext(name)[0],
-                                "output_index": meta_bits.get("output_index", 0),
-                                "created_at": meta_bits.get("created_at", ""),
-                                "label": meta_bits.get("caption", ""),
-                                "prompt": meta_bits.get("caption", ""),
-                                "author": meta_bits.get("author", ""),
-                                "title": meta_bits.get("title", ""),
-                                "metas": meta_bits.get("metas", {}) or {},
-                            }
-                        )
-                    elif lower.endswith(".json"):
-                        items.append(
-                            {
-                                "type": "json",
-                                "name": name,
-                                "path": rel_item,
-                                "size": size,
-                                "mtime": mtime,
-                                "file": f"/archive/api_audio/{quote(rel_item)}",
-                            }
-                        )
-                    else:
-                        continue
-    except OSError:
+    catalog = _get_catalog()
+    try:
+        catalog.sync("archive", base_abs, rel_dir, recursive=False)
+    except (OSError, sqlite3.Error):
         raise HTTPException(status_code=500, detail="Archive browse failed")
 
-    # ✅ add remote alias folder at ROOT only
-    if (rel_path or "").strip().replace("\\", "/").strip("/") == "":
-        items.append(
+    # ✅ add remote alias folder at ROOT only (always the first item)
+    alias: List[Dict] = []
+    if rel_dir == "":
+        alias = [
             {
                 "type": "dir",
                 "name": REMOTE_ARCHIVE_NAME,
                 "path": REMOTE_ARCHIVE_KEY,
                 "mtime": int(time.time()),
             }
-        )
+        ]
 
-    items.sort(key=lambda x: (0 if x["type"] == "dir" else 1, -(x.get("mtime") or 0), x.get("name", "")))
-    return {"base": base_abs, "path": (rel_path or ""), "exists": True, "items": items}
+    offset = max(0, offset)
+    page_alias = alias[offset:]
+    db_offset = max(0, offset - len(alias))
+    db_limit = None if limit is None else max(0, limit - len(page_alias))
+    items, total = catalog.browse("archive", rel_dir, db_offset, db_limit)
+    items = (page_alias + items) if limit is None else (page_alias + items)[:max(0, limit)]
+
+    return {
+        "base": base_abs,
+        "path": (rel_path or ""),
+        "exists": True,
+        "items": items,
+        "total": total + len(alias),
+        "offset": offset,
+        "limit": limit,
+    }
 
 
-async def _archive_browse(rel_path: str) -> Dict:
+async def _archive_browse(rel_path: str, offset: int = 0, limit: Optional[int] = None) -> Dict:
     if _is_remote_archive_path(rel_path):
         return await _remote_archive_browse(rel_path)
-    return _local_archive_browse(rel_path)
+    return await asyncio.to_thread(_local_archive_browse, rel_path, offset, limit)
 
 
 @app.get("/archive/browse")
-async def archive_browse(path: str = ""):
-    return JSONResponse(await _archive_browse(path))
+async def archive_browse(path: str = "", offset: int = 0, limit: Optional[int] = None):
+    return JSONResponse(await _archive_browse(path, offset, limit))
 
 
 @app.get("/archive/browse/{subpath:path}")
-async def archive_browse_sub(subpath: str):
-    return JSONResponse(await _archive_browse(subpath))
+async def archive_browse_sub(subpath: str, offset: int = 0, limit: Optional[int] = None):
+    return JSONResponse(await _archive_browse(subpath, offset, limit))
 
 
 @app.get("/archive/api_audio/{rel_path:path}")
@@ -1038,15 +1288,13 @@ async def archive_api_audio(rel_path: str):
 # ============================================================
 # Users online endpoint
 # ============================================================
-try:
-    import fcntl  # type: ignore
-except Exception:
-    fcntl = None
-
 USERS_ONLINE_LOG = os.getenv("USERS_ONLINE_LOG", os.path.join(SCRIPT_DIR, "users_online_ips.json"))
-USERS_ONLINE_LOCK = USERS_ONLINE_LOG + ".lock"
 WINDOW_MINUTES = 90
 WINDOW_SECONDS = WINDOW_MINUTES * 60
+USERS_ONLINE_BUCKET_SECONDS = 60
+
+# In-memory presence + chat user DB are written to disk (atomically, off the event loop) this often
+STATE_SNAPSHOT_SECONDS = float(os.getenv("STATE_SNAPSHOT_SECONDS", "10"))
 
 
 def _get_client_ip(request: Request) -> str:
@@ -1107,39 +1355,94 @@ def _write_state_atomic(path: str, state: dict) -> None:
             pass
 
 
-def _with_lock(lock_path: str):
-    d = os.path.dirname(lock_path) or "."
-    os.makedirs(d, exist_ok=True)
+class PresenceTracker:
+    """
+    Distinct client IPs seen within the last `window_seconds`, kept in time buckets.
+    A touch moves the IP into the current bucket and whole buckets expire at once,
+    so touch/count are O(1) amortized and never touch the disk.
+    Event-loop only (not thread-safe).
+    """
 
-    lf = open(lock_path, "a+", encoding="utf-8")
-    if fcntl:
-        try:
-            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
-        except Exception:
-            pass
-    return lf
+    def __init__(self, window_seconds: float, bucket_seconds: float = USERS_ONLINE_BUCKET_SECONDS):
+        self.window_seconds = float(window_seconds)
+        self.bucket_seconds = float(bucket_seconds)
+        self._last_seen: Dict[str, float] = {}
+        self._ip_bucket: Dict[str, int] = {}
+        self._buckets: Dict[int, set] = {}
+        self._order: Deque[int] = deque()
+        self.dirty = False
+
+    def touch(self, ip: str, now: float) -> None:
+        b = int(now // self.bucket_seconds)
+        if self._order and b < self._order[-1]:
+            b = self._order[-1]  # clock went backwards: keep buckets ordered
+        old = self._ip_bucket.get(ip)
+        if old != b:
+            if old is not None:
+                self._buckets[old].discard(ip)
+            if b not in self._buckets:
+                self._buckets[b] = set()
+                self._order.append(b)
+            self._buckets[b].add(ip)
+            self._ip_bucket[ip] = b
+        self._last_seen[ip] = max(now, self._last_seen.get(ip, 0.0))
+        self.dirty = True
+
+    def _expire(self, now: float) -> None:
+        cutoff_b = int((now - self.window_seconds) // self.bucket_seconds)
+        while self._order and self._order[0] < cutoff_b:
+            for ip in self._buckets.pop(self._order.popleft()):
+                self._ip_bucket.pop(ip, None)
+                self._last_seen.pop(ip, None)
+                self.dirty = True
+
+    def count(self, now: float) -> int:
+        self._expire(now)
+        return len(self._ip_bucket)
+
+    def snapshot(self, now: float) -> Dict[str, float]:
+        self._expire(now)
+        return dict(self._last_seen)
+
+    def load(self, state: Dict[str, float], now: float) -> None:
+        cutoff = now - self.window_seconds
+        for ip, ts in sorted(state.items(), key=lambda kv: kv[1]):
+            if ts >= cutoff:
+                self.touch(ip, ts)
+        self.dirty = False
+
+
+_presence = PresenceTracker(WINDOW_SECONDS)
+_presence_loaded = False
+
+
+async def _ensure_presence_loaded() -> None:
+    global _presence_loaded
+    if _presence_loaded:
+        return
+    state = await asyncio.to_thread(_read_state, USERS_ONLINE_LOG)
+    if not _presence_loaded:
+        _presence.load(state, time.time())
+        _presence_loaded = True
+
+
+async def _snapshot_presence() -> None:
+    if not (_presence_loaded and _presence.dirty):
+        return
+    _presence.dirty = False
+    state = _presence.snapshot(time.time())
+    try:
+        await asyncio.to_thread(_write_state_atomic, USERS_ONLINE_LOG, state)
+    except Exception:
+        _presence.dirty = True
 
 
 @app.get("/users_online")
 async def users_online(request: Request):
+    await _ensure_presence_loaded()
     now = time.time()
-    ip = _get_client_ip(request)
-    cutoff = now - WINDOW_SECONDS
-
-    lockf = _with_lock(USERS_ONLINE_LOCK)
-    try:
-        state = _read_state(USERS_ONLINE_LOG)
-        state[ip] = now
-        state = {k: v for (k, v) in state.items() if v >= cutoff}
-        _write_state_atomic(USERS_ONLINE_LOG, state)
-        count = len(state)
-    finally:
-        try:
-            lockf.close()
-        except Exception:
-            pass
-
-    return JSONResponse({"online": count, "window_minutes": WINDOW_MINUTES})
+    _presence.touch(_get_client_ip(request), now)
+    return JSONResponse({"online": _presence.count(now), "window_minutes": WINDOW_MINUTES})
 
 
 
@@ -1158,6 +1461,12 @@ def _room_file(room: int) -> str:
     return os.path.join(CHAT_DIR, f"room_{room}.jsonl")
 
 
+def _append_room_line(room: int, line: str) -> None:
+    # blocking: call via asyncio.to_thread
+    with open(_room_file(room), "a", encoding="utf-8") as f:
+        f.write(line)
+
+
 _ROOM_CACHE: Dict[int, Deque[Dict[str, Any]]] = {r: deque(maxlen=CHAT_CACHE_MAX) for r in range(1, CHAT_ROOMS + 1)}
 _ROOM_LOCKS: Dict[int, asyncio.Lock] = {r: asyncio.Lock() for r in range(1, CHAT_ROOMS + 1)}
 _ROOM_LAST_ID: Dict[int, int] = {r: 0 for r in range(1, CHAT_ROOMS + 1)}
@@ -1237,7 +1546,6 @@ CHAT_USER_LOG = os.getenv(
     "ACESTEP_CHAT_USER_LOG",
     os.path.join(CHAT_DIR, "chat_user_log.json")
 )
-CHAT_USER_LOCK = CHAT_USER_LOG + ".lock"
 
 def _now_iso_ms(ms: int) -> str:
     try:
@@ -1402,7 +1710,7 @@ def _read_chat_user_db_locked() -> tuple[Dict[str, Any], bool]:
     """
     Reads CHAT_USER_LOG and returns (db, changed).
     Ensures keys are canonical (case-insensitive) and merges duplicates.
-    Call this ONLY while holding CHAT_USER_LOCK file lock and/or _CHAT_USER_ASYNC_LOCK.
+    Blocking: only used to load the in-memory DB (see _get_chat_user_db).
     """
     raw = _read_json_dict(CHAT_USER_LOG)
     if not isinstance(raw, dict):
@@ -1442,8 +1750,51 @@ def _read_chat_user_db_locked() -> tuple[Dict[str, Any], bool]:
 
 MAX_USERNAMES_PER_IP = int(os.getenv("CHAT_MAX_USERNAMES_PER_IP", "5"))
 
-# Windows-safe in-process lock (your fcntl lock is effectively a no-op on Windows)
+# Guards the in-memory chat user DB (all reads/updates happen on the event loop)
 _CHAT_USER_ASYNC_LOCK = asyncio.Lock()
+_state_snapshot_task: Optional[asyncio.Task] = None
+
+# In-memory chat user DB: loaded once, snapshotted to CHAT_USER_LOG by _state_snapshot_loop
+_chat_user_db: Optional[Dict[str, Any]] = None
+_chat_user_db_dirty = False
+
+
+async def _get_chat_user_db() -> Dict[str, Any]:
+    """In-memory chat user DB. Call while holding _CHAT_USER_ASYNC_LOCK."""
+    global _chat_user_db, _chat_user_db_dirty
+    if _chat_user_db is None:
+        db, changed = await asyncio.to_thread(_read_chat_user_db_locked)
+        _chat_user_db = db
+        _chat_user_db_dirty = _chat_user_db_dirty or changed
+    return _chat_user_db
+
+
+def _mark_chat_user_db_dirty() -> None:
+    global _chat_user_db_dirty
+    _chat_user_db_dirty = True
+
+
+async def _snapshot_chat_user_db() -> None:
+    global _chat_user_db_dirty
+    async with _CHAT_USER_ASYNC_LOCK:
+        if _chat_user_db is None or not _chat_user_db_dirty:
+            return
+        _chat_user_db_dirty = False
+        try:
+            # the lock keeps the DB from changing while the thread serializes it
+            await asyncio.to_thread(_write_json_atomic, CHAT_USER_LOG, _chat_user_db)
+        except Exception:
+            _chat_user_db_dirty = True
+
+
+async def _state_snapshot_loop():
+    while True:
+        await asyncio.sleep(STATE_SNAPSHOT_SECONDS)
+        try:
+            await _snapshot_presence()
+            await _snapshot_chat_user_db()
+        except Exception:
+            pass
 
 def _usernames_for_ip_from_db(db: Dict[str, Any], ip: str) -> set[str]:
     """
@@ -1488,27 +1839,19 @@ def _display_names_for_ip_from_db(db: Dict[str, Any], ip: str) -> List[str]:
         uniq.append(n)
     return uniq
 
-def _peek_ip_usernames(ip: str) -> set[str]:
+async def _peek_ip_usernames(ip: str) -> set[str]:
     """Read-only: returns canonical username keys already associated with this IP."""
-    lockf = _with_lock(CHAT_USER_LOCK)
-    try:
-        db, changed = _read_chat_user_db_locked()
-        if changed:
-            _write_json_atomic(CHAT_USER_LOG, db)
-        return _usernames_for_ip_from_db(db, ip)
-    finally:
-        try:
-            lockf.close()
-        except Exception:
-            pass
+    async with _CHAT_USER_ASYNC_LOCK:
+        return _usernames_for_ip_from_db(await _get_chat_user_db(), ip)
 
-def _touch_user_identity(username: str, ip: str, now_ms: int) -> tuple[str, str]:
+def _touch_user_identity(db: Dict[str, Any], username: str, ip: str, now_ms: int) -> tuple[str, str]:
     """
     Case-insensitive username identity:
       - owners live in rec["ips"]
       - impostor usage lives in rec["impostors"] (NOT owned)
       - suffix is stable per ip in whichever bucket it lands in
 
+    Updates the in-memory `db` (call while holding _CHAT_USER_ASYNC_LOCK).
     Returns (first_ip_for_username, suffix_for_this_ip_or_empty).
     """
     username_in = _cap_display(username)
@@ -1519,95 +1862,45 @@ def _touch_user_identity(username: str, ip: str, now_ms: int) -> tuple[str, str]
     if not ukey:
         ukey = "unknown"
 
-    lockf = _with_lock(CHAT_USER_LOCK)
-    try:
-        db, changed = _read_chat_user_db_locked()
-
-        rec = db.get(ukey)
-        if not isinstance(rec, dict):
-            rec = {}
-
-        # keep initial display stable (don’t let casing “rename”)
-        disp = rec.get("display")
-        if not isinstance(disp, str) or not disp.strip():
-            rec["display"] = username_in or ukey
-
-        first_ip = str(rec.get("first_ip") or "").strip()
-        first_seen_ms = int(rec.get("first_seen_ms") or 0) or now_ms
-
-        # owners map
-        ips = rec.get("ips")
-        if not isinstance(ips, dict):
-            ips = {}
-
-        # If first_ip missing/unknown, let a real IP claim ownership as first owner
-        if (not first_ip) or first_ip.lower() in ("unknown", "0.0.0.0"):
-            if ip_l not in ("unknown", "0.0.0.0") and ip:
-                first_ip = ip
-            else:
-                first_ip = first_ip or ip or "unknown"
-
-        # -----------------------------
-        # ✅ IMPERSONATION CASE:
-        # username already has a first owner (first_ip),
-        # and this ip is different -> DO NOT add to rec["ips"].
-        # Track under rec["impostors"] instead.
-        # -----------------------------
-        is_real_ip = ip_l not in ("unknown", "0.0.0.0") and bool(ip)
-        has_real_first = (first_ip or "").lower() not in ("", "unknown", "0.0.0.0")
-
-        if has_real_first and is_real_ip and ip != first_ip and ukey in db:
-            impostors = rec.get("impostors")
-            if not isinstance(impostors, dict):
-                impostors = {}
-
-            iprec = impostors.get(ip)
-            if not isinstance(iprec, dict):
-                iprec = {
-                    "first_seen_ms": now_ms,
-                    "first_seen": _now_iso_ms(now_ms),
-                    "last_seen_ms": now_ms,
-                    "last_seen": _now_iso_ms(now_ms),
-                    "count": 0,
-                }
+    rec = db.get(ukey)
+    if not isinstance(rec, dict):
+        rec = {}
 
-            iprec["last_seen_ms"] = now_ms
-            iprec["last_seen"] = _now_iso_ms(now_ms)
-            try:
-                iprec["count"] = int(iprec.get("count") or 0) + 1
-            except Exception:
-                iprec["count"] = 1
-
-            # stable suffix for impostor
-            s = str(iprec.get("suffix") or "").strip()
-            if not re.fullmatch(r"\d{6}", s or ""):
-                s = _rand6()
-                iprec["suffix"] = s
-
-            impostors[ip] = iprec
-            rec["impostors"] = impostors
-
-            # update summary fields
-            rec["first_ip"] = first_ip
-            rec["first_seen_ms"] = first_seen_ms
-            rec["first_seen"] = rec.get("first_seen") or _now_iso_ms(first_seen_ms)
-            rec["last_seen_ms"] = now_ms
-            rec["last_seen"] = _now_iso_ms(now_ms)
-            rec["ips"] = ips  # unchanged (no ownership granted)
+    # keep initial display stable (don’t let casing “rename”)
+    disp = rec.get("display")
+    if not isinstance(disp, str) or not disp.strip():
+        rec["display"] = username_in or ukey
 
-            try:
-                rec["count_total"] = int(rec.get("count_total") or 0) + 1
-            except Exception:
-                rec["count_total"] = 1
+    first_ip = str(rec.get("first_ip") or "").strip()
+    first_seen_ms = int(rec.get("first_seen_ms") or 0) or now_ms
 
-            db[ukey] = rec
-            _write_json_atomic(CHAT_USER_LOG, db)
-            return first_ip, s
+    # owners map
+    ips = rec.get("ips")
+    if not isinstance(ips, dict):
+        ips = {}
 
-        # -----------------------------
-        # OWNER CASE (new name OR same first_ip)
-        # -----------------------------
-        iprec = ips.get(ip)
+    # If first_ip missing/unknown, let a real IP claim ownership as first owner
+    if (not first_ip) or first_ip.lower() in ("unknown", "0.0.0.0"):
+        if ip_l not in ("unknown", "0.0.0.0") and ip:
+            first_ip = ip
+        else:
+            first_ip = first_ip or ip or "unknown"
+
+    # -----------------------------
+    # ✅ IMPERSONATION CASE:
+    # username already has a first owner (first_ip),
+    # and this ip is different -> DO NOT add to rec["ips"].
+    # Track under rec["impostors"] instead.
+    # -----------------------------
+    is_real_ip = ip_l not in ("unknown", "0.0.0.0") and bool(ip)
+    has_real_first = (first_ip or "").lower() not in ("", "unknown", "0.0.0.0")
+
+    if has_real_first and is_real_ip and ip != first_ip and ukey in db:
+        impostors = rec.get("impostors")
+        if not isinstance(impostors, dict):
+            impostors = {}
+
+        iprec = impostors.get(ip)
         if not isinstance(iprec, dict):
             iprec = {
                 "first_seen_ms": now_ms,
@@ -1624,24 +1917,22 @@ def _touch_user_identity(username: str, ip: str, now_ms: int) -> tuple[str, str]
         except Exception:
             iprec["count"] = 1
 
-        suffix = ""
-        if ip != first_ip:
-            s = str(iprec.get("suffix") or "").strip()
-            if not re.fullmatch(r"\d{6}", s or ""):
-                s = _rand6()
-                iprec["suffix"] = s
-            suffix = s
-        else:
-            iprec.pop("suffix", None)
+        # stable suffix for impostor
+        s = str(iprec.get("suffix") or "").strip()
+        if not re.fullmatch(r"\d{6}", s or ""):
+            s = _rand6()
+            iprec["suffix"] = s
 
-        ips[ip] = iprec
+        impostors[ip] = iprec
+        rec["impostors"] = impostors
 
+        # update summary fields
         rec["first_ip"] = first_ip
         rec["first_seen_ms"] = first_seen_ms
         rec["first_seen"] = rec.get("first_seen") or _now_iso_ms(first_seen_ms)
         rec["last_seen_ms"] = now_ms
         rec["last_seen"] = _now_iso_ms(now_ms)
-        rec["ips"] = ips
+        rec["ips"] = ips  # unchanged (no ownership granted)
 
         try:
             rec["count_total"] = int(rec.get("count_total") or 0) + 1
@@ -1649,15 +1940,57 @@ def _touch_user_identity(username: str, ip: str, now_ms: int) -> tuple[str, str]
             rec["count_total"] = 1
 
         db[ukey] = rec
-        _write_json_atomic(CHAT_USER_LOG, db)
+        _mark_chat_user_db_dirty()
+        return first_ip, s
+
+    # -----------------------------
+    # OWNER CASE (new name OR same first_ip)
+    # -----------------------------
+    iprec = ips.get(ip)
+    if not isinstance(iprec, dict):
+        iprec = {
+            "first_seen_ms": now_ms,
+            "first_seen": _now_iso_ms(now_ms),
+            "last_seen_ms": now_ms,
+            "last_seen": _now_iso_ms(now_ms),
+            "count": 0,
+        }
 
-        return first_ip, suffix
+    iprec["last_seen_ms"] = now_ms
+    iprec["last_seen"] = _now_iso_ms(now_ms)
+    try:
+        iprec["count"] = int(iprec.get("count") or 0) + 1
+    except Exception:
+        iprec["count"] = 1
+
+    suffix = ""
+    if ip != first_ip:
+        s = str(iprec.get("suffix") or "").strip()
+        if not re.fullmatch(r"\d{6}", s or ""):
+            s = _rand6()
+            iprec["suffix"] = s
+        suffix = s
+    else:
+        iprec.pop("suffix", None)
 
-    finally:
-        try:
-            lockf.close()
-        except Exception:
-            pass
+    ips[ip] = iprec
+
+    rec["first_ip"] = first_ip
+    rec["first_seen_ms"] = first_seen_ms
+    rec["first_seen"] = rec.get("first_seen") or _now_iso_ms(first_seen_ms)
+    rec["last_seen_ms"] = now_ms
+    rec["last_seen"] = _now_iso_ms(now_ms)
+    rec["ips"] = ips
+
+    try:
+        rec["count_total"] = int(rec.get("count_total") or 0) + 1
+    except Exception:
+        rec["count_total"] = 1
+
+    db[ukey] = rec
+    _mark_chat_user_db_dirty()
+
+    return first_ip, suffix
 
 
 
@@ -1678,43 +2011,33 @@ async def chat_send(req: Request, payload: ChatSendIn):
 
     async with _CHAT_USER_ASYNC_LOCK:
         # If IP already has >= MAX usernames, block NEW username attempts (case-insensitive).
+        db = await _get_chat_user_db()
         if ip and ip.lower() not in ("unknown", "0.0.0.0"):
-            lockf = _with_lock(CHAT_USER_LOCK)
-            try:
-                db, changed = _read_chat_user_db_locked()
-                if changed:
-                    _write_json_atomic(CHAT_USER_LOG, db)
-
-                existing_keys = _usernames_for_ip_from_db(db, ip)
-                existing_displays = _display_names_for_ip_from_db(db, ip)
-
-                if (author_key not in existing_keys) and (len(existing_keys) >= MAX_USERNAMES_PER_IP):
-                    allowed_list = ", ".join(sorted(existing_displays, key=lambda s: s.casefold())) if existing_displays else "(none)"
-                    err_text = (
-                        f"Username limit reached for your IP ({len(existing_keys)}/{MAX_USERNAMES_PER_IP}). "
-                        f"Please use one of your existing usernames: {allowed_list}"
-                    )
-
-                    msg = {
-                        "id": now_ms,
-                        "ts": now_ms,
-                        "room": room,
-                        "author": "system",
-                        "message": err_text,
-                        "local_only": True,
-                        "error": "username_limit",
-                        "ip": ip,
-                        "attempted_author": author_in,
-                    }
-                    return {"ok": False, "message": msg}
-            finally:
-                try:
-                    lockf.close()
-                except Exception:
-                    pass
+            existing_keys = _usernames_for_ip_from_db(db, ip)
+            existing_displays = _display_names_for_ip_from_db(db, ip)
+
+            if (author_key not in existing_keys) and (len(existing_keys) >= MAX_USERNAMES_PER_IP):
+                allowed_list = ", ".join(sorted(existing_displays, key=lambda s: s.casefold())) if existing_displays else "(none)"
+                err_text = (
+                    f"Username limit reached for your IP ({len(existing_keys)}/{MAX_USERNAMES_PER_IP}). "
+                    f"Please use one of your existing usernames: {allowed_list}"
+                )
+
+                msg = {
+                    "id": now_ms,
+                    "ts": now_ms,
+                    "room": room,
+                    "author": "system",
+                    "message": err_text,
+                    "local_only": True,
+                    "error": "username_limit",
+                    "ip": ip,
+                    "attempted_author": author_in,
+                }
+                return {"ok": False, "message": msg}
 
         # Allowed: update user/ip log and compute stable suffix ("" for oldest IP)
-        first_ip, suffix = _touch_user_identity(author_in, ip, now_ms)
+        first_ip, suffix = _touch_user_identity(db, author_in, ip, now_ms)
 
         author_out = author_in
         if suffix:
@@ -1743,10 +2066,8 @@ async def chat_send(req: Request, payload: ChatSendIn):
 
             _ROOM_CACHE[room].append(msg)
 
-            fp = _room_file(room)
             try:
-                with open(fp, "a", encoding="utf-8") as f:
-                    f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+                await asyncio.to_thread(_append_room_line, room, json.dumps(msg, ensure_ascii=False) + "\n")
             except Exception:
                 pass
 
@@ -1775,44 +2096,35 @@ async def query_users(request: Request):
         return []
 
     async with _CHAT_USER_ASYNC_LOCK:
-        lockf = _with_lock(CHAT_USER_LOCK)
-        try:
-            db, changed = _read_chat_user_db_locked()
-            if changed:
-                _write_json_atomic(CHAT_USER_LOG, db)
+        db = await _get_chat_user_db()
 
-            out: List[Tuple[int, str]] = []
-            for ukey, rec in (db or {}).items():
-                if not isinstance(rec, dict):
-                    continue
-                ips = rec.get("ips")
-                if not isinstance(ips, dict):
-                    continue
-                iprec = ips.get(ip)
-                if not isinstance(iprec, dict):
-                    continue
+        out: List[Tuple[int, str]] = []
+        for ukey, rec in (db or {}).items():
+            if not isinstance(rec, dict):
+                continue
+            ips = rec.get("ips")
+            if not isinstance(ips, dict):
+                continue
+            iprec = ips.get(ip)
+            if not isinstance(iprec, dict):
+                continue
 
-                last_seen_ms = _as_int(iprec.get("last_seen_ms"), 0)
-                disp = rec.get("display")
-                name = _cap_display(disp) if isinstance(disp, str) and disp.strip() else str(ukey)
-                out.append((last_seen_ms, name))
-
-            out.sort(key=lambda x: (x[0], x[1].casefold()), reverse=True)
-            # dedupe by canonical
-            seen = set()
-            res = []
-            for _, name in out:
-                k = _canon_username(name)
-                if k in seen:
-                    continue
-                seen.add(k)
-                res.append(name)
-            return res
-        finally:
-            try:
-                lockf.close()
-            except Exception:
-                pass
+            last_seen_ms = _as_int(iprec.get("last_seen_ms"), 0)
+            disp = rec.get("display")
+            name = _cap_display(disp) if isinstance(disp, str) and disp.strip() else str(ukey)
+            out.append((last_seen_ms, name))
+
+        out.sort(key=lambda x: (x[0], x[1].casefold()), reverse=True)
+        # dedupe by canonical
+        seen = set()
+        res = []
+        for _, name in out:
+            k = _canon_username(name)
+            if k in seen:
+                continue
+            seen.add(k)
+            res.append(name)
+        return res
 
 
 @app.post("/deleteUser")
@@ -1828,56 +2140,46 @@ async def delete_user(request: Request, payload: DeleteUserIn):
     ukey = _canon_username(username_in)
 
     async with _CHAT_USER_ASYNC_LOCK:
-        lockf = _with_lock(CHAT_USER_LOCK)
-        try:
-            db, changed = _read_chat_user_db_locked()
-            if changed:
-                _write_json_atomic(CHAT_USER_LOG, db)
-
-            rec = db.get(ukey)
-            if not isinstance(rec, dict):
-                # treat as success (UI already removed it)
-                return {"ok": True, "deleted": False, "username": username_in}
-
-            ips = rec.get("ips")
-            if not isinstance(ips, dict) or (ip not in ips):
-                raise HTTPException(status_code=403, detail="Username not owned by your IP")
+        db = await _get_chat_user_db()
 
-            ips.pop(ip, None)
+        rec = db.get(ukey)
+        if not isinstance(rec, dict):
+            # treat as success (UI already removed it)
+            return {"ok": True, "deleted": False, "username": username_in}
 
-            if not ips:
-                db.pop(ukey, None)
-            else:
-                def _first_seen_ms(v: Any) -> int:
-                    try:
-                        return int((v or {}).get("first_seen_ms") or 0)
-                    except Exception:
-                        return 0
+        ips = rec.get("ips")
+        if not isinstance(ips, dict) or (ip not in ips):
+            raise HTTPException(status_code=403, detail="Username not owned by your IP")
 
-                new_first_ip = sorted(ips.items(), key=lambda kv: (_first_seen_ms(kv[1]) or 0, kv[0]))[0][0]
-                rec["first_ip"] = new_first_ip
+        ips.pop(ip, None)
 
+        if not ips:
+            db.pop(ukey, None)
+        else:
+            def _first_seen_ms(v: Any) -> int:
                 try:
-                    if isinstance(ips.get(new_first_ip), dict):
-                        ips[new_first_ip].pop("suffix", None)
+                    return int((v or {}).get("first_seen_ms") or 0)
                 except Exception:
-                    pass
-
-                rec["ips"] = ips
-                now_ms = int(time.time() * 1000)
-                rec["last_seen_ms"] = now_ms
-                rec["last_seen"] = _now_iso_ms(now_ms)
-                db[ukey] = rec
+                    return 0
 
-            _write_json_atomic(CHAT_USER_LOG, db)
-            return {"ok": True, "deleted": True, "username": username_in}
+            new_first_ip = sorted(ips.items(), key=lambda kv: (_first_seen_ms(kv[1]) or 0, kv[0]))[0][0]
+            rec["first_ip"] = new_first_ip
 
-        finally:
             try:
-                lockf.close()
+                if isinstance(ips.get(new_first_ip), dict):
+                    ips[new_first_ip].pop("suffix", None)
             except Exception:
                 pass
 
+            rec["ips"] = ips
+            now_ms = int(time.time() * 1000)
+            rec["last_seen_ms"] = now_ms
+            rec["last_seen"] = _now_iso_ms(now_ms)
+            db[ukey] = rec
+
+        _mark_chat_user_db_dirty()
+        return {"ok": True, "deleted": True, "username": username_in}
+
 
 
 
@@ -2213,8 +2515,7 @@ _ai_radio_queue: Deque[Dict[str, Any]] = deque()
 _ai_radio_started_at: float = 0.0  # start time (epoch seconds) of queue[0]
 _ai_radio_task: Optional[asyncio.Task] = None
 
-_archive_mp3_cache: List[str] = []     # list of rel paths under ARCHIVE_DIR (posix style)
-_archive_mp3_cache_ts: float = 0.0
+_archive_mp3_cache_ts: float = 0.0     # last full archive catalog sync
 
 # Optional fast duration via mutagen if installed
 try:
@@ -2449,16 +2750,19 @@ def _mp3_duration_local(path: str) -> float:
         return 0.0
 
 
-async def _mp3_duration_remote(url: str) -> float:
+async def _mp3_duration_remote(url: str, known_validator: str = "") -> Tuple[Optional[float], str]:
     """
     Remote mp3 duration: reads first ~128KB (range) + total size from headers if possible.
+    Returns (duration, validator) where validator is the ETag / Last-Modified / size from HEAD.
+    If HEAD yields `known_validator` the file is unchanged: returns (None, validator) without the GET.
     """
     url = (url or "").strip()
     if not url:
-        return 0.0
+        return 0.0, ""
 
     client = _get_client()
     size_total = 0
+    validator = ""
 
     # Try a HEAD first (some servers block HEAD; ignore errors)
     try:
@@ -2470,9 +2774,17 @@ async def _mp3_duration_remote(url: str) -> float:
                     size_total = int(cl)
                 except Exception:
                     size_total = 0
+            validator = (
+                rh.headers.get("etag")
+                or rh.headers.get("last-modified")
+                or (f"size:{size_total}" if size_total > 0 else "")
+            )
     except Exception:
         pass
 
+    if validator and validator == known_validator:
+        return None, validator
+
     # Range GET (stream) for prefix
     prefix = b""
     try:
@@ -2503,50 +2815,173 @@ async def _mp3_duration_remote(url: str) -> float:
                 if len(prefix) >= AI_RADIO_REMOTE_PROBE_BYTES:
                     break
     except Exception:
-        return 0.0
+        return 0.0, validator
 
     d = _mp3_parse_duration_from_prefix(prefix, size_total if size_total > 0 else len(prefix))
-    return _clamp_duration(d)
+    return _clamp_duration(d), validator
 
 
 async def _refresh_archive_mp3_cache(force: bool = False) -> None:
-    global _archive_mp3_cache, _archive_mp3_cache_ts
+    """Full (recursive, incremental) catalog sync of ARCHIVE_DIR, at most every AI_RADIO_ARCHIVE_REFRESH_SECONDS."""
+    global _archive_mp3_cache_ts
     now = time.time()
     if (not force) and (now - _archive_mp3_cache_ts) < AI_RADIO_ARCHIVE_REFRESH_SECONDS:
         return
 
-    base_abs = os.path.abspath(ARCHIVE_DIR)
-    if not os.path.isdir(base_abs):
-        _archive_mp3_cache = []
-        _archive_mp3_cache_ts = now
-        return
-
-    mp3s: List[str] = []
     try:
-        for root, dirs, files in os.walk(base_abs):
-            # skip hidden dirs
-            dirs[:] = [d for d in dirs if d and not d.startswith(".")]
-            for fn in files:
-                if not fn.lower().endswith(".mp3"):
-                    continue
-                full = os.path.join(root, fn)
-                rel = os.path.relpath(full, base_abs).replace("\\", "/")
-                # safety: no traversal from relpath anyway, but keep consistent
-                if rel.startswith(".."):
-                    continue
-                mp3s.append(rel)
+        await asyncio.to_thread(_get_catalog().sync, "archive", ARCHIVE_DIR, "", True)
     except Exception:
-        mp3s = []
-
-    _archive_mp3_cache = mp3s
+        pass
     _archive_mp3_cache_ts = now
 
 
+# ---------------------------
+# Duration probe cache (persistent, filled in the background)
+# ---------------------------
+AI_RADIO_PROBE_WORKERS = int(os.getenv("AI_RADIO_PROBE_WORKERS", "2"))
+AI_RADIO_PROBE_QUEUE = int(os.getenv("AI_RADIO_PROBE_QUEUE", "64"))
+
+
+class Mp3DurationProber:
+    """
+    Persistent mp3 duration cache with a bounded background prober.
+
+    Keys are absolute local paths (validator "size:mtime") or remote URLs
+    (validator ETag / Last-Modified / size). lookup() never does I/O; misses
+    and stale remote entries are queued and probed by a few worker tasks
+    (local files in a thread, remote URLs over the shared httpx client).
+    Results live in memory and in the song catalog DB.
+    """
+
+    def __init__(self, workers: int = AI_RADIO_PROBE_WORKERS, max_pending: int = AI_RADIO_PROBE_QUEUE):
+        self.workers = max(1, workers)
+        self._cache: Dict[str, Tuple[str, float, float]] = {}  # key -> (validator, duration, probed_at)
+        self._pending: set = set()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_pending))
+        self._tasks: List[asyncio.Task] = []
+        self._writes: set = set()
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        try:
+            rows = await asyncio.to_thread(_get_catalog().probes)
+        except Exception:
+            rows = []
+        for key, validator, duration, probed_at in rows:
+            self._cache[key] = (validator, float(duration), float(probed_at))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+
+    def lookup(self, key: str, validator: Optional[str] = None) -> Optional[float]:
+        """Cached duration (0.0 = unreadable), or None if unknown / validator mismatch."""
+        rec = self._cache.get(key)
+        if rec is None or (validator is not None and rec[0] != validator):
+            return None
+        return rec[1]
+
+    def request_local(self, path: str, validator: str) -> None:
+        self._request(("local", path, validator))
+
+    def request_remote(self, url: str) -> None:
+        """Probe `url` if unknown, or revalidate it if older than REMOTE_CACHE_SECONDS."""
+        rec = self._cache.get(url)
+        if rec is not None and (time.time() - rec[2]) < REMOTE_CACHE_SECONDS:
+            return
+        self._request(("remote", url, rec[0] if rec else ""))
+
+    def _request(self, job: Tuple[str, str, str]) -> None:
+        if job[1] in self._pending:
+            return
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return  # bounded: picked again later
+        self._pending.add(job[1])
+
+    def _store(self, key: str, validator: str, duration: float) -> None:
+        now = time.time()
+        self._cache[key] = (validator, float(duration), now)
+        t = asyncio.create_task(asyncio.to_thread(_get_catalog().set_probe, key, validator, duration, now))
+        self._writes.add(t)
+        t.add_done_callback(self._writes.discard)
+
+    async def _worker(self) -> None:
+        while True:
+            kind, key, validator = await self._queue.get()
+            try:
+                if kind == "local":
+                    if self.lookup(key, validator) is None:
+                        self._store(key, validator, await asyncio.to_thread(_mp3_duration_local, key))
+                else:
+                    duration, new_validator = await _mp3_duration_remote(key, known_validator=validator)
+                    if duration is None:
+                        rec = self._cache.get(key)
+                        if rec is not None:
+                            self._store(key, rec[0], rec[1])  # unchanged: just refresh probed_at
+                    elif duration > 0 or new_validator:
+                        self._store(key, new_validator, duration)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
+
+
+_duration_prober: Optional[Mp3DurationProber] = None
+
+
+def _get_prober() -> Mp3DurationProber:
+    global _duration_prober
+    if _duration_prober is None:
+        _duration_prober = Mp3DurationProber()
+    return _duration_prober
+
+
+def _local_probe_request(full_path: str, size: Any, mtime: Any) -> Dict[str, Any]:
+    """Cached duration for a local mp3 (queues a probe on a miss)."""
+    key = os.path.abspath(full_path)
+    validator = f"{size}:{mtime}"
+    prober = _get_prober()
+    dur = prober.lookup(key, validator)
+    if dur is None:
+        prober.request_local(key, validator)
+    return {"duration": float(dur or 0.0), "_probe": ("local", key, validator)}
+
+
+def _radio_item_duration(item: Dict[str, Any]) -> float:
+    """
+    Duration used for scheduling: the item's duration, else whatever the prober
+    has found since it was queued (no I/O), else 180s.
+    """
+    dur = 0.0
+    try:
+        dur = float(item.get("duration") or 0.0)
+    except Exception:
+        dur = 0.0
+    if dur <= 0:
+        probe = item.get("_probe")
+        if probe:
+            kind, key, validator = probe
+            found = _get_prober().lookup(key, validator if kind == "local" else None)
+            if found:
+                dur = float(found)
+                item["duration"] = dur
+    return _clamp_duration(dur) if dur > 0 else 180.0
+
+
 async def _pick_generated_song() -> Optional[Dict[str, Any]]:
     await _refresh_song_cache(force=False)
-    if not _song_cache:
+    picked = await asyncio.to_thread(_get_catalog().random_song, "generated")
+    if not picked:
         return None
-    base = secrets.choice(_song_cache)
+    base = picked["item"]
     fn = base.get("filename") or ""
     if not isinstance(fn, str) or not fn.lower().endswith(".mp3"):
         return None
@@ -2555,13 +2990,9 @@ async def _pick_generated_song() -> Optional[Dict[str, Any]]:
     if not full_path or not os.path.isfile(full_path):
         return None
 
-    dur = _mp3_duration_local(full_path)
-    if dur <= 0:
-        dur = 180.0
-
     item = dict(base)
     item["source"] = "generated"
-    item["duration"] = float(dur)
+    item.update(_local_probe_request(full_path, picked["size"], picked["mtime"]))
     # normalize a nice display name
     item["name"] = (item.get("title") or item.get("filename") or item.get("task_id") or "song")
     return item
@@ -2569,41 +3000,19 @@ async def _pick_generated_song() -> Optional[Dict[str, Any]]:
 
 async def _pick_archive_song() -> Optional[Dict[str, Any]]:
     await _refresh_archive_mp3_cache(force=False)
-    if not _archive_mp3_cache:
+    picked = await asyncio.to_thread(_get_catalog().random_song, "archive")
+    if not picked:
         return None
 
-    rel = secrets.choice(_archive_mp3_cache)
+    rel = picked["path"]
     base_abs = os.path.abspath(ARCHIVE_DIR)
     full = _safe_join_under(base_abs, rel)
     if not full or not os.path.isfile(full):
         return None
 
-    dur = _mp3_duration_local(full)
-    if dur <= 0:
-        dur = 180.0
-
-    name = os.path.basename(rel)
-    meta_bits = _archive_extract_meta_for_mp3(full)
-    item = {
-        "type": "mp3",
-        "name": name,
-        "path": rel,
-        "file": f"/archive/api_audio/{quote(rel)}",
-        "size": 0,
-        "mtime": 0,
-
-        # UI-ish fields
-        "task_id": meta_bits.get("job_id") or os.path.splitext(name)[0],
-        "output_index": meta_bits.get("output_index", 0),
-        "created_at": meta_bits.get("created_at", ""),
-        "label": meta_bits.get("caption", "") or "",
-        "prompt": meta_bits.get("caption", "") or "",
-        "author": meta_bits.get("author", "") or "",
-        "title": meta_bits.get("title", "") or "",
-        "metas": meta_bits.get("metas", {}) or {},
-    }
+    item = dict(picked["item"])
     item["source"] = "archive"
-    item["duration"] = float(dur)
+    item.update(_local_probe_request(full, picked["size"], picked["mtime"]))
     return item
 
 
@@ -2649,14 +3058,15 @@ async def _pick_remote_xt_song() -> Optional[Dict[str, Any]]:
     if not url:
         return None
 
-    dur = await _mp3_duration_remote(url)
-    if dur <= 0:
-        # if duration can't be computed remotely, fall back to 180s
-        dur = 180.0
+    # cached probe only; unknown/stale URLs are probed in the background
+    prober = _get_prober()
+    dur = prober.lookup(url)
+    prober.request_remote(url)
 
     item = dict(base)
     item["source"] = "xt_remote"
-    item["duration"] = float(dur)
+    item["duration"] = float(dur or 0.0)
+    item["_probe"] = ("remote", url, "")
     item["name"] = (item.get("title") or item.get("name") or item.get("task_id") or "song")
     return item
 
@@ -2735,12 +3145,7 @@ async def _ai_radio_advance_locked(now: float) -> None:
     while _ai_radio_queue and guard < 100:
         guard += 1
         cur = _ai_radio_queue[0]
-        dur = 0.0
-        try:
-            dur = float(cur.get("duration") or 0.0)
-        except Exception:
-            dur = 0.0
-        dur = _clamp_duration(dur) if dur > 0 else 180.0
+        dur = _radio_item_duration(cur)
 
         end_at = _ai_radio_started_at + dur
         if now < end_at:
@@ -2793,17 +3198,12 @@ async def ai_radio():
         if not _ai_radio_queue:
             return JSONResponse({"ok": False, "detail": "No songs available for aiRadio"})
 
-        cur = dict(_ai_radio_queue[0])
+        dur = _radio_item_duration(_ai_radio_queue[0])
+        cur = {k: v for k, v in _ai_radio_queue[0].items() if not k.startswith("_")}
+        cur["duration"] = dur
         started_at = float(_ai_radio_started_at or 0.0)
         now = float(time.time())
 
-        dur = 0.0
-        try:
-            dur = float(cur.get("duration") or 0.0)
-        except Exception:
-            dur = 0.0
-        dur = _clamp_duration(dur) if dur > 0 else 180.0
-
         elapsed = max(0.0, now - started_at) if started_at > 0 else 0.0
         remaining = max(0.0, dur - elapsed)
 
@@ -2976,10 +3376,8 @@ async def _append_chat_message_internal(room: int, author: str, message: str) ->
 
         _ROOM_CACHE[room].append(msg)
 
-        fp = _room_file(room)
         try:
-            with open(fp, "a", encoding="utf-8") as f:
-                f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+            await asyncio.to_thread(_append_room_line, room, json.dumps(msg, ensure_ascii=False) + "\n")
         except Exception:
             pass
 